@@ -1,10 +1,31 @@
 """
 dedup_file_tools_commons/db.py
 Checksum cache DB schema and initialization for shared use by all tools.
+
+The checksum DB records its schema version in checksum_schema_version (DBs from before versioning are v1):
+    - v1: rowid table, checksums as hex TEXT, (checksum, is_valid) index.
+    - v2: WITHOUT ROWID table, checksums as raw digest BLOBs (half the size of hex), a partial checksum index
+          over the valid rows only, no index duplicating the primary key.
+New DBs are created as v1, which older releases sharing the same cache can still read. migrate_checksum_db()
+rewrites a DB to v2 while other processes keep using it:
+    python -m dedup_file_tools_commons.db migrate <checksum-cache.db>
+Code reading or writing checksums goes through encode_checksum/decode_checksum, so it works on both versions.
 """
+import logging
+import sqlite3
 from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
 
-CHECKSUM_DB_SCHEMA = """
+CHECKSUM_SCHEMA_VERSION = 2
+# Version of new checksum DBs (v2 DBs cannot be read by releases from before schema versioning)
+CHECKSUM_SCHEMA_DEFAULT_VERSION = 1
+
+CHECKSUM_SCHEMA_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS checksum_schema_version (
+    version INTEGER NOT NULL
+);
+"""
+
+CHECKSUM_CACHE_SCHEMA_V1 = """
 CREATE TABLE IF NOT EXISTS checksum_cache (
     uid TEXT,
     relative_path TEXT,
@@ -14,32 +35,520 @@ CREATE TABLE IF NOT EXISTS checksum_cache (
     imported_at INTEGER,
     last_validated INTEGER,
     is_valid INTEGER DEFAULT 1, -- 1=valid, 0=stale
+    algorithm TEXT DEFAULT 'sha256', -- hash engine that produced checksum (see utils/hashing.py)
+    fingerprint TEXT, -- size + head/middle/tail sample hash (see fileops.compute_fingerprint)
+    inode INTEGER, -- st_ino of the file version the checksum describes (rename detection, see find_renamed_checksum)
+    mtime_ns INTEGER, -- st_mtime_ns of that version
+    inherited_from TEXT, -- relative_path whose checksum was reused for this renamed/moved file; NULL once hashed
     PRIMARY KEY (uid, relative_path)
 );
 CREATE INDEX IF NOT EXISTS idx_checksum_cache_uid_relpath ON checksum_cache(uid, relative_path);
 CREATE INDEX IF NOT EXISTS idx_checksum_cache_checksum_valid ON checksum_cache(checksum, is_valid);
+CREATE INDEX IF NOT EXISTS idx_checksum_cache_size ON checksum_cache(size);
 """
 
-CHECKSUM_DB_SCHEMA_ATTACHED = """
-CREATE TABLE IF NOT EXISTS checksumdb.checksum_cache (
-    uid TEXT,
-    relative_path TEXT,
+CHECKSUM_CACHE_SCHEMA_V2 = """
+CREATE TABLE IF NOT EXISTS checksum_cache (
+    uid TEXT NOT NULL,
+    relative_path TEXT NOT NULL,
     size INTEGER,
     last_modified INTEGER,
-    checksum TEXT,
+    checksum BLOB, -- raw digest bytes (see encode_checksum)
     imported_at INTEGER,
     last_validated INTEGER,
     is_valid INTEGER DEFAULT 1, -- 1=valid, 0=stale
+    algorithm TEXT DEFAULT 'sha256', -- hash engine that produced checksum (see utils/hashing.py)
+    fingerprint TEXT, -- size + head/middle/tail sample hash (see fileops.compute_fingerprint)
+    inode INTEGER, -- st_ino of the file version the checksum describes (rename detection, see find_renamed_checksum)
+    mtime_ns INTEGER, -- st_mtime_ns of that version
+    inherited_from TEXT, -- relative_path whose checksum was reused for this renamed/moved file; NULL once hashed
     PRIMARY KEY (uid, relative_path)
+) WITHOUT ROWID;
+"""
+
+# Lookups by checksum or size only want valid rows: the indexes leave the stale ones out
+CHECKSUM_CACHE_INDEXES_V2 = """
+CREATE INDEX IF NOT EXISTS idx_checksum_cache_valid_checksum ON checksum_cache(checksum) WHERE is_valid = 1;
+CREATE INDEX IF NOT EXISTS idx_checksum_cache_valid_size ON checksum_cache(size) WHERE is_valid = 1;
+"""
+
+# Optional per-chunk digests of large files (see utils/chunk_hashes.py), tagged with the file version they describe
+CHECKSUM_CHUNKS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checksum_chunks (
+    uid TEXT,
+    relative_path TEXT,
+    chunk_index INTEGER,
+    chunk_offset INTEGER,
+    chunk_length INTEGER,
+    digest TEXT,
+    algorithm TEXT,
+    size INTEGER,
+    last_modified INTEGER,
+    PRIMARY KEY (uid, relative_path, chunk_index)
 );
-CREATE INDEX IF NOT EXISTS checksumdb.idx_checksum_cache_uid_relpath ON checksumdb.checksum_cache(uid, relative_path);
-CREATE INDEX IF NOT EXISTS checksumdb.idx_checksum_cache_checksum_valid ON checksumdb.checksum_cache(checksum, is_valid);
 """
 
-def init_checksum_db(checksum_db_path):
-    conn = RobustSqliteConn(checksum_db_path).connect()
+# Columns added after the first release; existing checksum DBs are migrated in place.
+CHECKSUM_CACHE_MIGRATED_COLUMNS = [
+    ('algorithm', "TEXT DEFAULT 'sha256'"),
+    ('fingerprint', "TEXT"),
+    ('inode', "INTEGER"),
+    ('mtime_ns', "INTEGER"),
+    ('inherited_from', "TEXT"),
+]
+
+# Valid rows by inode fingerprint: a path miss can reuse the checksum of the same inode version under its old path
+CHECKSUM_CACHE_INODE_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_checksum_cache_inode ON checksum_cache(inode, size, mtime_ns) WHERE is_valid = 1 AND inode IS NOT NULL;
+"""
+
+# Column order (and defaults for older DBs) used when importing checksum_cache rows from another DB.
+CHECKSUM_CACHE_IMPORT_COLUMNS = [
+    ('uid', 'NULL'),
+    ('relative_path', 'NULL'),
+    ('size', 'NULL'),
+    ('last_modified', 'NULL'),
+    ('checksum', 'NULL'),
+    ('imported_at', 'NULL'),
+    ('last_validated', 'NULL'),
+    ('is_valid', '1'),
+    ('algorithm', "'sha256'"),
+    ('fingerprint', 'NULL'),
+]
+
+CHECKSUM_CACHE_IMPORT_SQL = f"""
+    INSERT OR REPLACE INTO checksumdb.checksum_cache ({', '.join(name for name, _ in CHECKSUM_CACHE_IMPORT_COLUMNS)})
+    VALUES ({', '.join('?' for _ in CHECKSUM_CACHE_IMPORT_COLUMNS)})
+"""
+
+# A cached fingerprint/checksum stays meaningful only while size, mtime and algorithm are unchanged.
+_SAME_FILE_VERSION = """checksum_cache.size=excluded.size AND checksum_cache.last_modified=excluded.last_modified
+                AND COALESCE(checksum_cache.algorithm, 'sha256')=excluded.algorithm"""
+
+# Store a full checksum. The fingerprint is kept if the file is unchanged and none was given, else replaced.
+CHECKSUM_CACHE_UPSERT_SQL = f"""
+    INSERT INTO checksum_cache (uid, relative_path, size, last_modified, checksum, imported_at, last_validated, is_valid, algorithm, fingerprint)
+    VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?, ?)
+    ON CONFLICT(uid, relative_path) DO UPDATE SET
+        fingerprint=CASE WHEN {_SAME_FILE_VERSION}
+            THEN COALESCE(excluded.fingerprint, checksum_cache.fingerprint) ELSE excluded.fingerprint END,
+        size=excluded.size,
+        last_modified=excluded.last_modified,
+        checksum=excluded.checksum,
+        last_validated=excluded.last_validated,
+        is_valid=1,
+        algorithm=excluded.algorithm
+"""
+
+# Same, on DBs with the inode columns (rows end with inode, mtime_ns). A writer that did not stat the file passes
+# NULLs: the recorded identity is kept while the file is unchanged. A hashed checksum is no longer inherited.
+CHECKSUM_CACHE_IDENTITY_UPSERT_SQL = f"""
+    INSERT INTO checksum_cache (uid, relative_path, size, last_modified, checksum, imported_at, last_validated, is_valid, algorithm, fingerprint,
+                                inode, mtime_ns)
+    VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?, ?, ?, ?)
+    ON CONFLICT(uid, relative_path) DO UPDATE SET
+        fingerprint=CASE WHEN {_SAME_FILE_VERSION}
+            THEN COALESCE(excluded.fingerprint, checksum_cache.fingerprint) ELSE excluded.fingerprint END,
+        inode=CASE WHEN {_SAME_FILE_VERSION} THEN COALESCE(excluded.inode, checksum_cache.inode) ELSE excluded.inode END,
+        mtime_ns=CASE WHEN {_SAME_FILE_VERSION} THEN COALESCE(excluded.mtime_ns, checksum_cache.mtime_ns) ELSE excluded.mtime_ns END,
+        inherited_from=NULL,
+        size=excluded.size,
+        last_modified=excluded.last_modified,
+        checksum=excluded.checksum,
+        last_validated=excluded.last_validated,
+        is_valid=1,
+        algorithm=excluded.algorithm
+"""
+
+# Rows of the same inode version under another path (see find_renamed_checksum). Without statistics SQLite prefers
+# the primary key prefix uid=? (a scan of the whole volume): +uid keeps it on idx_checksum_cache_inode.
+CHECKSUM_CACHE_RENAMED_SQL = """
+    SELECT relative_path, checksum FROM checksum_cache
+    WHERE +uid=? AND inode=? AND size=? AND mtime_ns=? AND is_valid=1 AND inode IS NOT NULL
+      AND checksum IS NOT NULL AND COALESCE(algorithm, 'sha256')=? AND relative_path != ?
+    LIMIT 1
+"""
+
+# Copy the row of a renamed/moved file (found by find_renamed_checksum) to its new path, without reading the file.
+# Parameters: new uid, new relative_path, last_validated, source uid, source relative_path.
+CHECKSUM_CACHE_INHERIT_SQL = """
+    INSERT INTO checksum_cache (uid, relative_path, size, last_modified, checksum, imported_at, last_validated, is_valid, algorithm, fingerprint,
+                                inode, mtime_ns, inherited_from)
+    SELECT ?, ?, size, last_modified, checksum, imported_at, ?, 1, algorithm, fingerprint, inode, mtime_ns, relative_path
+    FROM checksum_cache WHERE uid=? AND relative_path=?
+    ON CONFLICT(uid, relative_path) DO UPDATE SET
+        size=excluded.size,
+        last_modified=excluded.last_modified,
+        checksum=excluded.checksum,
+        last_validated=excluded.last_validated,
+        is_valid=1,
+        algorithm=excluded.algorithm,
+        fingerprint=excluded.fingerprint,
+        inode=excluded.inode,
+        mtime_ns=excluded.mtime_ns,
+        inherited_from=excluded.inherited_from
+"""
+
+# Store a partial fingerprint. The full checksum is kept only if the file is unchanged.
+CHECKSUM_CACHE_FINGERPRINT_UPSERT_SQL = f"""
+    INSERT INTO checksum_cache (uid, relative_path, size, last_modified, checksum, imported_at, last_validated, is_valid, algorithm, fingerprint)
+    VALUES (?, ?, ?, ?, NULL, ?, ?, 1, ?, ?)
+    ON CONFLICT(uid, relative_path) DO UPDATE SET
+        checksum=CASE WHEN {_SAME_FILE_VERSION} THEN checksum_cache.checksum ELSE NULL END,
+        is_valid=CASE WHEN {_SAME_FILE_VERSION} THEN checksum_cache.is_valid ELSE 1 END,
+        size=excluded.size,
+        last_modified=excluded.last_modified,
+        last_validated=excluded.last_validated,
+        algorithm=excluded.algorithm,
+        fingerprint=excluded.fingerprint
+"""
+
+
+def migrate_checksum_cache(conn, schema='main'):
+    """Add any columns missing from an older checksum_cache table."""
+    cur = conn.cursor()
+    cur.execute(f"PRAGMA {schema}.table_info(checksum_cache);")
+    columns = [row[1] for row in cur.fetchall()]
+    for name, decl in CHECKSUM_CACHE_MIGRATED_COLUMNS:
+        if name not in columns:
+            cur.execute(f"ALTER TABLE {schema}.checksum_cache ADD COLUMN {name} {decl};")
+    _run_statements(conn, CHECKSUM_CACHE_INODE_INDEX.replace('EXISTS idx_', f'EXISTS {schema}.idx_'))
+    conn.commit()
+
+
+def has_inode_columns(conn):
+    """True if the checksum_cache table of conn records inode fingerprints (tables created by hand may not)."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(checksum_cache)")}
+    return 'inode' in columns and 'mtime_ns' in columns
+
+
+def checksum_schema_version(conn, schema=None):
+    """Schema version of the checksum DB in conn (schema, default: the one `checksum_cache` resolves to); 1 if unversioned."""
+    table = f"{schema}.checksum_schema_version" if schema else "checksum_schema_version"
+    try:
+        row = conn.execute(f"SELECT MAX(version) FROM {table}").fetchone()
+    except sqlite3.OperationalError:
+        return 1
+    return (row[0] if row else None) or 1
+
+
+def encode_checksum(checksum, version):
+    """Checksum as stored by schema version: raw digest bytes in v2 (for hex that round-trips), else unchanged."""
+    if version >= 2 and checksum and isinstance(checksum, str):
+        try:
+            digest = bytes.fromhex(checksum)
+        except ValueError:
+            return checksum
+        if digest.hex() == checksum:
+            return digest
+    return checksum
+
+
+def decode_checksum(value):
+    """Checksum as the code uses it (a hex string), from a value stored by any schema version."""
+    return value.hex() if isinstance(value, bytes) else value
+
+
+def encode_checksum_rows(rows, version, column=4):
+    """Rows (UPSERT/IMPORT column order: checksum at column 4) with their checksum encoded for schema version."""
+    if version < 2:
+        return rows
+    return [tuple(row[:column]) + (encode_checksum(row[column], version),) + tuple(row[column + 1:]) for row in rows]
+
+
+def remember_checksum_schema(conn, schema='checksumdb'):
+    """
+    Look up the schema version and inode columns of the checksum DB attached to conn as schema and keep them on
+    conn, so the checksum lookups and upserts on it run no extra query (the connection pool does this when it
+    attaches the DB). Connections without them are looked up on every call.
+    The values are tagged with the DB's schema cookie: refresh_checksum_schema() looks them up again once the
+    schema changed, e.g. when migrate_checksum_db() swapped in the v2 table from another connection or process.
+    """
+    cookie = conn.execute(f"PRAGMA {schema}.schema_version").fetchone()[0]
+    conn.checksum_schema = (checksum_schema_version(conn), has_inode_columns(conn))
+    conn.checksum_schema_cookie = (schema, cookie)
+
+
+def refresh_checksum_schema(conn):
+    """Look up the values kept by remember_checksum_schema() again if the checksum DB schema changed since."""
+    schema, cookie = conn.checksum_schema_cookie
+    if conn.execute(f"PRAGMA {schema}.schema_version").fetchone()[0] != cookie:
+        remember_checksum_schema(conn, schema)
+
+
+def _checksum_schema(conn):
+    """(schema version, has_inode_columns) of the checksum DB in conn, as remembered on conn or looked up now."""
+    schema = getattr(conn, 'checksum_schema', None)
+    return schema if schema is not None else (checksum_schema_version(conn), has_inode_columns(conn))
+
+
+def checksum_param(conn, checksum, version=None):
+    """checksum encoded for the schema version of the checksum DB in conn, to compare with the checksum column."""
+    if version is None:
+        version = getattr(conn, 'checksum_schema', None)
+        version = version[0] if version is not None else checksum_schema_version(conn)
+    return encode_checksum(checksum, version)
+
+
+def ensure_checksum_cache_indexes(conn, schema='checksumdb'):
+    """Create the checksum_cache indexes of the DB's schema version (schema: the checksum DB in conn)."""
+    if checksum_schema_version(conn, schema) >= 2:
+        script = CHECKSUM_CACHE_INDEXES_V2.replace('EXISTS idx_', f'EXISTS {schema}.idx_')
+    else:
+        script = (f"CREATE INDEX IF NOT EXISTS {schema}.idx_checksum_cache_uid_relpath ON checksum_cache(uid, relative_path);"
+                  f"CREATE INDEX IF NOT EXISTS {schema}.idx_checksum_cache_checksum_valid ON checksum_cache(checksum, is_valid);")
+    _run_statements(conn, script)
+    conn.commit()
+
+
+def upsert_checksums(conn, rows):
+    """
+    executemany(CHECKSUM_CACHE_UPSERT_SQL, rows), with the checksums stored the way the DB's schema version expects.
+    Rows may carry the file's (st_ino, st_mtime_ns) as two extra columns; they are recorded where the DB has room.
+    """
+    version, inode_columns = _checksum_schema(conn)
+    rows = encode_checksum_rows(rows, version)
+    if inode_columns:
+        conn.executemany(CHECKSUM_CACHE_IDENTITY_UPSERT_SQL, [tuple(row) + (None,) * (11 - len(row)) for row in rows])
+    else:
+        conn.executemany(CHECKSUM_CACHE_UPSERT_SQL, [tuple(row[:9]) for row in rows])
+
+
+def find_renamed_checksum(conn, uid, relative_path, stat_result, algorithm):
+    """
+    Rename/move detection: (relative_path, hex checksum) of a valid row of another path of volume uid with the same
+    inode fingerprint (st_ino, size, mtime_ns) as stat_result, i.e. the same file version under its old name (or a
+    hardlink of it). None if there is none, or if the file system has no stable inode numbers.
+    """
+    if not stat_result.st_ino or not _checksum_schema(conn)[1]:
+        return None
+    row = conn.execute(
+        CHECKSUM_CACHE_RENAMED_SQL,
+        (uid, stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns, algorithm, str(relative_path))
+    ).fetchone()
+    return (row[0], decode_checksum(row[1])) if row else None
+
+
+def read_checksum_cache_rows(conn):
+    """
+    Read all checksum_cache rows from another checksum DB, in CHECKSUM_CACHE_IMPORT_COLUMNS order.
+    Columns missing from older DBs are filled with their defaults (e.g. algorithm='sha256'), and checksums
+    are returned as hex whatever the schema version of that DB.
+    """
+    cur = conn.cursor()
+    cur.execute("PRAGMA table_info(checksum_cache);")
+    columns = {row[1] for row in cur.fetchall()}
+    select = ', '.join(name if name in columns else default for name, default in CHECKSUM_CACHE_IMPORT_COLUMNS)
+    cur.execute(f"SELECT {select} FROM checksum_cache")
+    return [row[:4] + (decode_checksum(row[4]),) + row[5:] for row in cur.fetchall()]
+
+
+def _run_statements(conn, script):
+    # executescript() would commit the open transaction first
+    statement = ''
+    for part in script.split(';'):
+        statement += part + ';'
+        if sqlite3.complete_statement(statement):  # false inside a trigger body
+            if statement.strip(' \n;'):
+                conn.execute(statement)
+            statement = ''
+
+
+def init_checksum_db(checksum_db_path, version=None):
+    """
+    Create the checksum DB schema, or bring an existing DB up to date within its schema version.
+    version: schema version of a new DB (default: CHECKSUM_SCHEMA_DEFAULT_VERSION); use migrate_checksum_db()
+    to change the version of an existing one.
+    """
+    # Schema changes must not run under the readonly-report profile of a reporting phase
+    conn = RobustSqliteConn(checksum_db_path, profile='safe').connect()
+    try:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='checksum_cache'").fetchone()
+        conn.executescript(CHECKSUM_SCHEMA_VERSION_TABLE)
+        current = checksum_schema_version(conn, 'main') if exists else (version or CHECKSUM_SCHEMA_DEFAULT_VERSION)
+        if not conn.execute("SELECT 1 FROM checksum_schema_version").fetchone():
+            conn.execute("INSERT INTO checksum_schema_version (version) VALUES (?)", (current,))
+        if current >= 2:
+            conn.executescript(CHECKSUM_CACHE_SCHEMA_V2 + CHECKSUM_CACHE_INDEXES_V2)
+        else:
+            conn.executescript(CHECKSUM_CACHE_SCHEMA_V1)
+        conn.executescript(CHECKSUM_CHUNKS_SCHEMA)
+        migrate_checksum_cache(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+DEFAULT_MIGRATION_BATCH_SIZE = 50000
+# Every column: the import columns (checksum at index 4) and the inode fingerprint, which imports leave out
+_MIGRATED_COLUMN_NAMES = [name for name, _ in CHECKSUM_CACHE_IMPORT_COLUMNS] + ['inode', 'mtime_ns', 'inherited_from']
+_CHECKSUM_CACHE_COLUMNS = ', '.join(_MIGRATED_COLUMN_NAMES)
+_V2_INSERT_SQL = f"""
+    INSERT OR REPLACE INTO checksum_cache_v2 ({_CHECKSUM_CACHE_COLUMNS})
+    VALUES ({', '.join('?' for _ in _MIGRATED_COLUMN_NAMES)})
+"""
+# Keys written by other connections while the rows are copied; they are copied again before the swap
+_MIGRATION_SETUP = f"""
+DROP TABLE IF EXISTS checksum_cache_v2;
+DROP TABLE IF EXISTS checksum_cache_migration_log;
+{CHECKSUM_CACHE_SCHEMA_V2.replace('checksum_cache (', 'checksum_cache_v2 (')}
+{CHECKSUM_CACHE_INDEXES_V2.replace('ON checksum_cache(', 'ON checksum_cache_v2(')}
+CREATE TABLE checksum_cache_migration_log (uid TEXT, relative_path TEXT);
+CREATE TRIGGER IF NOT EXISTS checksum_cache_migration_insert AFTER INSERT ON checksum_cache BEGIN
+    INSERT INTO checksum_cache_migration_log VALUES (NEW.uid, NEW.relative_path);
+END;
+CREATE TRIGGER IF NOT EXISTS checksum_cache_migration_update AFTER UPDATE ON checksum_cache BEGIN
+    INSERT INTO checksum_cache_migration_log VALUES (OLD.uid, OLD.relative_path);
+    INSERT INTO checksum_cache_migration_log VALUES (NEW.uid, NEW.relative_path);
+END;
+CREATE TRIGGER IF NOT EXISTS checksum_cache_migration_delete AFTER DELETE ON checksum_cache BEGIN
+    INSERT INTO checksum_cache_migration_log VALUES (OLD.uid, OLD.relative_path);
+END;
+"""
+_MIGRATION_TRIGGERS = ('checksum_cache_migration_insert', 'checksum_cache_migration_update', 'checksum_cache_migration_delete')
+
+
+def _v2_rows(rows):
+    # The v2 primary key cannot be NULL; such v1 rows could never be looked up anyway
+    return encode_checksum_rows([row for row in rows if row[0] is not None and row[1] is not None], 2)
+
+
+def _in_write_transaction(conn, fn):
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        conn.executescript(CHECKSUM_DB_SCHEMA)
+        result = fn()
         conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return result
+
+
+def migrate_checksum_db(checksum_db_path, batch_size=DEFAULT_MIGRATION_BATCH_SIZE, vacuum=True, progress=None):
+    """
+    Rewrite a v1 checksum DB to schema v2 while other processes keep using it. Returns the number of rows copied
+    (0 if the DB already is v2).
+
+    Triggers record the keys written during the migration. The rows are copied to a v2 table in batches, each a
+    short transaction of its own; the last transaction copies the recorded keys again and swaps the tables, so
+    no write is lost. An interrupted migration leaves the v1 table in use and starts over when rerun.
+    vacuum: rebuild the file afterwards to give the space of the v1 table back to the file system (this waits
+    for a moment without other writers). progress: optional object with update(n), e.g. a tqdm bar.
+    """
+    from dedup_file_tools_commons.utils.sqlite_profiles import checkpoint_wal
+    init_checksum_db(checksum_db_path)
+    conn = RobustSqliteConn(checksum_db_path, profile='safe').connect()
+    try:
+        if checksum_schema_version(conn, 'main') >= CHECKSUM_SCHEMA_VERSION:
+            logging.info(f"[SQLITE] {checksum_db_path} already uses checksum schema v{CHECKSUM_SCHEMA_VERSION}")
+            # Left over if a migration was interrupted right after the swap
+            conn.execute("DROP TABLE IF EXISTS checksum_cache_v1")
+            return 0
+        def setup():
+            _run_statements(conn, _MIGRATION_SETUP)
+            return conn.execute("SELECT MAX(rowid) FROM checksum_cache").fetchone()[0] or 0
+        # Rows inserted after the setup are in the log: the copy stops at the last rowid of the setup
+        max_rowid = _in_write_transaction(conn, setup)
+        logging.info(f"[SQLITE] Migrating {checksum_db_path} to checksum schema v{CHECKSUM_SCHEMA_VERSION}")
+        copied, last_rowid = 0, 0
+        while True:
+            def copy_batch():
+                rows = conn.execute(
+                    f"SELECT rowid, {_CHECKSUM_CACHE_COLUMNS} FROM checksum_cache WHERE rowid > ? AND rowid <= ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, max_rowid, batch_size)).fetchall()
+                conn.executemany(_V2_INSERT_SQL, _v2_rows([row[1:] for row in rows]))
+                return rows
+            rows = _in_write_transaction(conn, copy_batch)
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+            copied += len(rows)
+            if progress:
+                progress.update(len(rows))
+
+        def swap():
+            changed = conn.execute(f"""
+                SELECT {', '.join('c.' + name for name in _MIGRATED_COLUMN_NAMES)}
+                FROM (SELECT DISTINCT uid, relative_path FROM checksum_cache_migration_log) AS k
+                JOIN checksum_cache AS c ON c.uid = k.uid AND c.relative_path = k.relative_path
+            """).fetchall()
+            conn.execute("""
+                DELETE FROM checksum_cache_v2 WHERE EXISTS (SELECT 1 FROM checksum_cache_migration_log AS k
+                    WHERE k.uid = checksum_cache_v2.uid AND k.relative_path = checksum_cache_v2.relative_path)
+            """)
+            conn.executemany(_V2_INSERT_SQL, _v2_rows(changed))
+            for trigger in _MIGRATION_TRIGGERS:
+                conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            # The v1 table is only renamed here: dropping it frees every page, which would hold the lock much longer
+            conn.execute("ALTER TABLE checksum_cache RENAME TO checksum_cache_v1")
+            conn.execute("ALTER TABLE checksum_cache_v2 RENAME TO checksum_cache")
+            conn.execute("DROP TABLE checksum_cache_migration_log")
+            conn.execute("DELETE FROM checksum_schema_version")
+            conn.execute("INSERT INTO checksum_schema_version (version) VALUES (?)", (CHECKSUM_SCHEMA_VERSION,))
+            return len(changed)
+        rewritten = _in_write_transaction(conn, swap)
+        _in_write_transaction(conn, lambda: conn.execute("DROP TABLE checksum_cache_v1"))
+        # Its name was taken by the index of the v1 table until now
+        _in_write_transaction(conn, lambda: _run_statements(conn, CHECKSUM_CACHE_INODE_INDEX))
+        logging.info(f"[SQLITE] {checksum_db_path}: {copied} rows copied to checksum schema v{CHECKSUM_SCHEMA_VERSION}, "
+                     f"{rewritten} rows written meanwhile copied again")
+        if vacuum:
+            conn.execute("VACUUM")
     finally:
         conn.close()
+    checkpoint_wal(checksum_db_path)
+    return copied
+
+
+def main(argv=None):
+    """python -m dedup_file_tools_commons.db {migrate,version,verify-inherited} <checksum DB>"""
+    import argparse
+    import os
+    from tqdm import tqdm
+    from dedup_file_tools_commons.utils.logging_config import setup_logging
+    parser = argparse.ArgumentParser(description="Checksum cache DB schema maintenance")
+    parser.add_argument('--log-level', default=None, help='Console log level (default: WARNING)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    parser_migrate = subparsers.add_parser('migrate', help=f'Rewrite a checksum DB to schema v{CHECKSUM_SCHEMA_VERSION}; it stays usable meanwhile')
+    parser_migrate.add_argument('checksum_db', help='Path to the checksum DB (e.g. <job-dir>/checksum-cache.db)')
+    parser_migrate.add_argument('--batch-size', type=int, default=DEFAULT_MIGRATION_BATCH_SIZE,
+                                help=f'Rows copied per transaction (default: {DEFAULT_MIGRATION_BATCH_SIZE})')
+    parser_migrate.add_argument('--no-vacuum', action='store_true', help='Do not rebuild the file afterwards (the freed space is reused by SQLite but the file does not shrink)')
+    parser_version = subparsers.add_parser('version', help='Print the schema version of a checksum DB')
+    parser_version.add_argument('checksum_db', help='Path to the checksum DB')
+    parser_verify = subparsers.add_parser('verify-inherited', help='Rehash the files whose checksum was inherited from a renamed/moved path')
+    parser_verify.add_argument('checksum_db', help='Path to the checksum DB')
+    parser_verify.add_argument('--limit', type=int, default=None, help='Verify at most this many files (default: all)')
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.checksum_db):
+        parser.error(f"No such checksum DB: {args.checksum_db}")
+    setup_logging(job_dir=os.path.dirname(os.path.abspath(args.checksum_db)), log_level=args.log_level)
+    if args.command == 'version':
+        conn = sqlite3.connect(args.checksum_db)
+        try:
+            print(checksum_schema_version(conn, 'main'))
+        finally:
+            conn.close()
+        return 0
+    if args.command == 'verify-inherited':
+        from contextlib import closing
+        from dedup_file_tools_commons.utils.checksum_cache import ChecksumCache
+        from dedup_file_tools_commons.utils.uidpath import UidPathUtil
+        init_checksum_db(args.checksum_db)
+        cache = ChecksumCache(lambda: closing(RobustSqliteConn(args.checksum_db).connect()), UidPathUtil())
+        counts = cache.verify_inherited(limit=args.limit)
+        print(f"verified: {counts['verified']}, mismatched: {counts['mismatched']}, stale: {counts['stale']}")
+        return 1 if counts['mismatched'] else 0
+    conn = sqlite3.connect(args.checksum_db)
+    try:
+        total = conn.execute("SELECT COUNT(*) FROM checksum_cache").fetchone()[0]
+    finally:
+        conn.close()
+    with tqdm(total=total, desc="Migrating checksum cache", unit="row") as pbar:
+        migrate_checksum_db(args.checksum_db, batch_size=args.batch_size, vacuum=not args.no_vacuum, progress=pbar)
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -2,7 +2,16 @@
 from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
 from typing import Optional
 from pathlib import Path
-from dedup_file_tools_commons.utils.fileops import compute_sha256
+from dedup_file_tools_commons.utils.fileops import compute_hash, compute_fingerprint, FINGERPRINT_MIN_SIZE, DEFAULT_CACHE_POLICY, validate_cache_policy
+from dedup_file_tools_commons.utils.chunk_hashes import hash_file_with_chunks, diff_chunk_regions
+from dedup_file_tools_commons.db import (CHECKSUM_CACHE_FINGERPRINT_UPSERT_SQL, CHECKSUM_CACHE_INHERIT_SQL, upsert_checksums, checksum_param,
+                                         decode_checksum, ensure_checksum_cache_indexes, find_renamed_checksum, has_inode_columns)
+from dedup_file_tools_commons.utils.hashing import DEFAULT_HASH_ALGORITHM, validate_algorithm
+from dedup_file_tools_commons.utils.hardlinks import inode_key
+from dedup_file_tools_commons.utils.db_utils import transaction
+from dedup_file_tools_commons.utils.checksum_lru import ChecksumLRU
+from dedup_file_tools_commons.utils.checksum_set import ChecksumSet
+from dedup_file_tools_commons.utils.path_store import has_path_store_layout, uid_path_match_sql
 import time
 
 
@@ -10,40 +19,163 @@ class ChecksumCache:
     """
     Centralized access for all checksum cache operations.
     Uses UidPath for all conversions and file resolution.
+    Checksums are computed with `algorithm` (see hashing.py); cached rows produced
+    by a different algorithm are treated as a cache miss.
+    If chunk_size is set, files of at least chunk_size bytes also get per-chunk digests (see chunk_hashes.py).
+    Checksums computed for hardlinked files are remembered per inode, so the other paths of the same inode
+    are cached without being read again (see hardlinks.py).
+    Full reads follow cache_policy (see fileops.CACHE_POLICIES).
+
+    Bulk methods (get_many, validate_many, put_many) take iterables of (uid, relative_path) tuples or paths and
+    run in one connection and one transaction: lookups join a temp table of the keys against checksum_cache,
+    writes use executemany. Use them in loops over whole tables instead of the per-path methods.
+
+    Current rows read or written by this instance are also kept in an in-memory LRU (see checksum_lru.py), so
+    repeated lookups of an unchanged file skip SQLite. Pass lru to share one between instances or to size it
+    (ChecksumLRU(max_entries=0) disables it).
+
+    Rows record the inode fingerprint (st_ino, size, mtime_ns) of the file version they describe. On a path miss,
+    a valid row of another path of the same volume with the same fingerprint (the file was renamed or moved) is
+    copied to the new path without reading the file, and marked as inherited (inherited_from); verify_inherited()
+    rehashes such rows later. inherit_renamed=False always hashes.
     """
-    def __init__(self, conn_factory, uid_path):
+    def __init__(self, conn_factory, uid_path, algorithm=DEFAULT_HASH_ALGORITHM, chunk_size=None, cache_policy=DEFAULT_CACHE_POLICY, lru=None,
+                 inherit_renamed=True):
         self.conn_factory = conn_factory
         self.uid_path = uid_path
+        self.algorithm = validate_algorithm(algorithm)
+        self.chunk_size = chunk_size
+        self.cache_policy = validate_cache_policy(cache_policy)
+        self.lru = lru if lru is not None else ChecksumLRU()
+        self.inherit_renamed = inherit_renamed
+        # {(st_dev, st_ino, size, mtime): checksum} for hardlinked files hashed by this instance
+        self._inode_checksums = {}
+        # {table: True if it is a path store view}, see _path_match
+        self._path_store_layouts = {}
+
+    def _path_match(self, conn, table, alias):
+        """Condition matching alias (a row of the job table) to cc.relative_path, indexable for path store views."""
+        layout = self._path_store_layouts.get(table)
+        if layout is None:
+            layout = self._path_store_layouts[table] = has_path_store_layout(conn, table)
+        return uid_path_match_sql(alias, 'cc.uid', 'cc.relative_path', layout)
+
+    # --- Bulk API ---
+    def _resolve_keys(self, items):
+        """Map items ((uid, relative_path) tuples or paths) to {item: (uid, relative_path)}; paths without a uid are left out."""
+        keys = {}
+        for item in items:
+            if isinstance(item, tuple):
+                uid, rel_path = item
+            else:
+                uid_path_obj = self.uid_path.convert_path(str(item))
+                uid, rel_path = uid_path_obj.uid, uid_path_obj.relative_path
+            if uid:
+                keys[item] = (uid, str(rel_path))
+        return keys
+
+    def _fetch_rows(self, conn, keys):
+        """{(uid, relative_path): (checksum, size, last_modified, is_valid, algorithm, fingerprint)} for the cached keys."""
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS bulk_keys (uid TEXT, relative_path TEXT, PRIMARY KEY (uid, relative_path))")
+        with transaction(conn):
+            conn.execute("DELETE FROM temp.bulk_keys")
+            conn.executemany("INSERT OR IGNORE INTO temp.bulk_keys (uid, relative_path) VALUES (?, ?)", keys)
+        cur = conn.execute("""
+            SELECT c.uid, c.relative_path, c.checksum, c.size, c.last_modified, c.is_valid, c.algorithm, c.fingerprint
+            FROM temp.bulk_keys AS k
+            JOIN checksum_cache AS c ON c.uid = k.uid AND c.relative_path = k.relative_path
+        """)
+        return {(row[0], row[1]): (decode_checksum(row[2]),) + row[3:] for row in cur.fetchall()}
+
+    def _is_current(self, row):
+        return row[3] == 1 and (row[4] or DEFAULT_HASH_ALGORITHM) == self.algorithm
+
+    def _remember(self, rows):
+        """Keep the current rows of a _fetch_rows() result in the LRU."""
+        for key, row in rows.items():
+            if row[0] and self._is_current(row):
+                self.lru.put(key, row[1], row[2], row[0])
+
+    def get_many(self, items):
+        """Bulk get(): {item: checksum} for the items with a valid cached checksum of this algorithm."""
+        keys = self._resolve_keys(items)
+        if not keys:
+            return {}
+        with self.conn_factory() as conn:
+            rows = self._fetch_rows(conn, set(keys.values()))
+        self._remember(rows)
+        result = {}
+        for item, key in keys.items():
+            row = rows.get(key)
+            if row and row[0] and self._is_current(row):
+                result[item] = row[0]
+        return result
+
+    def validate_many(self, items, field='checksum'):
+        """
+        Check cached rows against the files on disk: returns {item: value of field ('checksum' or 'fingerprint')}
+        for the items whose valid row of this algorithm still matches the file's size and mtime. Rows of files
+        that are missing or changed are marked stale (is_valid=0) in the same transaction.
+        """
+        from dedup_file_tools_commons.utils.uidpath import UidPath
+        column = {'checksum': 0, 'fingerprint': 5}[field]
+        keys = self._resolve_keys(items)
+        if not keys:
+            return {}
+        result = {}
+        stale = []
+        with self.conn_factory() as conn, transaction(conn):
+            rows = self._fetch_rows(conn, set(keys.values()))
+            for item, key in keys.items():
+                row = rows.get(key)
+                if not row or not self._is_current(row):
+                    continue
+                path = self.uid_path.reconstruct_path(UidPath(*key)) if isinstance(item, tuple) else item
+                try:
+                    stat = Path(path).stat() if path else None
+                except OSError:
+                    stat = None
+                if stat is None or stat.st_size != row[1] or int(stat.st_mtime) != row[2]:
+                    stale.append(key)
+                    continue
+                if row[0]:
+                    self.lru.put(key, row[1], row[2], row[0])
+                if row[column]:
+                    result[item] = row[column]
+            if stale:
+                conn.executemany("UPDATE checksum_cache SET is_valid=0 WHERE uid=? AND relative_path=?", stale)
+        for key in stale:
+            self.lru.invalidate(key)
+        return result
+
+    def put_many(self, rows):
+        """
+        Bulk insert_or_update(): rows are (item, size, last_modified, checksum) or
+        (item, size, last_modified, checksum, fingerprint), written with one executemany in one transaction.
+        """
+        rows = list(rows)
+        keys = self._resolve_keys(row[0] for row in rows)
+        now = int(time.time())
+        params = [(*keys[row[0]], row[1], row[2], row[3], now, now, self.algorithm, row[4] if len(row) > 4 else None)
+                  for row in rows if row[0] in keys]
+        if not params:
+            return
+        with self.conn_factory() as conn, transaction(conn):
+            upsert_checksums(conn, params)
+        for param in params:
+            self.lru.put(param[:2], param[2], param[3], param[4])
 
     def exists_at_paths(self, paths, checksum):
-        for path in paths:
-            uid_path_obj = self.uid_path.convert_path(path)
-            uid, rel_path = uid_path_obj.uid, uid_path_obj.relative_path
-            if not uid:
-                continue
-            with self.conn_factory() as conn:
-                cur = conn.cursor()
-                cur.execute(
-                    "SELECT 1 FROM checksumdb.checksum_cache WHERE uid=? AND relative_path=? AND checksum=? AND is_valid=1 LIMIT 1",
-                    (uid, str(rel_path), checksum)
-                )
-                if cur.fetchone():
-                    return True
-        return False
+        return self.exists_at_uid_relpath_array(self._resolve_keys(paths).values(), checksum)
 
     def exists_at_uid_relpath_array(self, uid_relpath_list, checksum):
-        for uid, rel_path in uid_relpath_list:
-            if not uid:
-                continue
-            with self.conn_factory() as conn:
-                cur = conn.cursor()
-                cur.execute(
-                    "SELECT 1 FROM checksumdb.checksum_cache WHERE uid=? AND relative_path=? AND checksum=? AND is_valid=1 LIMIT 1",
-                    (uid, str(rel_path), checksum)
-                )
-                if cur.fetchone():
-                    return True
-        return False
+        keys = {(uid, str(rel_path)) for uid, rel_path in uid_relpath_list if uid}
+        if not keys:
+            return False
+        with self.conn_factory() as conn:
+            rows = self._fetch_rows(conn, keys)
+        self._remember(rows)
+        return any(row[0] == checksum and row[3] == 1 for row in rows.values())
 
     def exists_at_destination(self, uid, rel_path):
         with self.conn_factory() as conn:
@@ -64,16 +196,13 @@ class ChecksumCache:
                 WHERE c.checksum = ? AND c.is_valid = 1
                 LIMIT 1
                 """,
-                (checksum,)
+                (checksum_param(conn, checksum),)
             )
             return cur.fetchone() is not None
 
     def ensure_indexes(self):
         with self.conn_factory() as conn:
-            cur = conn.cursor()
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_checksum_cache_uid_relpath ON checksumdb.checksum_cache(uid, relative_path)")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_checksum_cache_checksum_valid ON checksumdb.checksum_cache(checksum, is_valid)")
-            conn.commit()
+            ensure_checksum_cache_indexes(conn)
 
     def get_or_compute_with_invalidation(self, path: str) -> Optional[str]:
         import logging
@@ -85,14 +214,19 @@ class ChecksumCache:
         if not file_path.exists():
             return None
         stat = file_path.stat()
+        remembered = self.lru.get((uid, rel_path), stat.st_size, int(stat.st_mtime))
+        if remembered:
+            return remembered
         try:
             with self.conn_factory() as conn:
                 cur = conn.cursor()
                 cur.execute(
-                    "SELECT checksum, size, last_modified, is_valid FROM checksum_cache WHERE uid=? AND relative_path=? ORDER BY last_validated DESC LIMIT 1",
+                    "SELECT checksum, size, last_modified, is_valid, algorithm FROM checksum_cache WHERE uid=? AND relative_path=? ORDER BY last_validated DESC LIMIT 1",
                     (uid, str(rel_path))
                 )
                 row = cur.fetchone()
+            if row:
+                row = (decode_checksum(row[0]),) + row[1:]
         except Exception as e:
             import traceback
             logging.error(f"[ChecksumCache] Exception during cache query for {file_path}: {e}")
@@ -101,33 +235,207 @@ class ChecksumCache:
             # Log the current stack (from the caller)
             logging.error("[ChecksumCache] Full call stack:\n" + ''.join(traceback.format_stack()))
             return None
-        if row and row[0] and row[3] == 1:
-            cached_checksum, cached_size, cached_mtime, _ = row
+        if row and row[0] and row[3] == 1 and (row[4] or DEFAULT_HASH_ALGORITHM) == self.algorithm:
+            cached_checksum, cached_size, cached_mtime, _, _ = row
             if cached_size == stat.st_size and cached_mtime == int(stat.st_mtime):
+                self.lru.put((uid, rel_path), cached_size, cached_mtime, cached_checksum)
                 return cached_checksum
+        inode = inode_key(stat)
+        inode_version = inode + (stat.st_size, int(stat.st_mtime)) if inode else None
+        shared = self._inode_checksums.get(inode_version) if inode_version else None
+        if shared:
+            # Another path of the same hardlinked inode was just hashed
+            self.insert_or_update(path, stat.st_size, int(stat.st_mtime), shared, inode=stat.st_ino, mtime_ns=stat.st_mtime_ns)
+            return shared
+        inherited = self._inherit_renamed(uid, rel_path, stat)
+        if inherited:
+            return inherited
         # Only log when cache miss or invalid
         logging.info(f"[ChecksumCache] No valid cache, computing checksum for {file_path}")
-        checksum = compute_sha256(file_path)
+        if self.chunk_size and stat.st_size >= self.chunk_size:
+            checksum, _, _ = hash_file_with_chunks(self.conn_factory, uid, rel_path, str(file_path), self.algorithm, self.chunk_size,
+                                                   self.cache_policy)
+        else:
+            checksum = compute_hash(file_path, self.algorithm, cache_policy=self.cache_policy)
         logging.info(f"[ChecksumCache] Computed checksum for {file_path}: {checksum}")
+        if checksum and inode_version:
+            self._inode_checksums[inode_version] = checksum
         if checksum:
-            self.insert_or_update(path, stat.st_size, int(stat.st_mtime), checksum)
+            # The head/middle/tail samples are in the page cache now, so the fingerprint is nearly free
+            fingerprint = compute_fingerprint(file_path, self.algorithm) if stat.st_size >= FINGERPRINT_MIN_SIZE else None
+            self.insert_or_update(path, stat.st_size, int(stat.st_mtime), checksum, fingerprint=fingerprint,
+                                  inode=stat.st_ino, mtime_ns=stat.st_mtime_ns)
         return checksum
 
+    def _inherit_renamed(self, uid, rel_path, stat):
+        """Checksum cached for the same inode version under another path of the volume, copied to rel_path; None on a miss."""
+        import logging
+        if not self.inherit_renamed:
+            return None
+        with self.conn_factory() as conn, transaction(conn):
+            found = find_renamed_checksum(conn, uid, rel_path, stat, self.algorithm)
+            if found:
+                conn.execute(CHECKSUM_CACHE_INHERIT_SQL, (uid, str(rel_path), int(time.time()), uid, found[0]))
+        if not found:
+            return None
+        logging.info(f"[ChecksumCache] {rel_path} inherits the checksum of {found[0]} (same inode, size and mtime)")
+        self.lru.put((uid, rel_path), stat.st_size, int(stat.st_mtime), found[1])
+        return found[1]
+
+    def verify_inherited(self, limit=None):
+        """
+        Rehash the files whose checksum was inherited from a renamed path, with the algorithm of their row.
+        A matching row becomes an ordinary hashed row, a mismatch is logged and the new checksum stored, and rows of
+        missing or changed files are marked stale. Returns {'verified': n, 'mismatched': n, 'stale': n}.
+        """
+        import logging
+        from dedup_file_tools_commons.utils.uidpath import UidPath
+        counts = {'verified': 0, 'mismatched': 0, 'stale': 0}
+        with self.conn_factory() as conn:
+            if not has_inode_columns(conn):
+                return counts
+            sql = ("SELECT uid, relative_path, size, last_modified, checksum, algorithm FROM checksum_cache "
+                   "WHERE inherited_from IS NOT NULL AND is_valid=1")
+            rows = conn.execute(sql + (f" LIMIT {int(limit)}" if limit else "")).fetchall()
+        for uid, rel_path, size, mtime, stored, algorithm in rows:
+            path = self.uid_path.reconstruct_path(UidPath(uid, rel_path))
+            try:
+                stat = Path(path).stat() if path else None
+            except OSError:
+                stat = None
+            if stat is None or stat.st_size != size or int(stat.st_mtime) != mtime:
+                with self.conn_factory() as conn:
+                    conn.execute("UPDATE checksum_cache SET is_valid=0 WHERE uid=? AND relative_path=?", (uid, rel_path))
+                    conn.commit()
+                self.lru.invalidate((uid, rel_path))
+                counts['stale'] += 1
+                continue
+            algorithm = algorithm or DEFAULT_HASH_ALGORITHM
+            try:
+                checksum = compute_hash(path, algorithm, cache_policy=self.cache_policy)
+            except (OSError, ValueError) as e:
+                logging.error(f"[ChecksumCache] Cannot verify inherited checksum of {path}: {e}")
+                continue
+            if checksum == decode_checksum(stored):
+                counts['verified'] += 1
+            else:
+                logging.warning(f"[ChecksumCache] Inherited checksum of {path} did not match its content; stored the new checksum")
+                counts['mismatched'] += 1
+            self.insert_or_update(str(path), stat.st_size, int(stat.st_mtime), checksum, algorithm=algorithm,
+                                  inode=stat.st_ino, mtime_ns=stat.st_mtime_ns)
+        logging.info(f"[ChecksumCache] Inherited checksums: {counts}")
+        return counts
+
+    def diff_chunk_regions(self, path: str):
+        """
+        Return the (offset, length) regions of path whose content no longer matches its recorded chunk
+        digests, or None if the file has no chunk digests.
+        """
+        uid_path_obj = self.uid_path.convert_path(path)
+        uid, rel_path = uid_path_obj.uid, uid_path_obj.relative_path
+        if not uid or not Path(path).exists():
+            return None
+        return diff_chunk_regions(self.conn_factory, uid, rel_path, str(path), self.cache_policy)
+
+    def get_or_compute_fingerprint(self, path: str) -> Optional[str]:
+        """
+        Return the partial fingerprint of path (see fileops.compute_fingerprint), from the cache if
+        size/mtime still match, else computed and stored. Returns None for files smaller than
+        FINGERPRINT_MIN_SIZE or that cannot be resolved; callers then fall back to the full hash.
+        """
+        uid_path_obj = self.uid_path.convert_path(path)
+        uid, rel_path = uid_path_obj.uid, uid_path_obj.relative_path
+        if not uid:
+            return None
+        file_path = Path(path)
+        if not file_path.exists():
+            return None
+        stat = file_path.stat()
+        if stat.st_size < FINGERPRINT_MIN_SIZE:
+            return None
+        with self.conn_factory() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT fingerprint, size, last_modified, is_valid, algorithm FROM checksum_cache WHERE uid=? AND relative_path=? LIMIT 1",
+                (uid, str(rel_path))
+            )
+            row = cur.fetchone()
+        if row and row[0] and row[3] == 1 and (row[4] or DEFAULT_HASH_ALGORITHM) == self.algorithm:
+            if row[1] == stat.st_size and row[2] == int(stat.st_mtime):
+                return row[0]
+        fingerprint = compute_fingerprint(file_path, self.algorithm)
+        if fingerprint:
+            now = int(time.time())
+            with self.conn_factory() as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    CHECKSUM_CACHE_FINGERPRINT_UPSERT_SQL,
+                    (uid, str(rel_path), stat.st_size, int(stat.st_mtime), now, now, self.algorithm, fingerprint)
+                )
+                conn.commit()
+            # The upsert drops the checksum of a changed file
+            self.lru.invalidate((uid, rel_path))
+        return fingerprint
+
+    def may_exist_at_destination(self, size: int, fingerprint: str) -> bool:
+        """
+        Cheap check before fully hashing a source file: returns False only if no destination pool file
+        and no destination file can hold the same content, i.e. there is no valid cache row of the same
+        size whose fingerprint is equal or unknown. Fingerprints depend on the algorithm, so the fingerprint
+        of a row of another algorithm counts as unknown.
+        """
+        with self.conn_factory() as conn:
+            cur = conn.cursor()
+            for table in ('destination_pool_files', 'destination_files'):
+                cur.execute(
+                    f"""
+                    SELECT 1 FROM checksumdb.checksum_cache AS cc
+                    JOIN {table} AS t ON t.uid = cc.uid AND {self._path_match(conn, table, 't')}
+                    WHERE cc.size = ? AND cc.is_valid = 1
+                      AND (cc.fingerprint IS NULL OR COALESCE(cc.algorithm, 'sha256') != ? OR cc.fingerprint = ?)
+                    LIMIT 1
+                    """,
+                    (size, self.algorithm, fingerprint)
+                )
+                if cur.fetchone():
+                    return True
+        return False
+
+    def destination_pool_checksums(self) -> ChecksumSet:
+        """Load the valid checksums of all destination pool files at once, for O(1) membership probes
+        (a member still has to be confirmed with exists_at_destination_pool, which checks the file on disk).
+        Rows of another algorithm are left out; ensure_destination_pool_checksums rehashes them first."""
+        with self.conn_factory() as conn:
+            cur = conn.execute(
+                """
+                SELECT DISTINCT cc.checksum
+                FROM destination_pool_files AS dpf
+                JOIN checksumdb.checksum_cache AS cc
+                  ON dpf.uid = cc.uid AND dpf.relative_path = cc.relative_path
+                WHERE cc.is_valid = 1 AND cc.checksum IS NOT NULL
+                  AND COALESCE(cc.algorithm, 'sha256') = ?
+                """,
+                (self.algorithm,)
+            )
+            # Checksums of a v2 DB come as digest bytes, which is what ChecksumSet keeps anyway
+            return ChecksumSet(row[0] for row in cur)
+
     def exists_at_destination_pool(self, checksum: str) -> bool:
         import logging
         # Find the destination pool file and its cache entry
         with self.conn_factory() as conn:
             cur = conn.cursor()
             cur.execute(
-                """
+                f"""
                 SELECT dpf.uid, dpf.relative_path, dpf.size, dpf.last_modified, cc.is_valid
                 FROM destination_pool_files AS dpf
                 JOIN checksumdb.checksum_cache AS cc
-                  ON dpf.uid = cc.uid AND dpf.relative_path = cc.relative_path
+                  ON dpf.uid = cc.uid AND {self._path_match(conn, 'destination_pool_files', 'dpf')}
                 WHERE cc.checksum = ? AND cc.is_valid = 1
+                  AND COALESCE(cc.algorithm, 'sha256') = ?
                 LIMIT 1
                 """,
-                (checksum,)
+                (checksum_param(conn, checksum), self.algorithm)
             )
             row = cur.fetchone()
         if not row:
@@ -148,6 +456,7 @@ class ChecksumCache:
                     (uid, rel_path)
                 )
                 conn.commit()
+            self.lru.invalidate((uid, rel_path))
             return False
         stat = Path(file_path).stat()
         if stat.st_size != cached_size:
@@ -159,6 +468,7 @@ class ChecksumCache:
                     (uid, rel_path)
                 )
                 conn.commit()
+            self.lru.invalidate((uid, rel_path))
             return False
         if int(stat.st_mtime) != cached_mtime:
             logging.warning(f"[ChecksumCache] Destination pool file mtime mismatch: {file_path} (disk={int(stat.st_mtime)}, cache={cached_mtime})")
@@ -169,36 +479,26 @@ class ChecksumCache:
                     (uid, rel_path)
                 )
                 conn.commit()
+            self.lru.invalidate((uid, rel_path))
             return False
         logging.info(f"[ChecksumCache] Destination pool file valid: {file_path}")
         return True
 
     def get(self, path: str) -> Optional[str]:
-        uid_path_obj = self.uid_path.convert_path(path)
-        uid, rel_path = uid_path_obj.uid, uid_path_obj.relative_path
-        if not uid:
-            return None
-        with self.conn_factory() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT checksum, is_valid FROM checksumdb.checksum_cache WHERE uid=? AND relative_path=? ORDER BY last_validated DESC LIMIT 1",
-                (uid, str(rel_path))
-            )
-            row = cur.fetchone()
-            if row and row[0] and row[1] == 1:
-                return row[0]
-        return None
+        # Reports what the DB holds, whatever the file on disk looks like now, so it does not answer from the LRU
+        return self.get_many([path]).get(path)
 
     def exists(self, checksum: str) -> bool:
         with self.conn_factory() as conn:
             cur = conn.cursor()
             cur.execute(
                 "SELECT 1 FROM checksumdb.checksum_cache WHERE checksum=? AND is_valid=1 LIMIT 1",
-                (checksum,)
+                (checksum_param(conn, checksum),)
             )
             return cur.fetchone() is not None
 
-    def insert_or_update(self, path: str, size: int, last_modified: int, checksum: str):
+    def insert_or_update(self, path: str, size: int, last_modified: int, checksum: str, algorithm: Optional[str] = None, fingerprint: Optional[str] = None,
+                         inode: Optional[int] = None, mtime_ns: Optional[int] = None):
         import logging
         uid_path_obj = self.uid_path.convert_path(path)
         uid, rel_path = uid_path_obj.uid, uid_path_obj.relative_path
@@ -207,21 +507,13 @@ class ChecksumCache:
         now = int(time.time())
         # No log on positive insert
         with self.conn_factory() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                """
-                INSERT INTO checksum_cache (uid, relative_path, size, last_modified, checksum, imported_at, last_validated, is_valid)
-                VALUES (?, ?, ?, ?, ?, ?, ?, 1)
-                ON CONFLICT(uid, relative_path) DO UPDATE SET
-                    size=excluded.size,
-                    last_modified=excluded.last_modified,
-                    checksum=excluded.checksum,
-                    last_validated=excluded.last_validated,
-                    is_valid=1
-                """,
-                (uid, str(rel_path), size, last_modified, checksum, now, now)
-            )
+            upsert_checksums(conn, [(uid, str(rel_path), size, last_modified, checksum, now, now, algorithm or self.algorithm, fingerprint,
+                                     inode, mtime_ns)])
             conn.commit()
+        if (algorithm or self.algorithm) == self.algorithm:
+            self.lru.put((uid, rel_path), size, last_modified, checksum)
+        else:
+            self.lru.invalidate((uid, rel_path))
 
     def get_or_compute(self, path: str) -> Optional[str]:
         uid_path_obj = self.uid_path.convert_path(path)
@@ -235,9 +527,9 @@ class ChecksumCache:
         if not file_path.exists():
             return None
         stat = file_path.stat()
-        checksum = compute_sha256(file_path)
+        checksum = compute_hash(file_path, self.algorithm, cache_policy=self.cache_policy)
         if checksum:
-            self.insert_or_update(path, stat.st_size, int(stat.st_mtime), checksum)
+            self.insert_or_update(path, stat.st_size, int(stat.st_mtime), checksum, inode=stat.st_ino, mtime_ns=stat.st_mtime_ns)
         return checksum
 
     # --- Duplicated/legacy methods restored for compatibility ---
@@ -250,14 +542,15 @@ class ChecksumCache:
         with RobustSqliteConn(self.db_path).connect() as conn:
             cur = conn.cursor()
             cur.execute(
-                """
+                f"""
                 SELECT 1 FROM destination_pool_files AS dpf
                 JOIN checksum_cache AS cc
-                  ON dpf.uid = cc.uid AND dpf.relative_path = cc.relative_path
+                  ON dpf.uid = cc.uid AND {self._path_match(conn, 'destination_pool_files', 'dpf')}
                 WHERE cc.checksum = ? AND cc.is_valid = 1
+                  AND COALESCE(cc.algorithm, 'sha256') = ?
                 LIMIT 1
                 """,
-                (checksum,)
+                (checksum_param(conn, checksum), self.algorithm)
             )
             return cur.fetchone() is not None
 
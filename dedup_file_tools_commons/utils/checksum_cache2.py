@@ -1,4 +1,7 @@
-from dedup_file_tools_commons.utils.fileops import compute_sha256
+from dedup_file_tools_commons.utils.fileops import compute_hash, compute_fingerprint, FINGERPRINT_MIN_SIZE
+from dedup_file_tools_commons.db import upsert_checksums, checksum_param, decode_checksum, ensure_checksum_cache_indexes
+from dedup_file_tools_commons.utils.hashing import DEFAULT_HASH_ALGORITHM, validate_algorithm
+from dedup_file_tools_commons.utils.checksum_lru import ChecksumLRU
 from pathlib import Path
 from typing import Optional
 import time
@@ -9,16 +12,17 @@ class ChecksumCache2:
         Generic version of exists_at_destination_pool: checks if any file in the given pool table has the given checksum (using checksumdb.checksum_cache).
         """
         import logging
+        from dedup_file_tools_commons.utils.path_store import has_path_store_layout, uid_path_match_sql
         cur = conn.cursor()
         query = f'''
             SELECT pf.uid, pf.relative_path, pf.size, pf.last_modified, cc.is_valid
             FROM {table} AS pf
             JOIN checksumdb.checksum_cache AS cc
-              ON pf.uid = cc.uid AND pf.relative_path = cc.relative_path
+              ON pf.uid = cc.uid AND {uid_path_match_sql('pf', 'cc.uid', 'cc.relative_path', has_path_store_layout(conn, table))}
             WHERE cc.checksum = ? AND cc.is_valid = 1
             LIMIT 1
         '''
-        cur.execute(query, (checksum,))
+        cur.execute(query, (checksum_param(conn, checksum),))
         row = cur.fetchone()
         if not row:
             logging.info(f"[ChecksumCache2] No {table} entry for checksum {checksum}")
@@ -35,6 +39,7 @@ class ChecksumCache2:
                 (uid, rel_path)
             )
             conn.commit()
+            self.lru.invalidate((uid, rel_path))
             return False
         stat = Path(file_path).stat()
         if stat.st_size != cached_size:
@@ -44,6 +49,7 @@ class ChecksumCache2:
                 (uid, rel_path)
             )
             conn.commit()
+            self.lru.invalidate((uid, rel_path))
             return False
         if int(stat.st_mtime) != cached_mtime:
             logging.warning(f"[ChecksumCache2] {table} file mtime mismatch: {file_path} (disk={int(stat.st_mtime)}, cache={cached_mtime})")
@@ -52,15 +58,21 @@ class ChecksumCache2:
                 (uid, rel_path)
             )
             conn.commit()
+            self.lru.invalidate((uid, rel_path))
             return False
         logging.info(f"[ChecksumCache2] {table} file valid: {file_path}")
         return True
     """
     Variant of ChecksumCache that takes a live DB connection object for all operations.
     This avoids opening/closing a connection for each query, and is suitable for batch operations.
+    Checksums are computed with `algorithm` (see hashing.py); cached rows produced
+    by a different algorithm are treated as a cache miss.
+    Like ChecksumCache, it keeps the current rows it reads or writes in an in-memory LRU (see checksum_lru.py).
     """
-    def __init__(self, uid_path):
+    def __init__(self, uid_path, algorithm=DEFAULT_HASH_ALGORITHM, lru=None):
         self.uid_path = uid_path
+        self.algorithm = validate_algorithm(algorithm)
+        self.lru = lru if lru is not None else ChecksumLRU()
 
     def exists_at_paths(self, conn, paths, checksum):
         for path in paths:
@@ -71,7 +83,7 @@ class ChecksumCache2:
             cur = conn.cursor()
             cur.execute(
                 "SELECT 1 FROM checksumdb.checksum_cache WHERE uid=? AND relative_path=? AND checksum=? AND is_valid=1 LIMIT 1",
-                (uid, str(rel_path), checksum)
+                (uid, str(rel_path), checksum_param(conn, checksum))
             )
             if cur.fetchone():
                 return True
@@ -84,7 +96,7 @@ class ChecksumCache2:
             cur = conn.cursor()
             cur.execute(
                 "SELECT 1 FROM checksumdb.checksum_cache WHERE uid=? AND relative_path=? AND checksum=? AND is_valid=1 LIMIT 1",
-                (uid, str(rel_path), checksum)
+                (uid, str(rel_path), checksum_param(conn, checksum))
             )
             if cur.fetchone():
                 return True
@@ -107,15 +119,12 @@ class ChecksumCache2:
             WHERE c.checksum = ? AND c.is_valid = 1
             LIMIT 1
             """,
-            (checksum,)
+            (checksum_param(conn, checksum),)
         )
         return cur.fetchone() is not None
 
     def ensure_indexes(self, conn):
-        cur = conn.cursor()
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_checksum_cache_uid_relpath ON checksumdb.checksum_cache(uid, relative_path)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_checksum_cache_checksum_valid ON checksumdb.checksum_cache(checksum, is_valid)")
-        conn.commit()
+        ensure_checksum_cache_indexes(conn)
 
     def get_or_compute_with_invalidation(self, conn, path: str) -> Optional[str]:
         import logging
@@ -127,41 +136,51 @@ class ChecksumCache2:
         if not file_path.exists():
             return None
         stat = file_path.stat()
+        remembered = self.lru.get((uid, rel_path), stat.st_size, int(stat.st_mtime))
+        if remembered:
+            return remembered
         try:
             cur = conn.cursor()
             cur.execute(
-                "SELECT checksum, size, last_modified, is_valid FROM checksum_cache WHERE uid=? AND relative_path=? ORDER BY last_validated DESC LIMIT 1",
+                "SELECT checksum, size, last_modified, is_valid, algorithm FROM checksum_cache WHERE uid=? AND relative_path=? ORDER BY last_validated DESC LIMIT 1",
                 (uid, str(rel_path))
             )
             row = cur.fetchone()
         except Exception as e:
             logging.error(f"[ChecksumCache2] Exception during cache query for {file_path}: {e}")
             return None
-        if row and row[0] and row[3] == 1:
-            cached_checksum, cached_size, cached_mtime, _ = row
+        if row:
+            row = (decode_checksum(row[0]),) + row[1:]
+        if row and row[0] and row[3] == 1 and (row[4] or DEFAULT_HASH_ALGORITHM) == self.algorithm:
+            cached_checksum, cached_size, cached_mtime, _, _ = row
             if cached_size == stat.st_size and cached_mtime == int(stat.st_mtime):
+                self.lru.put((uid, rel_path), cached_size, cached_mtime, cached_checksum)
                 return cached_checksum
         # Only log when cache miss or invalid
         logging.info(f"[ChecksumCache2] No valid cache, computing checksum for {file_path}")
-        checksum = compute_sha256(file_path)
+        checksum = compute_hash(file_path, self.algorithm)
         logging.info(f"[ChecksumCache2] Computed checksum for {file_path}: {checksum}")
         if checksum:
-            self.insert_or_update(conn, path, stat.st_size, int(stat.st_mtime), checksum)
+            # The head/middle/tail samples are in the page cache now, so the fingerprint is nearly free
+            fingerprint = compute_fingerprint(file_path, self.algorithm) if stat.st_size >= FINGERPRINT_MIN_SIZE else None
+            self.insert_or_update(conn, path, stat.st_size, int(stat.st_mtime), checksum, fingerprint=fingerprint)
         return checksum
 
     def exists_at_destination_pool(self, conn, checksum: str) -> bool:
         import logging
+        from dedup_file_tools_commons.utils.path_store import has_path_store_layout, uid_path_match_sql
         cur = conn.cursor()
+        path_match = uid_path_match_sql('dpf', 'cc.uid', 'cc.relative_path', has_path_store_layout(conn, 'destination_pool_files'))
         cur.execute(
-            """
+            f"""
             SELECT dpf.uid, dpf.relative_path, dpf.size, dpf.last_modified, cc.is_valid
             FROM destination_pool_files AS dpf
             JOIN checksumdb.checksum_cache AS cc
-              ON dpf.uid = cc.uid AND dpf.relative_path = cc.relative_path
+              ON dpf.uid = cc.uid AND {path_match}
             WHERE cc.checksum = ? AND cc.is_valid = 1
             LIMIT 1
             """,
-            (checksum,)
+            (checksum_param(conn, checksum),)
         )
         row = cur.fetchone()
         if not row:
@@ -178,6 +197,7 @@ class ChecksumCache2:
                 (uid, rel_path)
             )
             conn.commit()
+            self.lru.invalidate((uid, rel_path))
             return False
         stat = Path(file_path).stat()
         if stat.st_size != cached_size:
@@ -187,6 +207,7 @@ class ChecksumCache2:
                 (uid, rel_path)
             )
             conn.commit()
+            self.lru.invalidate((uid, rel_path))
             return False
         if int(stat.st_mtime) != cached_mtime:
             logging.warning(f"[ChecksumCache2] Destination pool file mtime mismatch: {file_path} (disk={int(stat.st_mtime)}, cache={cached_mtime})")
@@ -195,6 +216,7 @@ class ChecksumCache2:
                 (uid, rel_path)
             )
             conn.commit()
+            self.lru.invalidate((uid, rel_path))
             return False
         logging.info(f"[ChecksumCache2] Destination pool file valid: {file_path}")
         return True
@@ -206,23 +228,25 @@ class ChecksumCache2:
             return None
         cur = conn.cursor()
         cur.execute(
-            "SELECT checksum, is_valid FROM checksumdb.checksum_cache WHERE uid=? AND relative_path=? ORDER BY last_validated DESC LIMIT 1",
+            "SELECT checksum, is_valid, algorithm, size, last_modified FROM checksumdb.checksum_cache WHERE uid=? AND relative_path=? ORDER BY last_validated DESC LIMIT 1",
             (uid, str(rel_path))
         )
         row = cur.fetchone()
-        if row and row[0] and row[1] == 1:
-            return row[0]
+        if row and row[0] and row[1] == 1 and (row[2] or DEFAULT_HASH_ALGORITHM) == self.algorithm:
+            checksum = decode_checksum(row[0])
+            self.lru.put((uid, rel_path), row[3], row[4], checksum)
+            return checksum
         return None
 
     def exists(self, conn, checksum: str) -> bool:
         cur = conn.cursor()
         cur.execute(
             "SELECT 1 FROM checksumdb.checksum_cache WHERE checksum=? AND is_valid=1 LIMIT 1",
-            (checksum,)
+            (checksum_param(conn, checksum),)
         )
         return cur.fetchone() is not None
 
-    def insert_or_update(self, conn, path: str, size: int, last_modified: int, checksum: str):
+    def insert_or_update(self, conn, path: str, size: int, last_modified: int, checksum: str, algorithm: Optional[str] = None, fingerprint: Optional[str] = None):
         import logging
         uid_path_obj = self.uid_path.convert_path(path)
         uid, rel_path = uid_path_obj.uid, uid_path_obj.relative_path
@@ -230,21 +254,12 @@ class ChecksumCache2:
             return
         now = int(time.time())
         # No log on positive insert
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO checksum_cache (uid, relative_path, size, last_modified, checksum, imported_at, last_validated, is_valid)
-            VALUES (?, ?, ?, ?, ?, ?, ?, 1)
-            ON CONFLICT(uid, relative_path) DO UPDATE SET
-                size=excluded.size,
-                last_modified=excluded.last_modified,
-                checksum=excluded.checksum,
-                last_validated=excluded.last_validated,
-                is_valid=1
-            """,
-            (uid, str(rel_path), size, last_modified, checksum, now, now)
-        )
+        upsert_checksums(conn, [(uid, str(rel_path), size, last_modified, checksum, now, now, algorithm or self.algorithm, fingerprint)])
         conn.commit()
+        if (algorithm or self.algorithm) == self.algorithm:
+            self.lru.put((uid, rel_path), size, last_modified, checksum)
+        else:
+            self.lru.invalidate((uid, rel_path))
 
     def get_or_compute(self, conn, path: str) -> Optional[str]:
         uid_path_obj = self.uid_path.convert_path(path)
@@ -258,7 +273,7 @@ class ChecksumCache2:
         if not file_path.exists():
             return None
         stat = file_path.stat()
-        checksum = compute_sha256(file_path)
+        checksum = compute_hash(file_path, self.algorithm)
         if checksum:
             self.insert_or_update(conn, path, stat.st_size, int(stat.st_mtime), checksum)
         return checksum
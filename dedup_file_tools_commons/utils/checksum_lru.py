@@ -0,0 +1,103 @@
+"""
+File: dedup_file_tools_commons/utils/checksum_lru.py
+Description: Bounded in-process LRU in front of the checksum cache.
+
+A run looks up the same (uid, relative_path) several times (pre-copy hash, dedup checks, hardlink siblings,
+the source and destination sides of deep verify), and each lookup used to be a SQLite round-trip.
+ChecksumCache and ChecksumCache2 keep the rows they read or write in a ChecksumLRU:
+
+    (uid, relative_path) -> (size, last_modified, checksum)
+
+Only current rows (valid, of the cache's algorithm) are kept. A hit needs the caller's fresh stat of the file
+to match the remembered size and mtime, exactly like the SQLite path, so a changed file is a miss (get(),
+which reports the stored row without looking at the file, always asks SQLite). Writes
+through the cache update the entry and its is_valid=0 invalidations drop it. Rows changed by other processes
+or by raw SQL are not seen: only files with an unchanged size and mtime can be served from memory.
+
+Memory is capped by entry count and by an estimate of the bytes held; the least recently used entries go first.
+"""
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Rough per-entry cost of the OrderedDict slot, key/value tuples and int objects, on top of the string data
+ENTRY_OVERHEAD = 240
+
+
+def _entry_size(key, checksum):
+    return ENTRY_OVERHEAD + len(key[0]) + len(key[1]) + len(checksum)
+
+
+class ChecksumLRU:
+    """Thread-safe LRU of (size, last_modified, checksum) by (uid, relative_path). max_entries=0 disables it."""
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def get(self, key, size, last_modified):
+        """Checksum of key if it is remembered for this size and mtime, else None (a miss)."""
+        key = (key[0], str(key[1]))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == size and entry[1] == last_modified:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            if entry is not None:
+                # The file changed since: the entry can never hit again
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, size, last_modified, checksum):
+        if not self.max_entries or not checksum:
+            return
+        key = (key[0], str(key[1]))
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (size, last_modified, checksum)
+            self._bytes += _entry_size(key, checksum)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                old_key, old = self._entries.popitem(last=False)
+                self._bytes -= _entry_size(old_key, old[2])
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._remove((key[0], str(key[1])))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= _entry_size(key, old[2])
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
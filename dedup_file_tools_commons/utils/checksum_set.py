@@ -0,0 +1,37 @@
+"""
+File: dedup_file_tools_commons/utils/checksum_set.py
+Description: Compact in-memory membership set of checksums.
+
+Hex checksums are stored as their raw digest bytes (32 bytes for sha256/blake2b-256/blake3, 16 for xxh128,
+8 for xxh3), about half the memory of the hex strings, so the checksums of a large pool can be loaded once
+and probed in O(1) instead of querying SQLite per file. The set is exact: a member was loaded or added.
+"""
+
+
+def _digest(checksum):
+    if isinstance(checksum, bytes):
+        return checksum  # already a digest (checksum schema v2 rows)
+    try:
+        return bytes.fromhex(checksum)
+    except (TypeError, ValueError):
+        return checksum  # not a hex digest; stored as is
+
+
+class ChecksumSet:
+    def __init__(self, checksums=()):
+        self._digests = set()
+        self.update(checksums)
+
+    def add(self, checksum):
+        if checksum:
+            self._digests.add(_digest(checksum))
+
+    def update(self, checksums):
+        for checksum in checksums:
+            self.add(checksum)
+
+    def __contains__(self, checksum):
+        return bool(checksum) and _digest(checksum) in self._digests
+
+    def __len__(self):
+        return len(self._digests)
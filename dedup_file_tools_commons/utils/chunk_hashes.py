@@ -0,0 +1,93 @@
+"""
+File: dedup_file_tools_commons/utils/chunk_hashes.py
+Description: Optional per-chunk digests for large files, stored in the checksum_chunks table.
+
+Each file of at least one chunk is split into fixed-size chunks (fileops.CHUNK_SIZE, 64 MiB by default).
+The chunk digests are computed in the same read pass as the whole-file checksum, and each chunk row is
+written as soon as the chunk completes, tagged with the file size/mtime/algorithm it describes.
+
+- Resume: if hashing a file is interrupted, the next run keeps the recorded chunk rows for the same file
+  version and only hashes the remaining chunks. The whole-file digest still needs the full read, because
+  hash objects cannot be saved between runs.
+- Verification: diff_chunk_regions() compares the current content with the recorded chunk digests and
+  returns the byte regions that changed.
+
+All SQL uses the unqualified table name, so conn_factory may return a checksum DB connection or a job DB
+connection with the checksum DB attached as checksumdb.
+"""
+import os
+from dedup_file_tools_commons.utils.fileops import compute_hash_with_chunks, CHUNK_SIZE, DEFAULT_CACHE_POLICY
+from dedup_file_tools_commons.utils.hashing import DEFAULT_HASH_ALGORITHM
+
+
+def load_chunks(conn, uid, rel_path):
+    """Return the recorded (chunk_index, chunk_offset, chunk_length, digest, algorithm, size, last_modified) rows of a file."""
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT chunk_index, chunk_offset, chunk_length, digest, algorithm, size, last_modified FROM checksum_chunks "
+        "WHERE uid=? AND relative_path=? ORDER BY chunk_index",
+        (uid, str(rel_path))
+    )
+    return cur.fetchall()
+
+
+def hash_file_with_chunks(conn_factory, uid, rel_path, path, algorithm=DEFAULT_HASH_ALGORITHM, chunk_size=CHUNK_SIZE,
+                          cache_policy=DEFAULT_CACHE_POLICY):
+    """
+    Compute the whole-file checksum of path and record its chunk digests, resuming after the chunks already
+    recorded for this exact file version. Returns (checksum, size, last_modified).
+    """
+    stat = os.stat(path)
+    size, mtime = stat.st_size, int(stat.st_mtime)
+    with conn_factory() as conn:
+        rows = load_chunks(conn, uid, rel_path)
+        done = 0
+        for index, offset, length, digest, row_algorithm, row_size, row_mtime in rows:
+            expected_length = min(chunk_size, size - index * chunk_size)
+            if index != done or offset != index * chunk_size or length != expected_length \
+                    or row_algorithm != algorithm or row_size != size or row_mtime != mtime:
+                break
+            done += 1
+        if done < len(rows):
+            conn.execute("DELETE FROM checksum_chunks WHERE uid=? AND relative_path=? AND chunk_index>=?", (uid, str(rel_path), done))
+            conn.commit()
+
+    def record(index, offset, length, digest):
+        with conn_factory() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO checksum_chunks (uid, relative_path, chunk_index, chunk_offset, chunk_length, digest, algorithm, size, last_modified)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (uid, str(rel_path), index, offset, length, digest, algorithm, size, mtime)
+            )
+            conn.commit()
+
+    checksum, _ = compute_hash_with_chunks(path, algorithm, chunk_size, skip_chunks=done, on_chunk=record, cache_policy=cache_policy)
+    return checksum, size, mtime
+
+
+def diff_chunk_regions(conn_factory, uid, rel_path, path, cache_policy=DEFAULT_CACHE_POLICY):
+    """
+    Compare the current content of path with its recorded chunk digests.
+    Returns a list of differing (offset, length) regions, [] if all chunks match,
+    or None if no chunks are recorded for the file.
+    """
+    with conn_factory() as conn:
+        rows = load_chunks(conn, uid, rel_path)
+    if not rows:
+        return None
+    algorithm = rows[0][4] or DEFAULT_HASH_ALGORITHM
+    # Only files of at least one chunk are chunked, so the first chunk has the full chunk size
+    chunk_size = rows[0][2]
+    recorded = {index: (offset, length, digest) for index, offset, length, digest, _, _, _ in rows}
+    _, current = compute_hash_with_chunks(path, algorithm, chunk_size, cache_policy=cache_policy)
+    size = os.path.getsize(path)
+    regions = []
+    for index in range(max(len(current), max(recorded) + 1)):
+        offset = index * chunk_size
+        length = min(chunk_size, max(size - offset, 0))
+        old = recorded.get(index)
+        if old is None or index >= len(current) or old[2] != current[index] or old[1] != length:
+            regions.append((offset, length if length else old[1]))
+    return regions
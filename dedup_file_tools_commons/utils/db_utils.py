@@ -1,24 +1,147 @@
 import os
 import logging
-from dedup_file_tools_commons.db import init_checksum_db
+import threading
+from contextlib import contextmanager
+from dedup_file_tools_commons.db import init_checksum_db, remember_checksum_schema, refresh_checksum_schema
 from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
+from dedup_file_tools_commons.utils.sqlite_profiles import apply_profile, current_profile
 
-def connect_with_attached_checksum_db(main_db_path, checksum_db_path):
+# Checksum DBs whose schema was checked by this process: {absolute path: (st_dev, st_ino) when checked}
+_schema_checked = {}
+_schema_lock = threading.Lock()
+
+
+def _file_identity(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+def ensure_checksum_db(checksum_db_path):
     """
-    Ensure the checksum DB exists and has the correct schema, then attach it to the main DB connection as 'checksumdb'.
-    Returns a sqlite3.Connection object with the checksum DB attached.
+    Create/migrate the checksum DB schema once per process. The check runs again only if the file was
+    deleted or replaced since (e.g. a test recreating its job directory).
     """
-    # Ensure attached checksum DB has correct schema
-    if not os.path.exists(checksum_db_path):
-        init_checksum_db(checksum_db_path)
-    else:
-        # Try to create missing tables/indexes if DB exists but is incomplete
+    path = os.path.abspath(checksum_db_path)
+    identity = _file_identity(path)
+    if identity is not None and _schema_checked.get(path) == identity:
+        return
+    with _schema_lock:
+        identity = _file_identity(path)
+        if identity is not None and _schema_checked.get(path) == identity:
+            return
         try:
-            init_checksum_db(checksum_db_path)
+            init_checksum_db(path)
         except Exception as e:
             logging.error(f"Failed to ensure schema in attached checksum DB: {checksum_db_path}\nError: {e}")
             raise
+        _schema_checked[path] = _file_identity(path)
+
+
+def connect_with_attached_checksum_db(main_db_path, checksum_db_path):
+    """
+    Ensure the checksum DB exists and has the correct schema, then attach it to the main DB connection as 'checksumdb'.
+    Returns a new sqlite3.Connection object with the checksum DB attached; the caller owns (and closes) it.
+    Use pooled_attached_connection/attached_conn_factory for the many short lookups of a phase.
+    """
+    ensure_checksum_db(checksum_db_path)
     conn = RobustSqliteConn(main_db_path).connect()
     # Attach checksum DB as 'checksumdb'
     conn.execute(f"ATTACH DATABASE '{checksum_db_path}' AS checksumdb")
+    apply_profile(conn, schema='checksumdb')
+    # Once per connection, not per checksum lookup/upsert (a replaced checksum DB gets a new connection)
+    remember_checksum_schema(conn, 'checksumdb')
     return conn
+
+
+class AttachedConnectionPool:
+    """
+    Thread-local pool of long-lived job DB connections with the checksum DB attached. Each thread keeps one
+    connection per (job DB, checksum DB, SQLite profile), so a lookup costs no connect, ATTACH or connection PRAGMAs
+    (only a read of the checksum DB's schema cookie, see db.refresh_checksum_schema). A pooled connection is
+    replaced when it was closed, when either DB file was replaced, or after a fork.
+    Connections are in autocommit mode (see RobustSqliteConn); use transaction() to group writes.
+    """
+    def __init__(self):
+        self._local = threading.local()
+
+    def _connections(self):
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        return connections
+
+    def _identity(self, key):
+        return os.getpid(), _file_identity(key[0]), _file_identity(key[1])
+
+    def connection(self, main_db_path, checksum_db_path):
+        key = (os.path.abspath(main_db_path), os.path.abspath(checksum_db_path), current_profile())
+        connections = self._connections()
+        entry = connections.pop(key, None)
+        if entry is not None:
+            conn, identity = entry
+            try:
+                conn.total_changes  # raises ProgrammingError once the connection is closed
+                usable = identity == self._identity(key)
+            except Exception:
+                usable = False
+            if usable:
+                connections[key] = entry
+                # A schema change (an online v2 migration) must not leave the connection encoding for v1
+                refresh_checksum_schema(conn)
+                return conn
+            try:
+                conn.close()
+            except Exception:
+                pass
+        conn = connect_with_attached_checksum_db(key[0], key[1])
+        connections[key] = (conn, self._identity(key))
+        return conn
+
+    def close_thread_connections(self):
+        """Close the calling thread's pooled connections (other threads' connections close when they exit)."""
+        connections = self._connections()
+        for conn, _ in connections.values():
+            try:
+                conn.close()
+            except Exception:
+                pass
+        connections.clear()
+
+
+_pool = AttachedConnectionPool()
+
+
+def pooled_attached_connection(main_db_path, checksum_db_path):
+    """Borrow the calling thread's pooled connection (do not close it; `with conn:` is fine)."""
+    return _pool.connection(main_db_path, checksum_db_path)
+
+
+def attached_conn_factory(main_db_path, checksum_db_path):
+    """conn_factory for ChecksumCache, ensure_checksums and chunk_hashes that borrows pooled connections."""
+    def conn_factory():
+        return _pool.connection(main_db_path, checksum_db_path)
+    return conn_factory
+
+
+def close_pooled_connections():
+    _pool.close_thread_connections()
+
+
+@contextmanager
+def transaction(conn):
+    """Run the block in one explicit transaction (autocommit connections would commit every statement);
+    inside an already open transaction the block simply joins it."""
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
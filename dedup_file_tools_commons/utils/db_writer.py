@@ -0,0 +1,227 @@
+"""
+File: dedup_file_tools_commons/utils/db_writer.py
+Description: Single-writer queue with group commit for the status writes of worker threads.
+
+Worker threads of the copy, analyze, pool indexing and dupes move/verify phases used to open a connection
+per file and commit every status row on its own: under load that means "database is locked" storms and one
+fsync per row. Instead they hand write intents to a DBWriter, whose thread owns the only writing connection
+and commits them in batches:
+    - a batch is committed once it holds batch_size intents, or max_delay seconds after its first intent
+    - each intent runs in its own SAVEPOINT: a failing intent is logged and rolled back without losing the
+      rest of the batch, and the statements of a submit_group() intent are applied all or nothing
+    - flush() is the barrier for durability points: it returns once everything submitted before it is committed
+    - an error outside the intents (the writer's own transaction control) stops the writer: it is kept and
+      re-raised as DBWriterError by the next submit, flush or close, so no caller waits for a dead thread
+
+The writer connection comes from RobustSqliteConn, so lock contention is retried on BEGIN, every statement
+and COMMIT. Reads do not go through the writer: read your own writes only after flush().
+"""
+import logging
+import queue
+import threading
+import time
+from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_DELAY = 0.05  # seconds a submitted intent may wait for its batch to fill
+
+
+class DBWriterError(RuntimeError):
+    """The writer thread stopped on an unexpected error; the intents it had not committed are lost."""
+
+
+class _Barrier:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class DBWriter:
+    """
+    Background writer for one SQLite DB. Use as a context manager (or call start()/close()):
+
+        with DBWriter(db_path) as writer:
+            writer.submit("UPDATE ... WHERE uid=?", (uid,))
+            writer.submit_group([(sql1, params1), (sql2, params2)])  # applied atomically
+            writer.flush()  # everything above is committed
+    """
+    def __init__(self, db_path, batch_size=DEFAULT_BATCH_SIZE, max_delay=DEFAULT_MAX_DELAY, connect=None):
+        self.db_path = db_path
+        self.batch_size = max(1, batch_size)
+        self.max_delay = max_delay
+        self._connect = connect or (lambda: RobustSqliteConn(db_path).connect())
+        self._queue = queue.Queue()
+        self._thread = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self.committed = 0  # intents committed
+        self.failed = 0  # intents rolled back after an error
+        self.batches = 0
+        self._fatal = None  # exception that stopped the writer thread
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                # The writer thread owns its connection; wait for it so a bad path fails here, in the caller
+                ready = threading.Event()
+                error = []
+                thread = threading.Thread(target=self._run, args=(ready, error), name=f"DBWriter-{self.db_path}", daemon=True)
+                thread.start()
+                ready.wait()
+                if error:
+                    raise error[0]
+                self._thread = thread
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _check_fatal(self):
+        if self._fatal is not None:
+            raise DBWriterError(f"DBWriter for {self.db_path} stopped: {self._fatal}") from self._fatal
+
+    def _put(self, item):
+        self._check_fatal()
+        if self._closed:
+            raise RuntimeError(f"DBWriter for {self.db_path} is closed")
+        if self._thread is None:
+            self.start()
+        self._queue.put(item)
+
+    def submit(self, sql, params=()):
+        """Queue one statement."""
+        self._put(((sql, params),))
+
+    def submit_many(self, sql, seq_of_params):
+        """Queue one statement per parameter tuple (each is its own intent)."""
+        for params in seq_of_params:
+            self._put(((sql, params),))
+
+    def submit_group(self, statements):
+        """Queue [(sql, params), ...] as one intent: applied together or not at all."""
+        self._put(tuple(statements))
+
+    def flush(self, timeout=None):
+        """Block until every intent submitted before this call is committed (or failed and was logged).
+        Returns False if the timeout expired first. Raises DBWriterError if the writer stopped on an error."""
+        if self._thread is None:
+            return True
+        barrier = _Barrier()
+        self._put(barrier)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # Poll: a barrier queued after the writer thread died is never released
+        while not barrier.done.wait(0.1 if deadline is None else max(0, min(0.1, deadline - time.monotonic()))):
+            self._check_fatal()
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+        self._check_fatal()
+        return True
+
+    def close(self):
+        """Commit what is queued and stop the writer thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join()
+        if self.failed:
+            logging.error(f"[DBWriter] {self.failed} write(s) to {self.db_path} failed; see the errors above")
+        self._check_fatal()
+
+    def _run(self, ready, error):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            error.append(e)
+            ready.set()
+            return
+        ready.set()
+        try:
+            stop = False
+            while not stop:
+                item = self._queue.get()
+                batch, barriers = [], []
+                deadline = None
+                while True:
+                    if item is _STOP:
+                        stop = True
+                        break
+                    if isinstance(item, _Barrier):
+                        barriers.append(item)
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    if deadline is None:
+                        deadline = time.monotonic() + self.max_delay
+                    remaining = deadline - time.monotonic()
+                    try:
+                        item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if batch:
+                    try:
+                        self._commit_batch(conn, batch)
+                    except Exception as e:
+                        # Failing intents are rolled back and skipped inside _commit_batch; this is the writer itself
+                        logging.error(f"[DBWriter] Writer for {self.db_path} stopped; {len(batch)} queued write(s) lost: {e}")
+                        self._fatal = e
+                        try:
+                            conn.rollback()
+                        except Exception:
+                            pass
+                        stop = True
+                for barrier in barriers:
+                    barrier.done.set()
+        finally:
+            conn.close()
+            # Release flush() callers that raced with close()
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, _Barrier):
+                    item.done.set()
+
+    def _commit_batch(self, conn, batch):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except Exception as e:
+            logging.error(f"[DBWriter] Cannot start a write transaction on {self.db_path}: {e}")
+            self.failed += len(batch)
+            return
+        committed = 0
+        for statements in batch:
+            conn.execute("SAVEPOINT intent")
+            try:
+                for sql, params in statements:
+                    conn.execute(sql, params)
+            except Exception as e:
+                conn.execute("ROLLBACK TO intent")
+                logging.error(f"[DBWriter] Write failed and was skipped: {statements[0][0].strip().splitlines()[0]} {statements[0][1]!r}: {e}")
+                self.failed += 1
+            else:
+                committed += 1
+            conn.execute("RELEASE intent")
+        try:
+            conn.commit()
+        except Exception as e:
+            logging.error(f"[DBWriter] Commit of {len(batch)} write(s) to {self.db_path} failed: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            self.failed += committed
+            return
+        self.committed += committed
+        self.batches += 1
@@ -3,63 +3,475 @@ File: src/utils/fileops.py
 Description: File operations utilities (copy, verify, etc.)
 """
 import shutil
-import hashlib
 from pathlib import Path
 from tqdm import tqdm
 import os
+import mmap
+import stat
+import errno
+from dedup_file_tools_commons.utils.hashing import new_hasher, DEFAULT_HASH_ALGORITHM
+from dedup_file_tools_commons.utils.throttle import get_throttle
 
-def copy_file(src, dst, block_size=4096, progress_callback=None, show_progressbar=False):
-    """Copy file from src to dst in blocks, with optional progress callback and per-file progressbar. Preserves mtime. File-level resume: always restarts file if interrupted."""
-    total_size = Path(src).stat().st_size
+# Read block size bounds. Blocks scale with the file size so that small files use one small buffer
+# and large files are streamed in a few large reads.
+MIN_BLOCK_SIZE = 1024 * 1024
+MAX_BLOCK_SIZE = 16 * 1024 * 1024
+
+def adaptive_block_size(file_size, block_size=None):
+    """Return block_size if given, else 1/64 of file_size clamped to [MIN_BLOCK_SIZE, MAX_BLOCK_SIZE],
+    and never more than the file itself needs."""
+    if block_size:
+        return block_size
+    size = min(max(file_size // 64, MIN_BLOCK_SIZE), MAX_BLOCK_SIZE)
+    return max(min(size, file_size + 1), 1)
+
+# Page-cache policies for bulk reads and writes:
+#   - default  : plain buffered I/O; large files may be hashed from a memory map
+#   - dontneed : posix_fadvise(SEQUENTIAL) before reading and DONTNEED on each block once it has been read;
+#                written data is flushed every WRITE_BEHIND_BYTES and dropped as well
+#   - direct   : reads bypass the page cache with O_DIRECT and page-aligned buffers; writes behave as in
+#                dontneed. Falls back to dontneed where O_DIRECT is unavailable (tmpfs, some FUSE/network filesystems)
+# Bulk passes over a whole pool then leave the page cache of a shared host to the other workloads.
+CACHE_POLICIES = ('default', 'dontneed', 'direct')
+DEFAULT_CACHE_POLICY = 'default'
+DIRECT_IO_ALIGNMENT = 4096
+WRITE_BEHIND_BYTES = 64 * 1024 * 1024
+
+def validate_cache_policy(cache_policy):
+    if cache_policy not in CACHE_POLICIES:
+        raise ValueError(f"Unsupported cache policy: {cache_policy} (choose from {', '.join(CACHE_POLICIES)})")
+    return cache_policy
+
+def _fadvise(fd, offset, length, advice_name):
+    """posix_fadvise where the platform has it; advice is only a hint, so errors are ignored."""
+    advice = getattr(os, advice_name, None)
+    if advice is None or not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError:
+        pass
+
+def open_for_reading(path, cache_policy=DEFAULT_CACHE_POLICY):
+    """Open path unbuffered for one sequential pass under cache_policy.
+    Returns (file, direct) where direct tells whether the file was opened with O_DIRECT."""
+    validate_cache_policy(cache_policy)
+    if cache_policy == 'direct' and hasattr(os, 'O_DIRECT'):
+        try:
+            return os.fdopen(os.open(path, os.O_RDONLY | os.O_DIRECT), 'rb', buffering=0), True
+        except OSError:
+            pass
+    f = open(path, 'rb', buffering=0)
+    if cache_policy != 'default':
+        _fadvise(f.fileno(), 0, 0, 'POSIX_FADV_SEQUENTIAL')
+    return f, False
+
+def read_buffer(block_size, direct=False):
+    """Writable buffer for readinto. O_DIRECT needs page-aligned memory and lengths, which an anonymous
+    mapping of a DIRECT_IO_ALIGNMENT multiple provides."""
+    if direct:
+        return mmap.mmap(-1, -(-block_size // DIRECT_IO_ALIGNMENT) * DIRECT_IO_ALIGNMENT)
+    return bytearray(block_size)
+
+def read_blocks(f, block_size, cache_policy=DEFAULT_CACHE_POLICY, direct=False):
+    """Yield memoryview slices of one preallocated buffer filled with readinto (no per-block allocation).
+    Each slice is only valid until the next one is requested. With cache_policy 'dontneed' (or 'direct'
+    without O_DIRECT) the page cache of each block is dropped as soon as it has been copied into the buffer.
+    Every block is taken from the bytes/s throttle (see throttle.py)."""
+    view = memoryview(read_buffer(block_size, direct))
+    drop = cache_policy != 'default' and not direct
+    throttle = get_throttle()
+    device = os.fstat(f.fileno()).st_dev if throttle.active else None
+    offset = 0
+    while True:
+        n = f.readinto(view)
+        if not n:
+            break
+        throttle.acquire_bytes(n, device)
+        if drop:
+            _fadvise(f.fileno(), offset, n, 'POSIX_FADV_DONTNEED')
+        offset += n
+        yield view[:n]
+    if drop:
+        # Readahead may have cached pages beyond the last block
+        _fadvise(f.fileno(), 0, 0, 'POSIX_FADV_DONTNEED')
+
+def drop_written(f):
+    """Flush f, wait for its data to reach the disk and drop its pages from the page cache
+    (dirty pages cannot be dropped, so the data has to be written back first)."""
+    f.flush()
+    if hasattr(os, 'fdatasync'):
+        os.fdatasync(f.fileno())
+    else:
+        os.fsync(f.fileno())
+    _fadvise(f.fileno(), 0, 0, 'POSIX_FADV_DONTNEED')
+
+# Copy backends: 'buffered' runs read -> write -> hash on the calling thread; 'pipelined' reads into a ring
+# of PIPELINE_BUFFERS buffers while a writer thread and a hasher thread consume them concurrently, so the
+# source and destination devices stream at the same time. 'auto' pipelines files of at least PIPELINE_THRESHOLD
+# when more than one CPU is available (on a single CPU the threads only add hand-off overhead).
+# 'kernel' copies inside the kernel (see copy_file_with_method).
+COPY_BACKENDS = ('auto', 'buffered', 'pipelined', 'kernel')
+PIPELINE_BUFFERS = 4
+PIPELINE_THRESHOLD = 16 * 1024 * 1024
+
+def _copy_pipelined(fsrc, fdst, h, block_size, on_written, buffers=PIPELINE_BUFFERS, cache_policy=DEFAULT_CACHE_POLICY, direct=False):
+    """Copy fsrc to fdst through a ring of buffers: this thread reads, a writer thread writes and a hasher
+    thread hashes. A buffer is reused only after both consumers released it, so memory stays at
+    buffers * block_size. The first writer/hasher error stops the reader and is re-raised here.
+    cache_policy/direct and throttling apply to the reads as in read_blocks."""
+    import queue
+    import threading
+    ring = [read_buffer(block_size, direct) for _ in range(buffers)]
+    drop = cache_policy != 'default' and not direct
+    throttle = get_throttle()
+    device = os.fstat(fsrc.fileno()).st_dev if throttle.active else None
+    offset = 0
+    views = [memoryview(buf) for buf in ring]
+    free = queue.Queue()
+    for i in range(buffers):
+        free.put(i)
+    pending = [0] * buffers
+    pending_lock = threading.Lock()
+    write_q = queue.Queue()
+    hash_q = queue.Queue()
+    errors = []
+    failed = threading.Event()
+
+    def release(i):
+        with pending_lock:
+            pending[i] -= 1
+            reusable = pending[i] == 0
+        if reusable:
+            free.put(i)
+
+    def consume(q, work):
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            i, n = item
+            try:
+                if not failed.is_set():
+                    work(views[i][:n])
+            except BaseException as e:
+                errors.append(e)
+                failed.set()
+            finally:
+                release(i)
+
+    def write(block):
+        fdst.write(block)
+        on_written(len(block))
+
+    workers = [threading.Thread(target=consume, args=(write_q, write), name="copy-writer", daemon=True),
+               threading.Thread(target=consume, args=(hash_q, h.update), name="copy-hasher", daemon=True)]
+    for worker in workers:
+        worker.start()
+    try:
+        while not failed.is_set():
+            i = free.get()
+            n = fsrc.readinto(views[i])
+            if not n:
+                break
+            throttle.acquire_bytes(n, device)
+            if drop:
+                _fadvise(fsrc.fileno(), offset, n, 'POSIX_FADV_DONTNEED')
+            offset += n
+            with pending_lock:
+                pending[i] = 2
+            write_q.put((i, n))
+            hash_q.put((i, n))
+    finally:
+        write_q.put(None)
+        hash_q.put(None)
+        for worker in workers:
+            worker.join()
+    if errors:
+        raise errors[0]
+
+# Kernel-side copy methods, tried in this order by the 'kernel' backend. Each returns False (with the
+# destination left empty) when the filesystem or platform does not support it.
+KERNEL_COPY_METHODS = ('clone', 'copy_file_range', 'sendfile')
+_FICLONE = 0x40049409
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF,
+                       errno.ENOTTY, errno.EPERM, errno.ETXTBSY}
+
+def _kernel_copy(fsrc, fdst, method, size):
+    """Copy size bytes with one kernel method. Returns False if the method is not supported here.
+    Under an active throttle the data is copied in MAX_BLOCK_SIZE steps, each taken from the bytes/s bucket."""
+    src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+    throttle = get_throttle()
+    step = MAX_BLOCK_SIZE if throttle.active else 1 << 30
+    device = os.fstat(src_fd).st_dev if throttle.active else None
+    try:
+        if method == 'clone':
+            try:
+                import fcntl
+            except ImportError:
+                return False
+            fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+            return True
+        if method == 'copy_file_range':
+            if not hasattr(os, 'copy_file_range'):
+                return False
+            copy = lambda remaining: os.copy_file_range(src_fd, dst_fd, remaining)
+        else:
+            if not hasattr(os, 'sendfile'):
+                return False
+            copy = lambda remaining: os.sendfile(dst_fd, src_fd, None, remaining)
+        copied = 0
+        while copied < size:
+            n = copy(min(size - copied, step))
+            if not n:
+                break
+            copied += n
+            throttle.acquire_bytes(n, device)
+        # The source may have grown meanwhile; copy up to its current end like the streaming loop does
+        while True:
+            n = copy(step)
+            if not n:
+                return True
+            throttle.acquire_bytes(n, device)
+    except OSError as e:
+        if e.errno not in _UNSUPPORTED_ERRNOS:
+            raise
+        os.ftruncate(dst_fd, 0)
+        os.lseek(src_fd, 0, os.SEEK_SET)
+        os.lseek(dst_fd, 0, os.SEEK_SET)
+        return False
+
+def clone_file(src, dst):
+    """Create dst as a reflink clone of src (FICLONE; btrfs, xfs and other CoW filesystems). The clone shares
+    src's data blocks until either file is modified. Raises OSError if the filesystem or platform cannot clone;
+    a partially created dst is removed."""
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError(errno.EOPNOTSUPP, "reflink cloning is not supported on this platform")
+    with open(src, 'rb', buffering=0) as fsrc, open(dst, 'wb', buffering=0) as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+
+def copy_file(src, dst, block_size=None, progress_callback=None, show_progressbar=False, algorithm=DEFAULT_HASH_ALGORITHM, backend='auto',
+              expected_checksum=None, read_back=False, cache_policy=DEFAULT_CACHE_POLICY):
+    """Copy file from src to dst in blocks, with optional progress callback and per-file progressbar. Preserves mtime. File-level resume: always restarts file if interrupted.
+    Checksums are computed with the given hash algorithm (see hashing.py). block_size defaults to adaptive_block_size().
+    backend is one of COPY_BACKENDS; every backend returns the same (src_checksum, dst_checksum).
+    See copy_file_with_method for expected_checksum/read_back, and CACHE_POLICIES for cache_policy."""
+    src_checksum, dst_checksum, _ = copy_file_with_method(src, dst, block_size, progress_callback, show_progressbar, algorithm, backend,
+                                                          expected_checksum, read_back, cache_policy)
+    return src_checksum, dst_checksum
+
+def copy_file_with_method(src, dst, block_size=None, progress_callback=None, show_progressbar=False, algorithm=DEFAULT_HASH_ALGORITHM,
+                          backend='auto', expected_checksum=None, read_back=False, cache_policy=DEFAULT_CACHE_POLICY):
+    """
+    Like copy_file, but returns (src_checksum, dst_checksum, method) where method is one of KERNEL_COPY_METHODS,
+    'pipelined' or 'buffered'.
+
+    Kernel methods (FICLONE reflink, copy_file_range, sendfile) never pass the bytes through Python, so they
+    produce no checksum of their own. They are used when backend='kernel', or when backend='auto', the caller
+    already knows the source checksum (expected_checksum) and read_back=True. The result is then checked as follows:
+        - expected_checksum given, read_back=False: expected_checksum is trusted for both sides (backend='kernel' only)
+        - read_back=True, or no expected_checksum: the destination is read back and hashed
+    So 'auto' always measures the destination checksum, either while streaming or by reading the copy back.
+    If no kernel method is supported, the streaming backends are used.
+    With a cache_policy other than 'default', neither the source nor the destination stays in the page cache.
+    Every copy takes one token from the files/s throttle and its bytes from the bytes/s throttle (see throttle.py).
+    """
+    if backend not in COPY_BACKENDS:
+        raise ValueError(f"Unsupported copy backend: {backend} (choose from {', '.join(COPY_BACKENDS)})")
+    drop_cache = validate_cache_policy(cache_policy) != 'default'
+    src_stat = Path(src).stat()
+    total_size = src_stat.st_size
+    get_throttle().acquire_file(src_stat.st_dev)
+    block_size = adaptive_block_size(total_size, block_size)
+    pipelined = backend == 'pipelined' or (backend == 'auto' and total_size >= PIPELINE_THRESHOLD and (os.cpu_count() or 1) > 1)
     copied = 0
+    unflushed = 0
+    file_pbar = None
     if show_progressbar and total_size > 0:
-        with tqdm(total=total_size, desc=f"Copying {Path(src).name}", unit="B", unit_scale=True, leave=False) as file_pbar:
-            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
-                h_src = hashlib.sha256()
-                h_dst = hashlib.sha256()
-                while True:
-                    buf = fsrc.read(block_size)
-                    if not buf:
+        file_pbar = tqdm(total=total_size, desc=f"Copying {Path(src).name}", unit="B", unit_scale=True, leave=False)
+
+    def on_written(n):
+        nonlocal copied
+        copied += n
+        if file_pbar:
+            file_pbar.update(n)
+        if progress_callback and total_size > 0:
+            percent = int((copied / total_size) * 100)
+            progress_callback(percent, copied, total_size)
+
+    method = None
+    try:
+        if backend == 'kernel' or (backend == 'auto' and expected_checksum and read_back):
+            with open(src, 'rb', buffering=0) as fsrc, open(dst, 'wb', buffering=0) as fdst:
+                for candidate in KERNEL_COPY_METHODS:
+                    if _kernel_copy(fsrc, fdst, candidate, total_size):
+                        method = candidate
+                        on_written(os.fstat(fdst.fileno()).st_size)
                         break
-                    fdst.write(buf)
-                    h_src.update(buf)
-                    h_dst.update(buf)  # Since we just wrote, src==dst
-                    copied += len(buf)
-                    file_pbar.update(len(buf))
-                    if progress_callback and total_size > 0:
-                        percent = int((copied / total_size) * 100)
-                        progress_callback(percent, copied, total_size)
-    else:
-        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
-            h_src = hashlib.sha256()
-            h_dst = hashlib.sha256()
-            while True:
-                buf = fsrc.read(block_size)
-                if not buf:
-                    break
-                fdst.write(buf)
-                h_src.update(buf)
-                h_dst.update(buf)
-                copied += len(buf)
-                if progress_callback and total_size > 0:
-                    percent = int((copied / total_size) * 100)
-                    progress_callback(percent, copied, total_size)
+                if method and drop_cache:
+                    drop_written(fdst)
+                    _fadvise(fsrc.fileno(), 0, 0, 'POSIX_FADV_DONTNEED')
+        if method is None:
+            method = 'pipelined' if pipelined else 'buffered'
+            h = new_hasher(algorithm)
+            fsrc, direct = open_for_reading(src, cache_policy)
+            with fsrc, open(dst, 'wb') as fdst:
+                def written(n):
+                    # Runs on the writer thread when pipelined, the only thread that touches fdst
+                    nonlocal unflushed
+                    on_written(n)
+                    unflushed += n
+                    if drop_cache and unflushed >= WRITE_BEHIND_BYTES:
+                        drop_written(fdst)
+                        unflushed = 0
+                if pipelined:
+                    _copy_pipelined(fsrc, fdst, h, block_size, written, cache_policy=cache_policy, direct=direct)
+                else:
+                    for block in read_blocks(fsrc, block_size, cache_policy, direct):
+                        fdst.write(block)
+                        h.update(block)
+                        written(len(block))
+                if drop_cache:
+                    drop_written(fdst)
+    finally:
+        if file_pbar:
+            file_pbar.close()
     # Preserve mtime
     src_stat = Path(src).stat()
     os.utime(dst, (src_stat.st_atime, src_stat.st_mtime))
-    # Return checksums for verification
-    return h_src.hexdigest(), h_dst.hexdigest()
+    if method in KERNEL_COPY_METHODS:
+        if read_back or not expected_checksum:
+            dst_checksum = compute_hash(dst, algorithm, cache_policy=cache_policy)
+            return expected_checksum or dst_checksum, dst_checksum, method
+        return expected_checksum, expected_checksum, method
+    # Return checksums for verification (the bytes written are the bytes read, so both sides share one digest)
+    checksum = h.hexdigest()
+    return checksum, checksum, method
 
-def verify_file(src, dst):
-    """Verify that two files have the same SHA-256 checksum."""
-    return compute_sha256(src) == compute_sha256(dst)
+def verify_file(src, dst, algorithm=DEFAULT_HASH_ALGORITHM):
+    """Verify that two files have the same checksum (SHA-256 unless another algorithm is given)."""
+    return compute_hash(src, algorithm) == compute_hash(dst, algorithm)
 
-def compute_sha256(file_path, block_size=4096):
-    h = hashlib.sha256()
-    with open(file_path, 'rb') as f:
-        while True:
-            chunk = f.read(block_size)
-            if not chunk:
-                break
-            h.update(chunk)
+# Regular files at least this large are hashed through a read-only memory map instead of read calls.
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+def _hash_mmap(f, h, block_size):
+    """Feed h with memoryview slices of a read-only mapping of f. Returns False if f cannot be mapped."""
+    throttle = get_throttle()
+    device = os.fstat(f.fileno()).st_dev if throttle.active else None
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return False
+    try:
+        if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        with memoryview(mm) as view:
+            for offset in range(0, len(view), block_size):
+                with view[offset:offset + block_size] as block:
+                    throttle.acquire_bytes(len(block), device)
+                    h.update(block)
+    finally:
+        mm.close()
+    return True
+
+def compute_hash(file_path, algorithm=DEFAULT_HASH_ALGORITHM, block_size=None, mmap_threshold=MMAP_THRESHOLD, cache_policy=DEFAULT_CACHE_POLICY):
+    """Compute the hex digest of a file with the given hash algorithm. block_size defaults to adaptive_block_size().
+    Regular files of at least mmap_threshold bytes are hashed from a memory map (None disables this);
+    smaller and special files, or files that cannot be mapped, use buffered readinto.
+    cache_policy is one of CACHE_POLICIES; only 'default' uses the memory map. Reads are throttled (see throttle.py)."""
+    h = new_hasher(algorithm)
+    f, direct = open_for_reading(file_path, cache_policy)
+    with f:
+        st = os.fstat(f.fileno())
+        get_throttle().acquire_file(st.st_dev)
+        block_size = adaptive_block_size(st.st_size, block_size)
+        if cache_policy == 'default' and mmap_threshold is not None and stat.S_ISREG(st.st_mode) and st.st_size >= max(mmap_threshold, 1):
+            if _hash_mmap(f, h, block_size):
+                return h.hexdigest()
+        for block in read_blocks(f, block_size, cache_policy, direct):
+            h.update(block)
     return h.hexdigest()
+
+# Fixed chunk size for per-chunk digests (see utils/chunk_hashes.py).
+CHUNK_SIZE = 64 * 1024 * 1024
+
+def compute_hash_with_chunks(file_path, algorithm=DEFAULT_HASH_ALGORITHM, chunk_size=CHUNK_SIZE, skip_chunks=0, on_chunk=None,
+                             cache_policy=DEFAULT_CACHE_POLICY):
+    """
+    Compute the whole-file digest and the digests of consecutive fixed-size chunks in one read pass.
+    The first skip_chunks chunks (already recorded by an interrupted run) only feed the whole-file digest.
+    on_chunk(index, offset, length, digest) is called as each new chunk completes.
+    cache_policy is one of CACHE_POLICIES.
+    Returns (hexdigest, [digests of the chunks computed in this call]).
+    """
+    h = new_hasher(algorithm)
+    digests = []
+    index = 0
+    chunk_h = None
+    chunk_len = 0
+    def finish_chunk():
+        if index >= skip_chunks:
+            digest = chunk_h.hexdigest()
+            digests.append(digest)
+            if on_chunk:
+                on_chunk(index, index * chunk_size, chunk_len, digest)
+    f, direct = open_for_reading(file_path, cache_policy)
+    with f:
+        st = os.fstat(f.fileno())
+        get_throttle().acquire_file(st.st_dev)
+        block_size = adaptive_block_size(st.st_size)
+        for block in read_blocks(f, block_size, cache_policy, direct):
+            h.update(block)
+            pos = 0
+            while pos < len(block):
+                take = min(len(block) - pos, chunk_size - chunk_len)
+                if index >= skip_chunks:
+                    if chunk_h is None:
+                        chunk_h = new_hasher(algorithm)
+                    chunk_h.update(block[pos:pos + take])
+                chunk_len += take
+                pos += take
+                if chunk_len == chunk_size:
+                    finish_chunk()
+                    index += 1
+                    chunk_h = None
+                    chunk_len = 0
+        if chunk_len:
+            finish_chunk()
+    return h.hexdigest(), digests
+
+# Bytes sampled from the head, middle and tail of a file for its fingerprint.
+FINGERPRINT_SAMPLE_SIZE = 64 * 1024
+# Files up to this size are cheaper to hash fully than to fingerprint.
+FINGERPRINT_MIN_SIZE = 4 * FINGERPRINT_SAMPLE_SIZE
+
+def compute_fingerprint(file_path, algorithm=DEFAULT_HASH_ALGORITHM, sample_size=FINGERPRINT_SAMPLE_SIZE):
+    """
+    Compute a cheap partial fingerprint: the file size plus the hash of its first, middle and last
+    sample_size bytes, formatted as '<size>:<hexdigest>'. Different fingerprints prove different
+    content; equal fingerprints only mean the full hash is needed to decide.
+    Returns None for files smaller than FINGERPRINT_MIN_SIZE (hash those fully instead).
+    """
+    size = Path(file_path).stat().st_size
+    if size < max(FINGERPRINT_MIN_SIZE, 3 * sample_size):
+        return None
+    h = new_hasher(algorithm)
+    throttle = get_throttle()
+    with open(file_path, 'rb') as f:
+        device = os.fstat(f.fileno()).st_dev if throttle.active else None
+        for offset in (0, (size - sample_size) // 2, size - sample_size):
+            f.seek(offset)
+            throttle.acquire_bytes(sample_size, device)
+            h.update(f.read(sample_size))
+    return f"{size}:{h.hexdigest()}"
+
+def compute_sha256(file_path, block_size=None):
+    return compute_hash(file_path, 'sha256', block_size)
@@ -0,0 +1,49 @@
+"""
+File: dedup_file_tools_commons/utils/hardlinks.py
+Description: Hardlink awareness for the scanners, the checksum layer and the copy phase.
+
+Scanners record the identity of every file as (device, inode, nlink) = (st_dev, st_ino, st_nlink) next to its
+uid/relative_path. Paths with nlink > 1 that share (device, inode) are the same content on disk, so:
+    - the checksum layer hashes each such inode once and stores the result for all of its paths
+    - the copy phase recreates the hardlink at the destination instead of copying the data again
+
+st_dev is only stable while the filesystem stays mounted; lookups by identity across runs therefore always
+also match on the filesystem uid and re-check the files on disk.
+"""
+# Identity columns added to the file tables of every tool; older job DBs are migrated by their init_db
+FILE_IDENTITY_COLUMNS = [
+    ('device', 'INTEGER'),
+    ('inode', 'INTEGER'),
+    ('nlink', 'INTEGER'),
+]
+
+
+def file_identity(stat_result):
+    """Return (device, inode, nlink) of an os.stat_result."""
+    return stat_result.st_dev, stat_result.st_ino, stat_result.st_nlink
+
+
+def inode_key(stat_result):
+    """Key shared by all paths of a hardlinked file, or None if the file has a single link."""
+    if stat_result.st_nlink > 1:
+        return stat_result.st_dev, stat_result.st_ino
+    return None
+
+
+def add_identity_columns(cur, table):
+    """Add the FILE_IDENTITY_COLUMNS missing from table, and an index on (device, inode)."""
+    cur.execute(f"PRAGMA table_info({table});")
+    columns = [row[1] for row in cur.fetchall()]
+    for name, decl in FILE_IDENTITY_COLUMNS:
+        if name not in columns:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl};")
+    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_device_inode ON {table}(device, inode);")
+
+
+def has_identity_columns(conn, table):
+    """True if table already has the identity columns (tables created by hand or by an older release may not)."""
+    cur = conn.cursor()
+    cur.execute(f"PRAGMA table_info({table});")
+    columns = {row[1] for row in cur.fetchall()}
+    return all(name in columns for name, _ in FILE_IDENTITY_COLUMNS)
+
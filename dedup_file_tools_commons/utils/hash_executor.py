@@ -0,0 +1,242 @@
+"""
+File: dedup_file_tools_commons/utils/hash_executor.py
+Description: Shared hashing executor for all checksum phases.
+
+Cache lookups and cache writes always happen in the calling process; only the hashing is fanned out.
+Files are hashed in batches and every batch comes back as compact
+(path, size, last_modified, checksum, fingerprint, error) tuples that the caller bulk-writes into
+checksum_cache in one transaction.
+
+Work is dispatched through the per-device I/O scheduler (io_scheduler.py): each device gets its own
+pool of the selected kind, limited to ROTATIONAL_CONCURRENCY workers on spinning disks.
+
+Executor modes:
+    - thread  : ThreadPoolExecutor (default). Cheap to start; hashlib releases the GIL on large buffers.
+    - process : ProcessPoolExecutor. Scales the per-file Python work (open, stat, hashing small files)
+                past the GIL; best for many small files.
+
+With chunk_size set, files of at least chunk_size bytes are hashed with per-chunk digests instead
+(see chunk_hashes.py). Their chunk rows are written as each chunk completes, so those files are
+always hashed on threads in the calling process.
+
+Hardlinked paths (see hardlinks.py) are hashed once per inode; the checksum is stored for every path.
+Rows record the inode fingerprint of each file, and a file whose fingerprint is cached under another path of its
+volume (renamed or moved) inherits that checksum without being read (see ChecksumCache).
+cache_policy (fileops.CACHE_POLICIES) keeps full-pool passes from flushing the page cache.
+While a throttle is active (see throttle.py) hashing runs on threads: its token buckets live in this process.
+"""
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from dedup_file_tools_commons.utils.fileops import compute_hash, compute_fingerprint, FINGERPRINT_MIN_SIZE, DEFAULT_CACHE_POLICY, validate_cache_policy
+from dedup_file_tools_commons.utils.hashing import DEFAULT_HASH_ALGORITHM, validate_algorithm
+from dedup_file_tools_commons.utils.chunk_hashes import hash_file_with_chunks
+from dedup_file_tools_commons.utils.io_scheduler import DeviceScheduler, group_by_device, order_by_location, DEFAULT_READ_ORDER
+from dedup_file_tools_commons.utils.hardlinks import inode_key
+from dedup_file_tools_commons.utils.throttle import get_throttle
+from dedup_file_tools_commons.db import upsert_checksums, decode_checksum, find_renamed_checksum, CHECKSUM_CACHE_INHERIT_SQL
+from dedup_file_tools_commons.utils.db_utils import transaction
+
+EXECUTOR_MODES = ('thread', 'process')
+DEFAULT_EXECUTOR = 'thread'
+DEFAULT_BATCH_SIZE = 64
+
+
+def add_hashing_arguments(parser, job_algorithm=False, executor=True, cache_policy=True, copy=False, workers_default='--threads'):
+    """
+    Add the hashing options shared by the commands that read file data:
+        --hash-algorithm                          always; with job_algorithm, it defaults to None (the job's stored algorithm)
+        --executor, --hash-workers, --read-order  with executor (workers_default describes the --hash-workers default)
+        --cache-policy                            with cache_policy
+        --copy-backend, --read-back               with copy
+    """
+    from dedup_file_tools_commons.utils.hashing import HASH_ALGORITHMS
+    from dedup_file_tools_commons.utils.io_scheduler import READ_ORDERS
+    from dedup_file_tools_commons.utils.fileops import CACHE_POLICIES, COPY_BACKENDS
+    if job_algorithm:
+        parser.add_argument('--hash-algorithm', choices=HASH_ALGORITHMS, default=None, help='Hash algorithm for checksums (default: the algorithm stored with the job, else sha256; blake3/xxh3/xxh128 need optional packages)')
+    else:
+        parser.add_argument('--hash-algorithm', choices=HASH_ALGORITHMS, default=DEFAULT_HASH_ALGORITHM, help='Hash algorithm for checksums (default: sha256; blake3/xxh3/xxh128 need optional packages)')
+    if executor:
+        parser.add_argument('--executor', choices=EXECUTOR_MODES, default=DEFAULT_EXECUTOR, help='Hashing executor: thread (default) or process (scales past the GIL for many small files)')
+        parser.add_argument('--hash-workers', type=int, default=None, help=f'Number of hashing workers (default: {workers_default})')
+        parser.add_argument('--read-order', choices=READ_ORDERS, default=DEFAULT_READ_ORDER, help='Order reads by on-disk location: none (default), inode, or extent (FIEMAP); helps on spinning disks')
+    if cache_policy:
+        parser.add_argument('--cache-policy', choices=CACHE_POLICIES, default=DEFAULT_CACHE_POLICY, help='Page-cache policy for bulk reads/writes: default, dontneed (fadvise: drop pages after use), or direct (O_DIRECT reads, else dontneed)')
+    if copy:
+        parser.add_argument('--copy-backend', choices=COPY_BACKENDS, default='auto', help='Copy backend: auto (default; streaming, or a kernel-side copy read back when --read-back is given and the source checksum is known), buffered, pipelined, or kernel (reflink clone, copy_file_range, sendfile; trusts the cached source checksum unless --read-back)')
+        parser.add_argument('--read-back', action='store_true', help='After a kernel-side copy, re-read and hash the destination instead of trusting the cached source checksum (lets auto use kernel-side copies)')
+
+
+def hash_batch(paths, algorithm=DEFAULT_HASH_ALGORITHM, cache_policy=DEFAULT_CACHE_POLICY):
+    """
+    Hash a batch of files. Runs inside worker threads or processes, so it touches no database.
+    Returns a list of (path, size, last_modified, checksum, fingerprint, error) tuples.
+    """
+    results = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            checksum = compute_hash(path, algorithm, cache_policy=cache_policy)
+            fingerprint = compute_fingerprint(path, algorithm) if stat.st_size >= FINGERPRINT_MIN_SIZE else None
+            results.append((path, stat.st_size, int(stat.st_mtime), checksum, fingerprint, None))
+        except OSError as e:
+            results.append((path, None, None, None, None, str(e)))
+    return results
+
+
+def iter_hashed_batches(paths, algorithm=DEFAULT_HASH_ALGORITHM, executor=DEFAULT_EXECUTOR, workers=None, batch_size=DEFAULT_BATCH_SIZE,
+                        read_order=DEFAULT_READ_ORDER, cache_policy=DEFAULT_CACHE_POLICY):
+    """Hash paths with the given executor mode, yielding each batch's result list as it completes.
+    Within each device, batches are submitted in read_order (see io_scheduler.READ_ORDERS)."""
+    if executor not in EXECUTOR_MODES:
+        raise ValueError(f"Unsupported executor: {executor} (choose from {', '.join(EXECUTOR_MODES)})")
+    algorithm = validate_algorithm(algorithm)
+    cache_policy = validate_cache_policy(cache_policy)
+    if executor == 'process' and get_throttle().active:
+        logging.info("[HashExecutor] Throttle active; hashing on threads instead of processes")
+        executor = 'thread'
+    # Batches never span devices, so the per-device limits of the I/O scheduler hold
+    batches = []
+    for device, device_paths in group_by_device(str(p) for p in paths).items():
+        device_paths = order_by_location(device_paths, read_order)
+        batches.extend((device, device_paths[i:i + batch_size]) for i in range(0, len(device_paths), batch_size))
+    if not batches:
+        return
+    pool_cls = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+    with DeviceScheduler(workers, executor_cls=pool_cls) as scheduler:
+        futures = [scheduler.submit_to_device(device, hash_batch, batch, algorithm, cache_policy) for device, batch in batches]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def _cached_checksum(row, size, mtime, algorithm):
+    if row and row[0] and row[3] == 1 and (row[4] or DEFAULT_HASH_ALGORITHM) == algorithm:
+        if row[1] == size and row[2] == mtime:
+            return decode_checksum(row[0])
+    return None
+
+
+def _identity(identities, key, size, mtime):
+    # (st_ino, st_mtime_ns) from the stat before hashing, if the hashed version is still that one
+    identity = identities.get(key)
+    return identity[2:] if identity and identity[:2] == (size, mtime) else ()
+
+
+def ensure_checksums(conn_factory, files, algorithm=DEFAULT_HASH_ALGORITHM, executor=DEFAULT_EXECUTOR, workers=None,
+                     batch_size=DEFAULT_BATCH_SIZE, progress=None, chunk_size=None, read_order=DEFAULT_READ_ORDER,
+                     cache_policy=DEFAULT_CACHE_POLICY, inherit_renamed=True):
+    """
+    Make sure checksum_cache holds a current checksum for every file.
+
+    Args:
+        conn_factory: returns a connection in which `checksum_cache` resolves to the checksum DB
+            (a direct checksum DB connection or a job DB connection with checksumdb attached).
+        files: iterable of (uid, relative_path, path).
+        progress: optional object with update(n), e.g. a tqdm bar.
+        chunk_size: if set, also record per-chunk digests for files of at least this size.
+        read_order: on-disk ordering of the hashing work (see io_scheduler.READ_ORDERS).
+        cache_policy: page-cache policy of the reads (see fileops.CACHE_POLICIES).
+        inherit_renamed: reuse the cached checksum of a renamed/moved file (same inode fingerprint) instead of hashing it.
+    Returns:
+        dict {(uid, relative_path): checksum} for every file that has a checksum.
+    """
+    algorithm = validate_algorithm(algorithm)
+    checksums = {}
+    pending = {}
+    chunked = []
+    # Other paths of hardlinked inodes that are already queued: {queued (uid, relative_path): [(uid, relative_path), ...]}
+    aliases = {}
+    queued_inodes = {}
+    # {(uid, relative_path): (size, mtime, st_ino, st_mtime_ns)} of the files to hash
+    identities = {}
+    with conn_factory() as conn:
+        cur = conn.cursor()
+        for uid, rel_path, path in files:
+            try:
+                stat = os.stat(path)
+            except OSError as e:
+                logging.warning(f"[HashExecutor] Cannot stat {path}: {e}")
+                if progress:
+                    progress.update(1)
+                continue
+            cur.execute(
+                "SELECT checksum, size, last_modified, is_valid, algorithm FROM checksum_cache WHERE uid=? AND relative_path=? LIMIT 1",
+                (uid, str(rel_path))
+            )
+            cached = _cached_checksum(cur.fetchone(), stat.st_size, int(stat.st_mtime), algorithm)
+            if cached:
+                checksums[(uid, rel_path)] = cached
+                if progress:
+                    progress.update(1)
+                continue
+            renamed = find_renamed_checksum(conn, uid, rel_path, stat, algorithm) if inherit_renamed else None
+            if renamed:
+                cur.execute(CHECKSUM_CACHE_INHERIT_SQL, (uid, str(rel_path), int(time.time()), uid, renamed[0]))
+                checksums[(uid, rel_path)] = renamed[1]
+                if progress:
+                    progress.update(1)
+                continue
+            identities[(uid, rel_path)] = (stat.st_size, int(stat.st_mtime), stat.st_ino, stat.st_mtime_ns)
+            key = inode_key(stat)
+            if key in queued_inodes:
+                aliases.setdefault(queued_inodes[key], []).append((uid, rel_path))
+                continue
+            if key is not None:
+                queued_inodes[key] = (uid, rel_path)
+            if chunk_size and stat.st_size >= chunk_size:
+                chunked.append((uid, rel_path, str(path)))
+            else:
+                pending[str(path)] = (uid, rel_path)
+    if chunked:
+        chunked = order_by_location(chunked, read_order, path_of=lambda f: f[2])
+        _hash_chunked(conn_factory, chunked, algorithm, workers, chunk_size, checksums, progress, aliases, cache_policy, identities)
+    if not pending:
+        return checksums
+    logging.info(f"[HashExecutor] Hashing {len(pending)} files ({executor} mode, {algorithm})")
+    for results in iter_hashed_batches(list(pending), algorithm, executor, workers, batch_size, read_order, cache_policy):
+        now = int(time.time())
+        rows = []
+        for path, size, mtime, checksum, fingerprint, error in results:
+            uid, rel_path = pending[path]
+            if error or not checksum:
+                logging.error(f"[HashExecutor] Checksum failed for {path}: {error}")
+                continue
+            for key in [(uid, rel_path)] + aliases.get((uid, rel_path), []):
+                checksums[key] = checksum
+                rows.append((key[0], str(key[1]), size, mtime, checksum, now, now, algorithm, fingerprint) + _identity(identities, key, size, mtime))
+        if rows:
+            with conn_factory() as conn, transaction(conn):
+                upsert_checksums(conn, rows)
+        if progress:
+            progress.update(len(results) + sum(len(aliases.get(pending[r[0]], [])) for r in results))
+    return checksums
+
+
+def _hash_chunked(conn_factory, files, algorithm, workers, chunk_size, checksums, progress, aliases=None, cache_policy=DEFAULT_CACHE_POLICY,
+                  identities=None):
+    """Hash large files with per-chunk digests on threads in the calling process and store their checksums."""
+    def work(uid, rel_path, path):
+        checksum, size, mtime = hash_file_with_chunks(conn_factory, uid, rel_path, path, algorithm, chunk_size, cache_policy)
+        return uid, rel_path, size, mtime, checksum, compute_fingerprint(path, algorithm) if size >= FINGERPRINT_MIN_SIZE else None
+
+    logging.info(f"[HashExecutor] Hashing {len(files)} large files with {chunk_size}-byte chunk digests ({algorithm})")
+    with DeviceScheduler(workers) as scheduler:
+        futures = {scheduler.submit(f[2], work, *f): f for f in files}
+        for future in as_completed(futures):
+            uid, rel_path, path = futures[future]
+            keys = [(uid, rel_path)] + (aliases or {}).get((uid, rel_path), [])
+            try:
+                _, _, size, mtime, checksum, fingerprint = future.result()
+            except OSError as e:
+                logging.error(f"[HashExecutor] Checksum failed for {path}: {e}")
+            else:
+                now = int(time.time())
+                for key in keys:
+                    checksums[key] = checksum
+                with conn_factory() as conn, transaction(conn):
+                    upsert_checksums(conn, [(key[0], str(key[1]), size, mtime, checksum, now, now, algorithm, fingerprint)
+                                            + _identity(identities or {}, key, size, mtime) for key in keys])
+            if progress:
+                progress.update(len(keys))
@@ -0,0 +1,99 @@
+"""
+File: dedup_file_tools_commons/utils/hashing.py
+Description: Pluggable hash engines for file checksums.
+
+Every checksum in the tool is produced by one of the algorithms below. The
+algorithm name is stored next to each checksum_cache row so that checksums
+produced by different engines are never compared with each other.
+
+Supported algorithms:
+    - sha256  : hashlib (default, always available)
+    - blake2b : hashlib (always available, faster than sha256 on 64-bit CPUs)
+    - blake3  : requires the optional 'blake3' package
+    - xxh3    : 64-bit XXH3, requires the optional 'xxhash' package
+    - xxh128  : 128-bit XXH3, requires the optional 'xxhash' package
+"""
+import hashlib
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+DEFAULT_HASH_ALGORITHM = 'sha256'
+HASH_ALGORITHMS = ('sha256', 'blake2b', 'blake3', 'xxh3', 'xxh128')
+
+
+def is_algorithm_available(algorithm):
+    """Return True if the given algorithm can be used on this system."""
+    if algorithm in ('sha256', 'blake2b'):
+        return True
+    if algorithm == 'blake3':
+        return blake3 is not None
+    if algorithm in ('xxh3', 'xxh128'):
+        return xxhash is not None
+    return False
+
+
+def available_algorithms():
+    """Return the list of supported algorithms that are usable on this system."""
+    return [a for a in HASH_ALGORITHMS if is_algorithm_available(a)]
+
+
+def validate_algorithm(algorithm):
+    """
+    Return the algorithm name (DEFAULT_HASH_ALGORITHM if None) or raise ValueError
+    if it is unknown or its optional dependency is not installed.
+    """
+    if algorithm is None:
+        return DEFAULT_HASH_ALGORITHM
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"Unsupported hash algorithm: {algorithm} (choose from {', '.join(HASH_ALGORITHMS)})")
+    if not is_algorithm_available(algorithm):
+        package = 'blake3' if algorithm == 'blake3' else 'xxhash'
+        raise ValueError(f"Hash algorithm '{algorithm}' requires the '{package}' package (pip install {package})")
+    return algorithm
+
+
+def new_hasher(algorithm=DEFAULT_HASH_ALGORITHM):
+    """
+    Create a new incremental hasher for the given algorithm.
+    The returned object supports update(bytes) and hexdigest().
+    """
+    algorithm = validate_algorithm(algorithm)
+    if algorithm == 'sha256':
+        return hashlib.sha256()
+    if algorithm == 'blake2b':
+        return hashlib.blake2b()
+    if algorithm == 'blake3':
+        return blake3.blake3()
+    if algorithm == 'xxh3':
+        return xxhash.xxh3_64()
+    return xxhash.xxh3_128()
+
+
+JOB_METADATA_SCHEMA = "CREATE TABLE IF NOT EXISTS job_metadata (key TEXT PRIMARY KEY, value TEXT)"
+
+
+def job_hash_algorithm(db_path, requested=None):
+    """
+    The hash algorithm of the job whose DB is db_path. The first command that hashes stores its algorithm
+    (requested, default: DEFAULT_HASH_ALGORITHM) in job_metadata; later commands default to the stored one.
+    Raises ValueError if requested differs from the stored algorithm: none of the job's cached checksums
+    would match, and every file would silently be hashed again.
+    """
+    from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
+    with RobustSqliteConn(db_path).connect() as conn:
+        conn.execute(JOB_METADATA_SCHEMA)
+        row = conn.execute("SELECT value FROM job_metadata WHERE key='hash_algorithm'").fetchone()
+        if row and row[0]:
+            if requested and requested != row[0]:
+                raise ValueError(f"The job uses hash algorithm {row[0]}; --hash-algorithm {requested} would not match any of its checksums")
+            return row[0]
+        algorithm = validate_algorithm(requested)
+        conn.execute("INSERT OR REPLACE INTO job_metadata (key, value) VALUES ('hash_algorithm', ?)", (algorithm,))
+        conn.commit()
+    return algorithm
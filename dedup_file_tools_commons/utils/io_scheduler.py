@@ -0,0 +1,163 @@
+"""
+File: dedup_file_tools_commons/utils/io_scheduler.py
+Description: Per-device I/O scheduler shared by the copy, checksum, verify and pool-indexing phases.
+
+Work items are grouped by the device (st_dev) of the file they read. Each device gets its own executor,
+so different devices run in parallel while each device only sees a bounded number of concurrent readers:
+    - rotational disks (/sys/dev/block/<major>:<minor>/queue/rotational == 1): ROTATIONAL_CONCURRENCY
+    - SSDs, network and virtual filesystems, or unknown devices: the scheduler's `workers`
+
+Rotation is only detected on Linux; everywhere else every device is treated as non-rotational.
+
+Read ordering (READ_ORDERS): since every device pool runs its work in submission order, callers can sort
+work lists by on-disk location first (order_by_location) so reads on spinning disks become mostly sequential:
+    - none   : keep the caller's order (default)
+    - inode  : sort by inode number, a cheap proxy for allocation order on most filesystems
+    - extent : sort by the physical offset of the file's first extent (Linux FIEMAP ioctl), falling back to
+               the inode number where FIEMAP is unavailable
+"""
+import os
+import struct
+import logging
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+ROTATIONAL_CONCURRENCY = 1
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+READ_ORDERS = ('none', 'inode', 'extent')
+DEFAULT_READ_ORDER = 'none'
+
+# struct fiemap header and one struct fiemap_extent (linux/fiemap.h)
+_FS_IOC_FIEMAP = 0xC020660B
+_FIEMAP_HEADER = struct.Struct('=QQLLLL')
+_FIEMAP_EXTENT = struct.Struct('=QQQQQLLLL')
+_FIEMAP_FLAG_SYNC = 0x1
+
+
+def device_of(path):
+    """Return the st_dev of path, or None if it cannot be stat'ed."""
+    if path is None:
+        return None
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return None
+
+
+@lru_cache(maxsize=None)
+def is_rotational(device):
+    """True if the block device backing st_dev `device` is a spinning disk."""
+    if device is None:
+        return False
+    base = f"/sys/dev/block/{os.major(device)}:{os.minor(device)}"
+    # Partitions have no queue/ of their own; their parent disk does
+    for candidate in (os.path.join(base, 'queue', 'rotational'), os.path.join(base, '..', 'queue', 'rotational')):
+        try:
+            with open(candidate) as f:
+                return f.read().strip() == '1'
+        except OSError:
+            continue
+    return False
+
+
+def first_extent_offset(path):
+    """Physical byte offset of the first extent of path via FIEMAP, or None if unavailable (non-Linux, empty
+    or inline files, filesystems without FIEMAP support)."""
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    request = bytearray(_FIEMAP_HEADER.size + _FIEMAP_EXTENT.size)
+    _FIEMAP_HEADER.pack_into(request, 0, 0, 0xFFFFFFFFFFFFFFFF, _FIEMAP_FLAG_SYNC, 0, 1, 0)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        fcntl.ioctl(fd, _FS_IOC_FIEMAP, request)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    mapped_extents = _FIEMAP_HEADER.unpack_from(request, 0)[3]
+    if not mapped_extents:
+        return None
+    return _FIEMAP_EXTENT.unpack_from(request, _FIEMAP_HEADER.size)[1]
+
+
+def location_key(path, read_order=DEFAULT_READ_ORDER):
+    """Sort key approximating the on-disk location of path; files that cannot be stat'ed sort last."""
+    try:
+        inode = os.stat(path).st_ino
+    except (OSError, TypeError):
+        return (2, 0)
+    if read_order == 'extent':
+        offset = first_extent_offset(path)
+        if offset is not None:
+            return (0, offset)
+    return (1, inode)
+
+
+def order_by_location(items, read_order=DEFAULT_READ_ORDER, path_of=lambda item: item):
+    """Return items sorted by on-disk location according to read_order ('none' keeps the input order)."""
+    items = list(items)
+    if read_order not in READ_ORDERS:
+        raise ValueError(f"Unsupported read order: {read_order} (choose from {', '.join(READ_ORDERS)})")
+    if read_order == 'none':
+        return items
+    return sorted(items, key=lambda item: location_key(path_of(item), read_order))
+
+
+def group_by_device(items, path_of=lambda item: item):
+    """Group items into {device: [items]} keeping their order within each device."""
+    groups = {}
+    for item in items:
+        groups.setdefault(device_of(path_of(item)), []).append(item)
+    return groups
+
+
+class DeviceScheduler:
+    """
+    Executor that runs work on one pool per device. Use submit(path, fn, *args) where path is the file
+    the work item reads; futures are regular concurrent.futures futures, so as_completed() works as usual.
+    """
+    def __init__(self, workers=None, rotational_limit=ROTATIONAL_CONCURRENCY, executor_cls=ThreadPoolExecutor):
+        self.workers = workers or DEFAULT_WORKERS
+        self.rotational_limit = rotational_limit
+        self.executor_cls = executor_cls
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def limit_for(self, device):
+        if is_rotational(device):
+            return max(1, min(self.rotational_limit, self.workers))
+        return self.workers
+
+    def _pool_for(self, device):
+        with self._lock:
+            pool = self._pools.get(device)
+            if pool is None:
+                limit = self.limit_for(device)
+                logging.debug(f"[IOScheduler] Device {device}: {limit} workers")
+                pool = self._pools[device] = self.executor_cls(max_workers=limit)
+            return pool
+
+    def submit(self, path, fn, *args, **kwargs):
+        return self._pool_for(device_of(path)).submit(fn, *args, **kwargs)
+
+    def submit_to_device(self, device, fn, *args, **kwargs):
+        return self._pool_for(device).submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(wait=True)
+        return False
@@ -0,0 +1,244 @@
+"""
+File: dedup_file_tools_commons/utils/path_store.py
+Description: Normalized storage of (uid, relative_path) keys: interned volumes and directories.
+
+A row keyed by (uid, relative_path) repeats the volume UID and the whole directory part of the path. A table
+stored through a PathStore keys its rows by (vol_id, dir_id, name) instead:
+
+    volumes     : id INTEGER <-> uid (the volume UID of UidPath)
+    directories : id, vol_id, parent_id, name, path (the directory's relative path with its trailing separator)
+
+so every file row holds two small integers and its own file name. Each directory keeps its full path once
+(not once per file): relative_path is directories.path || name, a single join away, and all files below a
+directory are a range scan of the (vol_id, path) index (see subtree_condition). The separator is kept as it
+appears in relative_path, so the round trip through the store is exact on every platform.
+
+Callers keep working with UidPath: intern() turns one into a key and uid_path() turns a key back into one.
+Ids are cached per PathStore, so interning the files of a scan costs a dictionary lookup per file after the
+first file of each directory. Worker threads that write through a DBWriter use submit_group() instead: the
+volume and directories are created by the writer thread, and the file row resolves its key in SQL (FILE_KEY_SQL).
+
+A stored table keeps its old name as a view (uid_path_view_sql), so queries joining on (uid, relative_path)
+keep working. relative_path is computed in the view and has no index: a query probing the view for one path
+matches on uid_path_match_sql() instead. fs_copy's destination_pool_files is stored this way.
+"""
+import threading
+from dedup_file_tools_commons.utils.uidpath import UidPath
+
+PATH_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS volumes (
+    id INTEGER PRIMARY KEY,
+    uid NOT NULL UNIQUE -- no type affinity: the UID keeps its type (Windows serial numbers may be integers)
+);
+CREATE TABLE IF NOT EXISTS directories (
+    id INTEGER PRIMARY KEY,
+    vol_id INTEGER NOT NULL REFERENCES volumes(id),
+    parent_id INTEGER REFERENCES directories(id), -- NULL for the root of the volume
+    name TEXT NOT NULL, -- last path component ('' for the root)
+    path TEXT NOT NULL, -- relative path with its trailing separator ('' for the root)
+    UNIQUE (vol_id, path)
+);
+CREATE INDEX IF NOT EXISTS idx_directories_parent ON directories(parent_id);
+"""
+
+SEPARATORS = ('/', '\\')
+
+# "vol_id, dir_id, name" of a file in a VALUES list, with key_params(uid, relative_path) as its parameters
+FILE_KEY_SQL = ("(SELECT id FROM volumes WHERE uid = ?), "
+                "(SELECT d.id FROM directories AS d JOIN volumes AS v ON v.id = d.vol_id WHERE v.uid = ? AND d.path = ?), ?")
+_DIRECTORY_INSERT_SQL = ("INSERT OR IGNORE INTO directories (vol_id, parent_id, name, path) "
+                         "SELECT v.id, (SELECT d.id FROM directories AS d WHERE d.vol_id = v.id AND d.path = ?), ?, ? "
+                         "FROM volumes AS v WHERE v.uid = ?")
+
+
+def init_path_store(conn):
+    conn.executescript(PATH_STORE_SCHEMA)
+
+
+def split_relative_path(relative_path):
+    """'a/b/c.txt' -> ('a/b/', 'c.txt'): directory part with its trailing separator, and the name."""
+    cut = max(relative_path.rfind(sep) for sep in SEPARATORS) + 1
+    return relative_path[:cut], relative_path[cut:]
+
+
+def key_params(uid, relative_path):
+    """Parameters of FILE_KEY_SQL for the file (uid, relative_path)."""
+    dir_path, name = split_relative_path(str(relative_path))
+    return uid, uid, dir_path, name
+
+
+def _path_upper_bound(dir_path):
+    # Smallest string greater than every path starting with dir_path (which ends with a separator)
+    return dir_path[:-1] + chr(ord(dir_path[-1]) + 1)
+
+
+def uid_path_view_sql(view, table, columns):
+    """CREATE VIEW statement presenting a (vol_id, dir_id, name) table as (uid, relative_path, *columns),
+    plus the dir_id and name columns used by uid_path_match_sql."""
+    extra = ''.join(f", f.{column}" for column in columns)
+    return f"""
+        CREATE VIEW IF NOT EXISTS {view} AS
+        SELECT v.uid AS uid, d.path || f.name AS relative_path, f.dir_id AS dir_id, f.name AS name{extra}
+        FROM {table} AS f
+        JOIN volumes AS v ON v.id = f.vol_id
+        JOIN directories AS d ON d.id = f.dir_id
+    """
+
+
+def has_path_store_layout(conn, name):
+    """True if name is a view created by uid_path_view_sql, False if it is a plain (uid, relative_path) table."""
+    row = conn.execute("SELECT sql FROM main.sqlite_master WHERE name=?", (name,)).fetchone()
+    return bool(row and row[0] and row[0].lstrip().upper().startswith('CREATE VIEW'))
+
+
+def uid_path_match_sql(alias, uid_expr, path_expr, path_store_layout=True):
+    """
+    SQL condition matching the row alias of a uid_path_view_sql view to the file (uid_expr, path_expr), two SQL
+    expressions such as 'cc.uid', 'cc.relative_path'. The path is split in SQL into its directory (rtrim of every
+    character that is not a separator) and its name; a scalar subquery resolves the directory through the
+    volumes and (vol_id, path) indexes, and the row is found by its primary key (dir_id, name). Matching on the
+    computed relative_path would compute it for every row of the view instead.
+    With path_store_layout=False (a plain table), it is simply alias.relative_path = path_expr.
+    """
+    if not path_store_layout:
+        return f"{alias}.relative_path = {path_expr}"
+    dir_expr = f"rtrim({path_expr}, replace(replace({path_expr}, '/', ''), '\\', ''))"
+    return (f"{alias}.dir_id = (SELECT sd.id FROM directories AS sd JOIN volumes AS sv ON sv.id = sd.vol_id "
+            f"WHERE sv.uid = {uid_expr} AND sd.path = {dir_expr}) AND {alias}.name = substr({path_expr}, length({dir_expr}) + 1)")
+
+
+class PathStore:
+    """Interns volumes and directories in the DB of conn (methods take the connection, like ChecksumCache2)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._volume_ids = {}
+        self._volume_uids = {}
+        # {(vol_id, path): dir_id} and {dir_id: (vol_id, path)}
+        self._directory_ids = {}
+        self._directory_paths = {}
+        # (uid, path) of the volumes ('' path) and directories already queued by submit_group
+        self._submitted = set()
+        self._submit_lock = threading.Lock()
+
+    def volume_id(self, conn, uid):
+        vol_id = self._volume_ids.get(uid)
+        if vol_id is None:
+            conn.execute("INSERT OR IGNORE INTO volumes (uid) VALUES (?)", (uid,))
+            vol_id = conn.execute("SELECT id FROM volumes WHERE uid=?", (uid,)).fetchone()[0]
+            with self._lock:
+                self._volume_ids[uid] = vol_id
+                self._volume_uids[vol_id] = uid
+        return vol_id
+
+    def directory_id(self, conn, vol_id, dir_path):
+        """Id of the directory dir_path ('' or ending with a separator) of volume vol_id, created with its parents."""
+        dir_id = self._directory_ids.get((vol_id, dir_path))
+        if dir_id is not None:
+            return dir_id
+        if dir_path:
+            parent_path, name = split_relative_path(dir_path[:-1])
+            parent_id = self.directory_id(conn, vol_id, parent_path)
+        else:
+            parent_id, name = None, ''
+        conn.execute("INSERT OR IGNORE INTO directories (vol_id, parent_id, name, path) VALUES (?, ?, ?, ?)",
+                     (vol_id, parent_id, name, dir_path))
+        dir_id = conn.execute("SELECT id FROM directories WHERE vol_id=? AND path=?", (vol_id, dir_path)).fetchone()[0]
+        with self._lock:
+            self._directory_ids[(vol_id, dir_path)] = dir_id
+            self._directory_paths[dir_id] = (vol_id, dir_path)
+        return dir_id
+
+    def intern(self, conn, uid, relative_path):
+        """(vol_id, dir_id, name) key of a file, creating its volume and directories as needed."""
+        dir_path, name = split_relative_path(str(relative_path))
+        vol_id = self.volume_id(conn, uid)
+        return vol_id, self.directory_id(conn, vol_id, dir_path), name
+
+    def submit_group(self, writer, uid, relative_path, statements):
+        """
+        Queue statements (a submit_group intent writing the file (uid, relative_path), its key given as FILE_KEY_SQL
+        with key_params) on writer, a DBWriter, behind an intent creating the file's volume and directories if
+        this store has not queued them yet. Nothing is written on the caller's connection, so worker threads do
+        not compete with the writer thread for the write lock.
+        """
+        dir_path, _ = split_relative_path(str(relative_path))
+        with self._submit_lock:  # a directory's intent must be queued before any file intent that needs it
+            missing = []
+            path = dir_path
+            while (uid, path) not in self._submitted:
+                missing.append(path)
+                if not path:
+                    break
+                path = split_relative_path(path[:-1])[0]
+            if missing:
+                creates = [] if (uid, '') in self._submitted else [("INSERT OR IGNORE INTO volumes (uid) VALUES (?)", (uid,))]
+                for path in reversed(missing):
+                    if path:
+                        parent_path, name = split_relative_path(path[:-1])
+                        creates.append((_DIRECTORY_INSERT_SQL, (parent_path, name, path, uid)))
+                    else:
+                        creates.append((_DIRECTORY_INSERT_SQL, (None, '', '', uid)))
+                writer.submit_group(creates)
+                self._submitted.update((uid, path) for path in missing)
+            writer.submit_group(statements)
+
+    def intern_many(self, conn, keys):
+        """[(vol_id, dir_id, name)] for an iterable of (uid, relative_path), in one transaction."""
+        from dedup_file_tools_commons.utils.db_utils import transaction
+        try:
+            with transaction(conn):
+                return [self.intern(conn, uid, relative_path) for uid, relative_path in keys]
+        except BaseException:
+            self.clear()  # ids created by the rolled back transaction are gone
+            raise
+
+    def clear(self):
+        with self._lock:
+            self._volume_ids.clear()
+            self._volume_uids.clear()
+            self._directory_ids.clear()
+            self._directory_paths.clear()
+        with self._submit_lock:
+            self._submitted.clear()
+
+    def lookup(self, conn, uid, relative_path):
+        """Key of a file whose volume and directory are already stored, else None (creates nothing)."""
+        dir_path, name = split_relative_path(str(relative_path))
+        row = conn.execute(
+            "SELECT v.id, d.id FROM volumes AS v JOIN directories AS d ON d.vol_id = v.id WHERE v.uid=? AND d.path=?",
+            (uid, dir_path)).fetchone()
+        return (row[0], row[1], name) if row else None
+
+    def uid_path(self, conn, vol_id, dir_id, name):
+        """The UidPath of a stored key."""
+        uid = self._volume_uids.get(vol_id)
+        directory = self._directory_paths.get(dir_id)
+        if uid is None or directory is None:
+            row = conn.execute(
+                "SELECT v.uid, d.path FROM directories AS d JOIN volumes AS v ON v.id = d.vol_id WHERE d.id=? AND v.id=?",
+                (dir_id, vol_id)).fetchone()
+            if row is None:
+                raise KeyError(f"No directory {dir_id} on volume {vol_id}")
+            uid, directory = row[0], (vol_id, row[1])
+            with self._lock:
+                self._volume_ids[uid] = vol_id
+                self._volume_uids[vol_id] = uid
+                self._directory_ids[directory] = dir_id
+                self._directory_paths[dir_id] = directory
+        return UidPath(uid, directory[1] + name)
+
+    def subtree_condition(self, conn, uid, dir_path, dir_column='dir_id'):
+        """
+        (sql, params) restricting dir_column to the directory dir_path of volume uid and everything below it,
+        e.g. f"SELECT name FROM files WHERE {sql}". It is answered from the (vol_id, path) index.
+        """
+        if dir_path and not dir_path.endswith(SEPARATORS):
+            dir_path += '\\' if '\\' in dir_path and '/' not in dir_path else '/'
+        vol_id = self._volume_ids.get(uid)
+        if vol_id is None:
+            row = conn.execute("SELECT id FROM volumes WHERE uid=?", (uid,)).fetchone()
+            vol_id = row[0] if row else -1
+        if not dir_path:
+            return f"{dir_column} IN (SELECT id FROM directories WHERE vol_id = ?)", (vol_id,)
+        return (f"{dir_column} IN (SELECT id FROM directories WHERE vol_id = ? AND path >= ? AND path < ?)",
+                (vol_id, dir_path, _path_upper_bound(dir_path)))
@@ -1,22 +1,85 @@
 import sqlite3
 import time
+import logging
 from typing import Optional, Callable
+from dedup_file_tools_commons.utils.sqlite_profiles import apply_profile
+
+DEFAULT_RETRIES = 5
+DEFAULT_RETRY_DELAY = 0.5
+
+
+def is_lock_error(exc):
+    """True for the lock/busy errors that another writer's transaction can cause; retrying may succeed."""
+    message = str(exc).lower()
+    return isinstance(exc, sqlite3.OperationalError) and ('database is locked' in message or 'database is busy' in message
+                                                          or 'database table is locked' in message)
+
+
+def _retry_on_lock(conn, fn, what):
+    # A statement that failed on a lock applied nothing, but executemany may have applied its first rows
+    # (each one commits on its own in autocommit mode): only retry while nothing has changed.
+    changes = conn.total_changes
+    for attempt in range(conn.retries + 1):
+        try:
+            return fn()
+        except sqlite3.OperationalError as e:
+            if not is_lock_error(e) or attempt == conn.retries or conn.total_changes != changes:
+                raise
+            logging.warning(f"[SQLITE] {what} hit a lock ({e}); retry {attempt + 1}/{conn.retries}")
+            time.sleep(conn.retry_delay * (attempt + 1))
+
+
+class RetryingCursor(sqlite3.Cursor):
+    """Cursor whose execute/executemany retry on lock contention (on top of the connection's busy timeout)."""
+    def execute(self, sql, parameters=()):
+        return _retry_on_lock(self.connection, lambda: super(RetryingCursor, self).execute(sql, parameters), 'execute')
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)  # an iterator could not be replayed
+        return _retry_on_lock(self.connection, lambda: super(RetryingCursor, self).executemany(sql, seq_of_parameters), 'executemany')
+
+
+class RetryingConnection(sqlite3.Connection):
+    """Connection returned by RobustSqliteConn: statements and commits retry on lock contention."""
+    retries = DEFAULT_RETRIES
+    retry_delay = DEFAULT_RETRY_DELAY
+
+    def cursor(self, factory=RetryingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        return _retry_on_lock(self, super().commit, 'commit')
+
 
 class RobustSqliteConn:
-    def __init__(self, db_path: str, timeout: float = 30.0, retries: int = 5, retry_delay: float = 0.5, wal: bool = True):
+    """Connections in autocommit mode, in WAL mode and with the pragmas of profile (see sqlite_profiles.py;
+    default: the profile of the running phase). Every statement outside a transaction commits on its own: wrap
+    writes of several rows in db_utils.transaction()."""
+    def __init__(self, db_path: str, timeout: float = 30.0, retries: int = DEFAULT_RETRIES, retry_delay: float = DEFAULT_RETRY_DELAY, wal: bool = True,
+                 profile: Optional[str] = None):
         self.db_path = db_path
         self.timeout = timeout
         self.retries = retries
         self.retry_delay = retry_delay
         self.wal = wal
+        self.profile = profile
 
     def connect(self) -> sqlite3.Connection:
         last_exc = None
         for attempt in range(self.retries):
             try:
-                conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+                conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None, factory=RetryingConnection)
+                conn.retries = self.retries
+                conn.retry_delay = self.retry_delay
                 if self.wal:
                     conn.execute('PRAGMA journal_mode=WAL;')
+                apply_profile(conn, self.profile)
                 return conn
             except sqlite3.OperationalError as e:
                 last_exc = e
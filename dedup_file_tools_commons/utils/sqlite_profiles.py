@@ -0,0 +1,159 @@
+"""
+File: dedup_file_tools_commons/utils/sqlite_profiles.py
+Description: Named SQLite pragma profiles, selected per phase, and WAL checkpoints at phase boundaries.
+
+Every RobustSqliteConn connection gets the pragmas of the current profile on top of journal_mode=WAL:
+    - safe            : synchronous=FULL. The default for phases whose results cannot be rebuilt (copy status,
+                        verification results, checksums).
+    - bulk            : synchronous=NORMAL, 256 MiB page cache, 1 GiB mmap, in-memory temp tables and a 10x larger
+                        WAL autocheckpoint. For scans (analyze, pool indexing, checksum import): in WAL mode NORMAL
+                        only syncs at checkpoints, and a power loss can lose the last transactions but never corrupts
+                        the database. That matters because bulk also applies to the shared checksum DB.
+    - readonly-report : read-only connections (query_only) with a large cache and mmap, for summaries/status.
+
+A phase runs inside sqlite_phase() (or a handler decorated with phase_handler/job_phase): the profile applies to the connections opened during the phase, and when
+the phase ends the WAL of its databases is checkpointed (TRUNCATE), so it does not keep growing across phases.
+The profile of a phase can be overridden with configure_profiles(): one name for every phase, or
+{phase: name} (optionally with a 'default' entry), e.g. from --sqlite-profile or the YAML config.
+"""
+import functools
+import logging
+import os
+from contextlib import contextmanager
+
+PRAGMA_PROFILES = {
+    'safe': {
+        'synchronous': 'FULL',
+    },
+    'bulk': {
+        'synchronous': 'NORMAL',
+        'cache_size': -262144,  # KiB: 256 MiB
+        'mmap_size': 1 << 30,
+        'temp_store': 'MEMORY',
+        'wal_autocheckpoint': 10000,
+    },
+    'readonly-report': {
+        'query_only': 'ON',
+        'cache_size': -131072,  # KiB: 128 MiB
+        'mmap_size': 1 << 30,
+        'temp_store': 'MEMORY',
+    },
+}
+PROFILE_NAMES = tuple(PRAGMA_PROFILES)
+DEFAULT_PROFILE = 'safe'
+# Pragmas that apply to one database of the connection (main or an attached one); the others are per connection
+SCHEMA_PRAGMAS = ('synchronous', 'cache_size', 'mmap_size')
+
+# Profile of the running phase (process-wide: the worker threads of a phase open connections too)
+_process_profile = [DEFAULT_PROFILE]
+_selection = {'default': None, 'phases': {}}
+
+
+def validate_profile(name):
+    if name not in PRAGMA_PROFILES:
+        raise ValueError(f"Unknown SQLite profile: {name} (choose from {', '.join(PROFILE_NAMES)})")
+    return name
+
+
+def current_profile():
+    return _process_profile[0]
+
+
+def apply_profile(conn, profile=None, schema=None):
+    """Set the pragmas of profile (default: current_profile()) on conn; with schema, only those of that database."""
+    pragmas = PRAGMA_PROFILES[validate_profile(profile or current_profile())]
+    for name, value in pragmas.items():
+        if schema:
+            if name in SCHEMA_PRAGMAS:
+                conn.execute(f"PRAGMA {schema}.{name}={value}")
+        else:
+            conn.execute(f"PRAGMA {name}={value}")
+
+
+def configure_profiles(selection):
+    """Override the phase profiles: None (built-in choices), a profile name for every phase, or {phase: name}."""
+    if isinstance(selection, dict):
+        phases = {phase: validate_profile(name) for phase, name in selection.items() if phase != 'default'}
+        default = selection.get('default')
+        _selection['default'] = validate_profile(default) if default else None
+        _selection['phases'] = phases
+    else:
+        _selection['default'] = validate_profile(selection) if selection else None
+        _selection['phases'] = {}
+
+
+def profile_for_phase(phase, default=DEFAULT_PROFILE):
+    return _selection['phases'].get(phase) or _selection['default'] or default
+
+
+def checkpoint_wal(db_path, mode='TRUNCATE'):
+    """Checkpoint the WAL of db_path into the database file. Returns SQLite's (busy, log pages, checkpointed) or None."""
+    import sqlite3
+    if not os.path.exists(db_path) or not os.path.exists(db_path + '-wal'):
+        return None
+    try:
+        conn = sqlite3.connect(db_path, timeout=30.0)
+        try:
+            result = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logging.warning(f"[SQLITE] WAL checkpoint of {db_path} failed: {e}")
+        return None
+    if result and result[0]:
+        logging.info(f"[SQLITE] WAL checkpoint of {db_path} incomplete (readers still active): {result}")
+    return tuple(result) if result else None
+
+
+@contextmanager
+def sqlite_phase(phase, db_paths=(), default=DEFAULT_PROFILE):
+    """Run a phase under its SQLite profile, then checkpoint the WAL of db_paths."""
+    profile = profile_for_phase(phase, default)
+    previous = _process_profile[0]
+    _process_profile[0] = profile
+    logging.info(f"[SQLITE] Phase {phase}: profile {profile}")
+    try:
+        yield profile
+    finally:
+        _process_profile[0] = previous
+        for db_path in db_paths:
+            if db_path:
+                checkpoint_wal(db_path)
+
+
+def _job_db_paths(job_dir, job_name, checksum_db=None):
+    from dedup_file_tools_commons.utils.paths import get_db_path_from_job_dir, get_checksum_db_path
+    if not (job_dir and job_name):
+        return []
+    return [get_db_path_from_job_dir(job_dir, job_name), get_checksum_db_path(job_dir, checksum_db)]
+
+
+def phase_handler(phase, default=DEFAULT_PROFILE):
+    """Decorator for CLI handlers taking args with job_dir/job_name (and optional checksum_db): runs the handler
+    in sqlite_phase() over the job DB and the checksum DB."""
+    def decorate(handler):
+        @functools.wraps(handler)
+        def wrapper(args, *rest, **kwargs):
+            db_paths = _job_db_paths(getattr(args, 'job_dir', None), getattr(args, 'job_name', None), getattr(args, 'checksum_db', None))
+            with sqlite_phase(phase, db_paths, default):
+                return handler(args, *rest, **kwargs)
+        return wrapper
+    return decorate
+
+
+def job_phase(phase, default=DEFAULT_PROFILE):
+    """Like phase_handler, for handlers taking (job_dir, job_name, ...) and an optional checksum_db keyword."""
+    def decorate(handler):
+        @functools.wraps(handler)
+        def wrapper(job_dir, job_name, *rest, **kwargs):
+            with sqlite_phase(phase, _job_db_paths(job_dir, job_name, kwargs.get('checksum_db')), default):
+                return handler(job_dir, job_name, *rest, **kwargs)
+        return wrapper
+    return decorate
+
+
+def add_sqlite_profile_argument(parser):
+    """Add --sqlite-profile to a top-level parser; pass its value to configure_profiles()."""
+    parser.add_argument('--sqlite-profile', default=None,
+                        help=f"SQLite pragma profile for every phase ({', '.join(PROFILE_NAMES)}); default: bulk for scans and imports, "
+                             "readonly-report for reports, safe otherwise")
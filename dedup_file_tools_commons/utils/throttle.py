@@ -0,0 +1,347 @@
+"""
+File: dedup_file_tools_commons/utils/throttle.py
+Description: Token-bucket bandwidth (bytes/s) and IOPS (files/s) throttling for all I/O-heavy phases.
+
+One process-wide Throttle (get_throttle()) is consulted by the read and copy loops in fileops.py, so every
+copy, checksum, verify and pool-indexing pass is limited without per-phase plumbing:
+    - bytes/s : taken for every block read (buffered, pipelined, memory-mapped) and every kernel-side copy step
+    - files/s : taken once per file hashed or copied
+
+Limits can be set job-wide and per device. Both apply: a read on a limited device waits for the job
+bucket and for the device bucket. A rate of 0 means unlimited; with no limits set the throttle costs one
+attribute check per block.
+
+Limits are stored per job in the job DB (table throttle_limits; scope '*' is the job-wide row, any other
+scope is a path whose device is limited). A running job re-reads the table every RELOAD_INTERVAL seconds,
+so a long copy can be slowed down or sped up by editing the table, or with the tool's `throttle` command.
+Signals (POSIX only):
+    - SIGHUP  : re-read the table now
+    - SIGUSR1 : halve all stored limits
+    - SIGUSR2 : double all stored limits
+"""
+import os
+import time
+import signal
+import logging
+import threading
+from dedup_file_tools_commons.utils.io_scheduler import device_of
+from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
+
+THROTTLE_TABLE = 'throttle_limits'
+JOB_SCOPE = '*'
+RELOAD_INTERVAL = 5.0
+# Bucket capacity in seconds of the rate: how much an idle job may burst before the limit applies
+BURST_SECONDS = 1.0
+_RATE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_rate(text):
+    """Parse a rate such as '500', '20M', '1.5G' or '100M/s' (binary units) into a float; '0' means unlimited."""
+    value = str(text).strip().upper()
+    for suffix in ('/S', 'B'):
+        if value.endswith(suffix):
+            value = value[:-len(suffix)]
+    unit = value[-1:] if value[-1:] in _RATE_UNITS else ''
+    number = float(value[:len(value) - len(unit)])
+    if number < 0:
+        raise ValueError(f"Rate must not be negative: {text}")
+    return number * _RATE_UNITS[unit]
+
+
+def parse_device_limit(text):
+    """Parse PATH=BYTES[:FILES] (e.g. /mnt/nas=50M:200) into (path, bytes_per_sec, files_per_sec)."""
+    path, sep, rates = str(text).rpartition('=')
+    if not sep or not path:
+        raise ValueError(f"Expected PATH=BYTES[:FILES], got: {text}")
+    bytes_rate, _, files_rate = rates.partition(':')
+    return path, parse_rate(bytes_rate or 0), parse_rate(files_rate or 0)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire(n) takes n tokens and blocks until the bucket has refilled enough to
+    cover them; requests larger than the burst are allowed and simply wait longer. Waiters are served in
+    order and pick up rate changes immediately.
+    """
+    def __init__(self, rate=0, burst=None, clock=time.monotonic):
+        self._clock = clock
+        self._cond = threading.Condition()
+        self.rate = 0
+        self.burst = 0
+        self._tokens = 0.0
+        # Total tokens ever added; a waiter may go once it reaches the waiter's deadline
+        self._credit = 0.0
+        self._stamp = clock()
+        self.set_rate(rate, burst)
+
+    def _refill(self):
+        now = self._clock()
+        added = (now - self._stamp) * self.rate
+        self._stamp = now
+        self._credit += added
+        self._tokens = min(self.burst, self._tokens + added)
+
+    def set_rate(self, rate, burst=None):
+        with self._cond:
+            self._refill()
+            was_unlimited = not self.rate
+            self.rate = float(rate or 0)
+            self.burst = float(burst if burst is not None else self.rate * BURST_SECONDS)
+            if was_unlimited:
+                self._tokens = self.burst
+            self._tokens = min(self._tokens, self.burst)
+            self._cond.notify_all()
+
+    def acquire(self, n=1):
+        with self._cond:
+            if not self.rate:
+                return
+            self._refill()
+            self._tokens -= n
+            if self._tokens >= 0:
+                return
+            deadline = self._credit - self._tokens
+            while self.rate and self._credit < deadline:
+                self._cond.wait((deadline - self._credit) / self.rate)
+                self._refill()
+
+
+class Throttle:
+    """Job-wide and per-device buckets for bytes/s and files/s. Devices are st_dev values."""
+    def __init__(self, bytes_per_sec=0, files_per_sec=0, device_limits=None):
+        self._lock = threading.Lock()
+        self._bytes = TokenBucket()
+        self._files = TokenBucket()
+        self._devices = {}
+        self.active = False
+        self.set_limits(bytes_per_sec, files_per_sec, device_limits)
+
+    def set_limits(self, bytes_per_sec=0, files_per_sec=0, device_limits=None):
+        """Replace all limits; device_limits is {device: (bytes_per_sec, files_per_sec)}."""
+        device_limits = device_limits or {}
+        with self._lock:
+            self._bytes.set_rate(bytes_per_sec)
+            self._files.set_rate(files_per_sec)
+            for device, buckets in list(self._devices.items()):
+                if device not in device_limits:
+                    # Release anyone still waiting on a limit that no longer exists
+                    for bucket in buckets:
+                        bucket.set_rate(0)
+                    del self._devices[device]
+            for device, (device_bytes, device_files) in device_limits.items():
+                buckets = self._devices.setdefault(device, (TokenBucket(), TokenBucket()))
+                buckets[0].set_rate(device_bytes)
+                buckets[1].set_rate(device_files)
+            self.active = bool(bytes_per_sec or files_per_sec or any(b or f for b, f in device_limits.values()))
+
+    def limits(self):
+        """Current (bytes_per_sec, files_per_sec, {device: (bytes_per_sec, files_per_sec)})."""
+        with self._lock:
+            return self._bytes.rate, self._files.rate, {d: (b.rate, f.rate) for d, (b, f) in self._devices.items()}
+
+    def acquire_bytes(self, n, device=None):
+        if not self.active or n <= 0:
+            return
+        self._bytes.acquire(n)
+        buckets = self._devices.get(device)
+        if buckets:
+            buckets[0].acquire(n)
+
+    def acquire_file(self, device=None):
+        if not self.active:
+            return
+        self._files.acquire(1)
+        buckets = self._devices.get(device)
+        if buckets:
+            buckets[1].acquire(1)
+
+
+_throttle = Throttle()
+
+
+def get_throttle():
+    """The process-wide Throttle used by the read and copy loops."""
+    return _throttle
+
+
+def init_throttle_table(conn):
+    """Create the limits table (init_db of each tool; save_throttle_limits for job DBs from older releases)."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {THROTTLE_TABLE} (
+            scope TEXT PRIMARY KEY,
+            bytes_per_sec REAL NOT NULL DEFAULT 0,
+            files_per_sec REAL NOT NULL DEFAULT 0,
+            updated_at INTEGER
+        )
+    """)
+
+
+def save_throttle_limits(db_path, scope, bytes_per_sec=0, files_per_sec=0):
+    """Store the limits of one scope (JOB_SCOPE or a path) in the job DB; all-zero limits remove the scope."""
+    with RobustSqliteConn(db_path).connect() as conn:
+        init_throttle_table(conn)
+        if bytes_per_sec or files_per_sec:
+            conn.execute(f"""
+                INSERT OR REPLACE INTO {THROTTLE_TABLE} (scope, bytes_per_sec, files_per_sec, updated_at) VALUES (?, ?, ?, ?)
+            """, (scope, bytes_per_sec or 0, files_per_sec or 0, int(time.time())))
+        else:
+            conn.execute(f"DELETE FROM {THROTTLE_TABLE} WHERE scope=?", (scope,))
+        conn.commit()
+
+
+def read_throttle_rows(db_path):
+    """Return [(scope, bytes_per_sec, files_per_sec)] as stored in the job DB; none if it has no limits table.
+    Only reads, so it also works under the readonly-report SQLite profile."""
+    with RobustSqliteConn(db_path).connect() as conn:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (THROTTLE_TABLE,)).fetchone():
+            return []
+        cur = conn.cursor()
+        cur.execute(f"SELECT scope, bytes_per_sec, files_per_sec FROM {THROTTLE_TABLE} ORDER BY scope")
+        return cur.fetchall()
+
+
+def load_throttle_limits(db_path):
+    """Read the job DB limits as (bytes_per_sec, files_per_sec, {device: (bytes_per_sec, files_per_sec)})."""
+    bytes_per_sec, files_per_sec, device_limits = 0, 0, {}
+    for scope, scope_bytes, scope_files in read_throttle_rows(db_path):
+        if scope == JOB_SCOPE:
+            bytes_per_sec, files_per_sec = scope_bytes or 0, scope_files or 0
+            continue
+        device = device_of(scope)
+        if device is None:
+            logging.warning(f"[THROTTLE] Cannot resolve device of {scope}; its limit is ignored")
+            continue
+        device_limits[device] = (scope_bytes or 0, scope_files or 0)
+    return bytes_per_sec, files_per_sec, device_limits
+
+
+def scale_throttle_limits(db_path, factor):
+    """Multiply every stored limit by factor (unlimited rates stay unlimited)."""
+    for scope, scope_bytes, scope_files in read_throttle_rows(db_path):
+        save_throttle_limits(db_path, scope, (scope_bytes or 0) * factor, (scope_files or 0) * factor)
+
+
+class ThrottleController:
+    """
+    Applies the limits stored in a job DB to a Throttle while a phase runs: reloads them every interval
+    seconds and on SIGHUP, and scales them on SIGUSR1/SIGUSR2. Use as a context manager around the phase;
+    on exit the throttle is reset to unlimited and the previous signal handlers are restored.
+    """
+    def __init__(self, db_path, throttle=None, interval=RELOAD_INTERVAL):
+        self.db_path = db_path
+        self.throttle = throttle or get_throttle()
+        self.interval = interval
+        self._applied = None
+        self._pending_scale = 1.0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._previous_handlers = {}
+
+    def reload(self):
+        """Apply the stored limits if they changed; returns True if they did."""
+        if self._pending_scale != 1.0:
+            factor, self._pending_scale = self._pending_scale, 1.0
+            scale_throttle_limits(self.db_path, factor)
+        limits = load_throttle_limits(self.db_path)
+        if limits == self._applied:
+            return False
+        self._applied = limits
+        self.throttle.set_limits(*limits)
+        bytes_per_sec, files_per_sec, device_limits = limits
+        logging.info(f"[THROTTLE] Limits: {bytes_per_sec:.0f} bytes/s, {files_per_sec:.0f} files/s, per device: {device_limits}")
+        return True
+
+    def _watch(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopped.is_set():
+                return
+            try:
+                self.reload()
+            except Exception as e:
+                logging.warning(f"[THROTTLE] Cannot reload limits from {self.db_path}: {e}")
+
+    def _on_signal(self, signum, frame):
+        # Only flag the request here; the watcher thread does the DB work
+        if signum == getattr(signal, 'SIGUSR1', None):
+            self._pending_scale /= 2
+        elif signum == getattr(signal, 'SIGUSR2', None):
+            self._pending_scale *= 2
+        self._wake.set()
+
+    def _install_signal_handlers(self):
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for name in ('SIGHUP', 'SIGUSR1', 'SIGUSR2'):
+            signum = getattr(signal, name, None)
+            if signum is None:
+                continue
+            try:
+                self._previous_handlers[signum] = signal.signal(signum, self._on_signal)
+            except (ValueError, OSError):
+                pass
+
+    def start(self):
+        self.reload()
+        self._install_signal_handlers()
+        self._thread = threading.Thread(target=self._watch, name="throttle-reload", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+        for signum, handler in self._previous_handlers.items():
+            signal.signal(signum, handler)
+        self._previous_handlers = {}
+        self.throttle.set_limits()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def add_throttle_arguments(parser):
+    """Add the throttling options shared by every I/O-heavy command."""
+    parser.add_argument('--max-bytes-per-sec', type=parse_rate, default=None, help='Job-wide read bandwidth limit, e.g. 50M (binary units; 0 = unlimited; stored in the job DB and kept for later runs)')
+    parser.add_argument('--max-files-per-sec', type=parse_rate, default=None, help='Job-wide limit on files hashed/copied per second (0 = unlimited; stored in the job DB)')
+    parser.add_argument('--device-limit', type=parse_device_limit, action='append', default=None, metavar='PATH=BYTES[:FILES]', help='Limit for the device holding PATH, e.g. /mnt/nas=20M:100 (repeatable; stored in the job DB)')
+
+
+def save_throttle_args(db_path, args):
+    """Store the throttling options given on the command line in the job DB. Options left out keep their stored value."""
+    bytes_per_sec = getattr(args, 'max_bytes_per_sec', None)
+    files_per_sec = getattr(args, 'max_files_per_sec', None)
+    if bytes_per_sec is not None or files_per_sec is not None:
+        stored = {scope: (b, f) for scope, b, f in read_throttle_rows(db_path)}.get(JOB_SCOPE, (0, 0))
+        save_throttle_limits(db_path, JOB_SCOPE,
+                             stored[0] if bytes_per_sec is None else bytes_per_sec,
+                             stored[1] if files_per_sec is None else files_per_sec)
+    for path, device_bytes, device_files in getattr(args, 'device_limit', None) or []:
+        save_throttle_limits(db_path, os.path.abspath(path), device_bytes, device_files)
+
+
+def job_throttle(db_path, args=None):
+    """ThrottleController for a job DB, after storing any throttling options from args. Use with `with`."""
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    if args is not None:
+        save_throttle_args(db_path, args)
+    return ThrottleController(db_path)
+
+
+def format_throttle_limits(db_path):
+    """Human-readable listing of the stored limits (for the `throttle` commands)."""
+    rows = read_throttle_rows(db_path)
+    if not rows:
+        return "No throttle limits set (unlimited)."
+    lines = ["scope\tbytes/s\tfiles/s"]
+    for scope, scope_bytes, scope_files in rows:
+        lines.append(f"{'job' if scope == JOB_SCOPE else scope}\t{scope_bytes or 0:.0f}\t{scope_files or 0:.0f}")
+    return "\n".join(lines)
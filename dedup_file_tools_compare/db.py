@@ -1,6 +1,7 @@
 
 import sqlite3
 import os
+from dedup_file_tools_commons.utils.hardlinks import add_identity_columns
 
 def init_db(db_path):
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
@@ -14,6 +15,9 @@ def init_db(db_path):
             relative_path TEXT,
             last_modified INTEGER,
             size INTEGER,
+            device INTEGER, -- st_dev/st_ino/st_nlink, see dedup_file_tools_commons/utils/hardlinks.py
+            inode INTEGER,
+            nlink INTEGER,
             PRIMARY KEY (uid, relative_path)
         )
     ''')
@@ -23,6 +27,9 @@ def init_db(db_path):
             relative_path TEXT,
             last_modified INTEGER,
             size INTEGER,
+            device INTEGER, -- st_dev/st_ino/st_nlink, see dedup_file_tools_commons/utils/hardlinks.py
+            inode INTEGER,
+            nlink INTEGER,
             PRIMARY KEY (uid, relative_path)
         )
     ''')
@@ -54,5 +61,12 @@ def init_db(db_path):
     cur.execute('CREATE INDEX IF NOT EXISTS idx_right_missing_uid_relpath ON compare_results_right_missing(uid, relative_path)')
     cur.execute('CREATE INDEX IF NOT EXISTS idx_left_missing_uid_relpath ON compare_results_left_missing(uid, relative_path)')
 
+    # Pool tables created before hardlink detection get the identity columns added
+    for table in ('left_pool_files', 'right_pool_files'):
+        add_identity_columns(cur, table)
+
+    from dedup_file_tools_commons.utils.throttle import init_throttle_table
+    init_throttle_table(conn)
+
     conn.commit()
     conn.close()
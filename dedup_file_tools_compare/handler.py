@@ -3,7 +3,13 @@ import os
 import sqlite3
 from dedup_file_tools_compare.db import init_db
 from dedup_file_tools_compare.phases.add_to_pool import add_directory_to_pool
+from dedup_file_tools_commons.utils.hashing import DEFAULT_HASH_ALGORITHM
+from dedup_file_tools_commons.utils.hash_executor import DEFAULT_EXECUTOR
+from dedup_file_tools_commons.utils.io_scheduler import DEFAULT_READ_ORDER
+from dedup_file_tools_commons.utils.fileops import DEFAULT_CACHE_POLICY
+from dedup_file_tools_commons.utils.sqlite_profiles import phase_handler
 
+@phase_handler('add-to-pool', 'bulk')
 def handle_add_to_pool(args, side):
     from dedup_file_tools_compare.paths import get_db_path
     db_path = get_db_path(args.job_dir, args.job_name)
@@ -18,9 +24,13 @@ def handle_add_to_pool(args, side):
     logging.info(f"Added files from {directory} to {side} pool in {db_path}")
     # Ensure checksum cache is up to date for this pool
     from dedup_file_tools_compare.phases.ensure_pool_checksums import ensure_pool_checksums
-    ensure_pool_checksums(args.job_dir, args.job_name, table)
+    ensure_pool_checksums(args.job_dir, args.job_name, table, algorithm=getattr(args, 'hash_algorithm', DEFAULT_HASH_ALGORITHM),
+                          executor=getattr(args, 'executor', DEFAULT_EXECUTOR), hash_workers=getattr(args, 'hash_workers', None),
+                          read_order=getattr(args, 'read_order', DEFAULT_READ_ORDER),
+                          cache_policy=getattr(args, 'cache_policy', DEFAULT_CACHE_POLICY))
     logging.info(f"Checksums ensured for {side} pool.")
 
+@phase_handler('find-missing-files', 'safe')
 def handle_find_missing_files(args):
     from dedup_file_tools_compare.phases.compare import find_missing_files
     from dedup_file_tools_compare.paths import get_db_path
@@ -28,8 +38,9 @@ def handle_find_missing_files(args):
     # Logging setup is handled in main.py
     import logging
     logging.info(f"Running find_missing_files for job_dir={args.job_dir}, job_name={args.job_name}")
-    find_missing_files(db_path, threads=args.threads, no_progress=args.no_progress, left=args.left, right=args.right, both=args.both)
+    find_missing_files(db_path, threads=args.threads, no_progress=args.no_progress, left=args.left, right=args.right, both=args.both, algorithm=getattr(args, 'hash_algorithm', DEFAULT_HASH_ALGORITHM))
 
+@phase_handler('show-result', 'readonly-report')
 def handle_show_result(args):
     from dedup_file_tools_compare.phases.results import show_result
     from dedup_file_tools_compare.paths import get_db_path, get_csv_path
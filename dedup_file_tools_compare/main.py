@@ -5,6 +5,12 @@ import os
 import logging
 from dedup_file_tools_compare.db import init_db
 from dedup_file_tools_commons.utils.logging_config import setup_logging
+from dedup_file_tools_commons.utils.hash_executor import add_hashing_arguments
+from dedup_file_tools_commons.utils.throttle import add_throttle_arguments
+from dedup_file_tools_commons.utils.sqlite_profiles import add_sqlite_profile_argument, configure_profiles, sqlite_phase
+
+# Commands that read file data run under the job's throttle limits (see commons utils/throttle.py)
+THROTTLED_COMMANDS = ('one-shot', 'add-to-left', 'add-to-right', 'find-missing-files')
 
 
 def parse_args(argv=None):
@@ -12,6 +18,7 @@ def parse_args(argv=None):
     parser.add_argument('--config', type=str, help='YAML config file')
     parser.add_argument('--log-level', type=str, default='WARNING', help='Set logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)')
     parser.add_argument('--log-file', type=str, help='Custom log file path (default: job logs dir)')
+    add_sqlite_profile_argument(parser)
     subparsers = parser.add_subparsers(dest='command', required=True)
 
     # one-shot
@@ -27,6 +34,8 @@ def parse_args(argv=None):
     p_oneshot.add_argument('--summary', action='store_true', help='Show summary (default)')
     p_oneshot.add_argument('--full-report', action='store_true', help='Show full report')
     p_oneshot.add_argument('--use-normal-paths', action='store_true', help='Output absolute paths in the report (adds absolute_path column)')
+    add_hashing_arguments(p_oneshot, workers_default='CPU-based')
+    add_throttle_arguments(p_oneshot)
     # import-checksums
     p_import = subparsers.add_parser('import-checksums', help='Import checksums from the checksum_cache table of another compatible database')
     p_import.add_argument('--job-dir', required=True)
@@ -43,12 +52,16 @@ def parse_args(argv=None):
     p_left.add_argument('--job-dir', required=True)
     p_left.add_argument('--job-name', required=True)
     p_left.add_argument('--dir', required=True)
+    add_hashing_arguments(p_left, workers_default='CPU-based')
+    add_throttle_arguments(p_left)
 
     # add-to-right
     p_right = subparsers.add_parser('add-to-right', help='Add files from a directory to the right pool')
     p_right.add_argument('--job-dir', required=True)
     p_right.add_argument('--job-name', required=True)
     p_right.add_argument('--dir', required=True)
+    add_hashing_arguments(p_right, workers_default='CPU-based')
+    add_throttle_arguments(p_right)
 
     # find-missing-files
     p_find = subparsers.add_parser('find-missing-files', help='Find files missing from one or both sides (always compares by checksum)')
@@ -59,6 +72,14 @@ def parse_args(argv=None):
     p_find.add_argument('--left', action='store_true')
     p_find.add_argument('--right', action='store_true')
     p_find.add_argument('--both', action='store_true')
+    add_hashing_arguments(p_find, executor=False, cache_policy=False)
+    add_throttle_arguments(p_find)
+
+    # throttle
+    p_throttle = subparsers.add_parser('throttle', help='Show or set the bandwidth/IOPS limits of a job (running jobs pick up changes within seconds)')
+    p_throttle.add_argument('--job-dir', required=True)
+    p_throttle.add_argument('--job-name', required=True)
+    add_throttle_arguments(p_throttle)
 
     # show-result
     p_show = subparsers.add_parser('show-result', help='Show or export the comparison results')
@@ -79,22 +100,32 @@ def run_main_command(args):
         db_path = os.path.join(args.job_dir, f"{args.job_name}.db")
         if not os.path.exists(args.job_dir):
             os.makedirs(args.job_dir)
-        if not os.path.exists(db_path):
-            init_db(db_path)
+        # Always run: the throttle may already have created the DB file, and init_db migrates older schemas
+        init_db(db_path)
         # 2. add-to-left
         from types import SimpleNamespace
         from dedup_file_tools_compare.handler import handle_add_to_pool, handle_find_missing_files, handle_show_result
         left_args = SimpleNamespace(**{
             'job_dir': args.job_dir,
             'job_name': args.job_name,
-            'dir': args.left
+            'dir': args.left,
+            'hash_algorithm': args.hash_algorithm,
+            'executor': args.executor,
+            'hash_workers': args.hash_workers,
+            'read_order': args.read_order,
+            'cache_policy': args.cache_policy
         })
         handle_add_to_pool(left_args, side='left')
         # 3. add-to-right
         right_args = SimpleNamespace(**{
             'job_dir': args.job_dir,
             'job_name': args.job_name,
-            'dir': args.right
+            'dir': args.right,
+            'hash_algorithm': args.hash_algorithm,
+            'executor': args.executor,
+            'hash_workers': args.hash_workers,
+            'read_order': args.read_order,
+            'cache_policy': args.cache_policy
         })
         handle_add_to_pool(right_args, side='right')
         # 4. find-missing-files
@@ -105,7 +136,8 @@ def run_main_command(args):
             'no_progress': args.no_progress,
             'left': False,
             'right': False,
-            'both': True
+            'both': True,
+            'hash_algorithm': args.hash_algorithm
         })
         handle_find_missing_files(find_args)
         # 5. show-result
@@ -125,7 +157,8 @@ def run_main_command(args):
         db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
         checksum_db_path = get_checksum_db_path(args.job_dir)
         other_db_path = args.other_db
-        return run_import_checksums(db_path, checksum_db_path, other_db_path)
+        with sqlite_phase('import-checksums', [db_path, checksum_db_path], 'bulk'):
+            return run_import_checksums(db_path, checksum_db_path, other_db_path)
     if args.command == 'init':
         db_path = os.path.join(args.job_dir, f"{args.job_name}.db")
         init_db(db_path)
@@ -147,13 +180,20 @@ def run_main_command(args):
         from dedup_file_tools_compare.handler import handle_show_result
         handle_show_result(args)
         return 0
+    elif args.command == 'throttle':
+        from dedup_file_tools_commons.utils.throttle import save_throttle_args, format_throttle_limits
+        db_path = os.path.join(args.job_dir, f"{args.job_name}.db")
+        save_throttle_args(db_path, args)
+        print(format_throttle_limits(db_path))
+        return 0
     elif args.command == 'import-checksums':
         from dedup_file_tools_commons.utils.paths import get_db_path_from_job_dir, get_checksum_db_path
         from dedup_file_tools_compare.phases.import_checksum import run_import_checksums
         db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
         checksum_db_path = get_checksum_db_path(args.job_dir)
         other_db_path = args.other_db
-        return run_import_checksums(db_path, checksum_db_path, other_db_path)
+        with sqlite_phase('import-checksums', [db_path, checksum_db_path], 'bulk'):
+            return run_import_checksums(db_path, checksum_db_path, other_db_path)
     else:
         print("Unknown command")
         return 1
@@ -169,7 +209,13 @@ def main(argv=None):
         log_level = 'WARNING'
     setup_logging(log_level=log_level, job_dir=job_dir)
     logging.info(f"[COMPARE][MAIN] main() called with args: {argv}")
-    code = run_main_command(args)
+    configure_profiles(getattr(args, 'sqlite_profile', None))
+    if args.command in THROTTLED_COMMANDS:
+        from dedup_file_tools_commons.utils.throttle import job_throttle
+        with job_throttle(os.path.join(args.job_dir, f"{args.job_name}.db"), args):
+            code = run_main_command(args)
+    else:
+        code = run_main_command(args)
     logging.info(f"[COMPARE][MAIN] Main command phase complete with result: {code}")
     sys.exit(code)
 
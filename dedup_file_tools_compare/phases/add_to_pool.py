@@ -1,10 +1,16 @@
 def _insert_batch(db_path, table, batch):
     conn = sqlite3.connect(db_path)
     cur = conn.cursor()
-    cur.executemany(f'''
-        INSERT OR REPLACE INTO {table} (uid, relative_path, last_modified, size)
-        VALUES (?, ?, ?, ?)
-    ''', batch)
+    if has_identity_columns(conn, table):
+        cur.executemany(f'''
+            INSERT OR REPLACE INTO {table} (uid, relative_path, last_modified, size, device, inode, nlink)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', batch)
+    else:
+        cur.executemany(f'''
+            INSERT OR REPLACE INTO {table} (uid, relative_path, last_modified, size)
+            VALUES (?, ?, ?, ?)
+        ''', [row[:4] for row in batch])
     conn.commit()
     conn.close()
 
@@ -12,9 +18,11 @@ import logging
 import os
 import sqlite3
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import as_completed
 from tqdm import tqdm
 from dedup_file_tools_commons.utils.uidpath import UidPathUtil
+from dedup_file_tools_commons.utils.io_scheduler import DeviceScheduler, group_by_device
+from dedup_file_tools_commons.utils.hardlinks import file_identity, has_identity_columns
 
 _uid_util = UidPathUtil()
 
@@ -23,7 +31,7 @@ def _file_info(fpath, directory):
     uidpath = _uid_util.convert_path(fpath)
     uid = uidpath.uid
     rel_path = uidpath.relative_path
-    return (uid, rel_path, int(stat.st_mtime), stat.st_size)
+    return (uid, rel_path, int(stat.st_mtime), stat.st_size) + file_identity(stat)
 
 def add_directory_to_pool(db_path, directory, table, threads=4, batch_size=1000, show_progress=True):
     logging.info(f"[COMPARE][POOL] Scanning directory {directory} for files to add to {table}")
@@ -39,14 +47,17 @@ def add_directory_to_pool(db_path, directory, table, threads=4, batch_size=1000,
                 all_files.append(Path(root) / fname)
     total = len(all_files)
     logging.info(f"[COMPARE][POOL] Found {total} files in {directory}")
-    batches = [all_files[i:i+batch_size] for i in range(0, total, batch_size)]
+    # Batches never span devices, so each device is scanned under its own concurrency limit
+    batches = []
+    for device, device_files in group_by_device(all_files).items():
+        batches.extend((device, device_files[i:i+batch_size]) for i in range(0, len(device_files), batch_size))
 
     def process_batch(batch):
         return [_file_info(f, directory) for f in batch]
 
     results = []
-    with ThreadPoolExecutor(max_workers=threads) as executor:
-        futures = [executor.submit(process_batch, batch) for batch in batches]
+    with DeviceScheduler(threads) as scheduler:
+        futures = [scheduler.submit_to_device(device, process_batch, batch) for device, batch in batches]
         if show_progress:
             for f in tqdm(as_completed(futures), total=len(futures), desc="Scanning files", unit="batch"):
                 results.extend(f.result())
@@ -4,9 +4,10 @@ import sqlite3
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import os
-from dedup_file_tools_commons.utils.checksum_cache2 import ChecksumCache2
+from dedup_file_tools_commons.utils.checksum_cache import ChecksumCache
+from dedup_file_tools_commons.utils.hashing import DEFAULT_HASH_ALGORITHM
 
-def find_missing_files(db_path, by='checksum', threads=4, no_progress=False, left=False, right=False, both=False):
+def find_missing_files(db_path, by='checksum', threads=4, no_progress=False, left=False, right=False, both=False, algorithm=DEFAULT_HASH_ALGORITHM):
     logging.info(f"[COMPARE][COMPARE] Starting comparison for {db_path}")
     conn = sqlite3.connect(db_path)
     cur = conn.cursor()
@@ -38,33 +39,20 @@ def find_missing_files(db_path, by='checksum', threads=4, no_progress=False, lef
     right_map = {(uid, rel_path): (last_modified, size) for uid, rel_path, last_modified, size in right_files}
     job_dir = os.path.dirname(db_path)
     checksum_db_path = os.path.join(job_dir, 'checksum-cache.db')
-    checksum_conn = sqlite3.connect(checksum_db_path)
+    from dedup_file_tools_commons.db import init_checksum_db
+    init_checksum_db(checksum_db_path)
     uid_path_util = None
     try:
         from dedup_file_tools_commons.utils.uidpath import UidPathUtil
         uid_path_util = UidPathUtil()
     except ImportError:
         pass
-    checksum_cache2 = ChecksumCache2(uid_path_util)
-
-    # Build sets of checksums for left and right pools
-    def get_checksum(uid, rel_path):
-        cur = checksum_conn.cursor()
-        cur.execute('SELECT checksum FROM checksum_cache WHERE uid=? AND relative_path=? AND is_valid=1', (uid, rel_path))
-        row = cur.fetchone()
-        return row[0] if row else None
-
-    left_checksums = {}
-    for (uid, rel_path) in left_map:
-        csum = get_checksum(uid, rel_path)
-        if csum:
-            left_checksums[(uid, rel_path)] = csum
-
-    right_checksums = {}
-    for (uid, rel_path) in right_map:
-        csum = get_checksum(uid, rel_path)
-        if csum:
-            right_checksums[(uid, rel_path)] = csum
+    checksum_cache = ChecksumCache(lambda: sqlite3.connect(checksum_db_path), uid_path_util, algorithm)
+
+    # Build sets of checksums for left and right pools (only checksums produced by the job's algorithm are comparable),
+    # one bulk lookup per pool
+    left_checksums = checksum_cache.get_many(left_map)
+    right_checksums = checksum_cache.get_many(right_map)
 
     # Find identical files by checksum
     identical = []
@@ -95,8 +83,6 @@ def find_missing_files(db_path, by='checksum', threads=4, no_progress=False, lef
         if csum_left and csum_right and csum_left != csum_right:
             different.append((uid, rel_path, left_map[(uid, rel_path)][0], left_map[(uid, rel_path)][1], right_map[(uid, rel_path)][0], right_map[(uid, rel_path)][1], csum_left, csum_right))
 
-    checksum_conn.close()
-
     # Insert results in parallel batches
     def insert_batch(table, batch, fields):
         c = sqlite3.connect(db_path)
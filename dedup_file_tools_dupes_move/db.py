@@ -72,6 +72,8 @@ def init_db(db_path):
         if 'pool_base_path' not in columns:
             cur.execute("ALTER TABLE dedup_files_pool ADD COLUMN pool_base_path TEXT;")
             conn.commit()
+        from dedup_file_tools_commons.utils.throttle import init_throttle_table
+        init_throttle_table(conn)
     finally:
         conn.close()
 
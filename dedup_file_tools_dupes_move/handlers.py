@@ -1,8 +1,14 @@
 import logging
 from dedup_file_tools_commons.utils.paths import get_db_path_from_job_dir, get_checksum_db_path
-from dedup_file_tools_commons.utils.db_utils import connect_with_attached_checksum_db
+from dedup_file_tools_commons.utils.db_utils import connect_with_attached_checksum_db, transaction
 from dedup_file_tools_dupes_move.db import init_db
+from dedup_file_tools_commons.utils.hashing import DEFAULT_HASH_ALGORITHM
+from dedup_file_tools_commons.utils.hash_executor import DEFAULT_EXECUTOR
+from dedup_file_tools_commons.utils.io_scheduler import DEFAULT_READ_ORDER
+from dedup_file_tools_commons.utils.fileops import DEFAULT_CACHE_POLICY
+from dedup_file_tools_commons.utils.sqlite_profiles import job_phase
 
+@job_phase('init', 'safe')
 def handle_init(job_dir, job_name):
     db_path = get_db_path_from_job_dir(job_dir, job_name)
     checksum_db_path = get_checksum_db_path(job_dir)
@@ -17,18 +23,23 @@ def handle_add_to_lookup_pool(job_dir, job_name, lookup_pool_root):
     # For now, treat add-to-lookup-pool as a no-op or log, as pool management is not implemented in dedup_move
     logging.info(f'add-to-lookup-pool: no operation (all pools are handled in analyze phase, lookup_pool_root={lookup_pool_root})')
 
-def handle_analyze(job_dir, job_name, dupes_folder, threads=4):
+@job_phase('analyze', 'bulk')
+def handle_analyze(job_dir, job_name, dupes_folder, threads=4, algorithm=DEFAULT_HASH_ALGORITHM, executor=DEFAULT_EXECUTOR, hash_workers=None,
+                   read_order=DEFAULT_READ_ORDER, cache_policy=DEFAULT_CACHE_POLICY):
     from dedup_file_tools_commons.utils.paths import get_db_path_from_job_dir
     from dedup_file_tools_dupes_move.phases.analysis import find_and_queue_duplicates
     db_path = get_db_path_from_job_dir(job_dir, job_name)
-    find_and_queue_duplicates(db_path, dupes_folder, threads=threads)
+    find_and_queue_duplicates(db_path, dupes_folder, threads=threads, algorithm=algorithm, executor=executor, hash_workers=hash_workers, read_order=read_order,
+                              cache_policy=cache_policy)
     logging.info(f'Analyze phase complete for dupes_folder={dupes_folder}')
 
+@job_phase('preview-summary', 'readonly-report')
 def handle_preview_summary(job_dir, job_name):
     from dedup_file_tools_dupes_move.phases.preview_summary import preview_summary
     db_path = get_db_path_from_job_dir(job_dir, job_name)
     preview_summary(db_path)
 
+@job_phase('move', 'safe')
 def handle_move(job_dir, job_name, dupes_folder, removal_folder, threads=4):
     from dedup_file_tools_commons.utils.paths import get_db_path_from_job_dir
     from dedup_file_tools_dupes_move.phases.move import move_duplicates
@@ -36,13 +47,22 @@ def handle_move(job_dir, job_name, dupes_folder, removal_folder, threads=4):
     move_duplicates(db_path, dupes_folder, removal_folder, threads=threads)
     logging.info(f'Move phase complete for dupes_folder={dupes_folder} to removal_folder={removal_folder}')
 
-def handle_verify(job_dir, job_name, dupes_folder, removal_folder, threads=4):
+@job_phase('consolidate', 'safe')
+def handle_consolidate(job_dir, job_name, threads=4, link_mode='auto', algorithm=DEFAULT_HASH_ALGORITHM):
+    from dedup_file_tools_dupes_move.phases.consolidate import consolidate_duplicates
+    db_path = get_db_path_from_job_dir(job_dir, job_name)
+    consolidate_duplicates(db_path, threads=threads, link_mode=link_mode, algorithm=algorithm)
+    logging.info(f'Consolidate phase complete ({link_mode}) for job_dir={job_dir}')
+
+@job_phase('verify', 'safe')
+def handle_verify(job_dir, job_name, dupes_folder, removal_folder, threads=4, algorithm=DEFAULT_HASH_ALGORITHM):
     from dedup_file_tools_commons.utils.paths import get_db_path_from_job_dir
     from dedup_file_tools_dupes_move.phases.verify import verify_moves
     db_path = get_db_path_from_job_dir(job_dir, job_name)
-    verify_moves(db_path, removal_folder, threads=threads)
+    verify_moves(db_path, removal_folder, threads=threads, algorithm=algorithm)
     logging.info(f'Verify phase complete for dupes_folder={dupes_folder} to removal_folder={removal_folder}')
 
+@job_phase('summary', 'readonly-report')
 def handle_summary(job_dir, job_name):
     from dedup_file_tools_commons.utils.paths import get_db_path_from_job_dir
     from dedup_file_tools_dupes_move.phases.summary import summary_report
@@ -50,16 +70,22 @@ def handle_summary(job_dir, job_name):
     summary_report(db_path, job_dir)
     logging.info(f'Summary phase complete for job_dir={job_dir}')
 
-def handle_one_shot(job_dir, job_name, dupes_folder, removal_folder, threads=4):
+def handle_one_shot(job_dir, job_name, dupes_folder, removal_folder, threads=4, algorithm=DEFAULT_HASH_ALGORITHM, executor=DEFAULT_EXECUTOR, hash_workers=None,
+                    read_order=DEFAULT_READ_ORDER, mode='move', link_mode='auto', cache_policy=DEFAULT_CACHE_POLICY):
     handle_init(job_dir, job_name)
-    handle_analyze(job_dir, job_name, dupes_folder, threads=threads)
+    handle_analyze(job_dir, job_name, dupes_folder, threads=threads, algorithm=algorithm, executor=executor, hash_workers=hash_workers, read_order=read_order,
+                   cache_policy=cache_policy)
     handle_preview_summary(job_dir, job_name)
-    handle_move(job_dir, job_name, dupes_folder, removal_folder, threads=threads)
-    handle_verify(job_dir, job_name, dupes_folder, removal_folder, threads=threads)
+    if mode == 'consolidate':
+        handle_consolidate(job_dir, job_name, threads=threads, link_mode=link_mode, algorithm=algorithm)
+    else:
+        handle_move(job_dir, job_name, dupes_folder, removal_folder, threads=threads)
+    handle_verify(job_dir, job_name, dupes_folder, removal_folder, threads=threads, algorithm=algorithm)
     handle_summary(job_dir, job_name)
     logging.info('One-shot workflow complete.')
 
 
+@job_phase('import-checksums', 'bulk')
 def handle_import_checksums(job_dir, job_name, other_db, checksum_db=None, batch_size=1000):
     """
     Import checksums from another compatible database's checksum_cache table into this job's checksum cache, using batched inserts for scalability.
@@ -69,28 +95,27 @@ def handle_import_checksums(job_dir, job_name, other_db, checksum_db=None, batch
     db_path = get_db_path_from_job_dir(job_dir, job_name)
     checksum_db_path = get_checksum_db_path(job_dir, checksum_db)
     from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
+    from dedup_file_tools_commons.db import read_checksum_cache_rows, CHECKSUM_CACHE_IMPORT_SQL, checksum_schema_version, encode_checksum_rows
     with RobustSqliteConn(other_db).connect() as conn:
         cur = conn.cursor()
         cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='checksum_cache'")
         if not cur.fetchone():
             logging.error(f"Error: The other database does not have a checksum_cache table.")
             sys.exit(1)
-        cur.execute("SELECT uid, relative_path, size, last_modified, checksum, imported_at, last_validated, is_valid FROM checksum_cache")
-        rows = cur.fetchall()
+        rows = read_checksum_cache_rows(conn)
     logging.info(f"Rows to import from other DB: {len(rows)} rows")
     conn = connect_with_attached_checksum_db(db_path, checksum_db_path)
     try:
         cur = conn.cursor()
         total = len(rows)
+        version = checksum_schema_version(conn, 'checksumdb')
         with tqdm(total=total, desc="Importing checksums", unit="row") as pbar:
             for i in range(0, total, batch_size):
                 batch = rows[i:i+batch_size]
-                cur.executemany("""
-                    INSERT OR REPLACE INTO checksumdb.checksum_cache (uid, relative_path, size, last_modified, checksum, imported_at, last_validated, is_valid)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, batch)
+                # One transaction per batch: the connection is in autocommit mode
+                with transaction(conn):
+                    cur.executemany(CHECKSUM_CACHE_IMPORT_SQL, encode_checksum_rows(batch, version))
                 pbar.update(len(batch))
-        conn.commit()
         cur.execute("SELECT COUNT(*) FROM checksumdb.checksum_cache")
         count = cur.fetchone()[0]
         logging.info(f"All rows in main job's checksum_cache after import: {count} rows")
@@ -6,8 +6,17 @@ from dedup_file_tools_commons.utils.logging_config import setup_logging
 from dedup_file_tools_dupes_move.utils.config_loader import load_yaml_config, merge_config_with_args
 from dedup_file_tools_dupes_move.handlers import (
     handle_init, handle_add_to_lookup_pool, handle_analyze, handle_preview_summary,
-    handle_move, handle_verify, handle_summary, handle_one_shot, handle_import_checksums
+    handle_move, handle_consolidate, handle_verify, handle_summary, handle_one_shot, handle_import_checksums
 )
+from dedup_file_tools_commons.utils.hashing import DEFAULT_HASH_ALGORITHM
+from dedup_file_tools_commons.utils.hash_executor import add_hashing_arguments
+from dedup_file_tools_commons.utils.throttle import add_throttle_arguments
+from dedup_file_tools_commons.utils.sqlite_profiles import add_sqlite_profile_argument, configure_profiles
+from dedup_file_tools_dupes_move.phases.consolidate import LINK_MODES
+
+MOVE_MODES = ('move', 'consolidate')
+# Commands that read file data run under the job's throttle limits (see commons utils/throttle.py)
+THROTTLED_COMMANDS = ('analyze', 'move', 'verify', 'one-shot')
 
 
 
@@ -15,6 +24,7 @@ def main(argv=None):
     parser = argparse.ArgumentParser(description="Deduplication/dupes remover tool: scan, group, and move duplicates.")
     parser.add_argument('--log-level', default='WARNING', help='Logging level')
     parser.add_argument('--config', default=None, help='YAML config file')
+    add_sqlite_profile_argument(parser)
     subparsers = parser.add_subparsers(dest='command')
 
     parser_init = subparsers.add_parser('init', help='Initialize a new deduplication job')
@@ -27,6 +37,8 @@ def main(argv=None):
     parser_analyze.add_argument('--job-name', required=True, help='Name for this deduplication job')
     parser_analyze.add_argument('--lookup-pool', required=True, help='Path to folder to scan for duplicates')
     parser_analyze.add_argument('--threads', type=int, default=4, help='Number of threads for analysis')
+    add_hashing_arguments(parser_analyze)
+    add_throttle_arguments(parser_analyze)
 
     parser_preview = subparsers.add_parser('preview-summary', help='Preview planned duplicate groups and moves')
     parser_preview.add_argument('--job-dir', required=True, help='Directory to store job state and database')
@@ -37,16 +49,26 @@ def main(argv=None):
     parser_move.add_argument('--job-name', required=True, help='Name for this deduplication job')
     parser_move.add_argument('--dupes-folder', required=False, help='Folder to move duplicates into (removal folder)')
     parser_move.add_argument('--threads', type=int, default=4, help='Number of threads for move phase')
+    add_throttle_arguments(parser_move)
+    parser_move.add_argument('--mode', choices=MOVE_MODES, default='move', help='move: move duplicates into the dupes folder (default); consolidate: replace duplicates in place with reflinks/hardlinks to their keepers')
+    parser_move.add_argument('--link-mode', choices=LINK_MODES, default='auto', help='Consolidate mode: auto (reflink, else hardlink; default), reflink, or hardlink')
 
     parser_verify = subparsers.add_parser('verify', help='Verify that duplicates were moved/removed as planned')
     parser_verify.add_argument('--job-dir', required=True, help='Directory to store job state and database')
     parser_verify.add_argument('--job-name', required=True, help='Name for this deduplication job')
     parser_verify.add_argument('--threads', type=int, default=4, help='Number of threads for verify phase')
+    add_throttle_arguments(parser_verify)
+    add_hashing_arguments(parser_verify, job_algorithm=True, executor=False, cache_policy=False)
 
     parser_summary = subparsers.add_parser('summary', help='Print summary and generate CSV report of deduplication results')
     parser_summary.add_argument('--job-dir', required=True, help='Directory to store job state and database')
     parser_summary.add_argument('--job-name', required=True, help='Name for this deduplication job')
 
+    parser_throttle = subparsers.add_parser('throttle', help='Show or set the bandwidth/IOPS limits of a job (running jobs pick up changes within seconds)')
+    parser_throttle.add_argument('--job-dir', required=True, help='Directory to store job state and database')
+    parser_throttle.add_argument('--job-name', required=True, help='Name for this deduplication job')
+    add_throttle_arguments(parser_throttle)
+
     parser_import = subparsers.add_parser('import-checksums', help='Import checksums from another compatible database')
     parser_import.add_argument('--job-dir', required=True, help='Directory to store job state and database')
 
@@ -65,8 +87,12 @@ def main(argv=None):
     parser_one_shot.add_argument('--job-dir', required=True, help='Directory to store job state and database')
     parser_one_shot.add_argument('--job-name', required=True, help='Name for this deduplication job')
     parser_one_shot.add_argument('--lookup-pool', required=True, help='Path to folder to scan for duplicates')
-    parser_one_shot.add_argument('--dupes-folder', required=True, help='Folder to move duplicates into')
+    parser_one_shot.add_argument('--dupes-folder', required=False, help='Folder to move duplicates into (required unless --mode consolidate)')
     parser_one_shot.add_argument('--threads', type=int, default=4, help='Number of threads for all phases')
+    add_hashing_arguments(parser_one_shot)
+    add_throttle_arguments(parser_one_shot)
+    parser_one_shot.add_argument('--mode', choices=MOVE_MODES, default='move', help='move: move duplicates into the dupes folder (default); consolidate: replace duplicates in place with reflinks/hardlinks to their keepers')
+    parser_one_shot.add_argument('--link-mode', choices=LINK_MODES, default='auto', help='Consolidate mode: auto (reflink, else hardlink; default), reflink, or hardlink')
 
     import sys
     if argv is None:
@@ -81,6 +107,7 @@ def main(argv=None):
     log_level = getattr(args, 'log_level', 'WARNING')
     if job_dir is not None:
         setup_logging(job_dir, log_level)
+    configure_profiles(getattr(args, 'sqlite_profile', None))
 
     def get_lookup_pool_from_db(job_dir, job_name):
         import sqlite3
@@ -97,67 +124,100 @@ def main(argv=None):
             else:
                 raise RuntimeError("lookup_pool not found in job_metadata. Please specify --lookup-pool.")
 
-    if args.command == 'init':
-        handle_init(args.job_dir, args.job_name)
-    # 'add-to-lookup-pool' command removed as per request
-    elif args.command == 'analyze':
-        # Store lookup_pool in job_metadata for later phases
-        handle_analyze(args.job_dir, args.job_name, args.lookup_pool, threads=args.threads)
-        # Save lookup_pool to job_metadata
-        import sqlite3, os
-        db_path = os.path.join(args.job_dir, f"{args.job_name}.db")
-        with sqlite3.connect(db_path) as conn:
-            cur = conn.cursor()
-            cur.execute("CREATE TABLE IF NOT EXISTS job_metadata (key TEXT PRIMARY KEY, value TEXT)")
-            cur.execute("INSERT OR REPLACE INTO job_metadata (key, value) VALUES (?, ?)", ("lookup_pool", args.lookup_pool))
-            conn.commit()
-    elif args.command == 'preview-summary':
-        handle_preview_summary(args.job_dir, args.job_name)
-    elif args.command == 'move':
-        lookup_pool = get_lookup_pool_from_db(args.job_dir, args.job_name)
-        import sqlite3, os
-        db_path = os.path.join(args.job_dir, f"{args.job_name}.db")
-        # If dupes_folder is not provided, load from job_metadata
-        dupes_folder = args.dupes_folder
-        if not dupes_folder:
+    from contextlib import nullcontext
+    from dedup_file_tools_commons.utils.throttle import job_throttle
+    throttle = nullcontext()
+    if args.command in THROTTLED_COMMANDS:
+        import os
+        throttle = job_throttle(os.path.join(args.job_dir, f"{args.job_name}.db"), args)
+    with throttle:
+        if args.command == 'init':
+            handle_init(args.job_dir, args.job_name)
+        # 'add-to-lookup-pool' command removed as per request
+        elif args.command == 'analyze':
+            # Store lookup_pool in job_metadata for later phases
+            handle_analyze(args.job_dir, args.job_name, args.lookup_pool, threads=args.threads, algorithm=args.hash_algorithm,
+                           executor=args.executor, hash_workers=args.hash_workers, read_order=args.read_order, cache_policy=args.cache_policy)
+            # Save lookup_pool and hash_algorithm to job_metadata
+            import sqlite3, os
+            db_path = os.path.join(args.job_dir, f"{args.job_name}.db")
+            with sqlite3.connect(db_path) as conn:
+                cur = conn.cursor()
+                cur.execute("CREATE TABLE IF NOT EXISTS job_metadata (key TEXT PRIMARY KEY, value TEXT)")
+                cur.execute("INSERT OR REPLACE INTO job_metadata (key, value) VALUES (?, ?)", ("lookup_pool", args.lookup_pool))
+                cur.execute("INSERT OR REPLACE INTO job_metadata (key, value) VALUES (?, ?)", ("hash_algorithm", args.hash_algorithm))
+                conn.commit()
+        elif args.command == 'preview-summary':
+            handle_preview_summary(args.job_dir, args.job_name)
+        elif args.command == 'move' and args.mode == 'consolidate':
+            import sqlite3, os
+            db_path = os.path.join(args.job_dir, f"{args.job_name}.db")
+            with sqlite3.connect(db_path) as conn:
+                cur = conn.cursor()
+                cur.execute("CREATE TABLE IF NOT EXISTS job_metadata (key TEXT PRIMARY KEY, value TEXT)")
+                cur.execute("SELECT value FROM job_metadata WHERE key='hash_algorithm' LIMIT 1")
+                row = cur.fetchone()
+                algorithm = row[0] if row else DEFAULT_HASH_ALGORITHM
+            handle_consolidate(args.job_dir, args.job_name, threads=args.threads, link_mode=args.link_mode, algorithm=algorithm)
+        elif args.command == 'move':
+            lookup_pool = get_lookup_pool_from_db(args.job_dir, args.job_name)
+            import sqlite3, os
+            db_path = os.path.join(args.job_dir, f"{args.job_name}.db")
+            # If dupes_folder is not provided, load from job_metadata
+            dupes_folder = args.dupes_folder
+            if not dupes_folder:
+                with sqlite3.connect(db_path) as conn:
+                    cur = conn.cursor()
+                    cur.execute("SELECT value FROM job_metadata WHERE key='dupes_folder' LIMIT 1")
+                    row = cur.fetchone()
+                    if row:
+                        dupes_folder = row[0]
+                    else:
+                        raise RuntimeError("dupes_folder not found in job_metadata. Please specify --dupes-folder during first move phase.")
+            # Save dupes_folder to job_metadata for later use
+            with sqlite3.connect(db_path) as conn:
+                cur = conn.cursor()
+                cur.execute("CREATE TABLE IF NOT EXISTS job_metadata (key TEXT PRIMARY KEY, value TEXT)")
+                cur.execute("INSERT OR REPLACE INTO job_metadata (key, value) VALUES (?, ?)", ("dupes_folder", dupes_folder))
+                conn.commit()
+            handle_move(args.job_dir, args.job_name, lookup_pool, dupes_folder, threads=args.threads)
+        elif args.command == 'verify':
+            lookup_pool = get_lookup_pool_from_db(args.job_dir, args.job_name)
+            # Load dupes_folder from job_metadata
+            import sqlite3, os
+            db_path = os.path.join(args.job_dir, f"{args.job_name}.db")
             with sqlite3.connect(db_path) as conn:
                 cur = conn.cursor()
                 cur.execute("SELECT value FROM job_metadata WHERE key='dupes_folder' LIMIT 1")
                 row = cur.fetchone()
-                if row:
-                    dupes_folder = row[0]
-                else:
-                    raise RuntimeError("dupes_folder not found in job_metadata. Please specify --dupes-folder during first move phase.")
-        # Save dupes_folder to job_metadata for later use
-        with sqlite3.connect(db_path) as conn:
-            cur = conn.cursor()
-            cur.execute("CREATE TABLE IF NOT EXISTS job_metadata (key TEXT PRIMARY KEY, value TEXT)")
-            cur.execute("INSERT OR REPLACE INTO job_metadata (key, value) VALUES (?, ?)", ("dupes_folder", dupes_folder))
-            conn.commit()
-        handle_move(args.job_dir, args.job_name, lookup_pool, dupes_folder, threads=args.threads)
-    elif args.command == 'verify':
-        lookup_pool = get_lookup_pool_from_db(args.job_dir, args.job_name)
-        # Load dupes_folder from job_metadata
-        import sqlite3, os
-        db_path = os.path.join(args.job_dir, f"{args.job_name}.db")
-        with sqlite3.connect(db_path) as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT value FROM job_metadata WHERE key='dupes_folder' LIMIT 1")
-            row = cur.fetchone()
-            if row:
-                dupes_folder = row[0]
-            else:
-                raise RuntimeError("dupes_folder not found in job_metadata. Please specify it during move phase.")
-        handle_verify(args.job_dir, args.job_name, lookup_pool, dupes_folder, threads=args.threads)
-    elif args.command == 'summary':
-        handle_summary(args.job_dir, args.job_name)
-    elif args.command == 'one-shot':
-        handle_one_shot(args.job_dir, args.job_name, args.lookup_pool, args.dupes_folder, threads=args.threads)
-    elif args.command == 'import-checksums':
-        handle_import_checksums(args.job_dir, args.job_name, args.other_db, checksum_db=getattr(args, 'checksum_db', None))
-
-    else:
-        parser.print_help()
+                # Consolidate-only jobs have no dupes_folder; verify_moves only needs it for moved files
+                dupes_folder = row[0] if row else None
+                # Verify must use the same hash algorithm as analyze
+                algorithm = args.hash_algorithm
+                if not algorithm:
+                    cur.execute("SELECT value FROM job_metadata WHERE key='hash_algorithm' LIMIT 1")
+                    row = cur.fetchone()
+                    algorithm = row[0] if row else DEFAULT_HASH_ALGORITHM
+            handle_verify(args.job_dir, args.job_name, lookup_pool, dupes_folder, threads=args.threads, algorithm=algorithm)
+        elif args.command == 'summary':
+            handle_summary(args.job_dir, args.job_name)
+        elif args.command == 'one-shot':
+            if args.mode == 'move' and not args.dupes_folder:
+                parser.error("one-shot --mode move requires --dupes-folder")
+            handle_one_shot(args.job_dir, args.job_name, args.lookup_pool, args.dupes_folder, threads=args.threads, algorithm=args.hash_algorithm,
+                            executor=args.executor, hash_workers=args.hash_workers, read_order=args.read_order,
+                            mode=args.mode, link_mode=args.link_mode, cache_policy=args.cache_policy)
+        elif args.command == 'import-checksums':
+            handle_import_checksums(args.job_dir, args.job_name, args.other_db, checksum_db=getattr(args, 'checksum_db', None))
+        elif args.command == 'throttle':
+            import os
+            from dedup_file_tools_commons.utils.throttle import save_throttle_args, format_throttle_limits
+            db_path = os.path.join(args.job_dir, f"{args.job_name}.db")
+            save_throttle_args(db_path, args)
+            print(format_throttle_limits(db_path))
+
+        else:
+            parser.print_help()
 
 
 if __name__ == "__main__":
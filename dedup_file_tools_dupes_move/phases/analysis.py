@@ -1,94 +1,127 @@
 import os
 from pathlib import Path
 import logging
-from dedup_file_tools_commons.utils.uidpath import UidPathUtil
+from dedup_file_tools_commons.utils.uidpath import UidPathUtil, UidPath
 from dedup_file_tools_commons.utils.checksum_cache import ChecksumCache
+from dedup_file_tools_commons.utils.fileops import FINGERPRINT_MIN_SIZE, DEFAULT_CACHE_POLICY
+from dedup_file_tools_commons.utils.hash_executor import ensure_checksums, DEFAULT_EXECUTOR
 from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
+from dedup_file_tools_commons.utils.hashing import DEFAULT_HASH_ALGORITHM
+from dedup_file_tools_commons.utils.io_scheduler import DEFAULT_READ_ORDER
 
-def find_and_queue_duplicates(db_path, src_root, threads=4):
+def find_and_queue_duplicates(db_path, src_root, threads=4, algorithm=DEFAULT_HASH_ALGORITHM, executor=DEFAULT_EXECUTOR, hash_workers=None,
+                              read_order=DEFAULT_READ_ORDER, cache_policy=DEFAULT_CACHE_POLICY):
     """
-    Scan src_root recursively, compute checksums, persist all file metadata to dedup_files_pool,
+    Scan src_root recursively, compute checksums (with the given hash algorithm), persist all file metadata to dedup_files_pool,
     group by checksum, and queue all but one file per group in dedup_move_plan.
+
+    Files are bucketed by size first: a file whose size is unique (across this scan and the files already in
+    dedup_files_pool) cannot have a duplicate, so it is recorded with a NULL checksum and never read.
+    Large size-colliding files are then compared by a cheap head/middle/tail fingerprint, and only files whose
+    fingerprints collide are fully hashed, on the shared hash executor (executor='thread' or 'process',
+    hash_workers workers, defaulting to threads, reads sorted by read_order, page cache used per cache_policy).
     """
     from concurrent.futures import ThreadPoolExecutor
     from tqdm import tqdm
     import time
     from dedup_file_tools_commons.utils.paths import get_checksum_db_path
-    from dedup_file_tools_commons.utils.db_utils import connect_with_attached_checksum_db
+    from dedup_file_tools_commons.utils.db_utils import attached_conn_factory, pooled_attached_connection, transaction
     uid_path = UidPathUtil()
     checksum_db_path = get_checksum_db_path(os.path.dirname(db_path))
-    def conn_factory():
-        return connect_with_attached_checksum_db(db_path, checksum_db_path)
-    checksum_cache = ChecksumCache(conn_factory, uid_path)
-    # Step 1: Scan all files
-    files = [str(p) for p in Path(src_root).rglob("*") if Path(p).is_file()]
-    # Step 2: Compute checksums in parallel, robust to errors and hangs
-    import logging
-    from concurrent.futures import as_completed
-    import time
-    def compute(path):
-        start = time.time()
+    conn_factory = attached_conn_factory(db_path, checksum_db_path)
+    checksum_cache = ChecksumCache(conn_factory, uid_path, algorithm)
+    # Step 1: Scan all files and record their size
+    scanned = {}
+    for p in Path(src_root).rglob("*"):
+        try:
+            if not p.is_file():
+                continue
+            stat = p.stat()
+            uid_path_obj = uid_path.convert_path(str(p))
+        except OSError as e:
+            logging.error(f"Stat failed for {p}: {e}")
+            continue
+        scanned[str(p)] = (uid_path_obj.uid, uid_path_obj.relative_path, stat.st_size, int(stat.st_mtime))
+    # Step 1b: Size-collision prefilter. Only files sharing a size with another file can be duplicates.
+    # Files already in dedup_files_pool (from earlier lookup pools) take part in the collision check,
+    # and those recorded unhashed are hashed now if a new file collides with their size.
+    from collections import Counter
+    scanned_keys = {(uid, rel_path) for uid, rel_path, _, _ in scanned.values()}
+    size_counts = Counter(size for _, _, size, _ in scanned.values())
+    with pooled_attached_connection(db_path, checksum_db_path) as conn:
+        existing = conn.execute("SELECT uid, relative_path, size, checksum FROM dedup_files_pool").fetchall()
+    unhashed_existing = []
+    for uid, rel_path, size, chksum in existing:
+        if (uid, rel_path) in scanned_keys:
+            continue
+        size_counts[size] += 1
+        if chksum is None:
+            unhashed_existing.append((uid, rel_path, size))
+    files = [path for path, info in scanned.items() if size_counts[info[2]] > 1]
+    earlier_files = {}
+    for uid, rel_path, size in unhashed_existing:
+        if size_counts[size] > 1:
+            path = uid_path.reconstruct_path(UidPath(uid, rel_path))
+            if path is not None:
+                earlier_files[str(path)] = (uid, rel_path, size)
+    files.extend(earlier_files)
+    logging.info(f"Size prefilter: {len(scanned) - len(files) + len(earlier_files)} of {len(scanned)} files have a unique size and are not hashed")
+    # Step 1c: Fingerprint prefilter for large files. A candidate is fully hashed only if its head/middle/tail
+    # fingerprint collides with another file of the same size, or if a fingerprint of that size is unavailable.
+    size_of = {path: info[2] for path, info in scanned.items()}
+    size_of.update({path: info[2] for path, info in earlier_files.items()})
+    large_sizes = {size_of[path] for path in files if size_of[path] >= FINGERPRINT_MIN_SIZE}
+    reference = []
+    for uid, rel_path, size, chksum in existing:
+        if chksum is not None and size in large_sizes and (uid, rel_path) not in scanned_keys:
+            path = uid_path.reconstruct_path(UidPath(uid, rel_path))
+            reference.append((size, str(path) if path is not None else None))
+    def fingerprint(path):
+        if path in cached_fingerprints:
+            return cached_fingerprints[path]
         try:
-            chksum = checksum_cache.get_or_compute_with_invalidation(path)
-            elapsed = time.time() - start
-            if elapsed > 30:
-                logging.warning(f"Slow checksum: {path} took {elapsed:.1f}s")
-            return (path, chksum, None)
+            return checksum_cache.get_or_compute_fingerprint(path)
         except Exception as e:
-            logging.error(f"Checksum failed for {path}: {e}")
-            return (path, None, str(e))
-    from collections import deque
-    results = []
-    with ThreadPoolExecutor(max_workers=threads) as executor:
-        futures = deque()
-        file_iter = iter(files)
-        # Prime the pool
-        for _ in range(min(threads * 2, len(files))):
-            try:
-                path = next(file_iter)
-                futures.append((executor.submit(compute, path), path))
-            except StopIteration:
-                break
-        pbar = tqdm(total=len(files), desc="Checksumming", unit="file")
-        completed = 0
-        while futures:
-            future, path = futures.popleft()
-            try:
-                path2, chksum, err = future.result()
-                if err:
-                    logging.error(f"Checksum error for {path2}: {err}")
-                results.append((path2, chksum))
-            except Exception as e:
-                logging.error(f"Thread failed for {path}: {e}")
-                results.append((path, None))
-            completed += 1
-            pbar.update(1)
-            # Submit next file if any remain
-            try:
-                next_path = next(file_iter)
-                futures.append((executor.submit(compute, next_path), next_path))
-            except StopIteration:
-                pass
-        pbar.close()
-    # Step 3: Persist all file metadata to dedup_files_pool
+            logging.error(f"Fingerprint failed for {path}: {e}")
+            return None
+    fingerprint_paths = [path for path in files if size_of[path] in large_sizes] + [path for _, path in reference if path]
+    # Fingerprints still current on disk come from one bulk lookup; only the others are computed per file
+    cached_fingerprints = checksum_cache.validate_many(fingerprint_paths, field='fingerprint')
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        fingerprints = dict(zip(fingerprint_paths, pool.map(fingerprint, fingerprint_paths)))
+    fingerprint_counts = Counter(fp for fp in fingerprints.values() if fp)
+    unknown_sizes = {size for size, path in reference if not fingerprints.get(path)}
+    unknown_sizes.update(size_of[path] for path in files if size_of[path] in large_sizes and not fingerprints[path])
+    candidates = len(files)
+    files = [path for path in files
+             if size_of[path] not in large_sizes or size_of[path] in unknown_sizes or fingerprint_counts[fingerprints[path]] > 1]
+    logging.info(f"Fingerprint prefilter: {candidates - len(files)} of {candidates} size-colliding files have a unique fingerprint and are not fully hashed")
+    # Step 2: Compute checksums on the shared hash executor (thread or process mode); cache rows are bulk-written here
+    keys = {path: info[:2] for path, info in scanned.items()}
+    keys.update({path: info[:2] for path, info in earlier_files.items()})
+    with tqdm(total=len(files), desc="Checksumming", unit="file") as pbar:
+        by_key = ensure_checksums(conn_factory, [(*keys[path], path) for path in files], algorithm=algorithm,
+                                  executor=executor, workers=hash_workers or threads, progress=pbar,
+                                  read_order=read_order, cache_policy=cache_policy)
+    results = [(path, by_key.get(keys[path])) for path in files]
+    # Step 3: Persist all file metadata to dedup_files_pool (checksum is NULL for files that were not hashed)
     now = int(time.time())
-    with connect_with_attached_checksum_db(db_path, checksum_db_path) as conn:
+    checksums = dict(results)
+    # Compute pool_base_path as src_root (absolute)
+    pool_base_path = os.path.abspath(src_root)
+    with pooled_attached_connection(db_path, checksum_db_path) as conn, transaction(conn):
         cur = conn.cursor()
-        for path, chksum in results:
-            if not chksum:
-                continue
-            stat = Path(path).stat()
-            uid_path_obj = uid_path.convert_path(path)
-            uid, rel_path = uid_path_obj.uid, uid_path_obj.relative_path
-            # Compute pool_base_path as src_root (absolute)
-            pool_base_path = os.path.abspath(src_root)
+        for path, (uid, rel_path, size, mtime) in scanned.items():
             cur.execute("""
                 INSERT OR REPLACE INTO dedup_files_pool (uid, relative_path, size, last_modified, checksum, scanned_at, pool_base_path)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (uid, rel_path, stat.st_size, int(stat.st_mtime), chksum, now, pool_base_path))
-        conn.commit()
+            """, (uid, rel_path, size, mtime, checksums.get(path), now, pool_base_path))
+        for path, (uid, rel_path, _) in earlier_files.items():
+            if checksums.get(path):
+                cur.execute("UPDATE dedup_files_pool SET checksum=?, scanned_at=? WHERE uid=? AND relative_path=?",
+                            (checksums[path], now, uid, rel_path))
     # Step 4: Group by checksum globally across all files in dedup_files_pool
-    with connect_with_attached_checksum_db(db_path, checksum_db_path) as conn:
+    with pooled_attached_connection(db_path, checksum_db_path) as conn:
         cur = conn.cursor()
         cur.execute("SELECT uid, relative_path, checksum FROM dedup_files_pool WHERE checksum IS NOT NULL")
         all_files = cur.fetchall()
@@ -97,23 +130,23 @@ def find_and_queue_duplicates(db_path, src_root, threads=4):
             if not chksum:
                 continue
             checksum_to_files.setdefault(chksum, []).append((uid, rel_path))
-        # Clear existing move plan (optional: only for planned, not moved)
-        cur.execute("DELETE FROM dedup_move_plan WHERE status='planned'")
-        for chksum, file_tuples in checksum_to_files.items():
-            if len(file_tuples) < 2:
-                continue
-            # Pick one to keep (the first), others to move
-            keeper_uid, keeper_rel_path = file_tuples[0]
-            # Insert keeper with is_keeper=1
-            cur.execute("""
-                INSERT OR REPLACE INTO dedup_move_plan (uid, relative_path, checksum, move_to_uid, move_to_rel_path, status, planned_at, is_keeper)
-                VALUES (?, ?, ?, NULL, NULL, ?, ?, 1)
-            """, (keeper_uid, keeper_rel_path, chksum, 'keeper', now))
-            # Insert others with is_keeper=0, status='planned', move_to_* = keeper
-            for uid, rel_path in file_tuples[1:]:
+        with transaction(conn):
+            # Clear existing move plan (optional: only for planned, not moved)
+            cur.execute("DELETE FROM dedup_move_plan WHERE status='planned'")
+            for chksum, file_tuples in checksum_to_files.items():
+                if len(file_tuples) < 2:
+                    continue
+                # Pick one to keep (the first), others to move
+                keeper_uid, keeper_rel_path = file_tuples[0]
+                # Insert keeper with is_keeper=1
                 cur.execute("""
                     INSERT OR REPLACE INTO dedup_move_plan (uid, relative_path, checksum, move_to_uid, move_to_rel_path, status, planned_at, is_keeper)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, 0)
-                """, (uid, rel_path, chksum, keeper_uid, keeper_rel_path, 'planned', now))
-        conn.commit()
+                    VALUES (?, ?, ?, NULL, NULL, ?, ?, 1)
+                """, (keeper_uid, keeper_rel_path, chksum, 'keeper', now))
+                # Insert others with is_keeper=0, status='planned', move_to_* = keeper
+                for uid, rel_path in file_tuples[1:]:
+                    cur.execute("""
+                        INSERT OR REPLACE INTO dedup_move_plan (uid, relative_path, checksum, move_to_uid, move_to_rel_path, status, planned_at, is_keeper)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+                    """, (uid, rel_path, chksum, keeper_uid, keeper_rel_path, 'planned', now))
     logging.info("Duplicate move plan queued for all duplicate groups.")
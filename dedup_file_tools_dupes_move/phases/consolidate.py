@@ -0,0 +1,128 @@
+"""
+File: dedup_file_tools_dupes_move/phases/consolidate.py
+Phase: Consolidate (alternative to Move)
+
+Description:
+    Replaces every planned duplicate in place with a reflink clone of, or a hardlink to, its keeper
+    (dedup_move_plan.move_to_uid/move_to_rel_path). Paths stay valid for anything that references them,
+    no data is moved, and the space of the duplicate is reclaimed.
+
+    Each replacement is atomic: the clone/link is created under a temporary name in the duplicate's directory
+    and renamed over the duplicate with os.replace. Before replacing, both files are checked against the
+    planned checksum, so a file changed since analyze is never replaced.
+
+Link modes:
+    - auto     : reflink clone, falling back to a hardlink where the filesystem cannot clone (default)
+    - reflink  : reflink clone only; the duplicate keeps its own metadata (mtime, permissions)
+    - hardlink : hardlink only; the duplicate shares the keeper's inode and metadata
+"""
+import os
+import shutil
+import time
+import logging
+from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
+from dedup_file_tools_commons.utils.fileops import clone_file
+from dedup_file_tools_commons.utils.hashing import DEFAULT_HASH_ALGORITHM
+
+LINK_MODES = ('auto', 'reflink', 'hardlink')
+
+
+def _replace_with_link(keeper_path, dup_path, link_mode):
+    """Atomically replace dup_path with a clone of / link to keeper_path. Returns 'reflink' or 'hardlink'."""
+    tmp_path = os.path.join(os.path.dirname(dup_path), f".{os.path.basename(dup_path)}.dedup-{os.getpid()}-{time.time_ns()}.tmp")
+    try:
+        result = None
+        if link_mode in ('auto', 'reflink'):
+            try:
+                clone_file(keeper_path, tmp_path)
+                shutil.copystat(dup_path, tmp_path)
+                result = 'reflink'
+            except OSError:
+                if link_mode == 'reflink':
+                    raise
+        if result is None:
+            os.link(keeper_path, tmp_path)
+            result = 'hardlink'
+        os.replace(tmp_path, dup_path)
+        return result
+    finally:
+        if os.path.lexists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def consolidate_duplicates(db_path, threads=4, link_mode='auto', algorithm=DEFAULT_HASH_ALGORITHM):
+    """
+    Replace all planned duplicates with reflinks/hardlinks to their keepers (see module docstring).
+    Plan rows become status 'consolidated'; every attempt is recorded in dedup_move_history with
+    action 'consolidate' and the link type (or 'error') as result.
+    """
+    if link_mode not in LINK_MODES:
+        raise ValueError(f"Unsupported link mode: {link_mode} (choose from {', '.join(LINK_MODES)})")
+    from dedup_file_tools_commons.utils.uidpath import UidPath, UidPathUtil
+    from dedup_file_tools_commons.utils.paths import get_checksum_db_path
+    from dedup_file_tools_commons.utils.db_utils import attached_conn_factory
+    from dedup_file_tools_commons.utils.checksum_cache import ChecksumCache
+    from dedup_file_tools_commons.utils.db_writer import DBWriter
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from tqdm import tqdm
+    uid_path_util = UidPathUtil()
+    checksum_db_path = get_checksum_db_path(os.path.dirname(db_path))
+    conn_factory = attached_conn_factory(db_path, checksum_db_path)
+    checksum_cache = ChecksumCache(conn_factory, uid_path_util, algorithm)
+    with RobustSqliteConn(db_path).connect() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT uid, relative_path, checksum, move_to_uid, move_to_rel_path
+            FROM dedup_move_plan WHERE status='planned'
+        """)
+        rows = cur.fetchall()
+
+    def record(uid, rel_path, status, result, error_message=None):
+        now = int(time.time())
+        if status == 'consolidated':
+            plan_update = ("""
+                UPDATE dedup_move_plan SET status='consolidated', error_message=NULL, moved_at=?, updated_at=? WHERE uid=? AND relative_path=?
+            """, (now, now, uid, rel_path))
+        else:
+            plan_update = ("""
+                UPDATE dedup_move_plan SET status='error', error_message=?, updated_at=? WHERE uid=? AND relative_path=?
+            """, (error_message, now, uid, rel_path))
+        # Plan update and history row are one intent, group-committed by the writer thread
+        writer.submit_group([
+            plan_update,
+            ("""
+                INSERT INTO dedup_move_history (uid, relative_path, attempted_at, action, result, error_message)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (uid, rel_path, now, 'consolidate', result, error_message)),
+        ])
+
+    def consolidate_one(row):
+        uid, rel_path, checksum, keeper_uid, keeper_rel_path = row
+        try:
+            dup_path = uid_path_util.reconstruct_path(UidPath(uid, rel_path))
+            keeper_path = uid_path_util.reconstruct_path(UidPath(keeper_uid, keeper_rel_path)) if keeper_uid else None
+            if not dup_path or not dup_path.exists():
+                raise FileNotFoundError(f"Duplicate missing: {uid}:{rel_path}")
+            if not keeper_path or not keeper_path.exists():
+                raise FileNotFoundError(f"Keeper missing: {keeper_uid}:{keeper_rel_path}")
+            if os.path.samefile(dup_path, keeper_path):
+                record(uid, rel_path, 'consolidated', 'already-linked')
+                return (uid, rel_path, None)
+            # Never replace a file whose content no longer matches the plan
+            for path in (dup_path, keeper_path):
+                if checksum_cache.get_or_compute_with_invalidation(str(path)) != checksum:
+                    raise ValueError(f"Checksum changed since analyze: {path}")
+            result = _replace_with_link(str(keeper_path), str(dup_path), link_mode)
+            record(uid, rel_path, 'consolidated', result)
+            logging.info(f"[DUPES][CONSOLIDATE] {dup_path} -> {keeper_path} ({result})")
+            return (uid, rel_path, None)
+        except Exception as e:
+            record(uid, rel_path, 'error', 'error', str(e))
+            return (uid, rel_path, str(e))
+
+    with DBWriter(db_path) as writer, ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(consolidate_one, row) for row in rows]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Consolidating duplicates", unit="file"):
+            uid, rel_path, err = future.result()
+            if err:
+                logging.error(f"Consolidate error for {uid}:{rel_path}: {err}")
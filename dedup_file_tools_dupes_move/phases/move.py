@@ -3,6 +3,7 @@ import shutil
 import time
 from pathlib import Path
 from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
+from dedup_file_tools_commons.utils.db_writer import DBWriter
 
 def move_duplicates(db_path, dupes_folder, removal_folder, threads=4):
     with RobustSqliteConn(db_path).connect() as conn:
@@ -42,30 +43,29 @@ def move_duplicates(db_path, dupes_folder, removal_folder, threads=4):
                 Path(src_path).unlink()
                 move_type = 'copy-delete'
             moved_at = int(time.time())
-            with RobustSqliteConn(db_path).connect() as conn2:
-                cur2 = conn2.cursor()
-                cur2.execute("""
+            # Plan update and history row are one intent: group-committed, but applied together
+            writer.submit_group([
+                ("""
                     UPDATE dedup_move_plan SET status='moved', error_message=NULL, moved_at=?, updated_at=? WHERE uid=? AND relative_path=?
-                """, (moved_at, moved_at, uid, rel_path))
-                cur2.execute("""
+                """, (moved_at, moved_at, uid, rel_path)),
+                ("""
                     INSERT INTO dedup_move_history (uid, relative_path, attempted_at, action, result, error_message)
                     VALUES (?, ?, ?, ?, ?, NULL)
-                """, (uid, rel_path, moved_at, 'move', move_type))
-                conn2.commit()
+                """, (uid, rel_path, moved_at, 'move', move_type)),
+            ])
             return (uid, rel_path, None)
         except Exception as e:
-            with RobustSqliteConn(db_path).connect() as conn2:
-                cur2 = conn2.cursor()
-                cur2.execute("""
+            writer.submit_group([
+                ("""
                     UPDATE dedup_move_plan SET status='error', error_message=?, updated_at=? WHERE uid=? AND relative_path=?
-                """, (str(e), int(time.time()), uid, rel_path))
-                cur2.execute("""
+                """, (str(e), int(time.time()), uid, rel_path)),
+                ("""
                     INSERT INTO dedup_move_history (uid, relative_path, attempted_at, action, result, error_message)
                     VALUES (?, ?, ?, ?, ?, ?)
-                """, (uid, rel_path, int(time.time()), 'move', 'error', str(e)))
-                conn2.commit()
+                """, (uid, rel_path, int(time.time()), 'move', 'error', str(e))),
+            ])
             return (uid, rel_path, str(e))
-    with ThreadPoolExecutor(max_workers=threads) as executor:
+    with DBWriter(db_path) as writer, ThreadPoolExecutor(max_workers=threads) as executor:
         futures = deque()
         row_iter = iter(rows)
         for _ in range(min(threads * 2, len(rows))):
@@ -3,11 +3,16 @@ import os
 import time
 from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
 
-def verify_moves(db_path, dst_root, threads=4):
+def verify_moves(db_path, dst_root, threads=4, algorithm=None):
+    """
+    Verify moved files (in dst_root), and keepers and consolidated duplicates (in place), against the planned checksums.
+    algorithm must match the one used in the analyze phase (default: sha256).
+    """
     from dedup_file_tools_commons.utils.uidpath import UidPath, UidPathUtil
     from dedup_file_tools_commons.utils.paths import get_checksum_db_path
-    from dedup_file_tools_commons.utils.db_utils import connect_with_attached_checksum_db
+    from dedup_file_tools_commons.utils.db_utils import attached_conn_factory, pooled_attached_connection
     from dedup_file_tools_commons.utils.checksum_cache import ChecksumCache
+    from dedup_file_tools_commons.utils.db_writer import DBWriter
     import logging
     import time
     import sqlite3
@@ -16,27 +21,29 @@ def verify_moves(db_path, dst_root, threads=4):
         meta_db_path = db_path
         with sqlite3.connect(meta_db_path) as conn_meta:
             cur_meta = conn_meta.cursor()
-            cur_meta.execute("SELECT value FROM job_metadata WHERE key='dupes_folder' LIMIT 1")
-            row = cur_meta.fetchone()
+            try:
+                cur_meta.execute("SELECT value FROM job_metadata WHERE key='dupes_folder' LIMIT 1")
+                row = cur_meta.fetchone()
+            except sqlite3.OperationalError:
+                row = None  # consolidate-only jobs never record a dupes_folder
             if row:
                 dst_root = row[0]
-            else:
-                raise RuntimeError("dupes_folder not found in job_metadata. Please specify dupes_folder.")
     uid_path = UidPathUtil()
     checksum_db_path = get_checksum_db_path(os.path.dirname(db_path))
-    def conn_factory():
-        return connect_with_attached_checksum_db(db_path, checksum_db_path)
-    checksum_cache = ChecksumCache(conn_factory, uid_path)
-    with connect_with_attached_checksum_db(db_path, checksum_db_path) as conn:
+    conn_factory = attached_conn_factory(db_path, checksum_db_path)
+    checksum_cache = ChecksumCache(conn_factory, uid_path, algorithm)
+    with pooled_attached_connection(db_path, checksum_db_path) as conn:
         cur = conn.cursor()
         # Also fetch pool_base_path for each file, for both moved and keeper
         cur.execute("""
             SELECT dmp.uid, dmp.relative_path, dmp.move_to_uid, dmp.move_to_rel_path, dmp.status, dmp.checksum, dfp.pool_base_path
             FROM dedup_move_plan dmp
             JOIN dedup_files_pool dfp ON dmp.uid = dfp.uid AND dmp.relative_path = dfp.relative_path
-            WHERE dmp.status IN ('moved', 'keeper')
+            WHERE dmp.status IN ('moved', 'keeper', 'consolidated')
         """)
         rows = cur.fetchall()
+    if dst_root is None and any(row[4] == 'moved' for row in rows):
+        raise RuntimeError("dupes_folder not found in job_metadata. Please specify dupes_folder.")
     from concurrent.futures import ThreadPoolExecutor
     from tqdm import tqdm
     from collections import deque
@@ -50,7 +57,7 @@ def verify_moves(db_path, dst_root, threads=4):
             except Exception as e:
                 rel_to_pool = rel_path  # fallback
             dst_path = os.path.join(dst_root, rel_to_pool)
-        else:  # keeper
+        else:  # keeper, or duplicate consolidated in place
             dst_path = src_path
         error_message = None
         verified = False
@@ -66,27 +73,30 @@ def verify_moves(db_path, dst_root, threads=4):
                     verified = True
             except Exception as e:
                 error_message = f'Error verifying file: {e}'
-        with connect_with_attached_checksum_db(db_path, checksum_db_path) as conn2:
-            cur2 = conn2.cursor()
-            if verified:
-                cur2.execute("""
+        # Plan update and history row are one intent, group-committed by the writer thread
+        if verified:
+            writer.submit_group([
+                ("""
                     UPDATE dedup_move_plan SET status='verified', error_message=NULL, updated_at=? WHERE uid=? AND relative_path=?
-                """, (int(time.time()), uid, rel_path))
-                cur2.execute("""
+                """, (int(time.time()), uid, rel_path)),
+                ("""
                     INSERT INTO dedup_move_history (uid, relative_path, attempted_at, action, result, error_message)
                     VALUES (?, ?, ?, ?, ?, NULL)
-                """, (uid, rel_path, int(time.time()), 'verify', 'verified'))
-                return (uid, rel_path, None)
-            else:
-                cur2.execute("""
+                """, (uid, rel_path, int(time.time()), 'verify', 'verified')),
+            ])
+            return (uid, rel_path, None)
+        else:
+            writer.submit_group([
+                ("""
                     UPDATE dedup_move_plan SET status='error', error_message=?, updated_at=? WHERE uid=? AND relative_path=?
-                """, (error_message, int(time.time()), uid, rel_path))
-                cur2.execute("""
+                """, (error_message, int(time.time()), uid, rel_path)),
+                ("""
                     INSERT INTO dedup_move_history (uid, relative_path, attempted_at, action, result, error_message)
                     VALUES (?, ?, ?, ?, ?, ?)
-                """, (uid, rel_path, int(time.time()), 'verify', 'error', error_message))
-                return (uid, rel_path, error_message)
-    with ThreadPoolExecutor(max_workers=threads) as executor:
+                """, (uid, rel_path, int(time.time()), 'verify', 'error', error_message)),
+            ])
+            return (uid, rel_path, error_message)
+    with DBWriter(db_path) as writer, ThreadPoolExecutor(max_workers=threads) as executor:
         futures = deque()
         row_iter = iter(rows)
         for _ in range(min(threads * 2, len(rows))):
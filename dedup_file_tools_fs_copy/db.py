@@ -3,6 +3,8 @@
 db.py: SQLite schema management for Non-Redundant Media File Copy Tool
 """
 from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
+from dedup_file_tools_commons.utils.hardlinks import add_identity_columns, has_identity_columns
+from dedup_file_tools_commons.utils.path_store import PATH_STORE_SCHEMA, PathStore, has_path_store_layout, uid_path_view_sql
 
 SCHEMA = '''
 CREATE TABLE IF NOT EXISTS source_files (
@@ -10,6 +12,9 @@ CREATE TABLE IF NOT EXISTS source_files (
     relative_path TEXT,
     last_modified INTEGER,
     size INTEGER,
+    device INTEGER, -- st_dev/st_ino/st_nlink, see dedup_file_tools_commons/utils/hardlinks.py
+    inode INTEGER,
+    nlink INTEGER,
     PRIMARY KEY (uid, relative_path)
 );
 CREATE TABLE IF NOT EXISTS destination_files (
@@ -17,6 +22,9 @@ CREATE TABLE IF NOT EXISTS destination_files (
     relative_path TEXT,
     last_modified INTEGER,
     size INTEGER,
+    device INTEGER, -- st_dev/st_ino/st_nlink, see dedup_file_tools_commons/utils/hardlinks.py
+    inode INTEGER,
+    nlink INTEGER,
     PRIMARY KEY (uid, relative_path)
 );
 CREATE TABLE IF NOT EXISTS copy_status (
@@ -25,19 +33,26 @@ CREATE TABLE IF NOT EXISTS copy_status (
     status TEXT, -- 'pending', 'in_progress', 'done', 'error'
     last_copy_attempt INTEGER,
     error_message TEXT,
+    copy_method TEXT, -- 'clone', 'copy_file_range', 'sendfile', 'pipelined', 'buffered' or 'hardlink' (NULL if not copied)
+    bytes_copied INTEGER,
     PRIMARY KEY (uid, relative_path)
 );
 
--- Destination pool index (no checksums, just file presence)
-CREATE TABLE IF NOT EXISTS destination_pool_files (
-    uid TEXT,
-    relative_path TEXT,
+-- Destination pool index (no checksums, just file presence), keyed through the path store
+-- (dedup_file_tools_commons/utils/path_store.py) and read through the destination_pool_files view
+CREATE TABLE IF NOT EXISTS destination_pool_entries (
+    vol_id INTEGER NOT NULL,
+    dir_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
     size INTEGER,
     last_modified INTEGER,
     last_seen INTEGER,
-    PRIMARY KEY (uid, relative_path)
-);
-CREATE INDEX IF NOT EXISTS idx_destination_pool_uid_relpath ON destination_pool_files(uid, relative_path);
+    device INTEGER, -- st_dev/st_ino/st_nlink, see dedup_file_tools_commons/utils/hardlinks.py
+    inode INTEGER,
+    nlink INTEGER,
+    PRIMARY KEY (dir_id, name) -- a directory belongs to one volume
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_destination_pool_entries_device_inode ON destination_pool_entries(device, inode);
 
 -- Shallow verification results
 CREATE TABLE IF NOT EXISTS verification_shallow_results (
@@ -74,10 +89,54 @@ CREATE TABLE IF NOT EXISTS verification_deep_results (
 
 
 
+# Columns added to copy_status after its first release; older job DBs are migrated by init_db
+COPY_STATUS_MIGRATED_COLUMNS = [
+    ('copy_method', 'TEXT'),
+    ('bytes_copied', 'INTEGER'),
+]
+
+# File tables that record (device, inode, nlink) for hardlink detection (destination_pool_entries has them built in)
+IDENTITY_TABLES = ('source_files', 'destination_files')
+DESTINATION_POOL_COLUMNS = ('size', 'last_modified', 'last_seen', 'device', 'inode', 'nlink')
+
+
+def migrate_destination_pool(conn):
+    """Move the rows of a destination_pool_files table (older job DBs) into destination_pool_entries, and
+    replace the table by the view of the same name. Safe to call on a migrated DB."""
+    from dedup_file_tools_commons.utils.db_utils import transaction
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name='destination_pool_files'").fetchone()
+    if exists and not has_path_store_layout(conn, 'destination_pool_files'):
+        identity = has_identity_columns(conn, 'destination_pool_files')
+        columns = DESTINATION_POOL_COLUMNS if identity else DESTINATION_POOL_COLUMNS[:3]
+        rows = conn.execute(f"SELECT uid, relative_path, {', '.join(columns)} FROM destination_pool_files").fetchall()
+        store = PathStore()
+        with transaction(conn):
+            keys = [store.intern(conn, row[0], row[1]) for row in rows]
+            conn.executemany(
+                f"INSERT OR REPLACE INTO destination_pool_entries (vol_id, dir_id, name, {', '.join(columns)}) "
+                f"VALUES (?, ?, ?{', ?' * len(columns)})",
+                [key + tuple(row[2:]) for key, row in zip(keys, rows)])
+            conn.execute("DROP TABLE destination_pool_files")
+        import logging
+        logging.info(f"[AGENT][DB] Moved {len(rows)} destination pool rows into the path store")
+    conn.execute(uid_path_view_sql('destination_pool_files', 'destination_pool_entries', DESTINATION_POOL_COLUMNS))
+
+
 def init_db(db_path):
-    conn = RobustSqliteConn(db_path).connect()
+    conn = RobustSqliteConn(db_path, profile='safe').connect()
     try:
-        conn.executescript(SCHEMA)
+        conn.executescript(PATH_STORE_SCHEMA + SCHEMA)
+        migrate_destination_pool(conn)
+        cur = conn.cursor()
+        cur.execute("PRAGMA table_info(copy_status);")
+        columns = [row[1] for row in cur.fetchall()]
+        for name, decl in COPY_STATUS_MIGRATED_COLUMNS:
+            if name not in columns:
+                cur.execute(f"ALTER TABLE copy_status ADD COLUMN {name} {decl};")
+        for table in IDENTITY_TABLES:
+            add_identity_columns(cur, table)
+        from dedup_file_tools_commons.utils.throttle import init_throttle_table
+        init_throttle_table(conn)
         conn.commit()
     finally:
         conn.close()
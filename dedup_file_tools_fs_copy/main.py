@@ -18,8 +18,10 @@ Usage:
     Run as a standalone script or module to perform deduplicated file copy operations. Supports both full workflow and individual phase execution via CLI subcommands.
 """
 from dedup_file_tools_commons.db import init_checksum_db
+from dedup_file_tools_commons.utils.sqlite_profiles import phase_handler, configure_profiles, add_sqlite_profile_argument
 
 
+@phase_handler('add-to-destination-index-pool', 'bulk')
 def handle_add_to_destination_index_pool(args):
     from dedup_file_tools_fs_copy.utils.destination_pool_cli import add_to_destination_index_pool
     db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
@@ -39,6 +41,14 @@ from dedup_file_tools_fs_copy.phases.copy import copy_files
 from dedup_file_tools_fs_copy.phases.verify import shallow_verify_files, deep_verify_files
 from dedup_file_tools_commons.utils.uidpath import UidPathUtil, UidPath
 from dedup_file_tools_commons.utils.checksum_cache import ChecksumCache
+from dedup_file_tools_commons.utils.hashing import HASH_ALGORITHMS, job_hash_algorithm
+from dedup_file_tools_commons.utils.hash_executor import DEFAULT_EXECUTOR, add_hashing_arguments
+from dedup_file_tools_commons.utils.io_scheduler import DEFAULT_READ_ORDER
+from dedup_file_tools_commons.utils.fileops import CHUNK_SIZE, DEFAULT_CACHE_POLICY
+from dedup_file_tools_commons.utils.throttle import add_throttle_arguments
+
+# Commands that read file data run under the job's throttle limits (see commons utils/throttle.py)
+THROTTLED_COMMANDS = ('one-shot', 'checksum', 'copy', 'resume', 'verify', 'deep-verify')
 ## removed duplicate import of setup_logging
 
 def init_job_dir(job_dir, job_name, checksum_db=None):
@@ -48,8 +58,8 @@ def init_job_dir(job_dir, job_name, checksum_db=None):
     db_path = os.path.join(job_dir, f'{job_name}.db')
     checksum_db_path = checksum_db or os.path.join(job_dir, 'checksum-cache.db')
     init_db(db_path)
-    if not os.path.exists(checksum_db_path):
-        init_checksum_db(checksum_db_path)
+    # Always run: creates the checksum DB if missing and migrates older schemas
+    init_checksum_db(checksum_db_path)
     logging.info(f"[AGENT][MAIN] Initialized job directory at {job_dir} with database {db_path} and checksum DB {checksum_db_path}")
 
 
@@ -57,7 +67,7 @@ def init_job_dir(job_dir, job_name, checksum_db=None):
 from dedup_file_tools_commons.utils.paths import get_db_path_from_job_dir, get_checksum_db_path
 
 # Centralized DB connection with attached checksum DB
-from dedup_file_tools_commons.utils.db_utils import connect_with_attached_checksum_db
+from dedup_file_tools_commons.utils.db_utils import connect_with_attached_checksum_db, transaction
 
 
 
@@ -120,7 +130,8 @@ def add_source_to_db(db_path, src_dir):
                 logging.error(f"Error: Could not determine UID for {file}")
                 continue
             stat = file.stat()
-            with RobustSqliteConn(db_path).connect() as conn:
+            # Both rows in one transaction: the connection is in autocommit mode
+            with RobustSqliteConn(db_path).connect() as conn, transaction(conn):
                 cur = conn.cursor()
                 cur.execute("""
                     INSERT INTO source_files (uid, relative_path, size, last_modified)
@@ -135,7 +146,6 @@ def add_source_to_db(db_path, src_dir):
                     ON CONFLICT(uid, relative_path) DO UPDATE SET
                         status='pending'
                 """, (uid, rel))
-                conn.commit()
             local_count += 1
             with pbar_lock:
                 pbar.update(1)
@@ -172,6 +182,7 @@ def remove_file_from_db(db_path, file_path):
 def parse_args(args=None):
     parser = argparse.ArgumentParser(description="Non-Redundant Media File Copy Tool")
     parser.add_argument('-c', '--config', help='Path to YAML configuration file', default=None)
+    add_sqlite_profile_argument(parser)
     subparsers = parser.add_subparsers(dest='command')
     # Interactive config generator command
     parser_generate_config = subparsers.add_parser('generate-config', help='Interactively generate a YAML config file for use with -c')
@@ -194,6 +205,9 @@ def parse_args(args=None):
     parser_one_shot.add_argument('--skip-verify', action='store_true', help='Skip verification steps')
     parser_one_shot.add_argument('--deep-verify', action='store_true', help='Perform deep verification after shallow verification')
     parser_one_shot.add_argument('--dst-index-pool', help='Path to destination index pool (default: value of --dst)')
+    add_hashing_arguments(parser_one_shot, job_algorithm=True, copy=True, workers_default='--threads, or CPU-based for pool checksums')
+    add_throttle_arguments(parser_one_shot)
+    parser_one_shot.add_argument('--chunk-hashes', action='store_true', help='Also record 64 MiB chunk digests for large files (resumable hashing, changed-region reports in deep verify)')
     # Add to destination index pool command (must be after subparsers is defined)
     parser_add_pool = subparsers.add_parser('add-to-destination-index-pool', help='Scan and add/update all files in the destination pool index')
     parser_add_pool.add_argument('--job-dir', required=True, help='Path to job directory')
@@ -204,6 +218,7 @@ def parse_args(args=None):
     parser_init = subparsers.add_parser('init', help='Initialize a new job directory')
     parser_init.add_argument('--job-dir', required=True, help='Path to job directory')
     parser_init.add_argument('--job-name', required=True, help='Name of the job (database file will be <job-name>.db)')
+    parser_init.add_argument('--hash-algorithm', choices=HASH_ALGORITHMS, default=None, help='Hash algorithm of the job, stored in the job DB (default: set by the first hashing command)')
 
     # Import checksums command (simplified, only from checksum_cache)
     parser_import = subparsers.add_parser('import-checksums', help='Import checksums from the checksum_cache table of another compatible database')
@@ -224,6 +239,9 @@ def parse_args(args=None):
     parser_checksum.add_argument('--table', choices=['source_files', 'destination_files'], required=True)
     parser_checksum.add_argument('--threads', type=int, default=4, help='Number of threads for checksum phase (default: 4)')
     parser_checksum.add_argument('--no-progress', action='store_true', help='Disable progress bar')
+    add_hashing_arguments(parser_checksum, job_algorithm=True, workers_default='--threads, or CPU-based for pool checksums')
+    parser_checksum.add_argument('--chunk-hashes', action='store_true', help='Also record 64 MiB chunk digests for large files (resumable hashing, changed-region reports in deep verify)')
+    add_throttle_arguments(parser_checksum)
 
     parser_copy = subparsers.add_parser('copy', help='Copy files from source to destination. Skips already completed files and resumes incomplete jobs by default.')
     parser_copy.add_argument('--job-dir', required=True, help='Path to job directory')
@@ -233,6 +251,8 @@ def parse_args(args=None):
     parser_copy.add_argument('--threads', type=int, default=4, help='Number of threads for copy phase (default: 4)')
     parser_copy.add_argument('--no-progress', action='store_true', help='Disable progress bar')
     parser_copy.add_argument('--resume', action='store_true', default=True, help='[Default] Resume incomplete jobs by skipping already completed files. This is always enabled.')
+    add_hashing_arguments(parser_copy, job_algorithm=True, copy=True, workers_default='--threads, or CPU-based for pool checksums')
+    add_throttle_arguments(parser_copy)
 
     # Resume command
     parser_resume = subparsers.add_parser('resume', help='Alias for copy: resumes incomplete or failed operations (skips completed files).')
@@ -242,6 +262,14 @@ def parse_args(args=None):
     parser_resume.add_argument('--dst', nargs='+', help='Destination volume root(s)')
     parser_resume.add_argument('--threads', type=int, default=4, help='Number of threads for copy phase (default: 4)')
     parser_resume.add_argument('--no-progress', action='store_true', help='Disable progress bar')
+    add_hashing_arguments(parser_resume, job_algorithm=True, copy=True, workers_default='--threads, or CPU-based for pool checksums')
+    add_throttle_arguments(parser_resume)
+
+    # Throttle command: show or change the limits of a job, including one that is running
+    parser_throttle = subparsers.add_parser('throttle', help='Show or set the bandwidth/IOPS limits of a job (running jobs pick up changes within seconds)')
+    parser_throttle.add_argument('--job-dir', required=True, help='Path to job directory')
+    parser_throttle.add_argument('--job-name', required=True, help='Name of the job (database file will be <job-name>.db)')
+    add_throttle_arguments(parser_throttle)
 
     # Status command
     parser_status = subparsers.add_parser('status', help='Show job progress and statistics')
@@ -259,12 +287,16 @@ def parse_args(args=None):
     parser_shallow_verify.add_argument('--job-name', required=True, help='Name of the job (database file will be <job-name>.db)')
     parser_shallow_verify.add_argument('--stage', choices=['shallow', 'deep'], default='shallow', help='Verification stage: shallow (default) or deep')
     parser_shallow_verify.add_argument('--reverify', action='store_true', help='Force re-verification of all files, undoing any previous done status')
+    add_hashing_arguments(parser_shallow_verify, job_algorithm=True, executor=False)
+    add_throttle_arguments(parser_shallow_verify)
 
     # Deep verify command (checksums)
     parser_deep_verify = subparsers.add_parser('deep-verify', help='Deep verify: compare checksums between source and destination (always includes all shallow checks)')
     parser_deep_verify.add_argument('--job-dir', required=True, help='Path to job directory')
     parser_deep_verify.add_argument('--job-name', required=True, help='Name of the job (database file will be <job-name>.db)')
     parser_deep_verify.add_argument('--reverify', action='store_true', help='Force re-verification of all files, undoing any previous done status')
+    add_hashing_arguments(parser_deep_verify, job_algorithm=True, executor=False)
+    add_throttle_arguments(parser_deep_verify)
 
     # Shallow verify status command
     parser_shallow_status = subparsers.add_parser('verify-status', help='Show a summary of the latest shallow verification results for each file')
@@ -340,6 +372,7 @@ def main(args=None):
     log_level = getattr(parsed_args, 'log_level', None)
     setup_logging(log_level=log_level, job_dir=job_dir)
     logging.info(f"[AGENT][MAIN] main() called with args: {args}")
+    configure_profiles(getattr(parsed_args, 'sqlite_profile', None))
     if getattr(parsed_args, 'command', None) == 'generate-config':
         logging.info("[AGENT][MAIN] Entering interactive config generator phase.")
         from dedup_file_tools_fs_copy.utils.interactive_config import interactive_config_generator
@@ -347,21 +380,48 @@ def main(args=None):
         logging.info("[AGENT][MAIN] Interactive config generator phase complete.")
         return 0
     logging.info(f"[AGENT][MAIN] Entering main command phase: {getattr(parsed_args, 'command', None)}")
-    result = run_main_command(parsed_args)
+    if getattr(parsed_args, 'command', None) in THROTTLED_COMMANDS:
+        from dedup_file_tools_commons.utils.throttle import job_throttle
+        with job_throttle(get_db_path_from_job_dir(parsed_args.job_dir, parsed_args.job_name), parsed_args):
+            result = run_main_command(parsed_args)
+    else:
+        result = run_main_command(parsed_args)
     logging.info(f"[AGENT][MAIN] Main command phase complete with result: {result}")
     return result
 
 
+@phase_handler('summary', 'readonly-report')
 def handle_summary(args):
     from dedup_file_tools_fs_copy.phases.summary import summary_phase
     db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
     summary_phase(db_path, args.job_dir)
     return 0
 
+def handle_throttle(args):
+    from dedup_file_tools_commons.utils.throttle import save_throttle_args, format_throttle_limits
+    db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
+    save_throttle_args(db_path, args)
+    print(format_throttle_limits(db_path))
+    return 0
+
+def resolve_hash_algorithm(args):
+    """Set args.hash_algorithm to the job's algorithm (see hashing.job_hash_algorithm). Returns False on a conflicting --hash-algorithm."""
+    db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
+    try:
+        args.hash_algorithm = job_hash_algorithm(db_path, getattr(args, 'hash_algorithm', None))
+    except ValueError as e:
+        logging.error(f"[AGENT][MAIN] {e}")
+        return False
+    return True
+
+@phase_handler('init', 'safe')
 def handle_init(args):
     init_job_dir(args.job_dir, args.job_name, getattr(args, 'checksum_db', None))
+    if getattr(args, 'hash_algorithm', None) and not resolve_hash_algorithm(args):
+        return 1
     return 0
 
+@phase_handler('analyze', 'bulk')
 def handle_analyze(args):
     db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
     init_db(db_path)
@@ -371,21 +431,34 @@ def handle_analyze(args):
         analyze_directories(db_path, args.dst, 'destination_files')
     return 0
 
+@phase_handler('copy', 'safe')
 def handle_copy(args):
     db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
     checksum_db_path = get_checksum_db_path(args.job_dir, getattr(args, 'checksum_db', None))
     init_db(db_path)
+    if not resolve_hash_algorithm(args):
+        return 1
     # Ensure destination pool checksums before copy
     from dedup_file_tools_fs_copy.phases.ensure_destination_pool import ensure_destination_pool_checksums
+    algorithm = args.hash_algorithm
     ensure_destination_pool_checksums(
         job_dir=args.job_dir,
         job_name=args.job_name,
-        checksum_db=checksum_db_path
+        checksum_db=checksum_db_path,
+        algorithm=algorithm,
+        executor=getattr(args, 'executor', DEFAULT_EXECUTOR),
+        hash_workers=getattr(args, 'hash_workers', None),
+        read_order=getattr(args, 'read_order', DEFAULT_READ_ORDER),
+        cache_policy=getattr(args, 'cache_policy', DEFAULT_CACHE_POLICY)
     )
     # Step 2: Always check both path and pool deduplication in copy_files
-    copy_files(db_path, args.src, args.dst, threads=args.threads)
+    copy_files(db_path, args.src, args.dst, threads=args.threads, algorithm=algorithm,
+               read_order=getattr(args, 'read_order', DEFAULT_READ_ORDER),
+               copy_backend=getattr(args, 'copy_backend', 'auto'), read_back=getattr(args, 'read_back', False),
+               cache_policy=getattr(args, 'cache_policy', DEFAULT_CACHE_POLICY))
     return 0
 
+@phase_handler('verify', 'safe')
 def handle_verify(args):
     db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
     # Remove src and dst, just use db_path and stage
@@ -406,7 +479,10 @@ def handle_verify(args):
                 print("  No files verified.")
             print("============================================================\n")
     else:
-        deep_verify_files(db_path, reverify=getattr(args, 'reverify', False))
+        if not resolve_hash_algorithm(args):
+            return 1
+        deep_verify_files(db_path, reverify=getattr(args, 'reverify', False), algorithm=args.hash_algorithm,
+                          cache_policy=getattr(args, 'cache_policy', DEFAULT_CACHE_POLICY))
         error_count = 0
         with RobustSqliteConn(db_path).connect() as conn:
             cur = conn.cursor()
@@ -436,12 +512,19 @@ def handle_verify(args):
             return 1
     return 0
 
+@phase_handler('resume', 'safe')
 def handle_resume(args):
     db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
     init_db(db_path)
-    copy_files(db_path, args.src, args.dst)
+    if not resolve_hash_algorithm(args):
+        return 1
+    copy_files(db_path, args.src, args.dst, algorithm=args.hash_algorithm,
+               read_order=getattr(args, 'read_order', DEFAULT_READ_ORDER),
+               copy_backend=getattr(args, 'copy_backend', 'auto'), read_back=getattr(args, 'read_back', False),
+               cache_policy=getattr(args, 'cache_policy', DEFAULT_CACHE_POLICY))
     return 0
 
+@phase_handler('status', 'readonly-report')
 def handle_status(args):
     db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
     with RobustSqliteConn(db_path).connect() as conn:
@@ -459,6 +542,7 @@ def handle_status(args):
         print("==============================================================\n")
     return 0
 
+@phase_handler('log', 'readonly-report')
 def handle_log(args):
     db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
     with RobustSqliteConn(db_path).connect() as conn:
@@ -483,11 +567,16 @@ def handle_log(args):
             logging.warning(f"[AGENT][MAIN] {row[0]} | {row[1]} | status: {row[2]} | error: {row[3]}")
     return 0
 
+@phase_handler('deep-verify', 'safe')
 def handle_deep_verify(args):
     db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
-    deep_verify_files(db_path, reverify=getattr(args, 'reverify', False))
+    if not resolve_hash_algorithm(args):
+        return 1
+    deep_verify_files(db_path, reverify=getattr(args, 'reverify', False), algorithm=args.hash_algorithm,
+                      cache_policy=getattr(args, 'cache_policy', DEFAULT_CACHE_POLICY))
     return 0
 
+@phase_handler('verify-status', 'readonly-report')
 def handle_verify_status(args):
     db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
     with RobustSqliteConn(db_path).connect() as conn:
@@ -503,6 +592,7 @@ def handle_verify_status(args):
             logging.info(f"[AGENT][MAIN] {row[0]} | status: {row[1]} | error: {row[2]} | size: {row[4]}/{row[3]} | mtime: {row[6]}/{row[5]}")
     return 0
 
+@phase_handler('deep-verify-status', 'readonly-report')
 def handle_deep_verify_status(args):
     db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
     with RobustSqliteConn(db_path).connect() as conn:
@@ -523,11 +613,13 @@ def handle_add_file(args):
     add_file_to_db(db_path, args.file)
     return 0
 
+@phase_handler('add-source', 'bulk')
 def handle_add_source(args):
     db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
     add_source_to_db(db_path, args.src)
     return 0
 
+@phase_handler('list-files', 'readonly-report')
 def handle_list_files(args):
     db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
     list_files_in_db(db_path)
@@ -538,19 +630,29 @@ def handle_remove_file(args):
     remove_file_from_db(db_path, args.file)
     return 0
 
+@phase_handler('checksum', 'safe')
 def handle_checksum(args):
     from dedup_file_tools_fs_copy.phases.checksum import run_checksum_table
     db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
     checksum_db_path = get_checksum_db_path(args.job_dir, getattr(args, 'checksum_db', None))
     init_db(db_path)
+    if not resolve_hash_algorithm(args):
+        return 1
     return run_checksum_table(
         db_path=db_path,
         checksum_db_path=checksum_db_path,
         table=args.table,
         threads=getattr(args, 'threads', 4),
-        no_progress=getattr(args, 'no_progress', False)
+        no_progress=getattr(args, 'no_progress', False),
+        algorithm=args.hash_algorithm,
+        executor=getattr(args, 'executor', DEFAULT_EXECUTOR),
+        hash_workers=getattr(args, 'hash_workers', None),
+        chunk_size=CHUNK_SIZE if getattr(args, 'chunk_hashes', False) else None,
+        read_order=getattr(args, 'read_order', DEFAULT_READ_ORDER),
+        cache_policy=getattr(args, 'cache_policy', DEFAULT_CACHE_POLICY)
     )
 
+@phase_handler('import-checksums', 'bulk')
 def handle_import_checksums(args):
     from dedup_file_tools_fs_copy.phases.import_checksum import run_import_checksums
     db_path = get_db_path_from_job_dir(args.job_dir, args.job_name)
@@ -566,6 +668,9 @@ def run_main_command(args):
         except Exception as e:
             print(f"Error in init_job_dir: {e}")
             return 1
+        if not resolve_hash_algorithm(args):
+            print("Error: conflicting --hash-algorithm.")
+            return 1
         # Step 2: Import checksums if provided
         if getattr(args, 'other_db', None):
             class ImportArgs: pass
@@ -606,7 +711,12 @@ def run_main_command(args):
         ensure_destination_pool_checksums(
             job_dir=args.job_dir,
             job_name=args.job_name,
-            checksum_db=checksum_db_path
+            checksum_db=checksum_db_path,
+            algorithm=args.hash_algorithm,
+            executor=args.executor,
+            hash_workers=args.hash_workers,
+            read_order=args.read_order,
+            cache_policy=args.cache_policy
         )
         # Step 5: Analyze
         class AnalyzeArgs: pass
@@ -628,6 +738,12 @@ def run_main_command(args):
         checksum_args.threads = args.threads
         checksum_args.no_progress = args.no_progress
         checksum_args.checksum_db = getattr(args, 'checksum_db', None)
+        checksum_args.hash_algorithm = args.hash_algorithm
+        checksum_args.executor = args.executor
+        checksum_args.hash_workers = args.hash_workers
+        checksum_args.chunk_hashes = args.chunk_hashes
+        checksum_args.read_order = args.read_order
+        checksum_args.cache_policy = args.cache_policy
         rc = handle_checksum(checksum_args)
         if rc is not None and rc != 0:
             print("Error in checksum (source_files) step.")
@@ -648,6 +764,13 @@ def run_main_command(args):
         copy_args.threads = args.threads
         copy_args.no_progress = args.no_progress
         copy_args.resume = args.resume
+        copy_args.hash_algorithm = args.hash_algorithm
+        copy_args.executor = args.executor
+        copy_args.hash_workers = args.hash_workers
+        copy_args.read_order = args.read_order
+        copy_args.copy_backend = args.copy_backend
+        copy_args.read_back = args.read_back
+        copy_args.cache_policy = args.cache_policy
         rc = handle_copy(copy_args)
         if rc is not None and rc != 0:
             print("Error in copy step.")
@@ -660,6 +783,8 @@ def run_main_command(args):
             verify_args.job_name = args.job_name
             verify_args.stage = 'shallow'
             verify_args.reverify = args.reverify
+            verify_args.hash_algorithm = args.hash_algorithm
+            verify_args.cache_policy = args.cache_policy
             rc = handle_verify(verify_args)
             if rc is not None and rc != 0:
                 print("Error in verify (shallow) step.")
@@ -700,6 +825,8 @@ def run_main_command(args):
         return handle_resume(args)
     elif args.command == 'status':
         return handle_status(args)
+    elif args.command == 'throttle':
+        return handle_throttle(args)
     elif args.command == 'log':
         return handle_log(args)
     elif args.command == 'deep-verify':
@@ -5,7 +5,7 @@ Analysis Phase Module
 ---------------------
 This module implements the analysis phase for the deduplication/copy tool. It is responsible for:
 - Scanning a given volume or directory recursively for all files.
-- Extracting and persisting file metadata (UID, relative path, size, last modified time) to the database.
+- Extracting and persisting file metadata (UID, relative path, size, last modified time, device/inode/link count) to the database.
 - Using UidPath abstraction for robust, cross-platform file identification.
 - Providing progress feedback via tqdm.
 
@@ -14,21 +14,39 @@ All file metadata is stored in the specified table (e.g., source_files or destin
 import logging
 from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
 from dedup_file_tools_commons.utils.uidpath import UidPathUtil
+from dedup_file_tools_commons.utils.hardlinks import file_identity, has_identity_columns
+from dedup_file_tools_commons.utils.db_writer import DBWriter
 from pathlib import Path
 import os
 from tqdm import tqdm
 
+def file_metadata_statement(table, file_info, identity_columns):
+    """(sql, params) upserting file_info into table."""
+    # Tables without the hardlink identity columns (see hardlinks.py) only get the basic metadata
+    if identity_columns:
+        return f"""
+            INSERT INTO {table} (uid, relative_path, size, last_modified, device, inode, nlink)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(uid, relative_path) DO UPDATE SET
+                size=excluded.size,
+                last_modified=excluded.last_modified,
+                device=excluded.device,
+                inode=excluded.inode,
+                nlink=excluded.nlink
+        """, (file_info['uid'], file_info['relative_path'], file_info['size'], file_info['last_modified'],
+              file_info.get('device'), file_info.get('inode'), file_info.get('nlink'))
+    return f"""
+        INSERT INTO {table} (uid, relative_path, size, last_modified)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(uid, relative_path) DO UPDATE SET
+            size=excluded.size,
+            last_modified=excluded.last_modified
+    """, (file_info['uid'], file_info['relative_path'], file_info['size'], file_info['last_modified'])
+
 def persist_file_metadata(db_path, table, file_info):
     try:
         with RobustSqliteConn(db_path).connect() as conn:
-            cur = conn.cursor()
-            cur.execute(f"""
-                INSERT INTO {table} (uid, relative_path, size, last_modified)
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT(uid, relative_path) DO UPDATE SET
-                    size=excluded.size,
-                    last_modified=excluded.last_modified
-            """, (file_info['uid'], file_info['relative_path'], file_info['size'], file_info['last_modified']))
+            conn.execute(*file_metadata_statement(table, file_info, has_identity_columns(conn, table)))
             conn.commit()
         logging.info(f"[AGENT][ANALYZE] Persisted metadata: {file_info}")
     except Exception as e:
@@ -69,12 +87,16 @@ def _extract_file_info(file, uid_path):
             logging.error(f"[AGENT][ANALYZE] Could not determine UID for file {file}")
             return None
         stat = file.stat()
+        device, inode, nlink = file_identity(stat)
         logging.info(f"[AGENT][ANALYZE] Indexed: {file}")
         return {
             'uid': uid,
             'relative_path': rel,
             'size': stat.st_size,
-            'last_modified': int(stat.st_mtime)
+            'last_modified': int(stat.st_mtime),
+            'device': device,
+            'inode': inode,
+            'nlink': nlink
         }
     except Exception as e:
         logging.error(f"[AGENT][ANALYZE] Error extracting info for {file}: {e}")
@@ -112,18 +134,16 @@ def analyze_directories(db_path, directory_roots, table):
         logging.info(f"[AGENT][ANALYZE] Extracted info for {len(all_file_infos)} files.")
     except Exception as e:
         logging.exception(f"[AGENT][ANALYZE] Error extracting file info: {e}")
-    # Step 3: Batch persist metadata in parallel, with less frequent tqdm updates
+    # Step 3: Persist metadata through one writer thread that group-commits the rows
     batch_size = max(100, total_files // 100)
     try:
-        with tqdm(total=total_files, desc=f"Persisting {table}", miniters=batch_size) as pbar:
-            def process_file(file_info):
-                persist_file_metadata(db_path, table, file_info)
+        with RobustSqliteConn(db_path).connect() as conn:
+            identity_columns = has_identity_columns(conn, table)
+        with tqdm(total=total_files, desc=f"Persisting {table}", miniters=batch_size) as pbar, DBWriter(db_path) as writer:
+            for file_info in all_file_infos:
+                writer.submit(*file_metadata_statement(table, file_info, identity_columns))
                 logging.info(f"Indexed: {file_info['uid']}:{file_info['relative_path']} size={file_info['size']} mtime={file_info['last_modified']}")
-            with ThreadPoolExecutor() as executor:
-                for i in range(0, total_files, batch_size):
-                    batch = all_file_infos[i:i+batch_size]
-                    list(executor.map(process_file, batch))
-                    pbar.update(len(batch))
+                pbar.update(1)
         logging.info(f"[AGENT][ANALYZE] Persisted metadata for {len(all_file_infos)} files.")
     except Exception as e:
         logging.exception(f"[AGENT][ANALYZE] Error persisting file metadata: {e}")
@@ -9,6 +9,10 @@ Key Features:
     - Resets status for files missing from destination but marked as done
     - Identifies pending or failed copy tasks from the database
     - Performs deduplicated, resumable file copy operations with checksum verification
+    - Uses kernel-side copies (reflink clone, copy_file_range, sendfile) where supported and records the method per file
+    - Copies in a single pass when a size/fingerprint prefilter rules out duplicates, caching the copy-time checksum for source and destination
+    - Loads the destination pool checksums once into an in-memory set; only members are re-checked in the DB and on disk
+    - Recreates source hardlinks at the destination: only the first path of a hardlinked inode is copied, the other paths are linked to it
     - Updates copy status and destination file records in the database
     - Supports multi-threaded copying with progress reporting
 
@@ -16,15 +20,20 @@ Usage:
     This module is invoked as part of the phase-based workflow, typically by the main orchestration logic. It expects the database to be initialized and source/destination roots to be provided. Designed for use in both CLI and agent-driven workflows.
 """
 from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
-from dedup_file_tools_commons.utils.fileops import copy_file
+from dedup_file_tools_commons.utils.fileops import copy_file_with_method, DEFAULT_CACHE_POLICY
 from dedup_file_tools_commons.utils.checksum_cache import ChecksumCache
 from dedup_file_tools_commons.utils.uidpath import UidPathUtil, UidPath
+from dedup_file_tools_commons.utils.hashing import DEFAULT_HASH_ALGORITHM
+from dedup_file_tools_commons.utils.io_scheduler import DeviceScheduler, order_by_location, DEFAULT_READ_ORDER
+from dedup_file_tools_commons.utils.hardlinks import inode_key, has_identity_columns
+from dedup_file_tools_commons.utils.db_writer import DBWriter
 import threading
 import logging
 
-def reset_status_for_missing_files(db_path, dst_roots):
+def reset_status_for_missing_files(db_path, dst_roots, writer=None):
     """
     For any file marked as done but missing from all destination roots, reset its status to 'pending'.
+    With writer, the resets are queued on it (flush it before reading copy_status again).
     """
     from pathlib import Path
     import sys
@@ -68,7 +77,7 @@ def reset_status_for_missing_files(db_path, dst_roots):
         for uid, rel_path in to_reset:
             logging.info(f"Resetting {rel_path} to pending (was done, now missing)")
             sys.stderr.flush()
-            mark_copy_status(db_path, uid, rel_path, 'pending', 'Destination file missing, will retry')
+            mark_copy_status(db_path, uid, rel_path, 'pending', 'Destination file missing, will retry', writer=writer)
     logging.info("reset_status_for_missing_files: completed")
     sys.stderr.flush()
 
@@ -83,60 +92,97 @@ def get_pending_copies(db_path):
         """)
         return cur.fetchall()
 
-def mark_copy_status(db_path, uid, rel_path, status, error_message=None):
+COPY_STATUS_UPSERT_SQL = """
+    INSERT INTO copy_status (uid, relative_path, status, last_copy_attempt, error_message, copy_method, bytes_copied)
+    VALUES (?, ?, ?, strftime('%s','now'), ?, ?, ?)
+    ON CONFLICT(uid, relative_path) DO UPDATE SET
+        status=excluded.status,
+        last_copy_attempt=excluded.last_copy_attempt,
+        error_message=excluded.error_message,
+        copy_method=excluded.copy_method,
+        bytes_copied=excluded.bytes_copied
+"""
+
+DESTINATION_FILE_UPSERT_SQL = """
+    INSERT INTO destination_files (uid, relative_path, size, last_modified)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(uid, relative_path) DO UPDATE SET
+        size=excluded.size,
+        last_modified=excluded.last_modified
+"""
+
+def mark_copy_status(db_path, uid, rel_path, status, error_message=None, copy_method=None, bytes_copied=None, writer=None):
+    """Set the copy status of a file. copy_method/bytes_copied record how a 'done' file was copied (NULL if skipped).
+    With writer (a DBWriter on db_path) the update is queued for its next group commit."""
+    params = (uid, rel_path, status, error_message, copy_method, bytes_copied)
+    if writer is not None:
+        writer.submit(COPY_STATUS_UPSERT_SQL, params)
+        return
     with RobustSqliteConn(db_path).connect() as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO copy_status (uid, relative_path, status, last_copy_attempt, error_message)
-            VALUES (?, ?, ?, strftime('%s','now'), ?)
-            ON CONFLICT(uid, relative_path) DO UPDATE SET
-                status=excluded.status,
-                last_copy_attempt=excluded.last_copy_attempt,
-                error_message=excluded.error_message
-        """, (uid, rel_path, status, error_message))
+        conn.execute(COPY_STATUS_UPSERT_SQL, params)
         conn.commit()
 
-def copy_files(db_path, src_roots, dst_roots, threads=4):
+def copy_files(db_path, src_roots, dst_roots, threads=4, algorithm=DEFAULT_HASH_ALGORITHM, read_order=DEFAULT_READ_ORDER,
+               copy_backend='auto', read_back=False, cache_policy=DEFAULT_CACHE_POLICY):
+    """
+    Copy all pending source files to dst_roots with deduplication. copy_backend selects the copy_file backend
+    (fileops.COPY_BACKENDS); with kernel-side copies, read_back re-hashes the destination instead of trusting the
+    cached source checksum. The method used and the bytes copied are recorded in copy_status.
+    cache_policy (fileops.CACHE_POLICIES) applies to the copies and to the pre-copy hashing.
+    Source paths sharing a hardlinked inode are copied once; the others become hardlinks to that copy
+    (copy_method 'hardlink', 0 bytes copied), also across runs when source_files records device/inode.
+    """
     import sys
     import time
     from pathlib import Path
     from threading import Lock
     from tqdm import tqdm
-    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from concurrent.futures import as_completed
     logging.info(f"copy_files: db_path={db_path}, src_roots={src_roots}, dst_roots={dst_roots}")
     sys.stderr.flush()
     uid_path = UidPathUtil()
-    from dedup_file_tools_fs_copy.main import get_checksum_db_path, connect_with_attached_checksum_db
+    from dedup_file_tools_fs_copy.main import get_checksum_db_path
+    from dedup_file_tools_commons.utils.db_utils import attached_conn_factory
     import os
     job_dir = os.path.dirname(db_path)
     job_name = os.path.splitext(os.path.basename(db_path))[0]
     checksum_db_path = get_checksum_db_path(job_dir)
-    def conn_factory():
-        return connect_with_attached_checksum_db(db_path, checksum_db_path)
-    checksum_cache = ChecksumCache(conn_factory, uid_path)
+    conn_factory = attached_conn_factory(db_path, checksum_db_path)
+    checksum_cache = ChecksumCache(conn_factory, uid_path, algorithm, cache_policy=cache_policy)
     src_roots = [str(Path(root).resolve()) for root in (src_roots or [])]
-    reset_status_for_missing_files(db_path, dst_roots)
-    time.sleep(0.1)
+    # One writer thread group-commits the status rows of all copy workers; flush() before reading them back
+    writer = DBWriter(db_path).start()
+    reset_status_for_missing_files(db_path, dst_roots, writer=writer)
+    writer.flush()
     pending = get_pending_copies(db_path)
     if not pending:
+        writer.close()
         return
-    checksums_on_disk = set()
     with RobustSqliteConn(db_path).connect() as conn:
         cur = conn.cursor()
         cur.execute("""
             SELECT uid, relative_path FROM destination_files
         """)
-        for uid, rel_path in cur.fetchall():
-            uid_path_obj = UidPath(uid, rel_path)
-            abs_path = uid_path.reconstruct_path(uid_path_obj)
-            if abs_path:
-                chksum = checksum_cache.get(str(abs_path))
-                if chksum:
-                    checksums_on_disk.add(chksum)
+        destination_keys = [(uid, rel_path) for uid, rel_path in cur.fetchall() if uid_path.reconstruct_path(UidPath(uid, rel_path))]
+    # One bulk lookup instead of a cache query per destination file
+    checksums_on_disk = set(checksum_cache.get_many(destination_keys).values())
     copied_checksums = set(checksums_on_disk)
+    copied_prefilter_keys = {}
     copied_lock = Lock()
+    # {(st_dev, st_ino): (Event set once the first path of the inode is processed, [its relative_path if copied])}
+    inode_leaders = {}
+    with RobustSqliteConn(db_path).connect() as conn:
+        source_identity = has_identity_columns(conn, 'source_files')
+    # Pool checksums are loaded once; only a member is confirmed against the DB and the pool file on disk
+    try:
+        pool_checksums = checksum_cache.destination_pool_checksums()
+    except Exception as e:
+        logging.warning(f"[AGENT][COPY] Cannot load destination pool checksums, checking per file: {e}")
+        pool_checksums = None
     # Always check both path and pool deduplication
     def exists_in_pool(checksum):
+        if pool_checksums is not None and checksum not in pool_checksums:
+            return False
         try:
             return checksum_cache.exists_at_destination_pool(checksum)
         except Exception:
@@ -154,31 +200,153 @@ def copy_files(db_path, src_roots, dst_roots, threads=4):
         sys.stderr.flush()
         if not src_file or not src_file.exists():
             logging.error(f"Source file not found: {src_file}")
-            mark_copy_status(db_path, uid, rel_path, 'error', 'Source file not found for resume')
+            mark_copy_status(db_path, uid, rel_path, 'error', 'Source file not found for resume', writer=writer)
             return False
         try:
-            checksum = checksum_cache.get_or_compute_with_invalidation(str(src_file))
-        except Exception as e:
+            src_stat = src_file.stat()
+        except OSError as e:
             logging.error(f"[AGENT][COPY] File access error for {rel_path}: {e}")
-            mark_copy_status(db_path, uid, rel_path, 'error', f"File access error: {e}")
-            return False
-        logging.info(f"checksum for src_file: {checksum}")
-        sys.stderr.flush()
-        if not checksum:
-            mark_copy_status(db_path, uid, rel_path, 'error', 'No valid checksum in cache and cannot compute')
-            logging.error(f"[AGENT][COPY] Skipped (no valid checksum and cannot compute): {rel_path}")
+            mark_copy_status(db_path, uid, rel_path, 'error', f"File access error: {e}", writer=writer)
             return False
+        inode = inode_key(src_stat)
+        if inode is None:
+            return copy_deduplicated(uid, rel_path, size, last_modified, src_file, src_stat)
         with copied_lock:
-            if checksum in copied_checksums:
-                mark_copy_status(db_path, uid, rel_path, 'done')
-                logging.info(f"[AGENT][COPY] Skipped (deduplication: already present on disk or copied this batch): {rel_path}")
+            leader = inode_leaders.get(inode)
+            if leader is None:
+                leader = inode_leaders[inode] = (threading.Event(), [])
+                is_leader = True
+            else:
+                is_leader = False
+        if not is_leader:
+            # Another path of this inode is being copied; link to its copy once it is done
+            leader[0].wait()
+            if leader[1] and link_to_copied_sibling(uid, rel_path, size, last_modified, src_file, src_stat, leader[1][0]):
                 return True
-            copied_checksums.add(checksum)
+            return copy_deduplicated(uid, rel_path, size, last_modified, src_file, src_stat)
+        try:
+            for sibling_rel_path in copied_siblings_from_earlier_runs(uid, rel_path, src_file, src_stat):
+                if link_to_copied_sibling(uid, rel_path, size, last_modified, src_file, src_stat, sibling_rel_path):
+                    leader[1].append(sibling_rel_path)
+                    return True
+            result = copy_deduplicated(uid, rel_path, size, last_modified, src_file, src_stat)
+            if result:
+                leader[1].append(rel_path)
+            return result
+        finally:
+            leader[0].set()
+
+    def copied_siblings_from_earlier_runs(uid, rel_path, src_file, src_stat):
+        """Relative paths of already copied source files that are still the same inode as src_file."""
+        if not source_identity:
+            return []
+        with RobustSqliteConn(db_path).connect() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT s.relative_path FROM source_files s
+                JOIN copy_status cs ON s.uid = cs.uid AND s.relative_path = cs.relative_path
+                WHERE s.uid=? AND s.device=? AND s.inode=? AND s.relative_path<>? AND cs.status='done' AND cs.copy_method IS NOT NULL
+            """, (uid, src_stat.st_dev, src_stat.st_ino, rel_path))
+            rows = cur.fetchall()
+        siblings = []
+        for (sibling_rel_path,) in rows:
+            # st_dev is not stable across remounts, so confirm on disk that it is still the same file
+            sibling_src = uid_path.reconstruct_path(UidPath(uid, sibling_rel_path))
+            try:
+                if sibling_src and os.path.samefile(sibling_src, src_file):
+                    siblings.append(sibling_rel_path)
+            except OSError:
+                continue
+        return siblings
+
+    def link_to_copied_sibling(uid, rel_path, size, last_modified, src_file, src_stat, sibling_rel_path):
+        """Hardlink the destination of rel_path to the destination of sibling_rel_path in every dst_root.
+        Returns False (and the caller copies instead) if a sibling copy is missing or cannot be linked."""
+        targets = [(Path(dst_root) / sibling_rel_path, Path(dst_root) / rel_path) for dst_root in dst_roots]
+        for target, _ in targets:
+            if not target.is_file() or target.stat().st_size != src_stat.st_size:
+                return False
+        try:
+            for target, dst_file in targets:
+                dst_file.parent.mkdir(parents=True, exist_ok=True)
+                if os.path.lexists(dst_file):
+                    if os.path.samefile(target, dst_file):
+                        continue
+                    dst_file.unlink()
+                os.link(target, dst_file)
+        except OSError as e:
+            logging.warning(f"[AGENT][COPY] Cannot hardlink {rel_path} to {sibling_rel_path}, copying instead: {e}")
+            return False
+        checksum = checksum_cache.get(str(targets[0][0]))
+        if checksum:
+            rows = [(str(src_file), src_stat.st_size, int(src_stat.st_mtime), checksum)]
+            for _, dst_file in targets:
+                dst_stat = dst_file.stat()
+                rows.append((str(dst_file), dst_stat.st_size, int(dst_stat.st_mtime), checksum))
+            checksum_cache.put_many(rows)
+        record_destination(uid, rel_path, size, last_modified)
+        mark_copy_status(db_path, uid, rel_path, 'done', copy_method='hardlink', bytes_copied=0, writer=writer)
+        logging.info(f"[AGENT][COPY] {rel_path} hardlinked to the copy of {sibling_rel_path}")
+        return True
+
+    def record_destination(uid, rel_path, size, last_modified):
+        writer.submit(DESTINATION_FILE_UPSERT_SQL, (uid, rel_path, size, last_modified))
+
+    def copy_deduplicated(uid, rel_path, size, last_modified, src_file, src_stat):
+        # Single pass: a cheap prefilter (size, then partial fingerprint for large files) decides whether the
+        # source can duplicate any destination/pool file or any file of this batch. If it cannot, the pre-copy
+        # hash is skipped and the checksum computed while copying is cached for both source and destination.
+        try:
+            fingerprint = checksum_cache.get_or_compute_fingerprint(str(src_file))
+            unique_content = not checksum_cache.may_exist_at_destination(src_stat.st_size, fingerprint)
+        except Exception as e:
+            logging.error(f"[AGENT][COPY] File access error for {rel_path}: {e}")
+            mark_copy_status(db_path, uid, rel_path, 'error', f"File access error: {e}", writer=writer)
+            return False
+        prefilter_key = (src_stat.st_size, fingerprint)
+        with copied_lock:
+            sibling_done = copied_prefilter_keys.get(prefilter_key)
+            if sibling_done is None:
+                own_done = copied_prefilter_keys[prefilter_key] = threading.Event()
+            else:
+                own_done = None
+                unique_content = False
+        try:
+            return copy_one(uid, rel_path, size, last_modified, src_file, src_stat, fingerprint, unique_content, sibling_done)
+        finally:
+            if own_done is not None:
+                own_done.set()
+
+    def copy_one(uid, rel_path, size, last_modified, src_file, src_stat, fingerprint, unique_content, sibling_done):
+        checksum = None
+        if not unique_content:
+            try:
+                checksum = checksum_cache.get_or_compute_with_invalidation(str(src_file))
+            except Exception as e:
+                logging.error(f"[AGENT][COPY] File access error for {rel_path}: {e}")
+                mark_copy_status(db_path, uid, rel_path, 'error', f"File access error: {e}", writer=writer)
+                return False
+            logging.info(f"checksum for src_file: {checksum}")
+            sys.stderr.flush()
+            if not checksum:
+                mark_copy_status(db_path, uid, rel_path, 'error', 'No valid checksum in cache and cannot compute', writer=writer)
+                logging.error(f"[AGENT][COPY] Skipped (no valid checksum and cannot compute): {rel_path}")
+                return False
+            if sibling_done is not None:
+                # A file of this batch with the same size/fingerprint may still be copying without a pre-hash;
+                # its checksum is only known once that copy finishes.
+                sibling_done.wait()
+            with copied_lock:
+                if checksum in copied_checksums:
+                    mark_copy_status(db_path, uid, rel_path, 'done', writer=writer)
+                    logging.info(f"[AGENT][COPY] Skipped (deduplication: already present on disk or copied this batch): {rel_path}")
+                    return True
+                copied_checksums.add(checksum)
         # Check both pool-wide and path-specific deduplication: if checksum exists in either, skip copy
-        pool_exists = exists_in_pool(checksum)
+        pool_exists = checksum is not None and exists_in_pool(checksum)
         path_exists = checksum_cache.exists_at_destination(uid, rel_path)
         if pool_exists or path_exists:
-            mark_copy_status(db_path, uid, rel_path, 'done')
+            mark_copy_status(db_path, uid, rel_path, 'done', writer=writer)
             logging.info(f"[AGENT][COPY] Skipped (deduplication: checksum already present in pool or at destination): {rel_path}")
             return True
         for dst_root in dst_roots:
@@ -189,38 +357,47 @@ def copy_files(db_path, src_roots, dst_roots, threads=4):
             logging.info(f"Parent dir exists: {dst_file.parent.exists()} (should be True)")
             logging.info(f"About to copy: {src_file} -> {dst_file}")
             sys.stderr.flush()
-            mark_copy_status(db_path, uid, rel_path, 'in_progress')
+            mark_copy_status(db_path, uid, rel_path, 'in_progress', writer=writer)
             def log_progress(percent, copied, total):
                 if percent % 10 == 0 or percent == 100:
                     logging.info(f"[AGENT][COPY][PROGRESS] {rel_path}: {percent}% ({copied}/{total} bytes)")
-            src_checksum, dst_checksum = copy_file(src_file, dst_file, progress_callback=log_progress, show_progressbar=True)
+            src_checksum, dst_checksum, copy_method = copy_file_with_method(
+                src_file, dst_file, progress_callback=log_progress, show_progressbar=True, algorithm=checksum_cache.algorithm,
+                backend=copy_backend, expected_checksum=checksum, read_back=read_back, cache_policy=cache_policy)
+            logging.info(f"[AGENT][COPY] {rel_path} copied via {copy_method}")
             logging.info(f"Copy complete: {src_file} -> {dst_file} exists={dst_file.exists()} size={dst_file.stat().st_size if dst_file.exists() else 'N/A'}")
             sys.stderr.flush()
+            cache_rows = []
+            if src_checksum == dst_checksum and checksum is None:
+                # Single-pass path: record the checksum computed during the copy
+                checksum = src_checksum
+                cache_rows.append((str(src_file), src_stat.st_size, int(src_stat.st_mtime), checksum, fingerprint))
+                with copied_lock:
+                    copied_checksums.add(checksum)
             if src_checksum == dst_checksum == checksum:
-                with RobustSqliteConn(db_path).connect() as conn:
-                    cur = conn.cursor()
-                    cur.execute("""
-                        INSERT INTO destination_files (uid, relative_path, size, last_modified)
-                        VALUES (?, ?, ?, ?)
-                        ON CONFLICT(uid, relative_path) DO UPDATE SET
-                            size=excluded.size,
-                            last_modified=excluded.last_modified
-                    """, (uid, rel_path, size, last_modified))
-                    conn.commit()
-                mark_copy_status(db_path, uid, rel_path, 'done')
+                dst_stat = dst_file.stat()
+                cache_rows.append((str(dst_file), dst_stat.st_size, int(dst_stat.st_mtime), checksum, fingerprint))
+                checksum_cache.put_many(cache_rows)
+                record_destination(uid, rel_path, size, last_modified)
+                mark_copy_status(db_path, uid, rel_path, 'done', copy_method=copy_method, bytes_copied=dst_stat.st_size, writer=writer)
                 logging.info(f"File copy verified and marked done: {dst_file}")
                 sys.stderr.flush()
                 return True
             else:
-                mark_copy_status(db_path, uid, rel_path, 'error', 'Checksum mismatch after copy')
+                mark_copy_status(db_path, uid, rel_path, 'error', 'Checksum mismatch after copy', writer=writer)
                 logging.error(f"Checksum mismatch after copy: src={src_checksum}, dst={dst_checksum}, expected={checksum}")
                 sys.stderr.flush()
                 return False
-    with ThreadPoolExecutor(max_workers=threads) as executor:
-        futures = [executor.submit(process_copy, args) for args in pending]
+    # One pool per source device: spinning disks get few concurrent readers, other devices run in parallel.
+    # Each device runs its work in submission order, so read_order makes the source reads mostly sequential.
+    work = [(uid_path.reconstruct_path(UidPath(args[0], args[1])), args) for args in pending]
+    work = order_by_location(work, read_order, path_of=lambda item: item[0])
+    with writer, DeviceScheduler(threads) as scheduler:
+        futures = [scheduler.submit(src_file, process_copy, args) for src_file, args in work]
         with tqdm(total=len(futures), desc="Copying files") as pbar:
             for f in as_completed(futures):
                 try:
                     f.result()
                 finally:
                     pbar.update(1)
+    logging.info(f"[AGENT][COPY] Checksum lookups served from memory: {checksum_cache.lru.stats()}")
@@ -1,5 +1,6 @@
 from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
-from dedup_file_tools_commons.utils.db_utils import connect_with_attached_checksum_db
+from dedup_file_tools_commons.utils.db_utils import connect_with_attached_checksum_db, transaction
+from dedup_file_tools_commons.db import read_checksum_cache_rows, CHECKSUM_CACHE_IMPORT_SQL, checksum_schema_version, encode_checksum_rows
 from tqdm import tqdm
 import logging
 import sys
@@ -13,8 +14,7 @@ def run_import_checksums(db_path, checksum_db_path, other_db_path):
             logging.error(f"Error: The other database does not have a checksum_cache table.")
             sys.exit(1)
         # Import all rows from other checksum_cache
-        cur.execute("SELECT uid, relative_path, size, last_modified, checksum, imported_at, last_validated, is_valid FROM checksum_cache")
-        rows = cur.fetchall()
+        rows = read_checksum_cache_rows(conn)
     # Insert into attached checksum DB in batches
     logging.info(f"[AGENT][MAIN] Rows to import from other DB: {len(rows)} rows")
     min_batch_size = 5000
@@ -24,15 +24,13 @@ def run_import_checksums(db_path, checksum_db_path, other_db_path):
     conn = connect_with_attached_checksum_db(db_path, checksum_db_path)
     try:
         cur = conn.cursor()
+        version = checksum_schema_version(conn, 'checksumdb')
         with tqdm(total=total_rows, desc="Importing checksums", unit="row") as pbar:
             for batch in batches:
-                for row in batch:
-                    cur.execute("""
-                        INSERT OR REPLACE INTO checksumdb.checksum_cache (uid, relative_path, size, last_modified, checksum, imported_at, last_validated, is_valid)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """, row)
-                    pbar.update(1)
-                conn.commit()
+                # One transaction per batch: the connection is in autocommit mode
+                with transaction(conn):
+                    cur.executemany(CHECKSUM_CACHE_IMPORT_SQL, encode_checksum_rows(batch, version))
+                pbar.update(len(batch))
         # Log all rows in checksum_cache after import
         cur.execute("SELECT COUNT(*) FROM checksumdb.checksum_cache")
         count = cur.fetchone()[0]
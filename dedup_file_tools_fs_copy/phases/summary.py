@@ -7,7 +7,7 @@ Description:
     Implements the summary phase for the Non-Redundant Media File Copy Tool. This module generates a summary report after the copy phase, including a CSV file listing files that encountered errors or were not copied. It also prints job and log file locations for user reference.
 
 Key Features:
-    - Summarizes the results of the copy operation
+    - Summarizes the results of the copy operation, including bytes cloned versus streamed per copy method
     - Reports the location of log files and job directory
     - Generates a CSV report of files with errors or incomplete status
     - Designed for use in both CLI and agent-driven workflows
@@ -51,6 +51,19 @@ def summary_phase(db_path, job_dir):
             WHERE cs.status != 'done'
         """)
         rows = cur.fetchall()
+        # How the copied bytes were transferred (kernel clone/copy versus streamed through the process);
+        # job DBs not yet migrated by init_db have no copy_method column
+        cur.execute("PRAGMA table_info(copy_status);")
+        if 'copy_method' in [row[1] for row in cur.fetchall()]:
+            cur.execute("""
+                SELECT copy_method, COUNT(*), COALESCE(SUM(bytes_copied), 0)
+                FROM copy_status
+                WHERE status = 'done' AND copy_method IS NOT NULL
+                GROUP BY copy_method
+                ORDER BY copy_method
+            """)
+            for method, count, total_bytes in cur.fetchall():
+                logger.info(f"Copied via {method}: {count} file(s), {total_bytes} bytes")
         if not rows:
             logger.info("All files copied successfully. No errors or pending files.")
         else:
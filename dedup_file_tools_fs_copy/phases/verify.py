@@ -1,35 +1,39 @@
-def verify_files(db_path, stage='shallow', reverify=False):
+def verify_files(db_path, stage='shallow', reverify=False, algorithm=None):
     """
     Unified verify function: runs shallow or deep verification based on stage.
     Args:
         db_path (str): Path to job database.
         stage (str): 'shallow' or 'deep'.
         reverify (bool): If True, clear previous verification results before running.
+        algorithm (str): Hash algorithm for deep verification (default: sha256).
     """
     if stage == 'shallow':
         shallow_verify_files(db_path, reverify=reverify)
     else:
-        deep_verify_files(db_path, reverify=reverify)
+        deep_verify_files(db_path, reverify=reverify, algorithm=algorithm)
 import logging
 from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
+from dedup_file_tools_commons.utils.db_utils import transaction
 import time
 from dedup_file_tools_commons.utils.checksum_cache import ChecksumCache
 from dedup_file_tools_commons.utils.uidpath import UidPath, UidPathUtil
+from dedup_file_tools_commons.utils.io_scheduler import DeviceScheduler
+from dedup_file_tools_commons.utils.fileops import DEFAULT_CACHE_POLICY
 
 
 def shallow_verify_files(db_path, reverify=False, max_workers=8):
     """Shallow verification: check file existence, size, and last modified time. Now multithreaded."""
-    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from concurrent.futures import as_completed
     uid_path = UidPathUtil()
     uid_path.update_mounts()  # Ensure mounts are up to date for test environments
     logging.info("[AGENT][VERIFY] Starting shallow verification stage...")
     timestamp = int(time.time())
-    from dedup_file_tools_fs_copy.main import get_checksum_db_path, connect_with_attached_checksum_db
+    from dedup_file_tools_fs_copy.main import get_checksum_db_path
+    from dedup_file_tools_commons.utils.db_utils import attached_conn_factory
     import os
     job_dir = os.path.dirname(db_path)
     checksum_db_path = get_checksum_db_path(job_dir)
-    def conn_factory():
-        return connect_with_attached_checksum_db(db_path, checksum_db_path)
+    conn_factory = attached_conn_factory(db_path, checksum_db_path)
     if reverify:
         with RobustSqliteConn(db_path).connect() as conn:
             conn.execute("DELETE FROM verification_shallow_results")
@@ -78,35 +82,36 @@ def shallow_verify_files(db_path, reverify=False, max_workers=8):
         return (uid, rel_path, exists, size_matched, last_modified_matched, expected_size, actual_size, expected_last_modified, actual_last_modified, verify_status, verify_error, timestamp)
 
     results = []
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(verify_one, entry) for entry in files]
+    with DeviceScheduler(max_workers) as scheduler:
+        futures = [scheduler.submit(uid_path.reconstruct_path(UidPath(entry[0], entry[1])), verify_one, entry) for entry in files]
         from tqdm import tqdm
         for f in tqdm(as_completed(futures), total=len(futures), desc="Shallow Verify", unit="file"):
             results.append(f.result())
     # Write all results in main thread
     with RobustSqliteConn(db_path).connect() as conn:
         cur = conn.cursor()
-        cur.executemany("""
-            INSERT OR REPLACE INTO verification_shallow_results (uid, relative_path, "exists", size_matched, last_modified_matched, expected_size, actual_size, expected_last_modified, actual_last_modified, verify_status, verify_error, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, results)
-        conn.commit()
+        # One transaction: the connection is in autocommit mode
+        with transaction(conn):
+            cur.executemany("""
+                INSERT OR REPLACE INTO verification_shallow_results (uid, relative_path, "exists", size_matched, last_modified_matched, expected_size, actual_size, expected_last_modified, actual_last_modified, verify_status, verify_error, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, results)
     logging.info(f"[AGENT][VERIFY] Shallow verification complete: {len(files)} files processed.")
 
-def deep_verify_files(db_path, reverify=False, max_workers=8):
+def deep_verify_files(db_path, reverify=False, max_workers=8, algorithm=None, cache_policy=DEFAULT_CACHE_POLICY):
     """Deep verification: always perform all shallow checks, then compare checksums. Now multithreaded."""
-    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from concurrent.futures import as_completed
     uid_path = UidPathUtil()
     uid_path.update_mounts()  # Ensure mounts are up to date for test environments
     logging.info("[AGENT][VERIFY] Starting deep verification stage...")
     timestamp = int(time.time())
-    from dedup_file_tools_fs_copy.main import get_checksum_db_path, connect_with_attached_checksum_db
+    from dedup_file_tools_fs_copy.main import get_checksum_db_path
+    from dedup_file_tools_commons.utils.db_utils import attached_conn_factory
     import os
     job_dir = os.path.dirname(db_path)
     checksum_db_path = get_checksum_db_path(job_dir)
-    def conn_factory():
-        return connect_with_attached_checksum_db(db_path, checksum_db_path)
-    checksum_cache = ChecksumCache(conn_factory, uid_path)
+    conn_factory = attached_conn_factory(db_path, checksum_db_path)
+    checksum_cache = ChecksumCache(conn_factory, uid_path, algorithm, cache_policy=cache_policy)
     if reverify:
         with RobustSqliteConn(db_path).connect() as conn:
             conn.execute("DELETE FROM verification_deep_results")
@@ -124,6 +129,11 @@ def deep_verify_files(db_path, reverify=False, max_workers=8):
         print("[INFO] No files found in source_files with copy_status='done'. Nothing to verify.")
         logging.warning("[AGENT][VERIFY] No files found in source_files with copy_status='done'. Nothing to verify.")
         return
+    # Bulk cache reads before the workers start: the recorded checksums, then the rows that still match the
+    # files on disk (only the others are re-hashed below)
+    keys = [(uid, rel_path) for uid, rel_path, _, _ in files]
+    expected_checksums = checksum_cache.get_many(keys)
+    current_checksums = checksum_cache.validate_many(keys)
 
     def verify_one(entry):
         uid, rel_path, expected_size, expected_last_modified = entry
@@ -153,7 +163,7 @@ def deep_verify_files(db_path, reverify=False, max_workers=8):
             shallow_error = 'File missing at destination'
         src_file = uid_path.reconstruct_path(uid_path_obj)
         dst_file_actual = uid_path.reconstruct_path(uid_path_obj)
-        expected_checksum = checksum_cache.get(str(dst_file_actual)) if dst_file_actual else None
+        expected_checksum = expected_checksums.get((uid, rel_path)) if dst_file_actual else None
         checksum_matched = 0
         verify_status = 'ok'
         verify_error = None
@@ -170,28 +180,34 @@ def deep_verify_files(db_path, reverify=False, max_workers=8):
                 verify_status = 'error'
                 verify_error = 'Destination file missing'
             else:
-                src_checksum = checksum_cache.get_or_compute_with_invalidation(str(src_file))
-                dst_checksum = checksum_cache.get_or_compute_with_invalidation(str(dst_file_actual))
+                src_checksum = current_checksums.get((uid, rel_path)) or checksum_cache.get_or_compute_with_invalidation(str(src_file))
+                dst_checksum = current_checksums.get((uid, rel_path)) or checksum_cache.get_or_compute_with_invalidation(str(dst_file_actual))
                 if src_checksum == dst_checksum == expected_checksum:
                     checksum_matched = 1
                 else:
                     verify_status = 'failed'
                     verify_error = 'Checksum mismatch'
+                    # With chunk digests recorded (checksum --chunk-hashes), report which regions changed
+                    regions = checksum_cache.diff_chunk_regions(str(dst_file_actual))
+                    if regions:
+                        verify_error += '; differing regions: ' + ', '.join(f"{offset}+{length}" for offset, length in regions)
         logging.info(f"[AGENT][VERIFY] Deep verify {rel_path}: {verify_status}{' - ' + verify_error if verify_error else ''}")
         return (uid, rel_path, checksum_matched, expected_checksum, src_checksum, dst_checksum, verify_status, verify_error, timestamp)
 
     results = []
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(verify_one, entry) for entry in files]
+    with DeviceScheduler(max_workers) as scheduler:
+        futures = [scheduler.submit(uid_path.reconstruct_path(UidPath(entry[0], entry[1])), verify_one, entry) for entry in files]
         from tqdm import tqdm
         for f in tqdm(as_completed(futures), total=len(futures), desc="Deep Verify", unit="file"):
             results.append(f.result())
     # Write all results in main thread
     with RobustSqliteConn(db_path).connect() as conn:
         cur = conn.cursor()
-        cur.executemany("""
-            INSERT OR REPLACE INTO verification_deep_results (uid, relative_path, checksum_matched, expected_checksum, src_checksum, dst_checksum, verify_status, verify_error, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, results)
-        conn.commit()
+        # One transaction: the connection is in autocommit mode
+        with transaction(conn):
+            cur.executemany("""
+                INSERT OR REPLACE INTO verification_deep_results (uid, relative_path, checksum_matched, expected_checksum, src_checksum, dst_checksum, verify_status, verify_error, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, results)
     logging.info(f"[AGENT][VERIFY] Deep verification complete: {len(files)} files processed.")
+    logging.info(f"[AGENT][VERIFY] Checksum lookups served from memory: {checksum_cache.lru.stats()}")
@@ -1,23 +1,90 @@
 from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
 import time
+from dedup_file_tools_commons.utils.hardlinks import file_identity, has_identity_columns
+from dedup_file_tools_commons.utils.path_store import PathStore, has_path_store_layout, FILE_KEY_SQL, key_params
 
 class DestinationPoolIndex:
     """
     Manages the destination pool index for global duplicate detection.
     This does NOT store checksums, only tracks which files are in the pool (by uid and relative path).
     Checksum management remains in checksum_cache.py.
+    Job DBs created by init_db store the pool in destination_pool_entries, keyed through a PathStore, behind the
+    destination_pool_files view; a plain destination_pool_files table (created by hand) is written directly.
     """
-    def __init__(self, uid_path):
+    def __init__(self, uid_path, writer=None):
+        """With writer (a DBWriter on the job DB), add_or_update_file queues its upserts for group commit
+        instead of committing each one on conn; new volumes and directories of the path store are created by the
+        writer thread too, so conn is only read."""
         self.uid_path = uid_path
+        self.writer = writer
+        self._identity_columns = None
+        self._path_store = None
 
-    def add_or_update_file(self, conn, path: str, size: int, last_modified: int):
+    def _layout(self, conn):
+        if self._identity_columns is None:
+            if has_path_store_layout(conn, 'destination_pool_files'):
+                self._path_store = PathStore()
+            self._identity_columns = has_identity_columns(conn, 'destination_pool_files')
+
+    def add_or_update_file(self, conn, path: str, size: int, last_modified: int, stat=None):
+        """Add or refresh a pool file. With stat (an os.stat_result), its device/inode/link count are recorded too."""
         uid_path_obj = self.uid_path.convert_path(path)
         uid, rel_path = uid_path_obj.uid, uid_path_obj.relative_path
         if not uid:
             return
         now = int(time.time())
-        cur = conn.cursor()
-        cur.execute(
+        self._layout(conn)
+        if self._path_store is not None:
+            if stat is not None:
+                sql = """
+                    INSERT INTO destination_pool_entries (vol_id, dir_id, name, size, last_modified, last_seen, device, inode, nlink)
+                    VALUES ({key}, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(dir_id, name) DO UPDATE SET
+                        size=excluded.size,
+                        last_modified=excluded.last_modified,
+                        last_seen=excluded.last_seen,
+                        device=excluded.device,
+                        inode=excluded.inode,
+                        nlink=excluded.nlink
+                """
+                values = (size, last_modified, now) + file_identity(stat)
+            else:
+                sql = """
+                    INSERT INTO destination_pool_entries (vol_id, dir_id, name, size, last_modified, last_seen)
+                    VALUES ({key}, ?, ?, ?)
+                    ON CONFLICT(dir_id, name) DO UPDATE SET
+                        size=excluded.size,
+                        last_modified=excluded.last_modified,
+                        last_seen=excluded.last_seen
+                """
+                values = (size, last_modified, now)
+            if self.writer is not None:
+                # The key is resolved in SQL by the writer thread, after the intent creating its directories
+                self._path_store.submit_group(self.writer, uid, rel_path,
+                                              [(sql.format(key=FILE_KEY_SQL), key_params(uid, rel_path) + values)])
+                return
+            key = self._path_store.intern(conn, uid, str(rel_path))
+            self._write(conn, sql.format(key='?, ?, ?'), key + values)
+            return
+        if stat is not None and self._identity_columns:
+            self._write(
+                conn,
+                """
+                INSERT INTO destination_pool_files (uid, relative_path, size, last_modified, last_seen, device, inode, nlink)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(uid, relative_path) DO UPDATE SET
+                    size=excluded.size,
+                    last_modified=excluded.last_modified,
+                    last_seen=excluded.last_seen,
+                    device=excluded.device,
+                    inode=excluded.inode,
+                    nlink=excluded.nlink
+                """,
+                (uid, str(rel_path), size, last_modified, now) + file_identity(stat)
+            )
+            return
+        self._write(
+            conn,
             """
             INSERT INTO destination_pool_files (uid, relative_path, size, last_modified, last_seen)
             VALUES (?, ?, ?, ?, ?)
@@ -28,10 +95,23 @@ class DestinationPoolIndex:
             """,
             (uid, str(rel_path), size, last_modified, now)
         )
+
+    def _write(self, conn, sql, params):
+        if self.writer is not None:
+            self.writer.submit(sql, params)
+            return
+        conn.execute(sql, params)
         conn.commit()
 
     def exists(self, conn, uid: str, rel_path: str) -> bool:
+        self._layout(conn)
         cur = conn.cursor()
+        if self._path_store is not None:
+            key = self._path_store.lookup(conn, uid, rel_path)
+            if key is None:
+                return False
+            cur.execute("SELECT 1 FROM destination_pool_entries WHERE dir_id=? AND name=? LIMIT 1", key[1:])
+            return cur.fetchone() is not None
         cur.execute(
             "SELECT 1 FROM destination_pool_files WHERE uid=? AND relative_path=? LIMIT 1",
             (uid, rel_path)
@@ -4,6 +4,8 @@ from pathlib import Path
 from dedup_file_tools_commons.utils.uidpath import UidPathUtil
 from dedup_file_tools_commons.utils.checksum_cache2 import ChecksumCache2
 from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
+from dedup_file_tools_commons.utils.io_scheduler import DeviceScheduler, group_by_device
+from dedup_file_tools_commons.utils.db_writer import DBWriter
 from .destination_pool import DestinationPoolIndex
 
 def add_to_destination_index_pool(db_path, dst_root):
@@ -14,7 +16,6 @@ def add_to_destination_index_pool(db_path, dst_root):
     dst_root = Path(dst_root)
     logging.info(f"[AGENT][POOL] Adding files from {dst_root}")
     from tqdm import tqdm
-    from concurrent.futures import ThreadPoolExecutor
     all_files = []
     notify_every = 10000
     count = 0
@@ -30,26 +31,32 @@ def add_to_destination_index_pool(db_path, dst_root):
     min_batch_size = 5000
     batch_size = max(min_batch_size, total_files // 100) if total_files > 0 else min_batch_size
     from threading import Lock
-    batches = [all_files[i:i+batch_size] for i in range(0, total_files, batch_size)]
+    # Batches never span devices, so each device is indexed under its own concurrency limit
+    batches = []
+    for device, device_files in group_by_device(all_files).items():
+        batches.extend((device, device_files[i:i+batch_size]) for i in range(0, len(device_files), batch_size))
     processed = 0
     pbar_lock = Lock()
     logging.info(f"[AGENT][POOL] Starting tqdm progress bar for indexing {total_files} files from {dst_root}")
 
     # Use a single DB connection for all checksum operations
-    pool = DestinationPoolIndex(uid_path)
+    writer = DBWriter(db_path)
+    pool = DestinationPoolIndex(uid_path, writer=writer)
     checksum_cache = ChecksumCache2(uid_path)
     from tqdm import tqdm
-    with tqdm(total=total_files, desc=f"Indexing destination pool from {dst_root}", unit="file") as pbar:
+    with tqdm(total=total_files, desc=f"Indexing destination pool from {dst_root}", unit="file") as pbar, writer:
         def process_batch(batch):
-            # Each thread opens its own connection for its batch
+            # Each thread reads on its own connection; the upserts are group-committed by the writer thread
             with RobustSqliteConn(db_path).connect() as conn:
                 for path in batch:
                     stat = path.stat()
                     # Optionally, you can use checksum_cache here for checksum-related logic if needed
-                    pool.add_or_update_file(conn, str(path), stat.st_size, int(stat.st_mtime))
+                    pool.add_or_update_file(conn, str(path), stat.st_size, int(stat.st_mtime), stat=stat)
                     logging.info(f"[AGENT][POOL] Added/updated file in destination pool index: {path}")
                     with pbar_lock:
                         pbar.update(1)
-        with ThreadPoolExecutor() as executor:
-            list(executor.map(process_batch, batches))
+        with DeviceScheduler() as scheduler:
+            futures = [scheduler.submit_to_device(device, process_batch, batch) for device, batch in batches]
+            for future in futures:
+                future.result()
     logging.info(f"[AGENT][POOL] Batch add/update complete: {total_files} files processed in destination pool index from {dst_root}")
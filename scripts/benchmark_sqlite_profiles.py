@@ -0,0 +1,100 @@
+"""
+SQLite pragma profile benchmark (see dedup_file_tools_commons/utils/sqlite_profiles.py)
+
+Times analyze_directories (scan of many small files into source_files) and run_import_checksums (rows copied from
+another checksum DB) of dedup-file-copy-fs under each profile, on fresh databases for every run.
+Usage:
+    python scripts/benchmark_sqlite_profiles.py [--files N] [--rows N] [--repeat N] [--dir DIR]
+
+Put --dir on the device that holds real job directories: the synchronous setting mostly costs fsyncs.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TQDM_DISABLE', '1')
+
+from dedup_file_tools_commons.db import init_checksum_db
+from dedup_file_tools_commons.utils.sqlite_profiles import PROFILE_NAMES, configure_profiles, sqlite_phase
+from dedup_file_tools_fs_copy.db import init_db
+from dedup_file_tools_fs_copy.phases.analysis import analyze_directories
+from dedup_file_tools_fs_copy.phases.import_checksum import run_import_checksums
+
+# readonly-report cannot write, so only the writing profiles are compared
+WRITE_PROFILES = [name for name in PROFILE_NAMES if name != 'readonly-report']
+
+
+def make_source_tree(root, files):
+    for i in range(files):
+        directory = os.path.join(root, f"d{i // 500}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"f{i}.bin"), 'wb') as f:
+            f.write(os.urandom(64))
+
+
+def make_other_checksum_db(path, rows):
+    init_checksum_db(path)
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO checksum_cache (uid, relative_path, size, last_modified, checksum, imported_at, last_validated, is_valid, algorithm) "
+            "VALUES ('bench-uid', ?, 64, 0, ?, 0, 0, 1, 'sha256')",
+            ((f"d/f{i}.bin", f"{i:064x}") for i in range(rows)))
+
+
+def timed(phase, profile, job_dir, func):
+    configure_profiles(profile)
+    db_path = os.path.join(job_dir, 'bench.db')
+    checksum_db_path = os.path.join(job_dir, 'checksum-cache.db')
+    init_db(db_path)
+    init_checksum_db(checksum_db_path)
+    start = time.perf_counter()
+    with sqlite_phase(phase, [db_path, checksum_db_path]):
+        func(db_path, checksum_db_path)
+    return time.perf_counter() - start
+
+
+def best_time(phase, profile, tmp, func, repeat):
+    best = None
+    for run in range(repeat):
+        job_dir = tempfile.mkdtemp(prefix=f"{phase}-{profile}-{run}-", dir=tmp)
+        elapsed = timed(phase, profile, job_dir, func)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark analyze/import-checksums under each SQLite profile.")
+    parser.add_argument('--files', type=int, default=5000, help='Files scanned by analyze (default: 5000)')
+    parser.add_argument('--rows', type=int, default=20000, help='Rows imported by import-checksums (default: 20000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case, best is reported (default: 3)')
+    parser.add_argument('--dir', default=None, help='Directory for the test data (default: system temp dir)')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        src = os.path.join(tmp, 'src')
+        make_source_tree(src, args.files)
+        other_db = os.path.join(tmp, 'other.db')
+        make_other_checksum_db(other_db, args.rows)
+        cases = [
+            ('analyze', f"analyze_directories, {args.files} files",
+             lambda db_path, checksum_db_path: analyze_directories(db_path, [src], 'source_files')),
+            ('import-checksums', f"run_import_checksums, {args.rows} rows",
+             lambda db_path, checksum_db_path: run_import_checksums(db_path, checksum_db_path, other_db)),
+        ]
+        print(f"best of {args.repeat}")
+        for phase, label, func in cases:
+            print(f"  {label}")
+            for profile in WRITE_PROFILES:
+                elapsed = best_time(phase, profile, tmp, func, args.repeat)
+                print(f"    {profile:<8} {elapsed:8.2f} s")
+    configure_profiles(None)
+
+
+if __name__ == '__main__':
+    main()
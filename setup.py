@@ -20,11 +20,16 @@ setup(
         "tqdm",
         "pyyaml",
     ],
+    extras_require={
+        # Optional fast hash engines (see dedup_file_tools_commons/utils/hashing.py)
+        "fast-hash": ["blake3", "xxhash"],
+    },
     entry_points={
         "console_scripts": [
             "dedup-file-copy-fs=dedup_file_tools_fs_copy.main:main",
             "dedup-file-move-dupes=dedup_file_tools_dupes_move.main:main",
-            "dedup-file-compare=dedup_file_tools_compare.main:main"
+            "dedup-file-compare=dedup_file_tools_compare.main:main",
+            "dedup-file-checksum-db=dedup_file_tools_commons.db:main"
         ]
     },
     classifiers=[
@@ -15,6 +15,8 @@ def setup_test_db(tmp_path):
             imported_at INTEGER,
             last_validated INTEGER,
             is_valid INTEGER DEFAULT 1,
+            algorithm TEXT DEFAULT 'sha256',
+            fingerprint TEXT,
             PRIMARY KEY (uid, relative_path)
         )
     """)
@@ -15,6 +15,8 @@ def setup_test_db_with_pool(tmp_path):
             imported_at INTEGER,
             last_validated INTEGER,
             is_valid INTEGER DEFAULT 1,
+            algorithm TEXT DEFAULT 'sha256',
+            fingerprint TEXT,
             PRIMARY KEY (uid, relative_path)
         )
     """)
@@ -70,6 +72,8 @@ def setup_test_db(tmp_path):
             imported_at INTEGER,
             last_validated INTEGER,
             is_valid INTEGER DEFAULT 1,
+            algorithm TEXT DEFAULT 'sha256',
+            fingerprint TEXT,
             PRIMARY KEY (uid, relative_path)
         )
     """)
@@ -149,3 +153,109 @@ def test_subdirectory_file(tmp_path):
     stat = file_path.stat()
     cache.insert_or_update(str(file_path), stat.st_size, int(stat.st_mtime), "deepchk")
     assert cache.get(str(file_path)) == "deepchk"
+
+def test_bulk_get_put_validate(tmp_path):
+    db_path = setup_test_db_with_pool(tmp_path)
+    uid_path = UidPathUtil()
+    cache = ChecksumCache(lambda: sqlite3.connect(db_path), uid_path)
+    files = []
+    for i in range(3):
+        path = tmp_path / f"bulk{i}.txt"
+        path.write_text(f"content {i}")
+        files.append(path)
+    rows = [(str(p), p.stat().st_size, int(p.stat().st_mtime), f"sum{i}", None) for i, p in enumerate(files)]
+    cache.put_many(rows)
+    keys = [(u.uid, str(u.relative_path)) for u in (uid_path.convert_path(str(p)) for p in files)]
+    # Paths and (uid, relative_path) keys give the same rows; unknown keys are left out
+    assert cache.get_many([str(p) for p in files]) == {str(p): f"sum{i}" for i, p in enumerate(files)}
+    assert cache.get_many(keys + [(keys[0][0], "missing.txt")]) == {key: f"sum{i}" for i, key in enumerate(keys)}
+    assert cache.get(str(files[1])) == "sum1"
+    assert cache.exists_at_paths([str(files[2])], "sum2")
+    assert not cache.exists_at_uid_relpath_array(keys, "other")
+    # A changed and a deleted file are marked stale; the unchanged one validates
+    files[1].write_text("changed content, new size")
+    files[2].unlink()
+    assert cache.validate_many(keys) == {keys[0]: "sum0"}
+    assert cache.get_many(keys) == {keys[0]: "sum0"}
+
+def test_lru_front_cache_hits_and_invalidation(tmp_path):
+    import os
+    from dedup_file_tools_commons.utils.checksum_lru import ChecksumLRU
+    db_path = setup_test_db_with_pool(tmp_path)
+    uid_path = UidPathUtil()
+    queries = []
+    def conn_factory():
+        conn = sqlite3.connect(db_path)
+        conn.set_trace_callback(queries.append)
+        conn.execute(f"ATTACH DATABASE '{db_path}' AS checksumdb")
+        return conn
+    cache = ChecksumCache(conn_factory, uid_path)
+    f = tmp_path / "a.txt"
+    f.write_text("abc")
+    first = cache.get_or_compute_with_invalidation(str(f))
+    queries.clear()
+    assert cache.get_or_compute_with_invalidation(str(f)) == first
+    assert cache.get_or_compute_with_invalidation(str(f)) == first
+    assert queries == []
+    assert cache.lru.hits == 2
+    # A changed file misses and is re-hashed
+    f.write_text("abcd")
+    os.utime(f, (1, 1))
+    assert cache.get_or_compute_with_invalidation(str(f)) != first
+    # is_valid=0 invalidations drop the entry
+    key = (uid_path.convert_path(str(f)).uid, str(uid_path.convert_path(str(f)).relative_path))
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO destination_pool_files (uid, relative_path, size, last_modified, last_seen) VALUES (?, ?, 0, 0, 0)", key)
+    assert not cache.exists_at_destination_pool(cache.get(str(f)))
+    assert len(cache.lru) == 0
+    # Capped by entry count and bytes
+    lru = ChecksumLRU(max_entries=2)
+    for i in range(3):
+        lru.put(('u', str(i)), 1, 1, 'x')
+    assert len(lru) == 2 and lru.evictions == 1 and lru.get(('u', '0'), 1, 1) is None
+    lru = ChecksumLRU(max_bytes=300)
+    lru.put(('u', 'a'), 1, 1, 'x')
+    lru.put(('u', 'b'), 1, 1, 'x')
+    assert len(lru) == 1 and lru.nbytes <= 300
+
+def test_destination_pool_checksum_set(tmp_path):
+    from dedup_file_tools_commons.utils.checksum_set import ChecksumSet
+    db_path = setup_test_db_with_pool(tmp_path)
+    digest = "ab" * 32
+    with sqlite3.connect(db_path) as conn:
+        for rel, checksum, valid in (("a", digest, 1), ("b", "cd" * 32, 0), ("c", "not-hex", 1)):
+            conn.execute("INSERT INTO destination_pool_files (uid, relative_path, size, last_modified, last_seen) VALUES ('u', ?, 1, 1, 0)", (rel,))
+            conn.execute("INSERT INTO checksum_cache (uid, relative_path, size, last_modified, checksum, is_valid) VALUES ('u', ?, 1, 1, ?, ?)", (rel, checksum, valid))
+        conn.execute("INSERT INTO checksum_cache (uid, relative_path, size, last_modified, checksum, is_valid) VALUES ('u', 'not-in-pool', 1, 1, ?, 1)", ("ef" * 32,))
+    def conn_factory():
+        conn = sqlite3.connect(db_path)
+        conn.execute(f"ATTACH DATABASE '{db_path}' AS checksumdb")
+        return conn
+    pool = ChecksumCache(conn_factory, UidPathUtil()).destination_pool_checksums()
+    assert isinstance(pool, ChecksumSet) and len(pool) == 2
+    assert digest in pool and digest.upper() in pool and "not-hex" in pool
+    assert "cd" * 32 not in pool and "ef" * 32 not in pool and None not in pool
+
+def test_destination_pool_ignores_checksums_of_other_algorithms(tmp_path):
+    db_path = setup_test_db_with_pool(tmp_path)
+    uid_path = UidPathUtil()
+    file_path = tmp_path / "pooled.txt"
+    file_path.write_text("pooled")
+    stat = file_path.stat()
+    uid_path_obj = uid_path.convert_path(str(file_path))
+    digest = "ab" * 32
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO destination_pool_files (uid, relative_path, size, last_modified, last_seen) VALUES (?, ?, ?, ?, 0)",
+                     (uid_path_obj.uid, str(uid_path_obj.relative_path), stat.st_size, int(stat.st_mtime)))
+        conn.execute("INSERT INTO checksum_cache (uid, relative_path, size, last_modified, checksum, is_valid, algorithm) VALUES (?, ?, ?, ?, ?, 1, 'blake2b')",
+                     (uid_path_obj.uid, str(uid_path_obj.relative_path), stat.st_size, int(stat.st_mtime), digest))
+    def conn_factory():
+        conn = sqlite3.connect(db_path)
+        conn.execute(f"ATTACH DATABASE '{db_path}' AS checksumdb")
+        return conn
+    sha256_cache = ChecksumCache(conn_factory, uid_path)
+    assert digest not in sha256_cache.destination_pool_checksums()
+    assert not sha256_cache.exists_at_destination_pool(digest)
+    blake2b_cache = ChecksumCache(conn_factory, uid_path, algorithm='blake2b')
+    assert digest in blake2b_cache.destination_pool_checksums()
+    assert blake2b_cache.exists_at_destination_pool(digest)
@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import pytest
+from dedup_file_tools_commons.db import init_checksum_db, CHECKSUM_CACHE_RENAMED_SQL
+from dedup_file_tools_commons.utils import checksum_cache as checksum_cache_module
+from dedup_file_tools_commons.utils import hash_executor
+from dedup_file_tools_commons.utils.checksum_cache import ChecksumCache
+from dedup_file_tools_commons.utils.db_utils import attached_conn_factory
+from dedup_file_tools_commons.utils.fileops import compute_hash
+from dedup_file_tools_commons.utils.uidpath import UidPathUtil
+
+
+def no_reads(*args, **kwargs):
+    raise AssertionError("the file was read")
+
+
+def make_cache(tmp_path, version, **kwargs):
+    job_db = str(tmp_path / f"job{version}.db")
+    checksum_db = str(tmp_path / f"checksum{version}.db")
+    init_checksum_db(checksum_db, version=version)
+    sqlite3.connect(job_db).close()
+    return ChecksumCache(attached_conn_factory(job_db, checksum_db), UidPathUtil(), **kwargs), checksum_db
+
+
+def cached_row(checksum_db, rel_path):
+    with sqlite3.connect(checksum_db) as conn:
+        row = conn.execute("SELECT inherited_from, is_valid FROM checksum_cache WHERE relative_path=?", (rel_path,)).fetchone()
+    conn.close()
+    return row
+
+
+@pytest.mark.parametrize('version', [1, 2])
+def test_renamed_file_inherits_checksum(tmp_path, monkeypatch, version):
+    src = tmp_path / f"old{version}" / "a.bin"
+    src.parent.mkdir()
+    src.write_bytes(b"content" * 1000)
+    cache, checksum_db = make_cache(tmp_path, version)
+    checksum = cache.get_or_compute_with_invalidation(str(src))
+    old_rel = str(cache.uid_path.convert_path(str(src)).relative_path)
+
+    moved = tmp_path / f"new{version}" / "b.bin"
+    moved.parent.mkdir()
+    os.rename(src, moved)
+    new_rel = str(cache.uid_path.convert_path(str(moved)).relative_path)
+    monkeypatch.setattr(checksum_cache_module, 'compute_hash', no_reads)
+    monkeypatch.setattr(checksum_cache_module, 'hash_file_with_chunks', no_reads)
+    assert cache.get_or_compute_with_invalidation(str(moved)) == checksum
+    assert cached_row(checksum_db, new_rel) == (old_rel, 1)
+    with sqlite3.connect(checksum_db) as conn:
+        plan = ' '.join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + CHECKSUM_CACHE_RENAMED_SQL, ('u', 1, 1, 1, 'sha256', 'x')))
+    conn.close()
+    assert 'idx_checksum_cache_inode' in plan
+
+    # Re-verification rehashes the inherited row; a wrong checksum is replaced
+    monkeypatch.setattr(checksum_cache_module, 'compute_hash', compute_hash)
+    assert cache.verify_inherited() == {'verified': 1, 'mismatched': 0, 'stale': 0}
+    assert cached_row(checksum_db, new_rel) == (None, 1)
+    with sqlite3.connect(checksum_db) as conn:
+        conn.execute("UPDATE checksum_cache SET checksum=?, inherited_from='x' WHERE relative_path=?",
+                     (bytes(32) if version == 2 else '0' * 64, new_rel))
+    conn.close()
+    assert cache.verify_inherited() == {'verified': 0, 'mismatched': 1, 'stale': 0}
+    assert cache.get(str(moved)) == checksum
+
+
+def test_renamed_file_is_hashed_without_inheritance(tmp_path):
+    src = tmp_path / "a.bin"
+    src.write_bytes(b"abc")
+    cache, checksum_db = make_cache(tmp_path, 1, inherit_renamed=False)
+    checksum = cache.get_or_compute_with_invalidation(str(src))
+    moved = tmp_path / "b.bin"
+    os.rename(src, moved)
+    assert cache.get_or_compute_with_invalidation(str(moved)) == checksum
+    assert cached_row(checksum_db, str(cache.uid_path.convert_path(str(moved)).relative_path)) == (None, 1)
+
+
+def test_ensure_checksums_inherits_renamed_files(tmp_path, monkeypatch):
+    cache, checksum_db = make_cache(tmp_path, 2)
+    files = []
+    for i in range(3):
+        path = tmp_path / f"f{i}.bin"
+        path.write_bytes(f"content {i}".encode())
+        uid_path = cache.uid_path.convert_path(str(path))
+        files.append((uid_path.uid, uid_path.relative_path, str(path)))
+    checksums = hash_executor.ensure_checksums(cache.conn_factory, files)
+    assert len(checksums) == 3
+
+    renamed = []
+    for uid, rel_path, path in files:
+        new_path = path.replace('.bin', '.moved')
+        os.rename(path, new_path)
+        uid_path = cache.uid_path.convert_path(new_path)
+        renamed.append((uid_path.uid, uid_path.relative_path, new_path))
+    monkeypatch.setattr(hash_executor, 'iter_hashed_batches', no_reads)
+    moved = hash_executor.ensure_checksums(cache.conn_factory, renamed)
+    assert sorted(moved.values()) == sorted(checksums.values())
+    assert cached_row(checksum_db, str(renamed[0][1]))[0] == str(files[0][1])
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import sqlite3
+from dedup_file_tools_commons.db import (init_checksum_db, migrate_checksum_db, checksum_schema_version, read_checksum_cache_rows,
+                                         CHECKSUM_SCHEMA_VERSION)
+from dedup_file_tools_commons.utils.checksum_cache import ChecksumCache
+from dedup_file_tools_commons.utils.db_utils import attached_conn_factory
+from dedup_file_tools_commons.utils.uidpath import UidPathUtil
+
+INSERT_SQL = ("INSERT OR REPLACE INTO checksum_cache (uid, relative_path, size, last_modified, checksum, imported_at, last_validated, is_valid, algorithm) "
+              "VALUES ('u', ?, 1, 1, ?, 0, 0, ?, 'sha256')")
+
+
+def digest(i):
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+
+def test_migration_keeps_rows_written_meanwhile(tmp_path):
+    db_path = str(tmp_path / 'checksum-cache.db')
+    init_checksum_db(db_path)
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(INSERT_SQL, [(f"f{i}", digest(i), 1) for i in range(250)] + [('stale', digest('stale'), 0), ('not-hex', 'dummy', 1)])
+    conn.close()
+
+    class WriteBetweenBatches:
+        # Another process writing while the rows are being copied
+        def __init__(self):
+            self.batches = 0
+
+        def update(self, n):
+            self.batches += 1
+            with sqlite3.connect(db_path) as other:
+                other.execute(INSERT_SQL, (f"f{self.batches}", digest('changed'), 1))
+                other.execute(INSERT_SQL, (f"new{self.batches}", digest('new'), 1))
+                other.execute("DELETE FROM checksum_cache WHERE relative_path='f200'")
+            other.close()
+
+    progress = WriteBetweenBatches()
+    # f200 is deleted before its batch is copied
+    assert migrate_checksum_db(db_path, batch_size=100, progress=progress) == 251
+    assert progress.batches == 3
+    conn = sqlite3.connect(db_path)
+    assert checksum_schema_version(conn) == CHECKSUM_SCHEMA_VERSION
+    table_sql = conn.execute("SELECT sql FROM sqlite_master WHERE name='checksum_cache'").fetchone()[0]
+    assert 'WITHOUT ROWID' in table_sql
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='checksum_cache'")}
+    assert indexes == {'idx_checksum_cache_valid_checksum', 'idx_checksum_cache_valid_size', 'idx_checksum_cache_inode'}
+    rows = dict(conn.execute("SELECT relative_path, checksum FROM checksum_cache"))
+    assert rows['f0'] == bytes.fromhex(digest(0))
+    assert rows['f1'] == rows['f3'] == bytes.fromhex(digest('changed'))
+    assert rows['new3'] == bytes.fromhex(digest('new'))
+    assert 'f200' not in rows
+    assert rows['not-hex'] == 'dummy'
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT 1 FROM checksum_cache WHERE checksum=? AND is_valid=1", (rows['f0'],)).fetchall()
+    assert 'idx_checksum_cache_valid_checksum' in plan[0][-1]
+    # Rows read for an import are hex again
+    assert {row[4] for row in read_checksum_cache_rows(conn) if row[1] == 'f0'} == {digest(0)}
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name LIKE 'checksum_cache_%'").fetchone()[0] == 0
+    conn.close()
+    # Already migrated
+    assert migrate_checksum_db(db_path) == 0
+
+
+def test_checksum_cache_on_v1_and_v2(tmp_path):
+    files = []
+    for i in range(3):
+        path = tmp_path / f"file{i}.txt"
+        path.write_text(f"content {i}")
+        files.append(str(path))
+    for version in (1, 2):
+        job_db = str(tmp_path / f"job{version}.db")
+        checksum_db = str(tmp_path / f"checksum{version}.db")
+        init_checksum_db(checksum_db, version=version)
+        with sqlite3.connect(job_db) as conn:
+            conn.execute("CREATE TABLE destination_pool_files (uid TEXT, relative_path TEXT, size INTEGER, last_modified INTEGER, last_seen INTEGER)")
+        conn.close()
+        uid_path = UidPathUtil()
+        cache = ChecksumCache(attached_conn_factory(job_db, checksum_db), uid_path)
+        checksums = {path: cache.get_or_compute_with_invalidation(path) for path in files}
+        cache.lru.clear()
+        assert cache.get_many(files) == checksums
+        assert cache.validate_many(files) == checksums
+        assert cache.exists(checksums[files[0]])
+        pool = uid_path.convert_path(files[1])
+        stat = os.stat(files[1])
+        with sqlite3.connect(job_db) as conn:
+            conn.execute("INSERT INTO destination_pool_files VALUES (?, ?, ?, ?, 0)",
+                         (pool.uid, str(pool.relative_path), stat.st_size, int(stat.st_mtime)))
+        conn.close()
+        assert checksums[files[1]] in cache.destination_pool_checksums()
+        assert cache.exists_at_destination_pool(checksums[files[1]])
+        with sqlite3.connect(checksum_db) as conn:
+            stored = conn.execute("SELECT typeof(checksum) FROM checksum_cache").fetchone()[0]
+        conn.close()
+        assert stored == ('text' if version == 1 else 'blob')
+
+
+def test_pooled_connection_follows_online_migration(tmp_path):
+    from dedup_file_tools_commons.db import upsert_checksums, checksum_param
+    from dedup_file_tools_commons.utils.db_utils import close_pooled_connections
+    job_db = str(tmp_path / "job.db")
+    checksum_db = str(tmp_path / "checksum.db")
+    sqlite3.connect(job_db).close()
+    conn_factory = attached_conn_factory(job_db, checksum_db)
+
+    def upsert(name, checksum):
+        with conn_factory() as conn:
+            upsert_checksums(conn, [('u', name, 1, 1, checksum, 0, 0, 'sha256', None)])
+
+    upsert('a', digest('a'))
+    assert migrate_checksum_db(checksum_db, vacuum=False) == 1
+    # Written through the connection that was pooled before the migration
+    upsert('b', digest('b'))
+    conn = conn_factory()
+    assert conn.execute("SELECT relative_path, typeof(checksum) FROM checksumdb.checksum_cache ORDER BY relative_path").fetchall() == \
+        [('a', 'blob'), ('b', 'blob')]
+    assert conn.execute("SELECT COUNT(*) FROM checksumdb.checksum_cache WHERE checksum=?",
+                        (checksum_param(conn, digest('b')),)).fetchone() == (1,)
+    close_pooled_connections()
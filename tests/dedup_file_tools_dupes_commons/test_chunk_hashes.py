@@ -0,0 +1,52 @@
+import hashlib
+import sqlite3
+from dedup_file_tools_commons.utils.chunk_hashes import hash_file_with_chunks, diff_chunk_regions, load_chunks
+from dedup_file_tools_commons.utils.hash_executor import ensure_checksums
+from dedup_file_tools_commons.utils.fileops import compute_hash, compute_hash_with_chunks
+from dedup_file_tools_commons.db import init_checksum_db
+
+CHUNK = 1024
+
+def setup_db(tmp_path):
+    db_path = str(tmp_path / "checksum.db")
+    init_checksum_db(db_path)
+    return lambda: sqlite3.connect(db_path)
+
+def test_chunk_digests_computed_in_same_pass(tmp_path):
+    path = tmp_path / "big.bin"
+    data = bytes(range(256)) * 10  # 2560 bytes -> chunks of 1024, 1024, 512
+    path.write_bytes(data)
+    checksum, chunks = compute_hash_with_chunks(str(path), 'sha256', CHUNK)
+    assert checksum == hashlib.sha256(data).hexdigest()
+    assert chunks == [hashlib.sha256(data[i:i + CHUNK]).hexdigest() for i in range(0, len(data), CHUNK)]
+
+def test_resume_keeps_recorded_chunks(tmp_path):
+    conn_factory = setup_db(tmp_path)
+    path = tmp_path / "big.bin"
+    path.write_bytes(b"a" * 3000)
+    checksum, size, _ = hash_file_with_chunks(conn_factory, 'u', 'big.bin', str(path), chunk_size=CHUNK)
+    assert checksum == compute_hash(path) and size == 3000
+    # Simulate an interrupted run: only the first chunk made it to the DB
+    with conn_factory() as conn:
+        conn.execute("DELETE FROM checksum_chunks WHERE chunk_index > 0")
+        conn.execute("UPDATE checksum_chunks SET digest='kept'")
+        conn.commit()
+    assert hash_file_with_chunks(conn_factory, 'u', 'big.bin', str(path), chunk_size=CHUNK)[0] == checksum
+    with conn_factory() as conn:
+        rows = load_chunks(conn, 'u', 'big.bin')
+    assert [r[0] for r in rows] == [0, 1, 2]
+    assert rows[0][3] == 'kept'  # recorded chunk was not rehashed
+    assert [r[2] for r in rows] == [1024, 1024, 952]
+
+def test_diff_reports_changed_region(tmp_path):
+    conn_factory = setup_db(tmp_path)
+    path = tmp_path / "big.bin"
+    path.write_bytes(b"x" * 3000)
+    result = ensure_checksums(conn_factory, [('u', 'big.bin', str(path))], chunk_size=CHUNK)
+    assert result[('u', 'big.bin')] == compute_hash(path)
+    assert diff_chunk_regions(conn_factory, 'u', 'big.bin', str(path)) == []
+    data = bytearray(path.read_bytes())
+    data[1500] = ord('y')
+    path.write_bytes(bytes(data))
+    assert diff_chunk_regions(conn_factory, 'u', 'big.bin', str(path)) == [(1024, 1024)]
+    assert diff_chunk_regions(conn_factory, 'u', 'other.bin', str(path)) is None
@@ -0,0 +1,82 @@
+import os
+import sqlite3
+import threading
+import pytest
+from dedup_file_tools_commons.utils import db_utils
+from dedup_file_tools_commons.utils.db_utils import (
+    pooled_attached_connection, attached_conn_factory, close_pooled_connections, ensure_checksum_db, transaction
+)
+from dedup_file_tools_commons.utils.checksum_cache import ChecksumCache
+from dedup_file_tools_commons.utils.uidpath import UidPathUtil
+
+def test_pooled_connection_reused_per_thread_and_replaced(tmp_path):
+    main_db = str(tmp_path / "job.db")
+    checksum_db = str(tmp_path / "checksum.db")
+    sqlite3.connect(main_db).close()
+    conn = pooled_attached_connection(main_db, checksum_db)
+    assert pooled_attached_connection(main_db, checksum_db) is conn
+    other = []
+    t = threading.Thread(target=lambda: other.append(pooled_attached_connection(main_db, checksum_db)))
+    t.start()
+    t.join()
+    assert other[0] is not conn
+    conn.close()
+    conn2 = pooled_attached_connection(main_db, checksum_db)
+    assert conn2 is not conn
+    conn2.execute("SELECT COUNT(*) FROM checksumdb.checksum_cache").fetchone()
+    # A recreated checksum DB gets a fresh connection (and schema)
+    close_pooled_connections()
+    os.remove(checksum_db)
+    conn3 = pooled_attached_connection(main_db, checksum_db)
+    assert conn3.execute("SELECT COUNT(*) FROM checksumdb.checksum_cache").fetchone() == (0,)
+    close_pooled_connections()
+
+def test_schema_checked_once(tmp_path, monkeypatch):
+    calls = []
+    real_init = db_utils.init_checksum_db
+    monkeypatch.setattr(db_utils, 'init_checksum_db', lambda path: (calls.append(path), real_init(path)))
+    checksum_db = str(tmp_path / "checksum.db")
+    for _ in range(3):
+        ensure_checksum_db(checksum_db)
+    assert len(calls) == 1
+
+def test_transaction_rolls_back_and_batches_writes(tmp_path):
+    main_db = str(tmp_path / "job.db")
+    checksum_db = str(tmp_path / "checksum.db")
+    sqlite3.connect(main_db).close()
+    conn_factory = attached_conn_factory(main_db, checksum_db)
+    conn = conn_factory()
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    with pytest.raises(RuntimeError):
+        with transaction(conn):
+            conn.execute("INSERT INTO t VALUES (1)")
+            raise RuntimeError
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone() == (0,)
+    f = tmp_path / "a.txt"
+    f.write_text("abc")
+    cache = ChecksumCache(conn_factory, UidPathUtil())
+    st = f.stat()
+    cache.put_many([(f, st.st_size, int(st.st_mtime), "deadbeef")])
+    assert not conn.in_transaction
+    assert cache.get(f) == "deadbeef"
+    close_pooled_connections()
+
+def test_pooled_connection_remembers_checksum_schema(tmp_path):
+    main_db = str(tmp_path / "job.db")
+    checksum_db = str(tmp_path / "checksum.db")
+    sqlite3.connect(main_db).close()
+    conn_factory = attached_conn_factory(main_db, checksum_db)
+    conn = conn_factory()
+    assert conn.checksum_schema == (1, True)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    f = tmp_path / "a.txt"
+    f.write_text("abc")
+    cache = ChecksumCache(conn_factory, UidPathUtil())
+    st = f.stat()
+    cache.put_many([(f, st.st_size, int(st.st_mtime), "deadbeef")])
+    assert cache.get(f) == "deadbeef"
+    conn.set_trace_callback(None)
+    assert statements
+    assert not [s for s in statements if 'checksum_schema_version' in s or 'table_info' in s]
+    close_pooled_connections()
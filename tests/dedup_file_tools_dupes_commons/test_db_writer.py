@@ -0,0 +1,75 @@
+import sqlite3
+import threading
+import pytest
+from dedup_file_tools_commons.utils.db_writer import DBWriter, DBWriterError
+from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
+
+def make_db(tmp_path):
+    db_path = str(tmp_path / "job.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE status (id INTEGER PRIMARY KEY, value TEXT NOT NULL)")
+    return db_path
+
+def count(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM status").fetchone()[0]
+
+def test_group_commit_from_many_threads_and_flush(tmp_path):
+    db_path = make_db(tmp_path)
+    with DBWriter(db_path, batch_size=50, max_delay=0.5) as writer:
+        def work(start):
+            for i in range(start, start + 100):
+                writer.submit("INSERT INTO status (id, value) VALUES (?, ?)", (i, 'done'))
+        threads = [threading.Thread(target=work, args=(n * 100,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert writer.flush(timeout=10)
+        assert count(db_path) == 400
+        assert writer.batches < 400
+    assert writer.committed == 400 and writer.failed == 0
+
+def test_failed_intent_is_isolated_and_groups_are_atomic(tmp_path):
+    db_path = make_db(tmp_path)
+    with DBWriter(db_path) as writer:
+        writer.submit("INSERT INTO status (id, value) VALUES (?, ?)", (1, 'a'))
+        writer.submit_group([
+            ("INSERT INTO status (id, value) VALUES (?, ?)", (2, 'b')),
+            ("INSERT INTO status (id, value) VALUES (?, ?)", (3, None)),  # NOT NULL violation
+        ])
+        writer.submit_many("INSERT INTO status (id, value) VALUES (?, ?)", [(4, 'c'), (5, 'd')])
+    with sqlite3.connect(db_path) as conn:
+        assert [r[0] for r in conn.execute("SELECT id FROM status ORDER BY id")] == [1, 4, 5]
+    assert writer.failed == 1
+    with pytest.raises(RuntimeError):
+        writer.submit("DELETE FROM status")
+
+def test_writer_error_is_raised_instead_of_hanging(tmp_path):
+    db_path = make_db(tmp_path)
+    writer = DBWriter(db_path).start()
+    writer.submit("INSERT INTO status (id, value) VALUES (?, ?)", (1, 'a'))
+    # Ends the writer's transaction from inside an intent: releasing the intent's savepoint then fails
+    writer.submit("ROLLBACK")
+    with pytest.raises(DBWriterError):
+        writer.flush(timeout=10)
+    with pytest.raises(DBWriterError):
+        writer.submit("INSERT INTO status (id, value) VALUES (?, ?)", (2, 'b'))
+    with pytest.raises(DBWriterError):
+        writer.flush()
+    with pytest.raises(DBWriterError):
+        writer.close()
+    assert count(db_path) == 0
+
+def test_execute_retries_on_lock(tmp_path):
+    db_path = make_db(tmp_path)
+    conn = RobustSqliteConn(db_path, timeout=0.01, retry_delay=0.05).connect()
+    blocker = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+    blocker.execute("BEGIN IMMEDIATE")
+    timer = threading.Timer(0.1, blocker.rollback)
+    timer.start()
+    conn.execute("INSERT INTO status (id, value) VALUES (1, 'x')")
+    timer.join()
+    assert count(db_path) == 1
+    blocker.close()
+    conn.close()
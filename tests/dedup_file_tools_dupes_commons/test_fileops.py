@@ -1,4 +1,5 @@
-from dedup_file_tools_commons.utils.fileops import copy_file, verify_file
+import hashlib
+from dedup_file_tools_commons.utils.fileops import copy_file, verify_file, compute_hash, adaptive_block_size, MIN_BLOCK_SIZE, MAX_BLOCK_SIZE
 
 def test_copy_file(tmp_path):
     src = tmp_path / "source.txt"
@@ -10,3 +11,119 @@ def test_copy_file(tmp_path):
     assert dst.read_text() == content
     assert src_checksum == dst_checksum
     assert verify_file(str(src), str(dst))
+
+def test_adaptive_block_size():
+    assert adaptive_block_size(0) == 1
+    assert adaptive_block_size(100) == 101
+    assert adaptive_block_size(10 * MIN_BLOCK_SIZE) == MIN_BLOCK_SIZE
+    assert adaptive_block_size(10 ** 12) == MAX_BLOCK_SIZE
+    assert adaptive_block_size(10 ** 12, block_size=4096) == 4096
+
+def test_block_size_does_not_change_results(tmp_path):
+    src = tmp_path / "source.bin"
+    data = bytes(range(256)) * 5000
+    src.write_bytes(data)
+    expected = hashlib.sha256(data).hexdigest()
+    assert compute_hash(src) == compute_hash(src, block_size=4096) == compute_hash(src, block_size=1000) == expected
+    assert copy_file(str(src), str(tmp_path / "a.bin"), block_size=777) == (expected, expected)
+    assert (tmp_path / "a.bin").read_bytes() == data
+    empty = tmp_path / "empty.bin"
+    empty.write_bytes(b"")
+    assert copy_file(str(empty), str(tmp_path / "b.bin"))[0] == hashlib.sha256(b"").hexdigest()
+
+def test_mmap_path_matches_buffered_path(tmp_path):
+    src = tmp_path / "big.bin"
+    data = bytes(range(256)) * 9000
+    src.write_bytes(data)
+    expected = hashlib.sha256(data).hexdigest()
+    assert compute_hash(src, mmap_threshold=0, block_size=100000) == expected
+    assert compute_hash(src, mmap_threshold=None) == expected
+    empty = tmp_path / "empty.bin"
+    empty.write_bytes(b"")
+    assert compute_hash(empty, mmap_threshold=0) == hashlib.sha256(b"").hexdigest()
+
+def test_special_files_fall_back_to_buffered_reads(tmp_path):
+    import os
+    import pytest
+    if not os.path.exists(os.devnull) or os.name == 'nt':
+        pytest.skip("no character device available")
+    assert compute_hash(os.devnull, mmap_threshold=0) == hashlib.sha256(b"").hexdigest()
+
+def test_pipelined_copy_matches_buffered_copy(tmp_path):
+    import os
+    src = tmp_path / "source.bin"
+    data = os.urandom(300000)
+    src.write_bytes(data)
+    os.utime(src, (1000000000, 1000000000))
+    expected = hashlib.sha256(data).hexdigest()
+    progress = []
+    result = copy_file(str(src), str(tmp_path / "p.bin"), block_size=4096, backend='pipelined',
+                       progress_callback=lambda percent, copied, total: progress.append(copied))
+    assert result == copy_file(str(src), str(tmp_path / "b.bin"), block_size=4096, backend='buffered') == (expected, expected)
+    assert (tmp_path / "p.bin").read_bytes() == data
+    assert int((tmp_path / "p.bin").stat().st_mtime) == 1000000000
+    assert progress == sorted(progress) and progress[-1] == len(data)
+
+def test_pipelined_copy_propagates_consumer_errors(tmp_path, monkeypatch):
+    import pytest
+    from dedup_file_tools_commons.utils import fileops
+    src = tmp_path / "source.bin"
+    src.write_bytes(b"x" * 100000)
+    def failing_update(self, block):
+        raise OSError("disk full")
+    class FailingHasher:
+        update = failing_update
+    monkeypatch.setattr(fileops, "new_hasher", lambda algorithm: FailingHasher())
+    with pytest.raises(OSError, match="disk full"):
+        copy_file(str(src), str(tmp_path / "dst.bin"), block_size=1000, backend='pipelined')
+    with pytest.raises(ValueError):
+        copy_file(str(src), str(tmp_path / "dst.bin"), backend='parallel')
+
+def test_kernel_copy_backend(tmp_path, monkeypatch):
+    import os
+    from dedup_file_tools_commons.utils import fileops
+    from dedup_file_tools_commons.utils.fileops import copy_file_with_method, KERNEL_COPY_METHODS
+    src = tmp_path / "source.bin"
+    data = os.urandom(200000)
+    src.write_bytes(data)
+    expected = hashlib.sha256(data).hexdigest()
+    # Without a known source checksum the destination is read back and hashed
+    src_checksum, dst_checksum, method = copy_file_with_method(str(src), str(tmp_path / "k.bin"), backend='kernel')
+    assert (src_checksum, dst_checksum) == (expected, expected)
+    assert (tmp_path / "k.bin").read_bytes() == data
+    assert method in KERNEL_COPY_METHODS + ('buffered',)
+    # The kernel backend trusts a known source checksum unless read_back is set
+    if method in KERNEL_COPY_METHODS:
+        assert copy_file_with_method(str(src), str(tmp_path / "t.bin"), backend='kernel', expected_checksum="cached")[:2] == ("cached", "cached")
+        assert copy_file_with_method(str(src), str(tmp_path / "r.bin"), backend='kernel', expected_checksum="cached", read_back=True)[:2] == ("cached", expected)
+        # auto copies kernel-side only when it reads the destination back, so it never returns an unmeasured checksum
+        assert copy_file_with_method(str(src), str(tmp_path / "a.bin"), expected_checksum="cached") == (expected, expected, 'buffered')
+        assert copy_file_with_method(str(src), str(tmp_path / "ar.bin"), expected_checksum="cached", read_back=True) == ("cached", expected, method)
+    # Unsupported kernel methods fall back to the streaming copy
+    monkeypatch.setattr(fileops, "_kernel_copy", lambda fsrc, fdst, method, size: False)
+    assert copy_file_with_method(str(src), str(tmp_path / "f.bin"), backend='kernel', expected_checksum="cached") == (expected, expected, 'buffered')
+    assert (tmp_path / "f.bin").read_bytes() == data
+
+def test_cache_policies_match_default_results(tmp_path, monkeypatch):
+    import os
+    import pytest
+    from dedup_file_tools_commons.utils.fileops import CACHE_POLICIES, compute_hash_with_chunks
+    src = tmp_path / "source.bin"
+    data = os.urandom(3 * 4096 + 123)
+    src.write_bytes(data)
+    expected = hashlib.sha256(data).hexdigest()
+    advice = []
+    if hasattr(os, 'posix_fadvise'):
+        real_fadvise = os.posix_fadvise
+        monkeypatch.setattr(os, "posix_fadvise", lambda fd, offset, length, kind: advice.append(kind) or real_fadvise(fd, offset, length, kind))
+    for policy in CACHE_POLICIES:
+        assert compute_hash(str(src), block_size=4096, mmap_threshold=1, cache_policy=policy) == expected
+        assert compute_hash_with_chunks(str(src), chunk_size=8192, cache_policy=policy)[0] == expected
+        for backend in ('buffered', 'pipelined', 'kernel'):
+            dst = tmp_path / f"{policy}-{backend}.bin"
+            assert copy_file(str(src), str(dst), block_size=4096, backend=backend, cache_policy=policy) == (expected, expected)
+            assert dst.read_bytes() == data
+    if hasattr(os, 'posix_fadvise'):
+        assert os.POSIX_FADV_SEQUENTIAL in advice and os.POSIX_FADV_DONTNEED in advice
+    with pytest.raises(ValueError):
+        compute_hash(str(src), cache_policy='nocache')
@@ -0,0 +1,70 @@
+import os
+import sqlite3
+from dedup_file_tools_commons.utils.fileops import compute_fingerprint, compute_hash, FINGERPRINT_MIN_SIZE
+from dedup_file_tools_commons.utils.checksum_cache import ChecksumCache
+from dedup_file_tools_commons.utils.uidpath import UidPathUtil
+from dedup_file_tools_commons.db import init_checksum_db
+
+SIZE = FINGERPRINT_MIN_SIZE * 2
+
+def make_cache(tmp_path):
+    db_path = str(tmp_path / "checksum.db")
+    init_checksum_db(db_path)
+    def conn_factory():
+        conn = sqlite3.connect(db_path)
+        conn.execute(f"ATTACH DATABASE '{db_path}' AS checksumdb")
+        return conn
+    return db_path, ChecksumCache(conn_factory, UidPathUtil())
+
+def test_fingerprint_samples_head_middle_tail(tmp_path):
+    small = tmp_path / "small.bin"
+    small.write_bytes(b"x" * 100)
+    assert compute_fingerprint(small) is None
+    a = tmp_path / "a.bin"
+    b = tmp_path / "b.bin"
+    c = tmp_path / "c.bin"
+    a.write_bytes(b"\0" * SIZE)
+    b.write_bytes(b"\0" * SIZE)
+    middle_changed = bytearray(SIZE)
+    middle_changed[SIZE // 2] = 1
+    c.write_bytes(bytes(middle_changed))
+    assert compute_fingerprint(a) == compute_fingerprint(b)
+    assert compute_fingerprint(a).startswith(f"{SIZE}:")
+    assert compute_fingerprint(a) != compute_fingerprint(c)
+
+def test_fingerprint_cache_keeps_and_drops_checksum(tmp_path):
+    db_path, cache = make_cache(tmp_path)
+    file_path = tmp_path / "big.bin"
+    file_path.write_bytes(os.urandom(SIZE))
+    checksum = cache.get_or_compute_with_invalidation(str(file_path))
+    assert checksum == compute_hash(file_path)
+    with sqlite3.connect(db_path) as conn:
+        stored = conn.execute("SELECT fingerprint FROM checksum_cache").fetchone()[0]
+    # The full hash pass stores the fingerprint too
+    assert stored == compute_fingerprint(file_path)
+    assert cache.get_or_compute_fingerprint(str(file_path)) == stored
+    # File changes: the new fingerprint replaces the row and the stale full checksum is dropped
+    file_path.write_bytes(os.urandom(SIZE + 1))
+    fingerprint = cache.get_or_compute_fingerprint(str(file_path))
+    assert fingerprint.startswith(f"{SIZE + 1}:")
+    with sqlite3.connect(db_path) as conn:
+        row = conn.execute("SELECT checksum, fingerprint, size FROM checksum_cache").fetchone()
+    assert row == (None, fingerprint, SIZE + 1)
+    assert cache.get_or_compute_with_invalidation(str(file_path)) == compute_hash(file_path)
+
+def test_may_exist_at_destination_ignores_fingerprints_of_other_algorithms(tmp_path):
+    db_path, cache = make_cache(tmp_path)
+    pool_file = tmp_path / "pool.bin"
+    pool_file.write_bytes(os.urandom(SIZE))
+    with sqlite3.connect(db_path) as conn:
+        for table in ('destination_pool_files', 'destination_files'):
+            conn.execute(f"CREATE TABLE {table} (uid TEXT, relative_path TEXT, size INTEGER, last_modified INTEGER)")
+        conn.execute("INSERT INTO destination_pool_files VALUES ('u', 'pool.bin', ?, 0)", (SIZE,))
+        conn.execute("INSERT INTO checksum_cache (uid, relative_path, size, last_modified, checksum, is_valid, algorithm, fingerprint) "
+                     "VALUES ('u', 'pool.bin', ?, 0, 'x', 1, 'blake2b', ?)", (SIZE, compute_fingerprint(pool_file, 'blake2b')))
+    conn.close()
+    # Same content, but the pool row was fingerprinted with another algorithm: only a full hash can tell
+    assert cache.may_exist_at_destination(SIZE, compute_fingerprint(pool_file))
+    blake2b_cache = ChecksumCache(cache.conn_factory, UidPathUtil(), algorithm='blake2b')
+    assert blake2b_cache.may_exist_at_destination(SIZE, compute_fingerprint(pool_file, 'blake2b'))
+    assert not blake2b_cache.may_exist_at_destination(SIZE, f"{SIZE}:other")
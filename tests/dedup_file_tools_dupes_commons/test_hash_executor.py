@@ -0,0 +1,62 @@
+import sqlite3
+import pytest
+from dedup_file_tools_commons.utils.hash_executor import ensure_checksums, iter_hashed_batches, hash_batch
+from dedup_file_tools_commons.utils.fileops import compute_hash
+from dedup_file_tools_commons.db import init_checksum_db
+
+def make_files(tmp_path, count):
+    files = []
+    for i in range(count):
+        path = tmp_path / f"f{i}.txt"
+        path.write_text(f"content {i}")
+        files.append(("uid", f"f{i}.txt", str(path)))
+    return files
+
+@pytest.mark.parametrize("executor", ['thread', 'process'])
+def test_ensure_checksums_bulk_writes_cache(tmp_path, executor):
+    db_path = str(tmp_path / "checksum.db")
+    init_checksum_db(db_path)
+    files = make_files(tmp_path, 10)
+    result = ensure_checksums(lambda: sqlite3.connect(db_path), files, executor=executor, workers=2, batch_size=3)
+    assert result == {(uid, rel): compute_hash(path) for uid, rel, path in files}
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT relative_path, checksum, algorithm, is_valid FROM checksum_cache").fetchall()
+    assert len(rows) == 10 and all(r[2] == 'sha256' and r[3] == 1 for r in rows)
+
+def test_ensure_checksums_reuses_valid_rows(tmp_path):
+    db_path = str(tmp_path / "checksum.db")
+    init_checksum_db(db_path)
+    files = make_files(tmp_path, 2)
+    ensure_checksums(lambda: sqlite3.connect(db_path), files)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE checksum_cache SET checksum='cached' WHERE relative_path='f0.txt'")
+    # Unchanged file: served from the cache, not rehashed
+    assert ensure_checksums(lambda: sqlite3.connect(db_path), files)[("uid", "f0.txt")] == 'cached'
+    # Different algorithm: rehashed
+    result = ensure_checksums(lambda: sqlite3.connect(db_path), files, algorithm='blake2b')
+    assert result[("uid", "f0.txt")] == compute_hash(files[0][2], 'blake2b')
+
+def test_hash_batch_reports_errors(tmp_path):
+    results = hash_batch([str(tmp_path / "missing.txt")])
+    assert results[0][3] is None and results[0][5]
+    with pytest.raises(ValueError):
+        list(iter_hashed_batches([str(tmp_path)], executor='fibers'))
+
+def test_ensure_checksums_hashes_hardlinked_inode_once(tmp_path, monkeypatch):
+    from dedup_file_tools_commons.utils import hash_executor
+    db_path = str(tmp_path / "checksum.db")
+    init_checksum_db(db_path)
+    files = make_files(tmp_path, 2)
+    link = tmp_path / "f0-link.txt"
+    link.hardlink_to(files[0][2])
+    files.append(("uid", "f0-link.txt", str(link)))
+    hashed = []
+    def counting_hash(path, algorithm='sha256', **kwargs):
+        hashed.append(path)
+        return compute_hash(path, algorithm, **kwargs)
+    monkeypatch.setattr(hash_executor, "compute_hash", counting_hash)
+    result = ensure_checksums(lambda: sqlite3.connect(db_path), files)
+    assert len(hashed) == 2
+    assert result[("uid", "f0-link.txt")] == result[("uid", "f0.txt")] == compute_hash(files[0][2])
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM checksum_cache").fetchone()[0] == 3
@@ -0,0 +1,74 @@
+import hashlib
+import sqlite3
+import pytest
+from dedup_file_tools_commons.utils.hashing import new_hasher, validate_algorithm, available_algorithms
+from dedup_file_tools_commons.utils.fileops import compute_hash, compute_sha256, copy_file, verify_file
+from dedup_file_tools_commons.utils.checksum_cache import ChecksumCache
+from dedup_file_tools_commons.utils.uidpath import UidPathUtil
+from dedup_file_tools_commons.db import init_checksum_db, read_checksum_cache_rows
+
+def test_sha256_and_blake2b_match_hashlib(tmp_path):
+    file_path = tmp_path / "data.bin"
+    file_path.write_bytes(b"hash engine test" * 1000)
+    data = file_path.read_bytes()
+    assert compute_hash(file_path, 'sha256') == hashlib.sha256(data).hexdigest()
+    assert compute_sha256(file_path) == hashlib.sha256(data).hexdigest()
+    assert compute_hash(file_path, 'blake2b') == hashlib.blake2b(data).hexdigest()
+
+def test_unknown_algorithm_rejected():
+    with pytest.raises(ValueError):
+        new_hasher('md4')
+    assert validate_algorithm(None) == 'sha256'
+    assert 'sha256' in available_algorithms()
+
+@pytest.mark.parametrize("algorithm", ['blake3', 'xxh3', 'xxh128'])
+def test_optional_algorithms(tmp_path, algorithm):
+    if algorithm not in available_algorithms():
+        with pytest.raises(ValueError):
+            new_hasher(algorithm)
+        return
+    src = tmp_path / "src.bin"
+    dst = tmp_path / "dst.bin"
+    src.write_bytes(b"optional" * 5000)
+    src_checksum, dst_checksum = copy_file(str(src), str(dst), algorithm=algorithm)
+    assert src_checksum == dst_checksum == compute_hash(src, algorithm)
+    assert verify_file(str(src), str(dst), algorithm=algorithm)
+
+def test_cache_recomputes_on_algorithm_change(tmp_path):
+    db_path = str(tmp_path / "checksum.db")
+    init_checksum_db(db_path)
+    uid_path = UidPathUtil()
+    def conn_factory():
+        conn = sqlite3.connect(db_path)
+        conn.execute(f"ATTACH DATABASE '{db_path}' AS checksumdb")
+        return conn
+    file_path = tmp_path / "file.txt"
+    file_path.write_text("switch algorithms")
+    sha_cache = ChecksumCache(conn_factory, uid_path)
+    blake_cache = ChecksumCache(conn_factory, uid_path, 'blake2b')
+    assert sha_cache.get_or_compute_with_invalidation(str(file_path)) == compute_hash(file_path, 'sha256')
+    # A sha256 row must not be returned to a blake2b job
+    assert blake_cache.get(str(file_path)) is None
+    assert blake_cache.get_or_compute_with_invalidation(str(file_path)) == compute_hash(file_path, 'blake2b')
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT algorithm FROM checksum_cache").fetchone()[0] == 'blake2b'
+
+def test_legacy_checksum_db_is_migrated_and_importable(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE checksum_cache (
+            uid TEXT, relative_path TEXT, size INTEGER, last_modified INTEGER, checksum TEXT,
+            imported_at INTEGER, last_validated INTEGER, is_valid INTEGER DEFAULT 1,
+            PRIMARY KEY (uid, relative_path)
+        )
+    """)
+    conn.execute("INSERT INTO checksum_cache VALUES ('u', 'a.txt', 1, 2, 'abc', 0, 0, 1)")
+    conn.commit()
+    rows = read_checksum_cache_rows(conn)
+    conn.close()
+    assert rows == [('u', 'a.txt', 1, 2, 'abc', 0, 0, 1, 'sha256', None)]
+    init_checksum_db(db_path)
+    with sqlite3.connect(db_path) as conn:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(checksum_cache)")]
+        assert 'algorithm' in columns
@@ -0,0 +1,59 @@
+import os
+import threading
+import time
+import pytest
+from dedup_file_tools_commons.utils import io_scheduler
+from dedup_file_tools_commons.utils.io_scheduler import DeviceScheduler, group_by_device, device_of, is_rotational, order_by_location
+
+def run_tracked(scheduler, paths):
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+    def work():
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.02)
+        with lock:
+            active -= 1
+    with scheduler:
+        for f in [scheduler.submit(p, work) for p in paths]:
+            f.result()
+    return peak
+
+def test_group_by_device(tmp_path):
+    files = []
+    for i in range(3):
+        path = tmp_path / f"f{i}"
+        path.write_text("x")
+        files.append(str(path))
+    groups = group_by_device(files + [str(tmp_path / "missing")])
+    assert groups[os.stat(tmp_path).st_dev] == files
+    assert groups[None] == [str(tmp_path / "missing")]
+    assert not is_rotational(None)
+
+def test_rotational_device_limit(tmp_path, monkeypatch):
+    path = tmp_path / "f"
+    path.write_text("x")
+    paths = [str(path)] * 6
+    monkeypatch.setattr(io_scheduler, "is_rotational", lambda device: device == device_of(str(path)))
+    assert run_tracked(DeviceScheduler(workers=4), paths) == 1
+    monkeypatch.setattr(io_scheduler, "is_rotational", lambda device: False)
+    assert run_tracked(DeviceScheduler(workers=4), paths) > 1
+
+def test_order_by_location(tmp_path):
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"f{i}"
+        path.write_bytes(b"x" * 8192)
+        paths.append(str(path))
+    shuffled = list(reversed(paths)) + [str(tmp_path / "missing")]
+    assert order_by_location(shuffled, 'none') == shuffled
+    by_inode = order_by_location(shuffled, 'inode')
+    assert by_inode[:-1] == sorted(paths, key=lambda p: os.stat(p).st_ino)
+    assert by_inode[-1].endswith("missing")
+    # extent order falls back to the inode number where FIEMAP is unavailable
+    assert sorted(order_by_location(shuffled, 'extent')) == sorted(shuffled)
+    with pytest.raises(ValueError):
+        order_by_location(shuffled, 'random')
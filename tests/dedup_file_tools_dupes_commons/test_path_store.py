@@ -0,0 +1,103 @@
+import sqlite3
+from dedup_file_tools_commons.utils.path_store import PathStore, init_path_store, split_relative_path, uid_path_view_sql
+from dedup_file_tools_commons.utils.uidpath import UidPath
+
+
+def make_conn():
+    conn = sqlite3.connect(':memory:', isolation_level=None)
+    init_path_store(conn)
+    conn.execute("CREATE TABLE files (vol_id INTEGER, dir_id INTEGER, name TEXT, size INTEGER, PRIMARY KEY (vol_id, dir_id, name))")
+    return conn
+
+
+def test_intern_round_trip():
+    assert split_relative_path('a/b/c.txt') == ('a/b/', 'c.txt')
+    assert split_relative_path('c.txt') == ('', 'c.txt')
+    conn = make_conn()
+    store = PathStore()
+    keys = [('uuid-1', 'a/b/c.txt'), ('uuid-1', 'a/b/d.txt'), ('uuid-1', 'top.txt'), (1234, r'win\dir\e.txt'), ('uuid-2', 'a/b/c.txt')]
+    stored = store.intern_many(conn, keys)
+    assert stored[0][:2] == stored[1][:2]
+    assert stored[0][1] != stored[4][1]
+    conn.executemany("INSERT INTO files VALUES (?, ?, ?, 0)", stored)
+    # Every directory is stored once, with its parents up to the root of its volume
+    assert conn.execute("SELECT COUNT(*) FROM directories").fetchone()[0] == 9
+    parent = conn.execute("SELECT p.path FROM directories AS d JOIN directories AS p ON p.id = d.parent_id WHERE d.path=?",
+                          (r'win\dir' '\\',)).fetchone()[0]
+    assert parent == 'win\\'
+    for key, (uid, relative_path) in zip(stored, keys):
+        assert store.uid_path(conn, *key) == UidPath(uid, relative_path)
+        assert PathStore().uid_path(conn, *key) == UidPath(uid, relative_path)
+        assert store.lookup(conn, uid, relative_path) == key
+    assert store.lookup(conn, 'uuid-1', 'missing/x.txt') is None
+    conn.execute(uid_path_view_sql('files_by_path', 'files', ['size']))
+    assert sorted(conn.execute("SELECT uid, relative_path FROM files_by_path WHERE uid != 1234")) == sorted(
+        (uid, relative_path) for uid, relative_path in keys if uid != 1234)
+    assert conn.execute("SELECT typeof(uid) FROM files_by_path WHERE relative_path LIKE 'win%'").fetchone()[0] == 'integer'
+
+
+def test_subtree_condition_uses_index():
+    conn = make_conn()
+    store = PathStore()
+    keys = [('u', 'a/x.txt'), ('u', 'a/b/y.txt'), ('u', 'a/b/c/z.txt'), ('u', 'ab/w.txt'), ('u', 'b/v.txt'), ('other', 'a/b/y.txt')]
+    conn.executemany("INSERT INTO files VALUES (?, ?, ?, 0)", store.intern_many(conn, keys))
+
+    def names(dir_path):
+        sql, params = store.subtree_condition(conn, 'u', dir_path)
+        return sorted(row[0] for row in conn.execute(f"SELECT name FROM files WHERE {sql}", params))
+
+    assert names('a') == names('a/') == ['x.txt', 'y.txt', 'z.txt']
+    assert names('a/b') == ['y.txt', 'z.txt']
+    assert names('') == ['v.txt', 'w.txt', 'x.txt', 'y.txt', 'z.txt']
+    assert names('missing') == []
+    sql, params = store.subtree_condition(conn, 'u', 'a/b')
+    plan = ' '.join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN SELECT name FROM files WHERE {sql}", params))
+    assert 'path>? AND path<?' in plan
+
+
+def test_uid_path_match_sql_probes_view_by_key():
+    from dedup_file_tools_commons.utils.path_store import has_path_store_layout, uid_path_match_sql
+    conn = make_conn()
+    store = PathStore()
+    keys = [('u', 'a/b/c.txt'), ('u', 'top.txt'), (1234, r'win\dir\e.txt'), ('v', 'a/b/c.txt')]
+    conn.executemany("INSERT INTO files VALUES (?, ?, ?, 0)", store.intern_many(conn, keys))
+    conn.execute(uid_path_view_sql('files_by_path', 'files', ['size']))
+    conn.execute("CREATE TABLE wanted (uid, relative_path)")
+    conn.executemany("INSERT INTO wanted VALUES (?, ?)", keys[:3] + [('u', 'a/b/missing.txt'), ('u', 'a/c.txt')])
+    assert has_path_store_layout(conn, 'files_by_path') and not has_path_store_layout(conn, 'wanted')
+    query = f"""SELECT w.uid, w.relative_path FROM wanted AS w JOIN files_by_path AS f
+                ON f.uid = w.uid AND {uid_path_match_sql('f', 'w.uid', 'w.relative_path')}"""
+    assert sorted(conn.execute(query), key=str) == sorted(keys[:3], key=str)
+    plan = ' '.join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + query))
+    assert 'dir_id=? AND name=?' in plan
+    assert uid_path_match_sql('t', 'w.uid', 'w.relative_path', path_store_layout=False) == 't.relative_path = w.relative_path'
+
+
+def test_submit_group_creates_directories_on_the_writer(tmp_path):
+    import threading
+    from dedup_file_tools_commons.utils.db_writer import DBWriter
+    from dedup_file_tools_commons.utils.path_store import FILE_KEY_SQL, key_params
+    db_path = str(tmp_path / "store.db")
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    init_path_store(conn)
+    conn.execute("CREATE TABLE files (vol_id INTEGER NOT NULL, dir_id INTEGER NOT NULL, name TEXT, size INTEGER, PRIMARY KEY (dir_id, name))")
+    conn.execute(uid_path_view_sql('files_by_path', 'files', ['size']))
+    store = PathStore()
+    keys = [('uuid-1', f'a/d{i % 7}/sub/f{i}.txt') for i in range(200)] + [('uuid-2', 'top.txt'), ('uuid-1', 'a/b.txt')]
+    with DBWriter(db_path) as writer:
+        def work(part):
+            for uid, rel_path in part:
+                store.submit_group(writer, uid, rel_path,
+                                   [(f"INSERT INTO files (vol_id, dir_id, name, size) VALUES ({FILE_KEY_SQL}, ?)", key_params(uid, rel_path) + (1,))])
+        threads = [threading.Thread(target=work, args=(keys[n::4],)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert writer.failed == 0
+    assert sorted(conn.execute("SELECT uid, relative_path FROM files_by_path")) == sorted(keys)
+    # Each directory once, linked to its parent
+    assert conn.execute("SELECT COUNT(*) FROM directories").fetchone()[0] == 2 + 7 * 2 + 1
+    assert conn.execute("SELECT COUNT(*) FROM directories AS d LEFT JOIN directories AS p ON p.id = d.parent_id "
+                        "WHERE d.path != '' AND p.id IS NULL").fetchone() == (0,)
+    conn.close()
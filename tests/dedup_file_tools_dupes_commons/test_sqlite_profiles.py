@@ -0,0 +1,76 @@
+import os
+import sqlite3
+import pytest
+from dedup_file_tools_commons.utils.robust_sqlite import RobustSqliteConn
+from dedup_file_tools_commons.utils.sqlite_profiles import (
+    sqlite_phase, configure_profiles, profile_for_phase, current_profile, DEFAULT_PROFILE
+)
+
+@pytest.fixture(autouse=True)
+def reset_profiles():
+    yield
+    configure_profiles(None)
+
+def test_phase_profile_applies_and_checkpoints(tmp_path):
+    db_path = str(tmp_path / "job.db")
+    with sqlite_phase('analyze', [db_path], default='bulk') as profile:
+        assert profile == 'bulk' and current_profile() == 'bulk'
+        conn = RobustSqliteConn(db_path).connect()
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+        conn.execute("CREATE TABLE t (x)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(1000)])
+        # Still open at the phase end (like a pooled connection), so closing it does not checkpoint the WAL
+        assert os.path.getsize(db_path + '-wal') > 0
+    assert current_profile() == DEFAULT_PROFILE
+    assert os.path.getsize(db_path + '-wal') == 0  # truncated by the phase-end checkpoint
+    conn.close()
+    with RobustSqliteConn(db_path).connect() as conn:
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 2  # FULL
+
+def test_readonly_report_rejects_writes(tmp_path):
+    db_path = str(tmp_path / "job.db")
+    with RobustSqliteConn(db_path).connect() as conn:
+        conn.execute("CREATE TABLE t (x)")
+    with sqlite_phase('summary', [db_path], default='readonly-report'):
+        conn = RobustSqliteConn(db_path).connect()
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone() == (0,)
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO t VALUES (1)")
+        conn.close()
+
+def test_configured_profiles_override_phase_defaults():
+    configure_profiles({'analyze': 'safe', 'default': 'bulk'})
+    assert profile_for_phase('analyze', 'bulk') == 'safe'
+    assert profile_for_phase('copy') == 'bulk'
+    configure_profiles('readonly-report')
+    assert profile_for_phase('copy') == 'readonly-report'
+    with pytest.raises(ValueError):
+        configure_profiles('fast')
+
+def test_dupes_and_compare_handlers_run_in_phases(tmp_path):
+    from types import SimpleNamespace
+    from dedup_file_tools_dupes_move.handlers import handle_analyze, handle_summary
+    from dedup_file_tools_compare.handler import handle_add_to_pool
+    assert handle_analyze.__wrapped__ and handle_summary.__wrapped__ and handle_add_to_pool.__wrapped__
+    from dedup_file_tools_commons.utils.sqlite_profiles import job_phase, phase_handler
+    seen = []
+    db_path = str(tmp_path / "job.db")
+
+    @job_phase('analyze', 'bulk')
+    def by_job(job_dir, job_name, checksum_db=None):
+        seen.append(current_profile())
+        conn = RobustSqliteConn(db_path).connect()
+        conn.execute("CREATE TABLE t (x)")
+        return conn
+
+    @phase_handler('show-result', 'readonly-report')
+    def by_args(args, side):
+        seen.append((current_profile(), side))
+
+    conn = by_job(str(tmp_path), "job")
+    assert os.path.getsize(db_path + '-wal') == 0  # checkpointed at the phase end
+    conn.close()
+    by_args(SimpleNamespace(job_dir=str(tmp_path), job_name="job"), 'left')
+    assert seen == ['bulk', ('readonly-report', 'left')]
+    assert current_profile() == DEFAULT_PROFILE
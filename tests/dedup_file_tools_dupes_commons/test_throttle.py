@@ -0,0 +1,76 @@
+import os
+import threading
+import time
+import pytest
+from dedup_file_tools_commons.utils.throttle import (
+    TokenBucket, Throttle, ThrottleController, JOB_SCOPE, parse_rate, parse_device_limit,
+    save_throttle_limits, get_throttle
+)
+from dedup_file_tools_commons.utils.fileops import compute_hash
+
+def test_parse_rates():
+    assert parse_rate('500') == 500
+    assert parse_rate('20M') == 20 * 1024 * 1024
+    assert parse_rate('1.5g/s') == 1.5 * 1024 ** 3
+    assert parse_rate('0') == 0
+    assert parse_device_limit('/mnt/nas=4K:100') == ('/mnt/nas', 4096, 100)
+    assert parse_device_limit('/mnt/nas=4K') == ('/mnt/nas', 4096, 0)
+    with pytest.raises(ValueError):
+        parse_device_limit('4K')
+
+def test_bucket_waits_for_refill_and_releases_on_rate_change():
+    bucket = TokenBucket(1000)
+    start = time.monotonic()
+    bucket.acquire(1000)  # the initial burst is free
+    bucket.acquire(300)
+    assert 0.25 <= time.monotonic() - start < 1.0
+    bucket.set_rate(1)
+    waiter = threading.Thread(target=bucket.acquire, args=(1000,))
+    waiter.start()
+    time.sleep(0.1)
+    assert waiter.is_alive()
+    bucket.set_rate(0)
+    waiter.join(1.0)
+    assert not waiter.is_alive()
+
+def test_controller_applies_and_reloads_job_db_limits(tmp_path):
+    db_path = str(tmp_path / "job.db")
+    save_throttle_limits(db_path, JOB_SCOPE, 1000, 10)
+    save_throttle_limits(db_path, str(tmp_path), 500, 0)
+    throttle = Throttle()
+    with ThrottleController(db_path, throttle, interval=60) as controller:
+        assert throttle.limits() == (1000, 10, {os.stat(tmp_path).st_dev: (500, 0)})
+        save_throttle_limits(db_path, JOB_SCOPE, 2000, 0)
+        save_throttle_limits(db_path, str(tmp_path), 0, 0)
+        assert controller.reload()
+        assert throttle.limits() == (2000, 0, {})
+        assert throttle.active
+    assert not throttle.active
+
+def test_limits_load_under_readonly_report_profile(tmp_path):
+    import sqlite3
+    from dedup_file_tools_commons.utils.sqlite_profiles import sqlite_phase
+    from dedup_file_tools_commons.utils.throttle import load_throttle_limits
+    db_path = str(tmp_path / "job.db")
+    sqlite3.connect(db_path).close()
+    with sqlite_phase('show-result', [], 'readonly-report'):
+        # A job DB without the table has no limits
+        assert load_throttle_limits(db_path) == (0, 0, {})
+    save_throttle_limits(db_path, JOB_SCOPE, 1000, 10)
+    with sqlite_phase('show-result', [], 'readonly-report'):
+        assert load_throttle_limits(db_path) == (1000, 10, {})
+
+def test_hashing_is_throttled(tmp_path):
+    path = tmp_path / "data.bin"
+    data = os.urandom(1536 * 1024)
+    path.write_bytes(data)
+    unthrottled = compute_hash(str(path))
+    db_path = str(tmp_path / "job.db")
+    save_throttle_limits(db_path, JOB_SCOPE, 1024 * 1024, 0)
+    with ThrottleController(db_path):
+        start = time.monotonic()
+        assert compute_hash(str(path), cache_policy='dontneed') == unthrottled
+        elapsed = time.monotonic() - start
+    # 1 MiB burst, then 0.5 MiB at 1 MiB/s
+    assert elapsed >= 0.4
+    assert not get_throttle().active
@@ -61,3 +61,74 @@ def test_find_and_queue_duplicates(tmp_path):
         # There should be at least one duplicate checksum
         checksums = [r[1] for r in rows]
         assert any(checksums.count(chk) > 1 for chk in checksums)
+
+def test_unique_size_files_are_not_hashed(tmp_path):
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "a.txt").write_text("same")
+    (src_dir / "b.txt").write_text("same")
+    (src_dir / "c.txt").write_text("different size")
+    db_path = setup_test_db(tmp_path)
+    find_and_queue_duplicates(db_path, str(src_dir), threads=1)
+    with sqlite3.connect(db_path) as conn:
+        rows = {os.path.basename(r[0]): r[1] for r in conn.execute("SELECT relative_path, checksum FROM dedup_files_pool")}
+        planned = list(conn.execute("SELECT relative_path FROM dedup_move_plan WHERE is_keeper=0"))
+    assert rows["a.txt"] is not None and rows["a.txt"] == rows["b.txt"]
+    # Unique size: recorded but never hashed
+    assert rows["c.txt"] is None
+    assert len(planned) == 1
+    with sqlite3.connect(str(tmp_path / "checksum-cache.db")) as conn:
+        cached = {os.path.basename(r[0]) for r in conn.execute("SELECT relative_path FROM checksum_cache")}
+    assert cached == {"a.txt", "b.txt"}
+
+def test_size_collision_with_earlier_pool(tmp_path):
+    first = tmp_path / "first"
+    second = tmp_path / "second"
+    first.mkdir()
+    second.mkdir()
+    (first / "a.txt").write_text("payload")
+    (second / "b.txt").write_text("payload")
+    db_path = setup_test_db(tmp_path)
+    find_and_queue_duplicates(db_path, str(first), threads=1)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT checksum FROM dedup_files_pool").fetchone()[0] is None
+    # The earlier unhashed file collides with the new one and is hashed now
+    find_and_queue_duplicates(db_path, str(second), threads=1)
+    with sqlite3.connect(db_path) as conn:
+        checksums = [r[0] for r in conn.execute("SELECT checksum FROM dedup_files_pool")]
+        planned = list(conn.execute("SELECT relative_path FROM dedup_move_plan WHERE is_keeper=0"))
+    assert len(checksums) == 2 and checksums[0] is not None and checksums[0] == checksums[1]
+    assert len(planned) == 1
+
+def test_large_files_hashed_only_on_fingerprint_collision(tmp_path):
+    from dedup_file_tools_commons.utils.fileops import FINGERPRINT_MIN_SIZE
+    size = FINGERPRINT_MIN_SIZE * 2
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    payload = os.urandom(size)
+    (src_dir / "a.bin").write_bytes(payload)
+    (src_dir / "b.bin").write_bytes(payload)
+    (src_dir / "c.bin").write_bytes(os.urandom(size))
+    db_path = setup_test_db(tmp_path)
+    find_and_queue_duplicates(db_path, str(src_dir), threads=2)
+    with sqlite3.connect(db_path) as conn:
+        rows = {os.path.basename(r[0]): r[1] for r in conn.execute("SELECT relative_path, checksum FROM dedup_files_pool")}
+    assert rows["a.bin"] is not None and rows["a.bin"] == rows["b.bin"]
+    # Same size, different fingerprint: never fully hashed
+    assert rows["c.bin"] is None
+    with sqlite3.connect(str(tmp_path / "checksum-cache.db")) as conn:
+        cached = {os.path.basename(r[0]): r[1] for r in conn.execute("SELECT relative_path, checksum FROM checksum_cache")}
+    assert cached["c.bin"] is None
+
+def test_process_executor(tmp_path):
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (src_dir / name).write_text("same")
+    db_path = setup_test_db(tmp_path)
+    find_and_queue_duplicates(db_path, str(src_dir), threads=2, executor='process', hash_workers=2)
+    with sqlite3.connect(db_path) as conn:
+        checksums = {r[0] for r in conn.execute("SELECT checksum FROM dedup_files_pool")}
+        planned = list(conn.execute("SELECT relative_path FROM dedup_move_plan WHERE is_keeper=0"))
+    assert len(checksums) == 1 and None not in checksums
+    assert len(planned) == 2
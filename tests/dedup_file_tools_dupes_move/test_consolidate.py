@@ -0,0 +1,57 @@
+import os
+import sqlite3
+from dedup_file_tools_dupes_move.main import main
+
+
+def run_consolidate(tmp_path, link_mode, before_move=None):
+    job_dir = tmp_path / "job"
+    src = tmp_path / "src"
+    src.mkdir()
+    job_dir.mkdir()
+    (src / "a.txt").write_text("dupe")
+    (src / "b.txt").write_text("dupe")
+    (src / "c.txt").write_text("unique")
+    job_name = "consolidate"
+    common = ["--job-dir", str(job_dir), "--job-name", job_name]
+    main(["init"] + common)
+    main(["analyze"] + common + ["--lookup-pool", str(src), "--threads", "1"])
+    if before_move:
+        before_move(src)
+    main(["move"] + common + ["--mode", "consolidate", "--link-mode", link_mode, "--threads", "1"])
+    main(["verify"] + common + ["--threads", "1"])
+    return src, str(job_dir / f"{job_name}.db")
+
+
+def test_consolidate_hardlink(tmp_path):
+    src, db_path = run_consolidate(tmp_path, "hardlink")
+    # Both paths still exist and now share one inode
+    assert os.path.samefile(src / "a.txt", src / "b.txt")
+    assert (src / "a.txt").read_text() == "dupe"
+    assert not os.path.samefile(src / "a.txt", src / "c.txt")
+    with sqlite3.connect(db_path) as conn:
+        statuses = dict(conn.execute("SELECT status, COUNT(*) FROM dedup_move_plan GROUP BY status"))
+        assert statuses == {"verified": 2}
+        history = conn.execute("SELECT action, result FROM dedup_move_history WHERE action='consolidate'").fetchall()
+        assert history == [("consolidate", "hardlink")]
+    # No temporary files are left behind
+    assert sorted(p.name for p in src.iterdir()) == ["a.txt", "b.txt", "c.txt"]
+
+
+def test_consolidate_auto_keeps_content(tmp_path):
+    src, db_path = run_consolidate(tmp_path, "auto")
+    assert (src / "a.txt").read_text() == (src / "b.txt").read_text() == "dupe"
+    with sqlite3.connect(db_path) as conn:
+        results = [r[0] for r in conn.execute("SELECT result FROM dedup_move_history WHERE action='consolidate'")]
+        assert results and results[0] in ("reflink", "hardlink")
+
+
+def test_consolidate_refuses_changed_file(tmp_path):
+    def change_duplicate(src):
+        (src / "a.txt").write_text("changed")
+        (src / "b.txt").write_text("changed")
+        os.utime(src / "a.txt", (1, 1))
+    src, db_path = run_consolidate(tmp_path, "hardlink", before_move=change_duplicate)
+    assert not os.path.samefile(src / "a.txt", src / "b.txt")
+    with sqlite3.connect(db_path) as conn:
+        errors = conn.execute("SELECT error_message FROM dedup_move_history WHERE action='consolidate' AND result='error'").fetchall()
+        assert errors and "Checksum changed" in errors[0][0]
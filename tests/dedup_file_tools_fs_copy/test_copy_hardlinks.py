@@ -0,0 +1,56 @@
+import os
+import sqlite3
+from dedup_file_tools_fs_copy import main
+
+
+def run_phases(job_dir, job_name, src_dir, dst_dir, *phases):
+    for phase in phases:
+        args = [phase, "--job-dir", str(job_dir), "--job-name", job_name]
+        if phase != "init":
+            args += ["--src", str(src_dir), "--dst", str(dst_dir)]
+        assert main.run_main_command(main.parse_args(args)) == 0
+
+
+def test_copy_recreates_source_hardlinks(tmp_path):
+    src_dir = tmp_path / "src"
+    dst_dir = tmp_path / "dst"
+    job_dir = tmp_path / "job"
+    job_name = "testjob"
+    for d in (src_dir, dst_dir, job_dir):
+        d.mkdir()
+    (src_dir / "a.txt").write_text("linked content")
+    (src_dir / "snapshot").mkdir()
+    (src_dir / "snapshot" / "a.txt").hardlink_to(src_dir / "a.txt")
+    (src_dir / "b.txt").write_text("plain")
+    run_phases(job_dir, job_name, src_dir, dst_dir, "init", "analyze")
+    with sqlite3.connect(job_dir / f"{job_name}.db") as conn:
+        identities = conn.execute("SELECT device, inode, nlink FROM source_files WHERE relative_path LIKE '%a.txt'").fetchall()
+    assert len(identities) == 2 and identities[0] == identities[1] and identities[0][2] == 2
+    run_phases(job_dir, job_name, src_dir, dst_dir, "copy")
+    copies = sorted(dst_dir.rglob("a.txt"))
+    assert len(copies) == 2
+    assert os.path.samefile(copies[0], copies[1])
+    assert copies[0].read_text() == "linked content"
+    with sqlite3.connect(job_dir / f"{job_name}.db") as conn:
+        rows = conn.execute("SELECT relative_path, status, copy_method, bytes_copied FROM copy_status WHERE relative_path LIKE '%a.txt'").fetchall()
+    assert all(r[1] == 'done' for r in rows)
+    methods = sorted(r[2] for r in rows)
+    assert methods.count('hardlink') == 1
+    assert [r[3] for r in rows if r[2] == 'hardlink'] == [0]
+
+
+def test_resume_links_to_copy_from_earlier_run(tmp_path):
+    src_dir = tmp_path / "src"
+    dst_dir = tmp_path / "dst"
+    job_dir = tmp_path / "job"
+    job_name = "testjob"
+    for d in (src_dir, dst_dir, job_dir):
+        d.mkdir()
+    (src_dir / "a.txt").write_text("linked content")
+    run_phases(job_dir, job_name, src_dir, dst_dir, "init", "analyze", "copy")
+    # A new hardlink appears after the first copy
+    (src_dir / "b.txt").hardlink_to(src_dir / "a.txt")
+    run_phases(job_dir, job_name, src_dir, dst_dir, "analyze", "copy")
+    a_copy = next(dst_dir.rglob("a.txt"))
+    b_copy = next(dst_dir.rglob("b.txt"))
+    assert os.path.samefile(a_copy, b_copy)
@@ -0,0 +1,56 @@
+import sqlite3
+import hashlib
+from dedup_file_tools_fs_copy import main
+from dedup_file_tools_commons.utils.checksum_cache import ChecksumCache
+
+def test_copy_hashes_unique_files_once_and_caches_both_paths(tmp_path, monkeypatch):
+    src_dir = tmp_path / "src"
+    dst_dir = tmp_path / "dst"
+    job_dir = tmp_path / "job"
+    job_name = "testjob"
+    for d in (src_dir, dst_dir, job_dir):
+        d.mkdir()
+    (src_dir / "unique.txt").write_text("only one of these")
+    (src_dir / "dup1.txt").write_text("same")
+    (src_dir / "dup2.txt").write_text("same")
+    prehashed = []
+    original = ChecksumCache.get_or_compute_with_invalidation
+    def spy(self, path):
+        prehashed.append(path)
+        return original(self, path)
+    monkeypatch.setattr(ChecksumCache, "get_or_compute_with_invalidation", spy)
+    assert main.run_main_command(main.parse_args(["init", "--job-dir", str(job_dir), "--job-name", job_name])) == 0
+    assert main.run_main_command(main.parse_args(["analyze", "--job-dir", str(job_dir), "--job-name", job_name, "--src", str(src_dir), "--dst", str(dst_dir)])) == 0
+    assert main.run_main_command(main.parse_args(["copy", "--job-dir", str(job_dir), "--job-name", job_name, "--src", str(src_dir), "--dst", str(dst_dir), "--threads", "4"])) == 0
+    # The unique file was only read by the copy itself
+    assert not [p for p in prehashed if p.endswith("unique.txt")]
+    found = list(dst_dir.rglob("unique.txt"))
+    assert found and found[0].read_text() == "only one of these"
+    # Same-size files of one batch are still deduplicated
+    assert len(list(dst_dir.rglob("dup*.txt"))) == 1
+    expected = hashlib.sha256(b"only one of these").hexdigest()
+    with sqlite3.connect(job_dir / "checksum-cache.db") as conn:
+        rows = conn.execute("SELECT relative_path FROM checksum_cache WHERE checksum=?", (expected,)).fetchall()
+    paths = sorted(r[0].replace("\\", "/") for r in rows)
+    assert len(paths) == 2
+    assert any(p.endswith("src/unique.txt") for p in paths) and any("dst/" in p for p in paths)
+
+def test_copy_records_method_and_bytes(tmp_path):
+    src_dir = tmp_path / "src"
+    dst_dir = tmp_path / "dst"
+    job_dir = tmp_path / "job"
+    job_name = "testjob"
+    for d in (src_dir, dst_dir, job_dir):
+        d.mkdir()
+    (src_dir / "a.txt").write_text("kernel copy")
+    assert main.run_main_command(main.parse_args(["init", "--job-dir", str(job_dir), "--job-name", job_name])) == 0
+    assert main.run_main_command(main.parse_args(["analyze", "--job-dir", str(job_dir), "--job-name", job_name, "--src", str(src_dir), "--dst", str(dst_dir)])) == 0
+    assert main.run_main_command(main.parse_args(["copy", "--job-dir", str(job_dir), "--job-name", job_name, "--src", str(src_dir), "--dst", str(dst_dir),
+                                                  "--copy-backend", "kernel", "--read-back"])) == 0
+    found = list(dst_dir.rglob("a.txt"))
+    assert found and found[0].read_text() == "kernel copy"
+    with sqlite3.connect(job_dir / f"{job_name}.db") as conn:
+        status, method, bytes_copied = conn.execute("SELECT status, copy_method, bytes_copied FROM copy_status").fetchone()
+    assert status == 'done'
+    assert method in ('clone', 'copy_file_range', 'sendfile', 'buffered')
+    assert bytes_copied == len("kernel copy")
@@ -35,3 +35,47 @@ def test_add_and_exists(tmp_path):
         assert pool.exists(conn, uid, str(rel))
         # Should not exist for a different file
         assert not pool.exists(conn, uid, "not_a_file.txt")
+
+def test_job_db_stores_pool_in_path_store(tmp_path):
+    from dedup_file_tools_fs_copy.db import init_db
+    from dedup_file_tools_commons.db import init_checksum_db
+    from dedup_file_tools_commons.utils.checksum_cache import ChecksumCache
+    from dedup_file_tools_commons.utils.db_utils import attached_conn_factory
+    db_path = str(tmp_path / "job.db")
+    checksum_db_path = str(tmp_path / "checksum-cache.db")
+    # A job DB of an older release: destination_pool_files is a table
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE destination_pool_files (uid TEXT, relative_path TEXT, size INTEGER, last_modified INTEGER, last_seen INTEGER, PRIMARY KEY (uid, relative_path))")
+        conn.execute("INSERT INTO destination_pool_files VALUES ('u', 'old/a.txt', 3, 1, 1)")
+    conn.close()
+    init_db(db_path)
+    init_db(db_path)
+    init_checksum_db(checksum_db_path)
+    uid_path = UidPathUtil()
+    pool = DestinationPoolIndex(uid_path)
+    file_path = tmp_path / "pool" / "file1.txt"
+    file_path.parent.mkdir()
+    file_path.write_text("hello world")
+    stat = file_path.stat()
+    uid_path_obj = uid_path.convert_path(str(file_path))
+    uid, rel = uid_path_obj.uid, str(uid_path_obj.relative_path)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT type FROM sqlite_master WHERE name='destination_pool_files'").fetchone() == ('view',)
+        pool.add_or_update_file(conn, str(file_path), stat.st_size, int(stat.st_mtime), stat=stat)
+        pool.add_or_update_file(conn, str(file_path), stat.st_size, int(stat.st_mtime))
+        assert pool.exists(conn, uid, rel) and pool.exists(conn, 'u', 'old/a.txt')
+        assert not pool.exists(conn, uid, "not_a_file.txt")
+        assert sorted(row[:2] for row in pool.all_files(conn)) == sorted([('u', 'old/a.txt'), (uid, rel)])
+        assert conn.execute("SELECT inode FROM destination_pool_files WHERE name='file1.txt'").fetchone() == (stat.st_ino,)
+    conn.close()
+    conn_factory = attached_conn_factory(db_path, checksum_db_path)
+    cache = ChecksumCache(conn_factory, uid_path)
+    checksum = cache.get_or_compute(str(file_path))
+    assert cache.exists_at_destination_pool(checksum)
+    assert checksum in cache.destination_pool_checksums()
+    with conn_factory() as conn:
+        query = f"""SELECT 1 FROM destination_pool_files AS dpf JOIN checksumdb.checksum_cache AS cc
+                    ON dpf.uid = cc.uid AND {cache._path_match(conn, 'destination_pool_files', 'dpf')} WHERE cc.checksum = ?"""
+        plan = ' '.join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + query, (checksum,)))
+    # The pool side is probed through its indexes, not by computing relative_path for every row
+    assert 'dir_id=? AND name=?' in plan and 'SCAN' not in plan
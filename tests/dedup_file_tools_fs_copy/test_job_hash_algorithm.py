@@ -0,0 +1,24 @@
+import sqlite3
+from dedup_file_tools_fs_copy import main
+
+
+def test_hash_algorithm_is_stored_with_the_job(tmp_path):
+    src_dir = tmp_path / "src"
+    dst_dir = tmp_path / "dst"
+    job_dir = tmp_path / "job"
+    src_dir.mkdir()
+    dst_dir.mkdir()
+    (src_dir / "a.txt").write_text("hello")
+    job = ["--job-dir", str(job_dir), "--job-name", "job"]
+    assert main.run_main_command(main.parse_args(["init"] + job)) == 0
+    assert main.run_main_command(main.parse_args(["analyze"] + job + ["--src", str(src_dir)])) == 0
+    assert main.run_main_command(main.parse_args(["checksum"] + job + ["--table", "source_files", "--hash-algorithm", "blake2b"])) == 0
+    # Later commands default to the stored algorithm and refuse another one
+    assert main.run_main_command(main.parse_args(["copy"] + job + ["--src", str(src_dir), "--dst", str(dst_dir), "--hash-algorithm", "sha256"])) == 1
+    assert main.run_main_command(main.parse_args(["copy"] + job + ["--src", str(src_dir), "--dst", str(dst_dir)])) == 0
+    with sqlite3.connect(job_dir / "job.db") as conn:
+        assert conn.execute("SELECT value FROM job_metadata WHERE key='hash_algorithm'").fetchone() == ('blake2b',)
+    conn.close()
+    with sqlite3.connect(job_dir / "checksum-cache.db") as conn:
+        assert {row[0] for row in conn.execute("SELECT algorithm FROM checksum_cache")} == {'blake2b'}
+    conn.close()